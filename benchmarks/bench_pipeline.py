@@ -0,0 +1,80 @@
+"""Benchmarks for pipeline state handling, prompt construction and full runs."""
+
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from story_seq.config import StorySeqConfig
+from story_seq.models import AnalysisConfig
+from story_seq.pipeline.blast_pipeline import ResearchTaskGraph
+from story_seq.pipeline.state import PipelineOptions, PipelineState
+from story_seq.pipeline.tasks import get_fasta_sketch
+
+
+def make_options(query: str) -> PipelineOptions:
+    return PipelineOptions(
+        # No narrative cache, so every round writes the batch report from scratch
+        config=StorySeqConfig(llm_api_url="http://stub.invalid/v1", llm_api_key=".", narrative_cache_path=None),
+        query=query,
+        question="What species is this?",
+    )
+
+
+@pytest.fixture
+def finished_state(tmp_path: Path, blast_results: list) -> PipelineState:
+    state = PipelineState(
+        options=make_options("query.fna"),
+        analysis_config=AnalysisConfig(identify_unknown_dna=True),
+        blast_results=blast_results,
+        narrative="narrative " * 500,
+    )
+    state.state_file_path = str(tmp_path / "state.json")
+    return state
+
+
+@pytest.mark.benchmark(group="state")
+def test_state_save(benchmark: BenchmarkFixture, finished_state: PipelineState) -> None:
+    benchmark(finished_state.save_to_file, "benchmark")
+
+
+@pytest.mark.benchmark(group="state")
+def test_state_load(benchmark: BenchmarkFixture, finished_state: PipelineState) -> None:
+    finished_state.save_to_file("benchmark")
+
+    def load() -> PipelineState:
+        with open(finished_state.state_file_path) as f:
+            return PipelineState(options=finished_state.options, **json.load(f))
+
+    assert len(benchmark(load).blast_results) == 5
+
+
+@pytest.mark.benchmark(group="prompt")
+def test_reporter_prompt_construction(
+    benchmark: BenchmarkFixture, stub_backends: None, blast_results: list
+) -> None:
+    """Reporter run against the stub LLM: dominated by indexing 500 hits for the prompt overview."""
+    from story_seq.agent.reporter_agent import ReporterAgentDeps, get_reporter_agent
+
+    agent = asyncio.run(get_reporter_agent(llm_api_url="http://stub.invalid/v1", llm_api_key="."))
+    deps = ReporterAgentDeps(
+        blast_results=blast_results,
+        analysis_config=AnalysisConfig(identify_unknown_dna=True),
+        question="What species is this?",
+    )
+    result = benchmark(lambda: asyncio.run(agent.run("What species is this?", deps=deps)))
+    assert result.output
+
+
+@pytest.mark.benchmark(group="graph")
+def test_full_graph_run(benchmark: BenchmarkFixture, stub_backends: None, short_records_fasta: Path) -> None:
+    """Every node end to end with stubbed LLM and MCP backends."""
+
+    def run() -> PipelineState:
+        state = PipelineState(options=make_options(str(short_records_fasta)))
+        return asyncio.run(ResearchTaskGraph.run(get_fasta_sketch(), state=state)).output
+
+    state = benchmark.pedantic(run, rounds=5, iterations=1)
+    assert state.narrative
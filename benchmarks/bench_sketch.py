@@ -0,0 +1,71 @@
+"""Benchmarks for the FASTA sketching hot paths."""
+
+import random
+from pathlib import Path
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from benchmarks.synthetic import IUPAC_NT, NT, random_sequence
+from story_seq.util.fasta_sketch import (
+    analyze_single_fasta,
+    guess_alphabet,
+    longest_orf_length,
+    process_multiple_files,
+)
+
+
+@pytest.fixture(scope="module")
+def long_nt_sequence() -> str:
+    return random_sequence(1_000_000, NT, random.Random(1))
+
+
+@pytest.fixture(scope="module")
+def ambiguous_sequence() -> str:
+    return random_sequence(200_000, IUPAC_NT, random.Random(2)).lower()
+
+
+@pytest.mark.benchmark(group="guess_alphabet")
+def test_guess_alphabet_long_nt(benchmark: BenchmarkFixture, long_nt_sequence: str) -> None:
+    """Worst case: no protein-only characters, so every base is scanned."""
+    assert benchmark(guess_alphabet, long_nt_sequence) == "NT"
+
+
+@pytest.mark.benchmark(group="guess_alphabet")
+def test_guess_alphabet_protein(benchmark: BenchmarkFixture) -> None:
+    protein = random_sequence(5000, "ACDEFGHIKLMNPQRSTVWY", random.Random(3))
+    assert benchmark(guess_alphabet, protein) == "AA"
+
+
+@pytest.mark.benchmark(group="longest_orf_length")
+def test_longest_orf_length_random(benchmark: BenchmarkFixture, long_nt_sequence: str) -> None:
+    assert benchmark(longest_orf_length, long_nt_sequence) > 0
+
+
+@pytest.mark.benchmark(group="longest_orf_length")
+def test_longest_orf_length_ambiguous(benchmark: BenchmarkFixture, ambiguous_sequence: str) -> None:
+    assert benchmark(longest_orf_length, ambiguous_sequence) > 0
+
+
+@pytest.mark.benchmark(group="analyze_single_fasta")
+@pytest.mark.parametrize(
+    "dataset",
+    ["short_records_fasta", "huge_contigs_fasta", "mixed_fasta", "ambiguous_fasta"],
+)
+def test_analyze_single_fasta(benchmark: BenchmarkFixture, request: pytest.FixtureRequest, dataset: str) -> None:
+    path = str(request.getfixturevalue(dataset))
+    result = benchmark.pedantic(analyze_single_fasta, args=(path,), rounds=3, iterations=1)
+    assert "error" not in result
+
+
+@pytest.mark.benchmark(group="process_multiple_files")
+def test_process_multiple_files(
+    benchmark: BenchmarkFixture,
+    short_records_fasta: Path,
+    huge_contigs_fasta: Path,
+    mixed_fasta: Path,
+    ambiguous_fasta: Path,
+) -> None:
+    paths = [str(p) for p in (short_records_fasta, huge_contigs_fasta, mixed_fasta, ambiguous_fasta)]
+    sketch = benchmark.pedantic(process_multiple_files, args=(paths,), rounds=3, iterations=1)
+    assert not sketch["run_summary"]["errors"]
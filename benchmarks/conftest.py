@@ -0,0 +1,45 @@
+"""Shared fixtures for the benchmark suite."""
+
+from pathlib import Path
+
+import pytest
+
+from benchmarks import stubs, synthetic
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    return tmp_path_factory.mktemp("bench_data")
+
+
+@pytest.fixture(scope="session")
+def short_records_fasta(data_dir: Path) -> Path:
+    return synthetic.many_short_records(data_dir / "short_records.fna")
+
+
+@pytest.fixture(scope="session")
+def huge_contigs_fasta(data_dir: Path) -> Path:
+    return synthetic.huge_contigs(data_dir / "huge_contigs.fna")
+
+
+@pytest.fixture(scope="session")
+def mixed_fasta(data_dir: Path) -> Path:
+    return synthetic.mixed_nt_aa(data_dir / "mixed.fasta")
+
+
+@pytest.fixture(scope="session")
+def ambiguous_fasta(data_dir: Path) -> Path:
+    return synthetic.pathological_ambiguity(data_dir / "ambiguous.fna")
+
+
+@pytest.fixture(scope="session")
+def blast_results() -> list:
+    return synthetic.make_blast_results()
+
+
+@pytest.fixture
+def stub_backends(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Route every agent to the in-process stub LLM and MCP server."""
+    for module in ("configuration_agent", "blast_agent", "reporter_agent", "batch_reporter"):
+        monkeypatch.setattr(f"story_seq.agent.{module}.OpenAIModel", stubs.stub_model)
+    monkeypatch.setattr("story_seq.agent.blast_agent.MCPServerStdio", stubs.stub_mcp_server)
@@ -0,0 +1,82 @@
+"""
+In-process stand-ins for the LLM endpoint and the NCBI MCP server.
+
+The stubs answer instantly and deterministically, so pipeline benchmarks
+measure story-seq's own overhead (prompt assembly, validation, state
+handling) rather than network or model latency.
+"""
+
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List
+
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.toolsets import FunctionToolset
+
+from benchmarks.synthetic import make_blast_results
+from story_seq.models import AnalysisConfig
+
+STUB_NARRATIVE = "The query matches a synthetic reference with high identity across its full length. " * 20
+
+
+def blast_search(
+    sequence: str, program: str = "blastn", database: str = "nt", max_hits_per_query: int = 100, entrez_query: str = "",
+) -> List[Dict[str, Any]]:
+    """Stub BLAST tool returning one search of 100 hits."""
+    return [result.model_dump() for result in make_blast_results(searches=1, hits=100)]
+
+
+def _tool_returns(messages: List[ModelMessage]) -> List[ToolReturnPart]:
+    return [
+        part
+        for message in messages
+        for part in message.parts
+        if isinstance(part, ToolReturnPart)
+    ]
+
+
+def stub_model_function(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    """Answer like the real agents would: config, BLAST results or a narrative."""
+    if not info.output_tools:
+        return ModelResponse(parts=[TextPart(STUB_NARRATIVE)])
+
+    output_tool = info.output_tools[0]
+    properties = output_tool.parameters_json_schema.get("properties", {})
+    if "analysis_scenario" in properties:
+        config = AnalysisConfig(identify_unknown_dna=True, analysis_scenario="Mode A - species identification")
+        return ModelResponse(parts=[ToolCallPart(output_tool.name, config.model_dump())])
+
+    # BLAST agent: run the search tool first, then select the captured searches by id
+    returns = _tool_returns(messages)
+    if not returns and info.function_tools:
+        return ModelResponse(parts=[ToolCallPart(info.function_tools[0].name, {"sequence": "ACGT"})])
+    searches = returns[0].content["searches"] if returns else []
+    selections = [{"search_id": s["search_id"], "search_reason": "Benchmark search"} for s in searches]
+    return ModelResponse(parts=[ToolCallPart(output_tool.name, {"response": selections})])
+
+
+async def stub_stream_function(messages: List[ModelMessage], info: AgentInfo) -> AsyncIterator[str]:
+    """Stream the narrative a few words at a time, like a token stream."""
+    words = STUB_NARRATIVE.split(" ")
+    for i in range(0, len(words), 4):
+        yield " ".join(words[i:i + 4]) + " "
+
+
+def stub_model(*args: Any, **kwargs: Any) -> FunctionModel:
+    """Drop-in replacement for OpenAIModel(...)."""
+    return FunctionModel(stub_model_function, stream_function=stub_stream_function)
+
+
+class StubMCPServer(FunctionToolset):
+    """FunctionToolset that can also be called directly, like an MCP server."""
+
+    async def list_tools(self) -> List[SimpleNamespace]:
+        return [SimpleNamespace(name=name, inputSchema=tool.function_schema.json_schema) for name, tool in self.tools.items()]
+
+    async def direct_call_tool(self, name: str, args: Dict[str, Any], metadata: Any = None) -> Any:
+        return blast_search(**args)
+
+
+def stub_mcp_server(*args: Any, **kwargs: Any) -> FunctionToolset:
+    """Drop-in replacement for MCPServerStdio(...)."""
+    return StubMCPServer([blast_search])
@@ -0,0 +1,105 @@
+"""Synthetic inputs for the benchmark suite."""
+
+import random
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple
+
+from story_seq.models import BlastHit, BlastResult
+
+NT = "ACGT"
+AA = "ACDEFGHIKLMNPQRSTVWY"
+# Ambiguity codes that are valid nucleotides but defeat simple ORF/alphabet heuristics
+IUPAC_NT = "ACGTNRYKMSWBDHV"
+
+
+def random_sequence(length: int, alphabet: str, rng: random.Random) -> str:
+    """Return a random sequence drawn uniformly from alphabet."""
+    return "".join(rng.choices(alphabet, k=length))
+
+
+def write_fasta(path: Path, records: Iterable[Tuple[str, str]], line_width: int = 80) -> Path:
+    """Write (id, sequence) pairs as a wrapped FASTA file."""
+    with open(path, "w") as handle:
+        for record_id, seq in records:
+            handle.write(f">{record_id}\n")
+            for i in range(0, len(seq), line_width):
+                handle.write(seq[i:i + line_width] + "\n")
+    return path
+
+
+def many_short_records(path: Path, n: int = 5000, length: int = 150, seed: int = 0) -> Path:
+    """Many short nucleotide reads."""
+    rng = random.Random(seed)
+    return write_fasta(path, ((f"read{i}", random_sequence(length, NT, rng)) for i in range(n)))
+
+
+def huge_contigs(path: Path, n: int = 2, length: int = 1_000_000, seed: int = 0) -> Path:
+    """A few very long nucleotide contigs."""
+    rng = random.Random(seed)
+    return write_fasta(path, ((f"contig{i}", random_sequence(length, NT, rng)) for i in range(n)))
+
+
+def mixed_nt_aa(path: Path, n: int = 1000, nt_length: int = 900, aa_length: int = 300, seed: int = 0) -> Path:
+    """Interleaved nucleotide and protein records (forces a mixed-file split)."""
+    rng = random.Random(seed)
+
+    def records() -> Iterator[Tuple[str, str]]:
+        for i in range(n):
+            if i % 2:
+                yield f"prot{i}", random_sequence(aa_length, AA, rng)
+            else:
+                yield f"gene{i}", random_sequence(nt_length, NT, rng)
+
+    return write_fasta(path, records())
+
+
+def pathological_ambiguity(path: Path, n: int = 200, length: int = 20000, seed: int = 0) -> Path:
+    """
+    Long, lower-case, ambiguity-rich nucleotide records with long N runs.
+
+    No protein-exclusive characters appear, so alphabet guessing scans every
+    base, and the ambiguity codes break up stop codons so ORFs run long.
+    """
+    rng = random.Random(seed)
+
+    def records() -> Iterator[Tuple[str, str]]:
+        for i in range(n):
+            seq = random_sequence(length, IUPAC_NT, rng)
+            start = rng.randrange(0, length // 2)
+            seq = seq[:start] + "N" * (length // 10) + seq[start + length // 10:]
+            yield f"ambiguous{i}", seq.lower()
+
+    return write_fasta(path, records())
+
+
+def make_blast_results(searches: int = 5, hits: int = 100, query_length: int = 2000, seed: int = 0) -> List[BlastResult]:
+    """Realistic-sized BLAST results: several searches of up to 100 hits each."""
+    rng = random.Random(seed)
+    methods = ["megablast", "blastn", "blastx", "tblastx", "blastp"]
+    results = []
+    for s in range(searches):
+        search_hits = []
+        for h in range(hits):
+            start = rng.randint(1, query_length - 100)
+            end = rng.randint(start + 50, query_length)
+            search_hits.append(BlastHit(
+                query_id="query1",
+                subject_id=f"XM_{rng.randint(100000, 999999)}.{h % 3 + 1}",
+                identity=round(rng.uniform(60, 100), 2),
+                alignment_length=end - start + 1,
+                evalue=10 ** -rng.uniform(3, 180),
+                bit_score=round(rng.uniform(40, 3000), 1),
+                query_start=start,
+                query_end=end,
+                subject_start=1,
+                subject_end=end - start + 1,
+                genbank_summary=f"Synthetic organism {h % 17} hypothetical protein",
+            ))
+        results.append(BlastResult(
+            query_length=query_length,
+            hits=search_hits,
+            database="nt",
+            blast_method=methods[s % len(methods)],
+            search_reason=f"benchmark search {s}",
+        ))
+    return results
@@ -0,0 +1,271 @@
+"""
+Map-reduce narratives for large query batches.
+
+A single reporter call over hundreds of queries overflows the context window or
+takes minutes. For large batches the narrative is built as a tree instead:
+
+    - map: the reporter agent writes a short narrative for each query, from that
+      query's hits only; these calls run concurrently, at most `fanout` at once
+    - reduce: the merge agent combines a few narratives at a time, level by
+      level, until one batch report is left
+
+Groups in the tree are content-defined: a node closes its group when a hash of
+its id (the query id, or for merged nodes the id of their last child) falls on a
+boundary, as in a Merkle search tree. Adding a query to a batch therefore only
+changes the group it lands in at each level. Every node's narrative is cached
+under a hash of its inputs (a query's results, or its children's keys), so a
+rerun only calls the LLM for the branch from the new query up to the root.
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import time
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Mapping, Optional, Union
+
+from pydantic_ai import Agent, AgentRunResult
+from pydantic_ai.models.openai import OpenAIModel
+
+from story_seq.agent.llm_scheduler import scheduled_provider
+from story_seq.agent.prompts import static_prompt
+from story_seq.config import StorySeqConfig
+from story_seq.models import AnalysisConfig, BlastResult
+from story_seq.util.coverage import match_query
+from story_seq.util.orfs import orf_record_id
+from story_seq.util.single_flight import get_single_flight
+
+if TYPE_CHECKING:
+    from story_seq.agent.reporter_agent import ReporterAgentDeps
+
+# Safety net for the content-defined grouping: a group never grows past this many widths
+MAX_GROUP_WIDTHS = 2
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@dataclass
+class NarrativeNode:
+    """A narrative in the map-reduce tree."""
+    id: str  # stable across runs: the query id, or the id of the last child
+    key: str  # cache key: changes whenever the node's inputs change
+    text: str
+    queries: int  # queries covered
+
+
+class NarrativeCache:
+    """SQLite cache of narratives keyed by a hash of their inputs."""
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS narratives (key TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[str]:
+        with closing(sqlite3.connect(self.path, timeout=60)) as conn:
+            row = conn.execute("SELECT text FROM narratives WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, text: str) -> None:
+        with closing(sqlite3.connect(self.path, timeout=60)) as conn, conn:
+            conn.execute("INSERT OR REPLACE INTO narratives VALUES (?, ?, ?)", (key, text, time.time()))
+
+
+def split_results_by_query(
+    records: Mapping[str, Any],
+    blast_results: List[BlastResult],
+) -> Dict[str, List[BlastResult]]:
+    """
+    Each query record's share of the BLAST results, in record order.
+
+    Every result is narrowed to the hits of one record (hits on translated ORFs
+    count for the record they came from); records without hits get an empty list.
+    """
+    per_query: Dict[str, List[BlastResult]] = {record_id: [] for record_id in records}
+    for result in blast_results:
+        hits_by_record: Dict[str, list] = {}
+        for hit in result.hits:
+            record_id = match_query(orf_record_id(hit.query_id), records)
+            if record_id is not None:
+                hits_by_record.setdefault(record_id, []).append(hit)
+        for record_id, hits in hits_by_record.items():
+            per_query[record_id].append(result.model_copy(update={"hits": hits}))
+    return per_query
+
+
+def content_defined_groups(ids: List[str], width: int, level: int) -> List[List[int]]:
+    """
+    Split positions 0..len(ids)-1 into consecutive groups averaging `width` items.
+
+    A group ends after an id whose salted hash is divisible by `width`, so the
+    boundaries depend on the ids themselves rather than on their positions.
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    for position, node_id in enumerate(ids):
+        current.append(position)
+        boundary = int(hashlib.sha256(f"{level}:{node_id}".encode()).hexdigest()[:8], 16) % width == 0
+        if boundary or len(current) >= MAX_GROUP_WIDTHS * width:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def get_merge_agent(
+    llm_api_url: Optional[str],
+    llm_api_key: Optional[str],
+    model_name: str = "gpt-4",
+    max_tokens: int = 2000,
+    llm_endpoints: Optional[list] = None,
+    timeout: Optional[float] = None,
+) -> Agent[None, str]:
+    """Agent that merges several narratives into one (plain text output)."""
+    provider = scheduled_provider(llm_api_url, llm_api_key, stage="reporter", llm_endpoints=llm_endpoints, timeout=timeout)
+    return Agent(
+        model=OpenAIModel(model_name, provider=provider),
+        output_type=str,
+        instructions=static_prompt("narrative_merge"),
+        retries=3,
+        model_settings={'max_tokens': max_tokens},
+    )
+
+
+class BatchReporter:
+    """
+    Writes a batch narrative by mapping over queries and reducing in a tree.
+
+    Args:
+        config: Settings for the LLM, fan-out, reduce width and cache
+        question: The user's question
+        analysis_config: Analysis configuration of the run
+        timeout: Seconds left for the whole report; caps each LLM request
+        on_usage: Called with the usage of every LLM call
+    """
+
+    def __init__(
+        self,
+        config: StorySeqConfig,
+        question: str,
+        analysis_config: Optional[AnalysisConfig] = None,
+        timeout: Optional[float] = None,
+        on_usage: Optional[Callable[[Any], None]] = None,
+    ):
+        self.config = config
+        self.question = question
+        self.analysis_config = analysis_config
+        self.timeout = timeout
+        self.on_usage = on_usage
+        self.cache = NarrativeCache(config.narrative_cache_path) if config.narrative_cache_path else None
+        self._slots = asyncio.Semaphore(config.reporter_fanout)
+        self._reporter: Optional[Agent[ReporterAgentDeps, str]] = None
+        self._merger: Optional[Agent[None, str]] = None
+        self.calls = {"map": 0, "reduce": 0, "cached": 0}
+        # Everything besides a node's own inputs that shapes its text
+        self._context = _digest(
+            config.llm_model, question,
+            analysis_config.model_dump() if analysis_config else None,
+            static_prompt("reporter"), static_prompt("narrative_merge"),
+        )
+
+    async def _cached(self, kind: str, key: str, write: Callable[[], Awaitable[AgentRunResult[str]]]) -> str:
+        if self.cache is not None:
+            text = await asyncio.to_thread(self.cache.get, key)
+            if text is not None:
+                self.calls["cached"] += 1
+                return text
+
+        async def call() -> str:
+            async with self._slots:
+                result = await write()
+            self.calls[kind] += 1
+            if self.on_usage:
+                self.on_usage(result.usage)
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put, key, result.output)
+            return result.output
+
+        # Concurrent batches needing the same narrative before it is cached share one LLM call
+        return await get_single_flight("narratives").do(key, call)
+
+    async def map_query(self, query_id: str, results: List[BlastResult]) -> NarrativeNode:
+        """Narrative for one query, from its own hits."""
+        key = _digest("map", self._context, query_id, [r.model_dump(mode="json") for r in results])
+        if not any(r.hits for r in results):
+            # Nothing for the model to interpret
+            return NarrativeNode(query_id, key, f"{query_id}: no BLAST hits were found.", 1)
+
+        from story_seq.agent.reporter_agent import ReporterAgentDeps, get_reporter_agent
+
+        if self._reporter is None:
+            self._reporter = await get_reporter_agent(
+                llm_api_url=self.config.llm_api_url,
+                llm_api_key=self.config.llm_api_key,
+                model_name=self.config.llm_model,
+                max_tokens=self.config.max_tokens,
+                llm_endpoints=self.config.llm_endpoints,
+                timeout=self.timeout,
+            )
+        reporter = self._reporter
+        deps = ReporterAgentDeps(blast_results=results, analysis_config=self.analysis_config, question=self.question)
+        prompt = (
+            f"{self.question}\n\nThis query is one of a batch. Write a short narrative (one paragraph) "
+            f"about query {query_id} only, starting with its id; it will be merged into a batch report."
+        )
+        text = await self._cached("map", key, lambda: reporter.run(prompt, deps=deps))
+        return NarrativeNode(query_id, key, text, 1)
+
+    async def reduce_group(self, children: List[NarrativeNode], final: bool) -> NarrativeNode:
+        """Merge several narratives into one."""
+        key = _digest("reduce", self._context, final, [child.key for child in children])
+        queries = sum(child.queries for child in children)
+        if self._merger is None:
+            self._merger = await get_merge_agent(
+                self.config.llm_api_url, self.config.llm_api_key, self.config.llm_model,
+                self.config.max_tokens, self.config.llm_endpoints, self.timeout,
+            )
+        merger = self._merger
+        sections = "\n\n".join(
+            f"--- Narrative {number} ({child.queries} queries) ---\n{child.text}"
+            for number, child in enumerate(children, start=1)
+        )
+        prompt = (
+            f"User question: {self.question}\n\n"
+            f"{'This is the FINAL merge: write the batch report' if final else 'Merge these narratives'} "
+            f"covering {queries} queries.\n\n{sections}"
+        )
+        text = await self._cached("reduce", key, lambda: merger.run(prompt))
+        return NarrativeNode(children[-1].id, key, text, queries)
+
+    async def run(self, records: Mapping[str, Any], blast_results: List[BlastResult]) -> str:
+        """Batch narrative for every query record."""
+        per_query = split_results_by_query(records, blast_results)
+        nodes = list(await asyncio.gather(*(self.map_query(qid, results) for qid, results in per_query.items())))
+
+        level = 0
+        while len(nodes) > 1:
+            groups = content_defined_groups([node.id for node in nodes], self.config.reporter_reduce_width, level)
+            final = len(groups) == 1
+
+            async def reduce(
+                group: List[int], nodes: List[NarrativeNode] = nodes, final: bool = final
+            ) -> NarrativeNode:
+                # A lone node moves up a level unchanged unless it is the root
+                if len(group) == 1 and not final:
+                    return nodes[group[0]]
+                return await self.reduce_group([nodes[i] for i in group], final)
+
+            nodes = list(await asyncio.gather(*(reduce(group) for group in groups)))
+            level += 1
+        print(f"[batch_reporter] {len(per_query)} queries: {self.calls['map']} map and {self.calls['reduce']} "
+              f"reduce call(s), {self.calls['cached']} narrative(s) from cache")
+        return nodes[0].text if nodes else ""
@@ -2,16 +2,20 @@
 
 import os
 import sys
-from pydantic_ai import Agent, RunContext
+from pydantic_ai import Agent, ModelRetry, RunContext
 from pydantic import BaseModel, Field
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
+from story_seq.agent.blast_capture import BlastCaptureToolset, BlastSearchSelection
+from story_seq.agent.llm_scheduler import scheduled_provider
+from story_seq.agent.prompts import static_prompt
 from pydantic_ai import ModelSettings
 
 from pydantic_ai.mcp import MCPServerStdio
 from typing import Any, Dict, List, Optional
 from pathlib import Path
+from story_seq.config import LLMEndpoint
 from story_seq.models import BlastResult, AnalysisConfig
+from story_seq.util.seq_io import read_fasta_text
 
 class BlastAgentDeps(BaseModel):
     """
@@ -21,6 +25,34 @@ class BlastAgentDeps(BaseModel):
     database: str = Field(description="BLAST database name or path")
     fasta_sketch: Optional[Dict[str, Any]] = Field(default=None, description="FASTA file analysis information from process_multiple_files")
     analysis_config: Optional[AnalysisConfig] = Field(default=None, description="Analysis configuration from configuration agent")
+    orf_files: List[Path] = Field(default_factory=list, description="Protein FASTA files of ORFs translated from the nucleotide query")
+    captured_searches: Dict[str, BlastResult] = Field(default_factory=dict, exclude=True, description="BLAST results captured from tool calls, by search id")
+
+
+def get_ncbi_mcp_server(mcp_server_args: Optional[List[str]] = None, timeout: Optional[float] = None) -> MCPServerStdio:
+    """
+    The NCBI MCP server providing BLAST and eutils tools.
+
+    Args:
+        mcp_server_args: Python arguments that start the server
+            (defaults to running the ncbi_mcp_server.server module)
+        timeout: Seconds left for the run; caps the tool read timeout
+    """
+    # Use sys.executable with -m for portable invocation across different Python environments
+    # Set NCBI_EMAIL environment variable (required by ncbi-mcp-server)
+    # NCBI_API_KEY is optional but recommended for higher rate limits
+    if 'NCBI_EMAIL' not in os.environ:
+        os.environ['NCBI_EMAIL'] = 'user@example.com'  # Default fallback
+    
+    # Pass environment variables to the MCP server subprocess
+    env = os.environ.copy()
+    
+    return MCPServerStdio(sys.executable, mcp_server_args or ['-m', 'ncbi_mcp_server.server'],
+                    env=env,  # explicitly pass environment variables
+                    log_level="debug",
+                    # NCBI searches can take many minutes, but never past the run's deadline
+                    read_timeout=2600 if timeout is None else min(2600, timeout),
+    )
 
 
 async def get_blast_agent(
@@ -28,56 +60,50 @@ async def get_blast_agent(
     llm_api_key: Optional[str],
     model_name: str = "gpt-4",
     max_tokens: int = 2000,
-) -> Agent:
+    mcp_server_args: Optional[List[str]] = None,
+    llm_endpoints: Optional[List[LLMEndpoint]] = None,
+    timeout: Optional[float] = None,
+    max_concurrent_searches: int = 3,
+) -> Agent[BlastAgentDeps, List[BlastSearchSelection]]:
     """
     Create and configure the BLAST Agent.
+
+    BLAST tool results are captured into `deps.captured_searches` rather than
+    passed through the model; the agent's output only selects searches by id
+    (see `story_seq.agent.blast_capture.join_selected_searches`).
     
     Args:
         llm_api_url: Base URL for the LLM API
         llm_api_key: API key for authentication
         model_name: Name of the LLM model to use
         max_tokens: Maximum tokens for AI responses
+        mcp_server_args: Python arguments that start the NCBI MCP server
+            (defaults to running the ncbi_mcp_server.server module)
+        llm_endpoints: Pool of LLM endpoints to balance across (overrides llm_api_url)
+        timeout: Seconds left for this agent's work; caps its LLM request and MCP tool timeouts
+        max_concurrent_searches: Maximum BLAST tool calls in flight when the model issues parallel calls
         
     Returns:
         Configured Agent instance
     """
-    # Only pass api_key if it's not empty
-    provider_kwargs = {"base_url": llm_api_url}
-    if llm_api_key:
-        provider_kwargs["api_key"] = llm_api_key
-    provider = OpenAIProvider(**provider_kwargs)
+    # Requests go through the process-wide scheduler (concurrency, rate limits, retries)
+    provider = scheduled_provider(llm_api_url, llm_api_key, stage="blast", llm_endpoints=llm_endpoints, timeout=timeout)
     llm_model = OpenAIModel(model_name, provider=provider)
     
-    # Define the MCP server for NCBI BLAST functionality
-    # Use sys.executable with -m for portable invocation across different Python environments
-    # Set NCBI_EMAIL environment variable (required by ncbi-mcp-server)
-    # NCBI_API_KEY is optional but recommended for higher rate limits
-    if 'NCBI_EMAIL' not in os.environ:
-        os.environ['NCBI_EMAIL'] = 'user@example.com'  # Default fallback
-    
-    # Pass environment variables to the MCP server subprocess
-    env = os.environ.copy()
-    
-    mcp_servers = [
-        MCPServerStdio(sys.executable, ['-m', 'ncbi_mcp_server.server'],
-                    env=env,  # explicitly pass environment variables
-                    log_level="debug",
-                    read_timeout=2600
-        )
-    ]
+    mcp_server = get_ncbi_mcp_server(mcp_server_args, timeout)
+    # BLAST reports are parsed on the Python side; the model sees only per-search summaries
+    toolsets = [BlastCaptureToolset(mcp_server, max_concurrent_searches=max_concurrent_searches)]
     
-    # Read instructions from static markdown file
-    prompt_file = Path(__file__).parent / "static_blast_agent_prompt.md"
-    with open(prompt_file, 'r') as f:
-        instructions = f.read()
+    # Static prompt is read once per process and sent first so the request prefix is byte-stable
+    instructions = static_prompt("blast")
     
     agent = Agent(
         model=llm_model,
-        output_type=List[BlastResult],  # NCBI MCP server returns JSON string results
+        output_type=List[BlastSearchSelection],  # full results are captured from the tool calls
         deps_type=BlastAgentDeps,
-        system_prompt=instructions,
+        instructions=instructions,
         retries=3,
-        mcp_servers=mcp_servers,
+        toolsets=toolsets,
         model_settings={'max_tokens': max_tokens}
     )
     
@@ -90,16 +116,29 @@ async def get_blast_agent(
         
         #TODO: look at ctx.deps.fasta_sketch for additional info to add to the context
         
-        query_file_path = ctx.deps.query_file
-        with open(query_file_path, 'r') as f:
-            query_sequences = f.read()
+        query_sequences = read_fasta_text(ctx.deps.query_file)
         
         context = f"""
 BLAST Search Parameters:
 
 Query Sequences:
 {query_sequences}
+"""
+        if ctx.deps.orf_files:
+            orf_sequences = "".join(read_fasta_text(path) for path in ctx.deps.orf_files)
+            context += f"""
+Predicted Proteins (ORFs translated from the nucleotide query; record ids give the
+nucleotide span and strand). Use `blastp` with these instead of `blastx`/`tblastx`:
+{orf_sequences}
 """
         return context
+
+    @agent.output_validator
+    async def known_search_ids(ctx: RunContext[BlastAgentDeps], output: List[BlastSearchSelection]) -> List[BlastSearchSelection]:
+        unknown = [s.search_id for s in output if s.search_id not in ctx.deps.captured_searches]
+        if unknown:
+            known = ", ".join(ctx.deps.captured_searches) or "none yet"
+            raise ModelRetry(f"Unknown search id(s) {', '.join(unknown)}; captured searches: {known}")
+        return output
     
     return agent
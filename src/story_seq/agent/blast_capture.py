@@ -0,0 +1,184 @@
+"""
+Side-channel capture of BLAST tool results.
+
+Having the BLAST agent return `List[BlastResult]` makes the model re-emit every
+hit of every search as JSON: tens of thousands of output tokens, with room to
+drop or alter scores along the way. Instead, `BlastCaptureToolset` wraps the
+agent's tools. Each BLAST report a tool returns is parsed into `BlastResult`
+objects on the Python side and kept on the run's deps under a search id
+("S1", "S2", ...), and the model only sees a short summary of each search. The
+model's output is a list of `BlastSearchSelection` (search id, reason and
+optional subject summaries), which `join_selected_searches` turns back into
+the full results.
+"""
+
+import asyncio
+import json
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field, ValidationError
+from pydantic_ai import RunContext
+from pydantic_ai.toolsets import ToolsetTool, WrapperToolset
+
+from story_seq.models import BlastResult
+from story_seq.util.blast_json import parse_blast_json
+from story_seq.util.hit_table import BlastHitTable
+from story_seq.util.single_flight import flight_key, get_single_flight
+
+# Hits kept per search, as the BLAST agent prompt asks for
+MAX_HITS = 100
+# Hits per search shown to the model so it can judge whether to escalate
+SUMMARY_HITS = 5
+
+
+class BlastSearchSelection(BaseModel):
+    """A captured BLAST search the model keeps in its final answer."""
+    search_id: str = Field(description="Search id from the BLAST tool summary, e.g. S1")
+    search_reason: str = Field(description="Reason for performing this BLAST search")
+    subject_summaries: Dict[str, str] = Field(
+        default_factory=dict,
+        description="Short GenBank summaries of top hit subjects retrieved with esummary, keyed by subject_id",
+    )
+
+
+def decode_tool_payload(content: Any) -> Any:
+    """
+    Decode a tool result into JSON data.
+
+    Unwraps MCP structured content ({"result": "<json>"}) and tolerates text
+    before the JSON document. Returns None when no JSON is found.
+    """
+    while True:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", "replace")
+        if isinstance(content, str):
+            text = content.strip()
+            starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+            if not starts:
+                return None
+            try:
+                content, _ = json.JSONDecoder().raw_decode(text[min(starts):])
+            except ValueError:
+                return None
+            continue
+        if isinstance(content, dict) and set(content) == {"result"}:
+            content = content["result"]
+            continue
+        return content
+
+
+def blast_results_from_payload(payload: Any) -> Optional[List[BlastResult]]:
+    """
+    BLAST results in a decoded tool payload, or None if it holds none.
+
+    Accepts NCBI BLAST JSON reports and lists of BlastResult-shaped objects.
+    """
+    if isinstance(payload, dict) and ("BlastOutput2" in payload or "report" in payload):
+        try:
+            return parse_blast_json(payload, max_hits=MAX_HITS)
+        except (KeyError, TypeError, ValueError):
+            return None
+    if isinstance(payload, dict) and "hits" in payload and "query_length" in payload:
+        payload = [payload]
+    if isinstance(payload, list) and payload and all(isinstance(item, dict) and "hits" in item for item in payload):
+        try:
+            return [BlastResult.model_validate({"search_reason": "", **item}) for item in payload]
+        except ValidationError:
+            return None
+    return None
+
+
+def search_summary(search_id: str, result: BlastResult) -> Dict[str, Any]:
+    """What the model sees of a captured search."""
+    return {
+        "search_id": search_id,
+        "program": result.blast_method,
+        "database": result.database,
+        "query_id": result.hits[0].query_id if result.hits else None,
+        "query_length": result.query_length,
+        "num_hits": result.num_hits,
+        "top_hits": [
+            hit.model_dump(include={"subject_id", "identity", "evalue", "bit_score", "query_start", "query_end"})
+            for hit in BlastHitTable.from_result(result).top(SUMMARY_HITS).to_hits()
+        ],
+    }
+
+
+@dataclass
+class BlastCaptureToolset(WrapperToolset[Any]):
+    """
+    Keeps BLAST results out of the model's context and output.
+
+    Tool results that hold BLAST reports are stored in
+    `ctx.deps.captured_searches` and replaced by per-search summaries; all
+    other tool results (e.g. eutils) pass through unchanged. Parallel tool
+    calls run concurrently, with at most `max_concurrent_searches` BLAST tool
+    calls in flight, and a call identical to one already in flight waits for
+    that call's result instead of running again (or runs on this run's session
+    if the run that started it stops first).
+    """
+    max_concurrent_searches: int = 3
+    _slots: Optional[asyncio.Semaphore] = field(default=None, init=False, repr=False)
+
+    async def call_tool(
+        self, name: str, tool_args: Dict[str, Any], ctx: RunContext[Any], tool: ToolsetTool[Any]
+    ) -> Any:
+        call_wrapped = super().call_tool
+
+        async def call() -> Any:
+            if "blast" not in name.lower():
+                return await call_wrapped(name, tool_args, ctx, tool)
+            if self._slots is None:
+                self._slots = asyncio.Semaphore(self.max_concurrent_searches)
+            async with self._slots:
+                return await call_wrapped(name, tool_args, ctx, tool)
+
+        # Identical BLAST and eutils calls in flight in any run of this process share one result;
+        # the call uses the first run's MCP session, so the others call again if that run goes away
+        content = await get_single_flight("ncbi_tools").do(flight_key(name, tool_args), call, bound=True)
+        results = blast_results_from_payload(decode_tool_payload(content))
+        if results is None:
+            return content
+
+        captured = ctx.deps.captured_searches
+        summaries = []
+        for result in results:
+            search_id = f"S{len(captured) + 1}"
+            captured[search_id] = result
+            summaries.append(search_summary(search_id, result))
+        return {
+            "searches": summaries,
+            "note": "Full hit lists are kept by the pipeline. List the searches to report by search_id.",
+        }
+
+
+def join_selected_searches(
+    captured: Dict[str, BlastResult],
+    selections: List[BlastSearchSelection],
+) -> List[BlastResult]:
+    """
+    Full BLAST results for the searches the model selected, in its order.
+
+    Each result takes the selection's reason, and hits on subjects the model
+    summarized get that summary as `genbank_summary`. If the model selected
+    nothing, every captured search is returned.
+    """
+    if not selections:
+        return [
+            result.model_copy(update={"search_reason": result.search_reason or f"{result.blast_method} search against {result.database}"})
+            for result in captured.values()
+        ]
+
+    results = []
+    for selection in selections:
+        result = captured[selection.search_id]
+        hits = result.hits
+        if selection.subject_summaries:
+            hits = [
+                hit.model_copy(update={"genbank_summary": selection.subject_summaries[hit.subject_id]})
+                if hit.subject_id in selection.subject_summaries else hit
+                for hit in hits
+            ]
+        results.append(result.model_copy(update={"search_reason": selection.search_reason, "hits": hits}))
+    return results
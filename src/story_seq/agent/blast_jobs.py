@@ -0,0 +1,324 @@
+"""
+Remote BLAST through the NCBI BLAST URL API, with shared submission and polling.
+
+A remote search is submit-then-poll: `CMD=Put` returns a request id (RID) and
+an estimated time to completion (RTOE), `CMD=Get&FORMAT_OBJECT=SearchInfo`
+reports whether the RID is WAITING or READY, and `CMD=Get&FORMAT_TYPE=JSON2_S`
+fetches the report. Polling each search in its own loop multiplies requests
+and trips NCBI's rate limits, so one `BlastJobManager` per event loop:
+
+    - submits searches as soon as they are requested and hands back a future
+      per search
+    - polls every outstanding RID from a single loop; each RID waits for its
+      RTOE first, then for an interval that grows with its elapsed time,
+      between `min_poll_interval` and `max_poll_interval`
+    - spaces all requests to the server at least `min_request_interval` apart
+    - fetches finished reports and resolves the waiting pipelines' futures
+
+NCBI asks for at most one request every 10 seconds and one poll per RID per
+minute, which are the defaults. The managers of a loop are closed when the
+last pipeline run using the loop ends (`blast_job_managers`).
+"""
+
+import asyncio
+import os
+import re
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from story_seq.agent.blast_capture import MAX_HITS
+from story_seq.util.single_flight import flight_key, get_single_flight
+
+NCBI_BLAST_URL = "https://blast.ncbi.nlm.nih.gov/Blast.cgi"
+
+# Status codes worth retrying on the next poll rather than failing the search
+TRANSIENT_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+# URL API parameters selecting each program (megablast and dc-megablast are blastn tasks)
+PROGRAM_PARAMS = {
+    "megablast": {"PROGRAM": "blastn", "MEGABLAST": "on"},
+    "dc-megablast": {"PROGRAM": "blastn", "BLAST_PROGRAMS": "discoMegablast"},
+    "blastn": {"PROGRAM": "blastn", "BLAST_PROGRAMS": "blastn"},
+}
+
+_QBLAST_FIELD = re.compile(r"^\s*(\w+)\s*=\s*(\S+)", re.MULTILINE)
+
+
+class BlastJobError(RuntimeError):
+    """A remote BLAST search failed or its RID expired."""
+
+
+def parse_qblast_info(text: str) -> Dict[str, str]:
+    """The `KEY = value` fields of a QBlastInfo block (RID, RTOE, Status, ThereAreHits)."""
+    begin = text.find("QBlastInfoBegin")
+    if begin == -1:
+        return {}
+    end = text.find("QBlastInfoEnd", begin)
+    return dict(_QBLAST_FIELD.findall(text[begin + len("QBlastInfoBegin"):end if end != -1 else None]))
+
+
+@dataclass
+class BlastJob:
+    """An outstanding remote search."""
+    rid: str
+    program: str
+    submitted_at: float
+    estimate: float  # seconds, from RTOE
+    future: asyncio.Future
+    next_poll: float = 0.0
+    polls: int = 0
+
+
+@dataclass
+class BlastSearchRequest:
+    """One search to submit."""
+    sequence: str
+    program: str = "blastn"
+    database: str = "nt"
+    max_hits: int = MAX_HITS
+    entrez_query: str = ""
+    extra: Dict[str, str] = field(default_factory=dict)
+
+
+class BlastJobManager:
+    """
+    Submits remote BLAST searches and polls them together.
+
+    Args:
+        url: BLAST URL API endpoint
+        email: Contact address sent with every request (NCBI asks for one)
+        tool: Tool name sent with every request
+        min_request_interval: Minimum seconds between any two requests to the server
+        min_poll_interval: Minimum seconds between two polls of one RID
+        max_poll_interval: Maximum seconds between two polls of one RID
+        poll_growth: Fraction of a search's elapsed time to wait before its next poll
+        transport: httpx transport (for tests)
+    """
+
+    def __init__(
+        self,
+        url: str = NCBI_BLAST_URL,
+        email: Optional[str] = None,
+        tool: str = "story-seq",
+        min_request_interval: float = 10.0,
+        min_poll_interval: float = 60.0,
+        max_poll_interval: float = 300.0,
+        poll_growth: float = 0.25,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url
+        self.identity = {"EMAIL": email or os.environ.get("NCBI_EMAIL", ""), "TOOL": tool}
+        self.min_request_interval = min_request_interval
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.poll_growth = poll_growth
+        self.jobs: Dict[str, BlastJob] = {}
+        self.requests = {"put": 0, "status": 0, "get": 0}
+        self._client = httpx.AsyncClient(transport=transport, timeout=120.0)
+        self._request_lock = asyncio.Lock()
+        self._last_request = float("-inf")
+        self._wakeup = asyncio.Event()
+        self._poller: Optional[asyncio.Task] = None
+
+    async def _request(self, kind: str, method: str, params: Dict[str, Any]) -> httpx.Response:
+        """Send one request, no sooner than `min_request_interval` after the previous one."""
+        async with self._request_lock:
+            delay = self._last_request + self.min_request_interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._last_request = time.monotonic()
+            self.requests[kind] += 1
+            if method == "POST":
+                return await self._client.post(self.url, data={**params, **self.identity})
+            return await self._client.get(self.url, params={**params, **self.identity})
+
+    def poll_interval(self, job: BlastJob, now: float) -> float:
+        """Seconds until the next poll of a job that is still running."""
+        elapsed = now - job.submitted_at
+        remaining_estimate = job.estimate - elapsed
+        interval = max(remaining_estimate, elapsed * self.poll_growth)
+        return min(self.max_poll_interval, max(self.min_poll_interval, interval))
+
+    async def submit(self, request: BlastSearchRequest) -> asyncio.Future:
+        """
+        Submit a search and return the future of its BLAST JSON report.
+
+        Raises:
+            BlastJobError: If the server does not return an RID
+        """
+        params = {
+            "CMD": "Put",
+            "QUERY": request.sequence,
+            "DATABASE": request.database,
+            "HITLIST_SIZE": str(request.max_hits),
+            "FORMAT_TYPE": "JSON2_S",
+            **PROGRAM_PARAMS.get(request.program, {"PROGRAM": request.program}),
+            **request.extra,
+        }
+        if request.entrez_query:
+            params["ENTREZ_QUERY"] = request.entrez_query
+        response = await self._request("put", "POST", params)
+        info = parse_qblast_info(response.text)
+        if response.status_code != 200 or "RID" not in info:
+            raise BlastJobError(f"{request.program} submission failed (HTTP {response.status_code})")
+
+        now = time.monotonic()
+        estimate = float(info.get("RTOE", 0) or 0)
+        job = BlastJob(info["RID"], request.program, now, estimate, asyncio.get_running_loop().create_future())
+        job.next_poll = now + max(estimate, self.min_poll_interval)
+        self.jobs[job.rid] = job
+        print(f"[blast_jobs] Submitted {request.program} against {request.database} as RID {job.rid} "
+              f"(estimated {estimate:.0f}s)")
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.create_task(self._poll_loop())
+        self._wakeup.set()
+        return job.future
+
+    async def search(self, request: BlastSearchRequest) -> Dict[str, Any]:
+        """
+        Submit a search and wait for its report.
+
+        A search identical to one already in flight shares its RID instead of
+        being submitted again.
+        """
+        async def run() -> Dict[str, Any]:
+            report: Dict[str, Any] = await (await self.submit(request))
+            return report
+        return await get_single_flight("blast_searches").do(flight_key("url_api", self.url, asdict(request)), run)
+
+    def _reschedule(self, job: BlastJob) -> None:
+        job.next_poll = time.monotonic() + self.poll_interval(job, time.monotonic())
+
+    def _finish(self, job: BlastJob, result: Any = None, error: Optional[Exception] = None) -> None:
+        self.jobs.pop(job.rid, None)
+        # The waiting pipeline may have given up (deadline, cancelled flight) while this RID was polled
+        if job.future.done():
+            return
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(result)
+
+    async def _poll(self, job: BlastJob) -> None:
+        """Check one RID; fetch its report once it is ready."""
+        job.polls += 1
+        response = await self._request("status", "GET", {"CMD": "Get", "FORMAT_OBJECT": "SearchInfo", "RID": job.rid})
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            self._reschedule(job)
+            return
+        status = parse_qblast_info(response.text).get("Status", "UNKNOWN")
+        if status == "WAITING":
+            self._reschedule(job)
+            return
+        if status != "READY":
+            self._finish(job, error=BlastJobError(f"RID {job.rid} ({job.program}) finished with status {status}"))
+            return
+
+        report = await self._request("get", "GET", {"CMD": "Get", "FORMAT_TYPE": "JSON2_S", "RID": job.rid})
+        if report.status_code in TRANSIENT_STATUS_CODES:
+            self._reschedule(job)
+            return
+        try:
+            payload = report.json() if report.status_code == 200 else None
+        except ValueError:
+            payload = None
+        if payload is None:
+            self._finish(job, error=BlastJobError(f"RID {job.rid} report could not be read (HTTP {report.status_code})"))
+            return
+        print(f"[blast_jobs] RID {job.rid} ready after {time.monotonic() - job.submitted_at:.0f}s and {job.polls} poll(s)")
+        self._finish(job, payload)
+
+    async def _poll_loop(self) -> None:
+        """
+        Poll every due RID in turn, then sleep until the next one is due.
+
+        An unexpected error fails every outstanding search rather than leaving
+        the waiting pipelines without a poller.
+        """
+        try:
+            await self._poll_due_jobs()
+        except Exception as error:
+            for job in list(self.jobs.values()):
+                self._finish(job, error=BlastJobError(f"Polling RID {job.rid} ({job.program}) failed: {error!r}"))
+
+    async def _poll_due_jobs(self) -> None:
+        while self.jobs:
+            # Searches whose waiting pipeline gave up are dropped
+            for rid in [rid for rid, job in self.jobs.items() if job.future.done()]:
+                del self.jobs[rid]
+            now = time.monotonic()
+            for job in sorted(self.jobs.values(), key=lambda job: job.next_poll):
+                if job.next_poll > now:
+                    break
+                if job.future.done():
+                    continue
+                try:
+                    await self._poll(job)
+                except httpx.HTTPError:
+                    self._reschedule(job)
+            if not self.jobs:
+                return
+            self._wakeup.clear()
+            delay = min(job.next_poll for job in self.jobs.values()) - time.monotonic()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, delay))
+            except asyncio.TimeoutError:
+                pass
+
+    async def aclose(self) -> None:
+        if self._poller is not None:
+            self._poller.cancel()
+        for job in self.jobs.values():
+            if not job.future.done():
+                job.future.cancel()
+        self.jobs.clear()
+        await self._client.aclose()
+
+
+_managers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, BlastJobManager]]" = weakref.WeakKeyDictionary()
+_runs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, int]" = weakref.WeakKeyDictionary()
+
+
+def get_blast_job_manager(url: str = NCBI_BLAST_URL, **settings: Any) -> BlastJobManager:
+    """
+    The manager shared by every pipeline on the running event loop for `url`.
+
+    `settings` (see `BlastJobManager`) apply when the manager is created.
+    """
+    managers = _managers.setdefault(asyncio.get_running_loop(), {})
+    if url not in managers:
+        managers[url] = BlastJobManager(url, **settings)
+    return managers[url]
+
+
+@asynccontextmanager
+async def blast_job_managers() -> AsyncIterator[None]:
+    """
+    Keep the running loop's managers open for a pipeline run.
+
+    Runs on one loop share its managers, so they are closed (their HTTP
+    client and poller with them) when the last run on the loop leaves.
+    """
+    loop = asyncio.get_running_loop()
+    _runs[loop] = _runs.get(loop, 0) + 1
+    try:
+        yield
+    finally:
+        _runs[loop] -= 1
+        if not _runs[loop]:
+            del _runs[loop]
+            for manager in _managers.pop(loop, {}).values():
+                await manager.aclose()
+
+
+def url_api_search(manager: BlastJobManager) -> Callable[[Any, str], Awaitable[Any]]:
+    """Search function for the BLAST policy running searches through the URL API."""
+    async def search(step: Any, sequences: str) -> Any:
+        return await manager.search(BlastSearchRequest(sequences, step.program, step.database,
+                                                       entrez_query=step.entrez_query))
+    return search
@@ -0,0 +1,301 @@
+"""
+Deterministic BLAST escalation policy for Modes A, B and C.
+
+The BLAST agent prompt describes each mode as a ladder of programs (Mode A:
+megablast -> blastn -> blastx; Modes B and C: blastp or blastx, tblastx or
+tblastn, and a nucleotide search for context). Left to the model, the whole
+ladder often runs even when the first search already answered the question,
+and every extra remote BLAST costs minutes. Here the ladder is executed from
+Python. Independent programs share a stage and run concurrently (at most
+`max_concurrent` searches at once), so a stage takes as long as its slowest
+search. After each stage explicit criteria decide what happens next:
+
+    - stop: every query has a significant hit that reaches the stop identity
+      and coverage (nucleotide or protein identity, by program)
+    - escalate: some query has too few significant hits, or only fragmentary
+      ones; the next program runs
+    - ambiguous: every query has substantial hits but not all are conclusive;
+      the BLAST agent takes over with the searches run so far
+
+When the ladder is exhausted without ambiguity the policy stops with what it
+found, so the reporter can describe weak or missing hits.
+
+`narrow_workflow` puts a search limited to the queries' provisional taxa (from
+the local k-mer classifier) ahead of the Mode A ladder.
+"""
+
+import asyncio
+from dataclasses import dataclass, replace
+from itertools import groupby
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Mapping, Optional, Tuple
+
+import httpx
+from mcp.shared.exceptions import McpError
+from pydantic import BaseModel, Field
+from pydantic_ai import ModelRetry
+
+from story_seq.agent.blast_capture import MAX_HITS, blast_results_from_payload, decode_tool_payload
+from story_seq.agent.blast_jobs import BlastJobError
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult
+from story_seq.util.coverage import match_query
+from story_seq.util.orfs import hit_coverage, orf_record_id
+from story_seq.util.single_flight import flight_key, get_single_flight
+
+# Programs whose identities are nucleotide identities; all others compare translated sequences
+NUCLEOTIDE_PROGRAMS = {"megablast", "dc-megablast", "blastn"}
+# Failures of the searches or their backend, after which the BLAST agent takes over: tool errors,
+# unreadable reports or tool signatures, remote BLAST errors, and a server that cannot be started
+SEARCH_ERRORS = (ModelRetry, McpError, ValueError, BlastJobError, httpx.HTTPError, OSError)
+
+
+@dataclass
+class PolicyStep:
+    """One BLAST program in a mode's ladder."""
+    program: str
+    database: str
+    molecule: Literal["nucleotide", "protein"]  # which query sequences it searches
+    reason: str
+    stage: int = 1  # consecutive steps of the same stage are independent and run concurrently
+    entrez_query: str = ""  # limits the search to matching database entries, e.g. "txid561[Organism:exp]"
+
+
+@dataclass
+class EscalationCriteria:
+    """Thresholds deciding whether to stop, escalate or ask the BLAST agent."""
+    max_evalue: float = 1e-10
+    min_hits: int = 1
+    min_coverage: float = 50.0
+    stop_coverage: float = 80.0
+    stop_identity: float = 95.0
+    stop_protein_identity: float = 60.0
+
+
+class PolicyDecision(BaseModel):
+    """Outcome of assessing the searches run so far."""
+    action: Literal["stop", "escalate", "ambiguous"] = Field(description="What the policy does next")
+    reasons: List[str] = Field(default_factory=list, description="Per-query evidence behind the action")
+
+
+def mode_workflow(config: AnalysisConfig, has_nucleotide: bool, has_protein: bool) -> List[PolicyStep]:
+    """
+    The BLAST ladder for an analysis mode, given the query sequences available.
+
+    Protein sequences include ORFs translated from nucleotide queries. Custom
+    requests have no ladder and are left to the BLAST agent.
+    """
+    if config.custom_other:
+        return []
+    if config.identify_unknown_dna:
+        if has_nucleotide:
+            # Each program is tuned on the previous one's outcome, so the ladder stays sequential
+            return [
+                PolicyStep("megablast", "nt", "nucleotide", "Mode A: high-identity nucleotide search for species identification", 1),
+                PolicyStep("blastn", "nt", "nucleotide", "Mode A: more sensitive nucleotide search for related species", 2),
+                PolicyStep("blastx", "nr", "nucleotide", "Mode A: translated search for distant homologs", 3),
+            ]
+        if has_protein:
+            return [
+                PolicyStep("blastp", "nr", "protein", "Mode A: protein search for the source organism", 1),
+                PolicyStep("tblastn", "nt", "protein", "Mode A: protein against translated nucleotides for distant species", 2),
+            ]
+        return []
+    if config.find_protein_homologs or config.functional_hint:
+        purpose = "Mode C: AMR gene" if config.functional_hint else "Mode B: homology"
+        primary = deep = context = None
+        if has_protein:
+            primary = PolicyStep("blastp", "nr", "protein", f"{purpose} search of the protein sequences")
+        elif has_nucleotide:
+            primary = PolicyStep("blastx", "nr", "nucleotide", f"{purpose} search of the translated query")
+        if has_nucleotide:
+            deep = PolicyStep("tblastx", "nt", "nucleotide", f"{purpose} search, translated against translated nucleotides")
+            context = PolicyStep("megablast", "nt", "nucleotide", f"{purpose} context: nucleotide search of the query")
+        elif has_protein:
+            deep = PolicyStep("tblastn", "nt", "protein", f"{purpose} search against translated nucleotides")
+        # Mode C probes primary and deep together, then adds context; Mode B adds context to its
+        # primary search and escalates to the deep probe
+        stages = [[primary, deep], [context]] if config.functional_hint else [[primary, context], [deep]]
+        steps: List[PolicyStep] = []
+        for stage in stages:
+            present = [step for step in stage if step is not None]
+            if present:
+                number = steps[-1].stage + 1 if steps else 1
+                steps.extend(replace(step, stage=number) for step in present)
+        return steps
+    return []
+
+
+def narrow_workflow(steps: List[PolicyStep], taxids: List[int], certain: bool = False) -> List[PolicyStep]:
+    """
+    A Mode A ladder that searches within the queries' provisional taxa first.
+
+    When the provisional calls are certain, the whole ladder runs limited to
+    the taxa (an Entrez query on their taxids) and nothing else. Otherwise
+    only the first stage is limited and the full ladder follows as the
+    fallback, so an uncertain call costs a search rather than the answer; the
+    stop criteria end the run as soon as a limited search settles every query.
+    """
+    if not steps or not taxids:
+        return steps
+    entrez_query = " OR ".join(f"txid{taxid}[Organism:exp]" for taxid in taxids)
+    limited = [
+        replace(step, entrez_query=entrez_query, reason=f"{step.reason}, within the provisional taxon")
+        for step in steps if certain or step.stage == steps[0].stage
+    ]
+    if certain:
+        return limited
+    return limited + [replace(step, stage=limited[-1].stage + step.stage) for step in steps]
+
+
+def assess(captured: Mapping[str, BlastResult], records: Mapping[str, Any], criteria: EscalationCriteria) -> PolicyDecision:
+    """
+    Decide from every search run so far whether each query is answered.
+
+    Hits count for the query record they belong to (ORF hits for their
+    nucleotide record, with the coverage of the span they were translated
+    from); only hits within `criteria.max_evalue` are evidence.
+    """
+    significant: Dict[str, List[Tuple[BlastHit, BlastResult, float]]] = {record_id: [] for record_id in records}
+    for result in captured.values():
+        for hit in result.hits:
+            record_id = match_query(orf_record_id(hit.query_id), records)
+            if record_id is not None and hit.evalue <= criteria.max_evalue:
+                record = records[record_id]
+                coverage = hit_coverage(hit, result, len(record) if record is not None else None)
+                significant[record_id].append((hit, result, coverage or 0.0))
+
+    weak, unclear, answered = [], [], []
+    for record_id, hits in significant.items():
+        if len(hits) < criteria.min_hits:
+            weak.append(f"{record_id}: {len(hits)} significant hit(s)")
+            continue
+        conclusive = [
+            (hit, result, coverage) for hit, result, coverage in hits
+            if coverage >= criteria.stop_coverage and hit.identity >= (
+                criteria.stop_identity if result.blast_method in NUCLEOTIDE_PROGRAMS else criteria.stop_protein_identity
+            )
+        ]
+        if conclusive:
+            hit, result, coverage = conclusive[0]
+            answered.append(f"{record_id}: {result.blast_method} hit {hit.subject_id} at {hit.identity:.1f}% identity "
+                            f"over {coverage:.0f}%")
+            continue
+        hit, result, coverage = max(hits, key=lambda entry: entry[2])
+        if coverage < criteria.min_coverage:
+            weak.append(f"{record_id}: fragmentary hits (best coverage {coverage:.0f}%)")
+        else:
+            unclear.append(f"{record_id}: best hit {hit.subject_id} at {hit.identity:.1f}% identity "
+                           f"over {coverage:.0f}%")
+
+    if weak:
+        return PolicyDecision(action="escalate", reasons=weak)
+    if unclear:
+        return PolicyDecision(action="ambiguous", reasons=unclear)
+    return PolicyDecision(action="stop", reasons=answered)
+
+
+def is_search_failure(error: BaseException) -> bool:
+    """Whether an error is one of SEARCH_ERRORS, or a task group of them (as the MCP client raises)."""
+    nested = getattr(error, "exceptions", None)
+    if isinstance(nested, (list, tuple)) and nested:
+        return all(is_search_failure(inner) for inner in nested)
+    return isinstance(error, SEARCH_ERRORS)
+
+
+async def check_mcp_tool(server: Any, tool_name: str, steps: List[PolicyStep]) -> None:
+    """
+    Make sure the server's BLAST tool takes the arguments `mcp_search` passes.
+
+    Raises:
+        ValueError: If the server has no such tool, the tool lacks one of the
+            arguments, or it requires an argument the policy does not pass
+    """
+    tools = {tool.name: tool for tool in await server.list_tools()}
+    if tool_name not in tools:
+        raise ValueError(f"the MCP server has no {tool_name!r} tool (it offers {', '.join(sorted(tools)) or 'none'})")
+    passed = {"sequence", "program", "database", "max_hits_per_query"}
+    if any(step.entrez_query for step in steps):
+        passed.add("entrez_query")
+    schema = tools[tool_name].inputSchema or {}
+    missing = passed - set(schema.get("properties", {}))
+    unknown = set(schema.get("required", [])) - passed
+    if missing or unknown:
+        raise ValueError(f"the {tool_name!r} tool does not match the policy's arguments "
+                         f"(missing: {', '.join(sorted(missing)) or 'none'}; "
+                         f"also required: {', '.join(sorted(unknown)) or 'none'})")
+
+
+def mcp_search(server: Any, tool_name: str) -> Callable[[PolicyStep, str], Awaitable[Any]]:
+    """Search function calling the NCBI MCP server's BLAST tool directly."""
+    async def search(step: PolicyStep, sequences: str) -> Any:
+        args = {"sequence": sequences, "program": step.program, "database": step.database, "max_hits_per_query": MAX_HITS}
+        if step.entrez_query:
+            args["entrez_query"] = step.entrez_query
+        # Pipelines searching the same sequences at the same time share one search; it runs on
+        # the first pipeline's session, so the others search again on theirs if that one goes away
+        return await get_single_flight("blast_searches").do(
+            flight_key("mcp", tool_name, args), lambda: server.direct_call_tool(tool_name, args), bound=True
+        )
+    return search
+
+
+async def run_blast_policy(
+    search: Callable[[PolicyStep, str], Awaitable[Any]],
+    steps: List[PolicyStep],
+    sequences: Dict[str, str],
+    records: Mapping[str, Any],
+    captured: Dict[str, BlastResult],
+    criteria: EscalationCriteria,
+    max_concurrent: int = 3,
+) -> PolicyDecision:
+    """
+    Run a mode's BLAST ladder until the criteria say stop or ambiguous.
+
+    Args:
+        search: Runs one program on FASTA text and returns the tool result
+        steps: The ladder, from `mode_workflow`
+        sequences: FASTA text of the queries by molecule ("nucleotide", "protein")
+        records: Query records keyed by record id
+        captured: Searches by id; filled in like `BlastCaptureToolset` does
+        criteria: Stop and escalation thresholds
+        max_concurrent: Maximum searches in flight within a stage
+
+    Returns:
+        The last decision: "stop" or "ambiguous" (never "escalate")
+
+    Raises:
+        ValueError: If the tool result holds no BLAST report
+    """
+    slots = asyncio.Semaphore(max_concurrent)
+
+    async def run_step(step: PolicyStep) -> List[BlastResult]:
+        async with slots:
+            payload = decode_tool_payload(await search(step, sequences[step.molecule]))
+        results: Optional[List[BlastResult]] = blast_results_from_payload(payload)
+        if results is None:
+            raise ValueError(f"{step.program} search returned no BLAST report")
+        return results
+
+    decision = PolicyDecision(action="escalate", reasons=["no searches run"])
+    for number, group in groupby(steps, key=lambda step: step.stage):
+        stage = list(group)
+        # A stage takes as long as its slowest search; results are stored in ladder order.
+        # If one search fails, the others are cancelled rather than left holding NCBI slots.
+        tasks = [asyncio.ensure_future(run_step(step)) for step in stage]
+        try:
+            stage_results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        for step, results in zip(stage, stage_results, strict=True):
+            for result in results:
+                captured[f"S{len(captured) + 1}"] = result.model_copy(
+                    update={"search_reason": f"{step.reason} ({step.program} against {step.database}, policy stage {number})"}
+                )
+        decision = assess(captured, records, criteria)
+        programs = ", ".join(f"{step.program} against {step.database}" for step in stage)
+        print(f"[blast_policy] {programs}: {decision.action} ({'; '.join(decision.reasons)})")
+        if decision.action != "escalate":
+            return decision
+    if decision.action == "escalate":
+        decision = PolicyDecision(action="stop", reasons=[f"ladder exhausted; {reason}" for reason in decision.reasons])
+    return decision
@@ -5,9 +5,10 @@ from pathlib import Path
 from pydantic_ai import Agent, RunContext
 from pydantic import BaseModel, Field
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
-from typing import Any, Dict, Optional, Union
-from story_seq.config import StorySeqConfig
+from story_seq.agent.llm_scheduler import scheduled_provider
+from story_seq.agent.prompts import static_prompt
+from typing import Any, Dict, List, Optional, Union
+from story_seq.config import LLMEndpoint, StorySeqConfig
 from story_seq.models import AnalysisConfig
 
 class ConfigurationAgentDeps(BaseModel):
@@ -22,6 +23,8 @@ async def get_configuration_agent(
     model_name: str = "gpt-4",
     llm_api_url: Optional[str] = None,
     max_tokens: int = 2000,
+    llm_endpoints: Optional[List[LLMEndpoint]] = None,
+    timeout: Optional[float] = None,
 ) -> Agent[ConfigurationAgentDeps, AnalysisConfig]:
     """
     Create and configure the Configuration Agent.
@@ -31,29 +34,26 @@ async def get_configuration_agent(
         llm_api_key: API key for authentication
         model_name: Name of the LLM model to use
         max_tokens: Maximum tokens for AI responses
+        llm_endpoints: Pool of LLM endpoints to balance across (overrides llm_api_url)
+        timeout: Seconds left for this agent's work; caps its LLM request timeout
 
     Returns:
         Configured Agent instance
     """
-    # Only pass api_key if it's not empty
-    provider_kwargs = {"base_url": llm_api_url}
-    if llm_api_key:
-        provider_kwargs["api_key"] = llm_api_key
-    provider = OpenAIProvider(**provider_kwargs)
+    # Requests go through the process-wide scheduler (concurrency, rate limits, retries)
+    provider = scheduled_provider(llm_api_url, llm_api_key, stage="config", llm_endpoints=llm_endpoints, timeout=timeout)
     llm_model = OpenAIModel(model_name, provider=provider)
     
     mcp_servers = []
     
-    # Read instructions from static markdown file
-    prompt_file = Path(__file__).parent / "static_configuration_agent_prompt.md"
-    with open(prompt_file, 'r') as f:
-        instructions = f.read()
+    # Static prompt is read once per process and sent first so the request prefix is byte-stable
+    instructions = static_prompt("configuration")
   
     agent = Agent(
         model=llm_model,
         deps_type=ConfigurationAgentDeps,
         output_type=AnalysisConfig,
-        system_prompt=instructions,
+        instructions=instructions,
         retries=3,
         mcp_servers=mcp_servers,
         model_settings={'max_tokens': max_tokens}
@@ -65,8 +65,8 @@ async def get_configuration_agent(
         """
         Generate instructions based on the known materials.
         """
-        # Access fasta_sketch from ctx.prompt (the deps passed to run())
-        if hasattr(ctx, 'prompt') and ctx.prompt and hasattr(ctx.prompt, 'fasta_sketch') and ctx.prompt.fasta_sketch:
-            return f"Here is the FASTA sketch:\n{json.dumps(ctx.prompt.fasta_sketch, indent=4)}"
+        # The sketch comes from the deps passed to run(); sorted keys keep the text stable
+        if ctx.deps and ctx.deps.fasta_sketch:
+            return f"Here is the FASTA sketch:\n{json.dumps(ctx.deps.fasta_sketch, indent=4, sort_keys=True, default=str)}"
             
     return agent
@@ -0,0 +1,148 @@
+"""
+Rule-based fast path for the Configuration Agent.
+
+Most runs do not need an LLM to pick the analysis mode: a protein FASTA with
+"what does this do?" is Mode B and any mention of resistance is Mode C. The
+rules below mirror the mode selection rules of the configuration agent prompt,
+combining keyword patterns over the question with the alphabet and ORF flags
+of the FASTA sketch, and report how confident they are. The pipeline only
+calls the LLM when the confidence is below the configured threshold.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from story_seq.models import AnalysisConfig
+
+MODE_SCENARIOS = {
+    "A": "Mode A — Species Identification",
+    "B": "Mode B — Functional Inference / Homology",
+    "C": "Mode C — AMR Gene Detection",
+}
+
+AMR_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r"\bresistan(?:ce|t)\b", r"\bamr\b", r"\b[mx]dr\b", r"\bantibiotic", r"\bantimicrobial",
+        r"beta[- ]?lactamase", r"β-lactamase", r"\besbl\b", r"carbapenem", r"\bmbl\b",
+        r"efflux pump",
+    )
+] + [
+    # Gene names are case-sensitive so ordinary words ("black", "tether") do not match
+    re.compile(p) for p in (
+        r"\bbla[A-Z][A-Za-z0-9-]*", r"\bvan[A-Z]\b", r"\bqnr[A-Z]?\b", r"\btet(?:\([A-Z]\)|[A-Z]\b)",
+        r"\bmec[A-Z]\b", r"\bmcr-\d", r"\b(?:acr|mex)[A-Z]",
+    )
+]
+
+FUNCTION_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r"\bfunction(?:s|al)?\b", r"\bwhat (?:does|do|might|could) (?:this|it|these|they)\b.*\bdo\b",
+        r"\brole\b", r"\bhomolog", r"\bortholog", r"\bparalog", r"\bfamily\b", r"\benzyme",
+        r"\bpathway", r"\bdomain", r"\bannotat",
+    )
+]
+
+SPECIES_PATTERNS = [
+    re.compile(p, re.IGNORECASE) for p in (
+        r"\bspecies\b", r"\borganism", r"\btaxon", r"\bclassif", r"\bidentif(?:y|ication)\b",
+        r"\bwhere\b.*\bfrom\b", r"\borigin\b", r"\bstrain\b", r"\bgenus\b", r"\bgenome\b",
+        r"\bunknown (?:dna|sequence)", r"\bwhat is this\b",
+    )
+]
+
+
+class ConfigurationDecision(BaseModel):
+    """Outcome of the rule-based classifier."""
+    config: AnalysisConfig
+    mode: Optional[str] = Field(default=None, description="Selected mode (A, B or C), or None if unclassifiable")
+    confidence: float = Field(ge=0, le=1, description="Confidence in the selected mode")
+    reasons: List[str] = Field(default_factory=list, description="Rules that fired")
+
+
+def _matches(patterns: List[re.Pattern], text: str) -> List[str]:
+    found = []
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match:
+            found.append(match.group(0))
+    return found
+
+
+def sketch_alphabet(fasta_sketch: Optional[Dict[str, Any]]) -> Tuple[str, bool]:
+    """
+    Summarize the sketch as (alphabet, has_orfs).
+
+    The alphabet is "NT", "AA", "mixed" or "unknown"; has_orfs reports whether
+    the nucleotide partition looks protein-coding.
+    """
+    partitions = (fasta_sketch or {}).get("partitions", {})
+    nt = partitions.get("NT", {})
+    aa = partitions.get("AA", {})
+    has_nt = nt.get("total_records", 0) > 0
+    # ORFs translated from the NT query do not make it a protein query
+    has_aa = aa.get("total_records", 0) - aa.get("translated_records", 0) > 0
+    if has_nt and has_aa:
+        alphabet = "mixed"
+    elif has_nt:
+        alphabet = "NT"
+    elif has_aa:
+        alphabet = "AA"
+    else:
+        alphabet = "unknown"
+    return alphabet, bool(nt.get("has_orfs", False))
+
+
+def classify_request(question: str, fasta_sketch: Optional[Dict[str, Any]] = None) -> ConfigurationDecision:
+    """
+    Choose the analysis mode from the question and the FASTA sketch.
+
+    Args:
+        question: User's question
+        fasta_sketch: Sketch from process_multiple_files
+
+    Returns:
+        ConfigurationDecision with the AnalysisConfig, mode, confidence and the
+        rules that fired
+    """
+    question = question or ""
+    alphabet, has_orfs = sketch_alphabet(fasta_sketch)
+    amr = _matches(AMR_PATTERNS, question)
+    function = _matches(FUNCTION_PATTERNS, question)
+    species = _matches(SPECIES_PATTERNS, question)
+
+    reasons = [f"query alphabet: {alphabet}" + (" with ORFs" if has_orfs else "")]
+    if amr:
+        reasons.append(f"AMR keywords: {', '.join(amr)}")
+    if function:
+        reasons.append(f"function keywords: {', '.join(function)}")
+    if species:
+        reasons.append(f"species keywords: {', '.join(species)}")
+
+    coding = alphabet == "AA" or (alphabet == "NT" and has_orfs)
+    if amr:
+        # AMR supersedes functional inference
+        mode, confidence = "C", 0.95
+    elif function and species:
+        # Whether function "dominates" is a judgement call left to the LLM
+        mode, confidence = "B", 0.55
+    elif function:
+        mode, confidence = "B", 0.9 if coding else 0.7
+    elif species:
+        mode, confidence = "A", 0.9 if alphabet == "NT" else 0.75
+    elif alphabet == "AA":
+        mode, confidence = "B", 0.7
+    elif alphabet == "NT":
+        mode, confidence = "A", 0.6 if has_orfs else 0.7
+    else:
+        mode, confidence = None, 0.0
+
+    config = AnalysisConfig(
+        identify_unknown_dna=mode == "A",
+        find_protein_homologs=mode == "B",
+        functional_hint=mode == "C",
+        custom_other=mode is None,
+        analysis_scenario=MODE_SCENARIOS[mode] if mode is not None else "Unclassified request",
+    )
+    return ConfigurationDecision(config=config, mode=mode, confidence=confidence, reasons=reasons)
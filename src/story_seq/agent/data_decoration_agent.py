@@ -3,7 +3,7 @@
 from pydantic_ai import Agent, RunContext
 from pydantic import BaseModel, Field
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
+from story_seq.agent.llm_scheduler import scheduled_provider
 from typing import Any, Dict, List, Optional
 from story_seq.models import BlastResult
 
@@ -46,11 +46,8 @@ async def get_data_decoration_agent(
     Returns:
         Configured Agent instance
     """
-    # Only pass api_key if it's not empty
-    provider_kwargs = {"base_url": llm_api_url}
-    if llm_api_key:
-        provider_kwargs["api_key"] = llm_api_key
-    provider = OpenAIProvider(**provider_kwargs)
+    # Requests go through the process-wide scheduler (concurrency, rate limits, retries)
+    provider = scheduled_provider(llm_api_url, llm_api_key, stage="data_decoration")
     llm_model = OpenAIModel(model_name, provider=provider)
     
     if mcp_servers is None:
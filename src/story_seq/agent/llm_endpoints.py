@@ -0,0 +1,239 @@
+"""
+Load balancing and failover across a pool of OpenAI-compatible endpoints.
+
+The OpenAI client is pointed at the first endpoint of the pool, and a
+`BalancingTransport` underneath it re-targets each request to the endpoint
+chosen by the pool:
+
+    - endpoints are scored by latency EWMA x (outstanding requests + 1) / weight,
+      so faster, idler and heavier-weighted endpoints get more traffic
+    - a request that cannot connect is retried immediately on another endpoint
+    - endpoints that fail several times in a row (connection errors or 5xx) are
+      ejected for a cooldown that doubles on each consecutive ejection
+    - when an endpoint serves a different model name, the request's `model`
+      field is rewritten
+
+Health is tracked per endpoint and shared by every agent in the process.
+"""
+
+import json
+import threading
+import time
+from typing import AbstractSet, Dict, List, Optional, Sequence, Set, Tuple, cast
+
+import httpx
+
+from story_seq.agent.llm_scheduler import ReleasingStream
+from story_seq.config import LLMEndpoint
+
+EWMA_ALPHA = 0.3
+INITIAL_LATENCY = 0.5
+EJECT_AFTER_FAILURES = 3
+EJECT_BASE_SECONDS = 10.0
+EJECT_MAX_SECONDS = 300.0
+TRIED_EXTENSION = "story_seq.tried_endpoints"
+
+
+class EndpointState:
+    """Live health and load figures for one endpoint."""
+
+    def __init__(self, endpoint: LLMEndpoint):
+        self.endpoint = endpoint
+        self.outstanding = 0
+        self.latency = INITIAL_LATENCY
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.failures = 0
+
+    def score(self) -> float:
+        return self.latency * (self.outstanding + 1) / self.endpoint.weight
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+
+class EndpointPool:
+    """
+    Chooses endpoints for requests and tracks their health.
+
+    Args:
+        endpoints: Endpoints in the pool (at least one)
+    """
+
+    def __init__(self, endpoints: Sequence[LLMEndpoint]):
+        if not endpoints:
+            raise ValueError("An endpoint pool needs at least one endpoint")
+        self._lock = threading.Lock()
+        self.states = [EndpointState(endpoint) for endpoint in endpoints]
+
+    def acquire(self, exclude: AbstractSet[str] = frozenset()) -> Optional[EndpointState]:
+        """
+        Reserve the best endpoint not in `exclude`.
+
+        Healthy endpoints are preferred; if every candidate is ejected the one
+        whose ejection ends soonest is used rather than failing outright.
+        Returns None when every endpoint has been excluded.
+        """
+        now = time.monotonic()
+        with self._lock:
+            candidates = [s for s in self.states if s.endpoint.url not in exclude]
+            if not candidates:
+                return None
+            healthy = [s for s in candidates if s.healthy(now)]
+            if healthy:
+                chosen = min(healthy, key=EndpointState.score)
+            else:
+                chosen = min(candidates, key=lambda s: s.ejected_until)
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    def release(self, state: EndpointState) -> None:
+        with self._lock:
+            state.outstanding -= 1
+
+    def record_success(self, state: EndpointState, latency: float) -> None:
+        with self._lock:
+            state.latency += EWMA_ALPHA * (latency - state.latency)
+            state.consecutive_failures = 0
+            state.ejections = 0
+
+    def record_throttled(self, state: EndpointState) -> None:
+        """A 429 means saturated, not broken: steer traffic away without ejecting."""
+        with self._lock:
+            state.latency *= 1.5
+
+    def record_failure(self, state: EndpointState) -> None:
+        with self._lock:
+            state.failures += 1
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= EJECT_AFTER_FAILURES:
+                cooldown = min(EJECT_MAX_SECONDS, EJECT_BASE_SECONDS * (2 ** state.ejections))
+                state.ejected_until = time.monotonic() + cooldown
+                state.ejections += 1
+                state.consecutive_failures = 0
+
+    def stats(self) -> List[Dict[str, object]]:
+        """Per-endpoint counters for logging."""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "url": s.endpoint.url,
+                "requests": s.requests,
+                "failures": s.failures,
+                "outstanding": s.outstanding,
+                "latency_ewma": round(s.latency, 3),
+                "healthy": s.healthy(now),
+            } for s in self.states]
+
+
+def _retarget(request: httpx.Request, base: httpx.URL, endpoint: LLMEndpoint, api_key: Optional[str]) -> httpx.Request:
+    """Copy a request onto another endpoint, swapping base URL, model and API key."""
+    url = request.url
+    path = url.raw_path.decode()
+    base_path = base.raw_path.decode().rstrip("/")
+    suffix = path[len(base_path):] if path.startswith(base_path) else path
+    target = httpx.URL(endpoint.url.rstrip("/") + suffix)
+
+    headers = request.headers.copy()
+    key = endpoint.api_key or api_key
+    if key:
+        headers["Authorization"] = f"Bearer {key}"
+
+    content = request.content
+    if endpoint.model and content:
+        try:
+            body = json.loads(content)
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and "model" in body:
+            body["model"] = endpoint.model
+            content = json.dumps(body).encode()
+    headers.pop("Content-Length", None)
+    return httpx.Request(request.method, target, headers=headers, content=content, extensions=request.extensions)
+
+
+class BalancingTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that spreads requests over an `EndpointPool`.
+
+    Connection failures fail over to another endpoint straight away. Error
+    responses are returned to the caller (the scheduler retries them with
+    backoff); the endpoints already tried for a request are remembered across
+    those retries so each retry goes elsewhere while alternatives remain.
+    """
+
+    def __init__(
+        self,
+        pool: EndpointPool,
+        api_key: Optional[str] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.pool = pool
+        self.api_key = api_key
+        self.base = httpx.URL(pool.states[0].endpoint.url)
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        tried: Set[str] = request.extensions.setdefault(TRIED_EXTENSION, set())
+        if len(tried) >= len(self.pool.states):
+            tried.clear()
+
+        while True:
+            state = self.pool.acquire(exclude=tried)
+            if state is None:
+                raise httpx.ConnectError("No LLM endpoint in the pool accepted the connection", request=request)
+            tried.add(state.endpoint.url)
+            started = time.perf_counter()
+            try:
+                response = await self._transport.handle_async_request(
+                    _retarget(request, self.base, state.endpoint, self.api_key)
+                )
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                self.pool.release(state)
+                self.pool.record_failure(state)
+                continue
+            except BaseException:
+                self.pool.release(state)
+                self.pool.record_failure(state)
+                raise
+
+            if response.status_code == 429:
+                self.pool.record_throttled(state)
+            elif response.status_code >= 500:
+                self.pool.record_failure(state)
+            else:
+                self.pool.record_success(state, time.perf_counter() - started)
+
+            released = False
+
+            def release(state: EndpointState = state) -> None:
+                nonlocal released
+                if not released:
+                    released = True
+                    self.pool.release(state)
+
+            if response.is_closed:
+                release()
+            else:
+                response.stream = ReleasingStream(cast(httpx.AsyncByteStream, response.stream), release)
+            return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+_pools: Dict[Tuple[Tuple[str, Optional[str], float], ...], EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(endpoints: Sequence[LLMEndpoint]) -> EndpointPool:
+    """Return the process-wide pool for this set of endpoints, so health is shared by all agents."""
+    key = tuple((e.url, e.model, e.weight) for e in endpoints)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = EndpointPool(endpoints)
+        return _pools[key]
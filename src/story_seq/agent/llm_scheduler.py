@@ -0,0 +1,435 @@
+"""
+Process-wide scheduling of LLM requests.
+
+Every agent's OpenAI provider sends its HTTP requests through a
+`SchedulingTransport` that shares one `LLMScheduler` per process. The scheduler:
+
+    - caps the number of requests in flight to the LLM endpoint, halving the
+      cap when the endpoint answers 429 and growing it back by one request per
+      window of successes (additive increase, multiplicative decrease)
+    - keeps an estimated tokens-per-minute budget over a sliding 60 s window
+    - retries 429 and 5xx responses and connection errors with exponential
+      backoff and full jitter, honouring Retry-After when the server sends it
+    - grants waiting requests by pipeline stage priority, so reporter calls for
+      nearly finished jobs go ahead of configuration calls for new ones
+
+The OpenAI client's own retries are disabled so each attempt passes through
+the scheduler. Agents on one event loop share an HTTP client, and name their
+stage in a request header the transport reads.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    cast,
+)
+
+import httpx
+
+if TYPE_CHECKING:
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    from story_seq.agent.llm_endpoints import EndpointPool
+    from story_seq.config import LLMEndpoint
+
+# Lower values are granted first: later pipeline stages finish jobs that are
+# already holding resources, so they go ahead of stages that start new work
+STAGE_PRIORITY = {
+    "reporter": 0,
+    "validation": 1,
+    "data_decoration": 1,
+    "blast": 2,
+    "config": 3,
+}
+
+RETRY_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+TOKEN_WINDOW_SECONDS = 60.0
+
+# Request header naming the pipeline stage that sends a request; removed before it is sent
+STAGE_HEADER = "x-story-seq-stage"
+
+
+def estimate_tokens(request: httpx.Request) -> int:
+    """Rough prompt token count of a request (about four bytes per token)."""
+    try:
+        return max(1, len(request.content) // 4)
+    except httpx.RequestNotRead:
+        return 1
+
+
+class LLMScheduler:
+    """
+    Admission control, priority and retries for LLM requests.
+
+    Its state is guarded by a thread lock and every waiter is a future on its
+    own event loop, so one instance can be shared by pipelines running on
+    different event loops or threads. The only loop-bound object is the timer
+    that re-dispatches once the token budget frees up; it is started through
+    `call_soon_threadsafe` on the loop of the waiter it was scheduled for.
+
+    Args:
+        max_in_flight: Maximum concurrent requests to the LLM endpoint
+        tokens_per_minute: Estimated prompt token budget per minute (None for no limit)
+        max_retries: Retries per request on 429/5xx responses and connection errors
+        backoff_base: First backoff ceiling in seconds; doubles with each retry
+        backoff_max: Upper bound of any single backoff in seconds
+        rng: Random source for jitter
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        rng: Optional[random.Random] = None,
+    ):
+        self._lock = threading.Lock()
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+        self._tokens: Deque[Tuple[float, int]] = deque()
+        self._tokens_in_window = 0
+        self._timer_generation = 0
+        self._rng = rng or random.Random()
+        self.in_flight = 0
+        self.configure(max_in_flight, tokens_per_minute, max_retries, backoff_base, backoff_max)
+
+    def configure(
+        self,
+        max_in_flight: int = 4,
+        tokens_per_minute: Optional[int] = None,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+    ) -> None:
+        """Update the limits; requests already waiting are re-evaluated."""
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        with self._lock:
+            self.max_in_flight = max_in_flight
+            self.limit = float(max_in_flight)
+            self.tokens_per_minute = tokens_per_minute
+            self.max_retries = max_retries
+            self.backoff_base = backoff_base
+            self.backoff_max = backoff_max
+            self._dispatch()
+
+    @property
+    def waiting(self) -> int:
+        with self._lock:
+            return sum(1 for waiter in self._waiters if not waiter[2].done())
+
+    def _expire_tokens(self, now: float) -> None:
+        while self._tokens and now - self._tokens[0][0] >= TOKEN_WINDOW_SECONDS:
+            self._tokens_in_window -= self._tokens.popleft()[1]
+
+    def _token_delay(self, tokens: int, now: float) -> float:
+        """Seconds until `tokens` fit in the budget (0 if they fit now)."""
+        if self.tokens_per_minute is None or not self._tokens:
+            # An empty window always admits one request, however large
+            return 0.0
+        excess = self._tokens_in_window + tokens - self.tokens_per_minute
+        if excess <= 0:
+            return 0.0
+        freed = 0
+        for stamp, count in self._tokens:
+            freed += count
+            if freed >= excess:
+                return stamp + TOKEN_WINDOW_SECONDS - now
+        return self._tokens[-1][0] + TOKEN_WINDOW_SECONDS - now
+
+    def _dispatch(self) -> None:
+        """Grant waiting requests in priority order while limits allow. Caller holds the lock."""
+        now = time.monotonic()
+        self._expire_tokens(now)
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters[0]
+            _, _, future, tokens, _ = waiter
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            delay = self._token_delay(tokens, now)
+            if delay > 0:
+                self._schedule_retry(future.get_loop(), delay)
+                return
+            heapq.heappop(self._waiters)
+            # The slot belongs to the waiter from here on, even if it is cancelled before the grant runs
+            waiter[4] = True
+            self.in_flight += 1
+            self._tokens.append((now, tokens))
+            self._tokens_in_window += tokens
+            future.get_loop().call_soon_threadsafe(_grant, future)
+
+    def _schedule_retry(self, loop: asyncio.AbstractEventLoop, delay: float) -> None:
+        """Re-dispatch after `delay` on `loop`, which may belong to another thread. Caller holds the lock."""
+        # Timers cannot be cancelled from another thread, so an older one simply finds itself superseded
+        self._timer_generation += 1
+        generation = self._timer_generation
+
+        def fire() -> None:
+            with self._lock:
+                if generation == self._timer_generation:
+                    self._dispatch()
+
+        loop.call_soon_threadsafe(loop.call_later, delay, fire)
+
+    async def acquire(self, stage: str = "config", tokens: int = 1) -> None:
+        """Wait for a request slot; the caller must `release()` it afterwards."""
+        future = asyncio.get_running_loop().create_future()
+        priority = STAGE_PRIORITY.get(stage, max(STAGE_PRIORITY.values()))
+        waiter = [priority, next(self._sequence), future, tokens, False]  # last: granted
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted before the cancellation arrived: hand the slot back
+            with self._lock:
+                granted = waiter[4]
+            if granted:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def record_outcome(self, throttled: bool) -> None:
+        """Adapt the concurrency cap: halve on throttling, creep back up on success."""
+        with self._lock:
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_in_flight), self.limit + 1.0 / self.limit)
+            self._dispatch()
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Delay before retry number `attempt` (0-based)."""
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        ceiling = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return self._rng.uniform(0, ceiling)
+
+
+def _grant(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """Response body that calls `release` when it is closed (after being read or abandoned)."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class SchedulingTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that routes requests through an `LLMScheduler`.
+
+    A scheduler slot is held from admission until the response body is closed,
+    so streamed responses count as in flight for as long as they stream.
+    Requests carrying a `STAGE_HEADER` are scheduled for that stage instead of
+    `stage`.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        scheduler: Optional[LLMScheduler] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.stage = stage
+        self.scheduler = scheduler or get_scheduler()
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        scheduler = self.scheduler
+        stage = request.headers.pop(STAGE_HEADER, self.stage)
+        tokens = estimate_tokens(request)
+        attempt = 0
+        while True:
+            await scheduler.acquire(stage, tokens)
+            released = False
+
+            def release() -> None:
+                nonlocal released
+                if not released:
+                    released = True
+                    scheduler.release()
+
+            try:
+                response = await self._transport.handle_async_request(request)
+            except (httpx.ConnectError, httpx.ReadError, httpx.RemoteProtocolError, httpx.TimeoutException):
+                release()
+                if attempt >= scheduler.max_retries:
+                    raise
+                await asyncio.sleep(scheduler.backoff(attempt))
+                attempt += 1
+                continue
+            except BaseException:
+                release()
+                raise
+
+            throttled = response.status_code == 429
+            scheduler.record_outcome(throttled)
+            if response.status_code in RETRY_STATUS_CODES and attempt < scheduler.max_retries:
+                await response.aclose()
+                release()
+                await asyncio.sleep(scheduler.backoff(attempt, _retry_after(response)))
+                attempt += 1
+                continue
+
+            if response.is_closed:
+                # Body was already buffered by the inner transport
+                release()
+            else:
+                # Responses from an async transport always carry an async body
+                response.stream = ReleasingStream(cast(httpx.AsyncByteStream, response.stream), release)
+            return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+_scheduler: Optional[LLMScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler(**limits: Any) -> LLMScheduler:
+    """
+    Return the process-wide scheduler.
+
+    `limits` (see `LLMScheduler`) apply when the scheduler is created, so the
+    first pipeline of a process sets them and later ones do not reset the
+    adaptive limit while other pipelines are running.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler(**limits)
+        return _scheduler
+
+
+def configure_scheduler(
+    max_in_flight: int = 4,
+    tokens_per_minute: Optional[int] = None,
+    max_retries: int = 5,
+    backoff_base: float = 1.0,
+    backoff_max: float = 60.0,
+) -> LLMScheduler:
+    """Set the limits of the process-wide scheduler, resetting its adaptive limit."""
+    scheduler = get_scheduler()
+    scheduler.configure(max_in_flight, tokens_per_minute, max_retries, backoff_base, backoff_max)
+    return scheduler
+
+
+def scheduled_provider(
+    llm_api_url: Optional[str],
+    llm_api_key: Optional[str],
+    stage: str,
+    llm_endpoints: Optional[List["LLMEndpoint"]] = None,
+    timeout: Optional[float] = None,
+) -> "OpenAIProvider":
+    """
+    Create an OpenAI provider whose requests go through the process-wide scheduler.
+
+    Args:
+        llm_api_url: Base URL for the LLM API
+        llm_api_key: API key for authentication (may be empty for local servers)
+        stage: Pipeline stage making the requests, used for priority
+        llm_endpoints: Pool of endpoints to balance across; replaces llm_api_url when set
+        timeout: Upper bound in seconds for each HTTP request, e.g. the time left
+            before the pipeline's deadline (default 600)
+    """
+    from openai import AsyncOpenAI
+    from pydantic_ai.providers.openai import OpenAIProvider
+
+    pool = None
+    if llm_endpoints:
+        from story_seq.agent.llm_endpoints import get_endpoint_pool
+
+        pool = get_endpoint_pool(llm_endpoints)
+        llm_api_url = llm_endpoints[0].url
+
+    # Same fallback as OpenAIProvider: local OpenAI-compatible servers often need no key
+    api_key = llm_api_key or os.environ.get("OPENAI_API_KEY")
+    if not api_key and llm_api_url is not None:
+        api_key = "api-key-not-set"
+
+    # openai releases built on httpx2 annotate these as httpx2 types; httpx objects work as they do
+    # for OpenAIProvider, which passes its own httpx client
+    client = AsyncOpenAI(
+        base_url=llm_api_url,
+        api_key=api_key,
+        http_client=shared_http_client(pool, llm_api_key),  # type: ignore[arg-type]
+        max_retries=0,
+        # An expired deadline (0 s left) fails the request at once rather than falling back to the defaults
+        timeout=httpx.Timeout(timeout=600 if timeout is None else min(600, timeout),  # type: ignore[arg-type]
+                              connect=5 if timeout is None else min(5, timeout)),
+        default_headers={STAGE_HEADER: stage},
+    )
+    return OpenAIProvider(openai_client=client)
+
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[Any, Optional[str]], httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def shared_http_client(pool: Optional["EndpointPool"] = None, api_key: Optional[str] = None) -> httpx.AsyncClient:
+    """
+    The scheduled HTTP client shared by every agent on the running event loop.
+
+    Agents balancing over an endpoint pool share one client per pool and API key.
+    """
+    clients = _clients.setdefault(asyncio.get_running_loop(), {})
+    key = (pool, api_key if pool is not None else None)
+    if key not in clients:
+        inner = None
+        if pool is not None:
+            from story_seq.agent.llm_endpoints import BalancingTransport
+
+            inner = BalancingTransport(pool, api_key=api_key)
+        clients[key] = httpx.AsyncClient(transport=SchedulingTransport("config", transport=inner))
+    return clients[key]
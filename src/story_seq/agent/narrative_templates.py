@@ -0,0 +1,153 @@
+"""
+Template fast path for the Reporter Agent.
+
+Many runs are routine: the best hit matches the query at >99% identity over
+nearly its whole length and names a well-annotated reference (e.g. TetM from
+S. pneumoniae). Those do not need an LLM to tell the story. When every query's
+best hit clears the configured identity, coverage and e-value thresholds, the
+narrative is filled in from templates per analysis mode, using the hit and its
+GenBank, BioProject and BioSample enrichment. Anything less clear-cut (weak or
+conflicting hits, queries without hits, unannotated references, custom
+requests) is left to the reporter LLM.
+"""
+
+import re
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from pydantic import BaseModel, Field
+
+from story_seq.agent.configuration_rules import AMR_PATTERNS, _matches
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult
+from story_seq.util.orfs import hit_coverage, orf_record_id
+
+# A hit on another organism this close in identity to the best hit makes the species call ambiguous
+MIN_IDENTITY_MARGIN = 1.0
+# Top hits checked for agreement with the best hit's annotation
+AGREEMENT_HITS = 10
+
+BRACKET_ORGANISM = re.compile(r"\[([^\[\]]+)\]\s*$")
+BINOMIAL = re.compile(r"^([A-Z][a-z]+ (?:sp\.|[a-z]+))\b")
+
+
+class NarrativeDecision(BaseModel):
+    """Outcome of the template fast path."""
+    narrative: Optional[str] = Field(default=None, description="Template narrative, or None when the reporter LLM is needed")
+    reasons: List[str] = Field(default_factory=list, description="Why the evidence was or was not clear enough")
+
+
+def organism_of(summary: Optional[str]) -> Optional[str]:
+    """Organism named in a definition line ("... [Genus species]" or "Genus species ...")."""
+    if not summary:
+        return None
+    match = BRACKET_ORGANISM.search(summary) or BINOMIAL.match(summary)
+    return match.group(1) if match else None
+
+
+def _hits_by_query(blast_results: List[BlastResult]) -> Dict[str, List[Tuple[BlastHit, BlastResult]]]:
+    """Hits of every query, best bit score first; ORF hits count for their nucleotide record."""
+    by_query: Dict[str, List[Tuple[BlastHit, BlastResult]]] = {}
+    for result in blast_results:
+        for hit in result.hits:
+            by_query.setdefault(orf_record_id(hit.query_id), []).append((hit, result))
+    for hits in by_query.values():
+        hits.sort(key=lambda pair: -pair[0].bit_score)
+    return by_query
+
+
+def _paragraph(query_id: str, hits: List[Tuple[BlastHit, BlastResult]], coverage: float, config: AnalysisConfig) -> str:
+    best, result = hits[0]
+    organism = organism_of(best.genbank_summary)
+    top = hits[:AGREEMENT_HITS]
+    agreeing = sum(1 for hit, _ in top if (organism_of(hit.genbank_summary) or hit.genbank_summary) == (organism or best.genbank_summary))
+    evidence = (
+        f"its best BLAST hit ({result.blast_method} against {result.database}) is {best.subject_id}, "
+        f"{best.genbank_summary}, at {best.identity:.1f}% identity over {coverage:.0f}% of the query "
+        f"(E-value {best.evalue:.2g}, bit score {best.bit_score:.0f})"
+    )
+    if config.functional_hint:
+        amr = ", ".join(_matches(AMR_PATTERNS, best.genbank_summary or ""))
+        text = (f"{query_id} carries an antimicrobial resistance gene: {evidence}. The reference is annotated "
+                f"as resistance-associated ({amr}), and the near-identical full-length match makes this a "
+                f"high-confidence AMR detection.")
+    elif config.find_protein_homologs:
+        text = (f"{query_id} is a close homolog of a characterized sequence: {evidence}. At this identity and "
+                f"coverage it very likely has the same function.")
+    else:
+        text = f"{query_id} is identified as {organism or 'the organism of its best hit'}: {evidence}."
+    text += f" {agreeing} of the top {len(top)} hits agree with this annotation."
+    if best.bioproject_info:
+        text += f" BioProject: {best.bioproject_info}."
+    if best.biosample_info:
+        text += f" BioSample: {best.biosample_info}."
+    return text
+
+
+def template_narrative(
+    blast_results: List[BlastResult],
+    analysis_config: Optional[AnalysisConfig],
+    query_count: int = 0,
+    min_identity: float = 99.0,
+    min_coverage: float = 95.0,
+    max_evalue: float = 1e-30,
+    records: Optional[Mapping[str, Any]] = None,
+) -> NarrativeDecision:
+    """
+    Write the narrative from templates if the evidence is unambiguous.
+
+    Args:
+        blast_results: BLAST results of the run (with enrichment fields, if any)
+        analysis_config: Analysis configuration; selects the template
+        query_count: Number of query sequences; if fewer have hits, the LLM is needed
+        min_identity: Minimum percent identity of each query's best hit
+        min_coverage: Minimum percent query coverage of each query's best hit
+        max_evalue: Maximum e-value of each query's best hit
+        records: Query records by id; needed to measure the coverage of hits on
+            translated ORFs, which are otherwise left to the LLM
+
+    Returns:
+        NarrativeDecision whose narrative is None when the reporter LLM should run
+    """
+    config = analysis_config or AnalysisConfig()
+    if config.custom_other:
+        return NarrativeDecision(reasons=["custom request"])
+    by_query = _hits_by_query(blast_results)
+    if not by_query:
+        return NarrativeDecision(reasons=["no hits"])
+    if len(by_query) < query_count:
+        return NarrativeDecision(reasons=[f"{query_count - len(by_query)} of {query_count} queries without hits"])
+
+    reasons = []
+    coverages = {}
+    for query_id, hits in by_query.items():
+        best, result = hits[0]
+        record = (records or {}).get(query_id)
+        coverage = hit_coverage(best, result, len(record) if record is not None else None)
+        if coverage is None:
+            return NarrativeDecision(reasons=[f"{query_id}: coverage of the best hit, on a translated ORF, is unknown"])
+        coverages[query_id] = coverage
+        problems = []
+        if best.identity < min_identity:
+            problems.append(f"identity {best.identity:.1f}% < {min_identity}%")
+        if coverage < min_coverage:
+            problems.append(f"coverage {coverage:.0f}% < {min_coverage}%")
+        if best.evalue > max_evalue:
+            problems.append(f"E-value {best.evalue:.2g} > {max_evalue:g}")
+        if not best.genbank_summary:
+            problems.append("best hit not annotated")
+        elif config.functional_hint and not _matches(AMR_PATTERNS, best.genbank_summary):
+            problems.append("best hit not annotated as an AMR gene")
+        elif config.identify_unknown_dna:
+            organism = organism_of(best.genbank_summary)
+            rival = next((hit for hit, _ in hits[1:] if organism_of(hit.genbank_summary) not in (None, organism)), None)
+            if rival is not None and best.identity - rival.identity < MIN_IDENTITY_MARGIN:
+                problems.append(f"{organism_of(rival.genbank_summary)} matches almost as well")
+        if problems:
+            return NarrativeDecision(reasons=[f"{query_id}: {', '.join(problems)}"])
+        reasons.append(f"{query_id}: {best.identity:.1f}% identity over {coverage:.0f}% to {best.subject_id}")
+
+    paragraphs = [_paragraph(query_id, hits, coverages[query_id], config) for query_id, hits in by_query.items()]
+    paragraphs.append(
+        f"(Written from a template: every query's best hit met the clarity thresholds of {min_identity:g}% identity, "
+        f"{min_coverage:g}% query coverage and E-value {max_evalue:g}.)"
+    )
+    return NarrativeDecision(narrative="\n\n".join(paragraphs), reasons=reasons)
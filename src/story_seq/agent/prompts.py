@@ -0,0 +1,26 @@
+"""
+Static agent prompts.
+
+The `static_*_agent_prompt.md` files are read once per process and reused by every
+agent instance. Agents pass them as the literal part of their `instructions`,
+which pydantic-ai places ahead of the dynamic instruction functions, so every
+request starts with the same bytes and OpenAI-compatible servers with prefix
+(KV) caching, such as vLLM, can reuse the prompt's cached prefix.
+"""
+
+from functools import lru_cache, cache
+from pathlib import Path
+
+PROMPT_DIR = Path(__file__).parent
+
+
+@cache
+def static_prompt(name: str) -> str:
+    """
+    Return the contents of `static_<name>_agent_prompt.md`, read on first use.
+
+    Args:
+        name: Agent name, e.g. "blast", "configuration" or "reporter"
+    """
+    with open(PROMPT_DIR / f"static_{name}_agent_prompt.md") as f:
+        return f.read()
@@ -1,16 +1,23 @@
 """Reporter agent for generating narrative reports."""
 
-import json
-from pathlib import Path
-from pydantic_ai import Agent, RunContext
-from pydantic import BaseModel, Field
+from pydantic_ai import Agent, ModelRetry, RunContext
+from pydantic import BaseModel, Field, PrivateAttr
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
+from story_seq.agent.llm_scheduler import scheduled_provider
+from story_seq.agent.prompts import static_prompt
+from story_seq.agent.reporter_tools import HitIndex
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
+from pydantic_ai.messages import (
+    AgentStreamEvent, PartDeltaEvent, PartEndEvent, PartStartEvent, TextPart, TextPartDelta, ToolCallPart,
+)
+from story_seq.config import LLMEndpoint
 from story_seq.models import SequenceNarrative, BlastResult
 from story_seq.models import AnalysisConfig
 
+# Text a model writes before calling a tool is a sentence or two ("Let me look at the best hits first.")
+PREAMBLE_CHARS = 200
+
 class ReporterAgentDeps(BaseModel):
     """
     Dependencies for the Reporter Agent.
@@ -19,45 +26,60 @@ class ReporterAgentDeps(BaseModel):
         default_factory=list,
         description="BLAST results to generate narrative from"
     )
-    analysis_config: AnalysisConfig = Field(default=None, description="Analysis configuration from configuration agent" )
+    analysis_config: Optional[AnalysisConfig] = Field(default=None, description="Analysis configuration from configuration agent" )
     question: Optional[str] = Field(
         default=None,
         description="Specific question to address in the narrative"
     )
+    taxonomy_summary: Optional[str] = Field(
+        default=None,
+        description="Weighted LCA and lineage of the hits from the offline NCBI taxonomy"
+    )
+    _hit_index: Optional[HitIndex] = PrivateAttr(default=None)
+
+    @property
+    def hit_index(self) -> HitIndex:
+        """All hits indexed for the reporter's retrieval tools, built on first use."""
+        if self._hit_index is None:
+            self._hit_index = HitIndex(self.blast_results)
+        return self._hit_index
 
 
 async def get_reporter_agent(
     llm_api_url: Optional[str],
     llm_api_key: Optional[str],
     model_name: str = "gpt-4",
-    max_tokens: int = 2000
-) -> Agent:
+    max_tokens: int = 2000,
+    llm_endpoints: Optional[List[LLMEndpoint]] = None,
+    timeout: Optional[float] = None,
+) -> Agent[ReporterAgentDeps, str]:
     """
     Create and configure the Reporter Agent.
+
+    The prompt carries a compact overview of the BLAST results; the agent's
+    tools (top_hits, hits_for_taxon, coverage_summary, hit_detail) retrieve
+    individual hits from `ReporterAgentDeps.hit_index` on demand.
     
     Args:
         llm_api_url: Base URL for the LLM API
         llm_api_key: API key for authentication
         model_name: Name of the LLM model to use
         max_tokens: Maximum tokens for AI responses
+        llm_endpoints: Pool of LLM endpoints to balance across (overrides llm_api_url)
+        timeout: Seconds left for this agent's work; caps its LLM request timeout
         
     Returns:
         Configured Agent instance
     """
-    # Only pass api_key if it's not empty
-    provider_kwargs = {"base_url": llm_api_url}
-    if llm_api_key:
-        provider_kwargs["api_key"] = llm_api_key
-    provider = OpenAIProvider(**provider_kwargs)
+    # Requests go through the process-wide scheduler (concurrency, rate limits, retries)
+    provider = scheduled_provider(llm_api_url, llm_api_key, stage="reporter", llm_endpoints=llm_endpoints, timeout=timeout)
     llm_model = OpenAIModel(model_name, provider=provider)
     
     # Reporter agent doesn't need MCP servers - it only synthesizes narratives from existing data
     # mcp_servers = []
     
-    # Read instructions from static markdown file
-    prompt_file = Path(__file__).parent / "static_reporter_agent_prompt.md"
-    with open(prompt_file, 'r') as f:
-        instructions = f.read()
+    # Static prompt is read once per process and sent first so the request prefix is byte-stable
+    instructions = static_prompt("reporter")
     
     agent = Agent(
         model=llm_model,
@@ -83,8 +105,109 @@ async def get_reporter_agent(
             context += "Focus the narrative on answering this specific question.\n"
         
         if ctx.deps.blast_results:
-            context += f"\nBLAST results are available for analysis.\n{json.dumps([br.model_dump() for br in ctx.deps.blast_results], indent=4)}\n    "
+            # Only an overview goes in the prompt; the tools below fetch the hits themselves
+            context += f"\nBLAST results overview:\n{ctx.deps.hit_index.overview()}\n"
+            if ctx.deps.taxonomy_summary:
+                context += f"\nTaxonomic placement of the hits (NCBI taxonomy):\n{ctx.deps.taxonomy_summary}\n"
+            context += ("\nUse the top_hits, hits_for_taxon, coverage_summary and hit_detail tools "
+                        "to retrieve the hits and annotations you cite.\n")
 
         return context
+
+    @agent.tool
+    async def top_hits(ctx: RunContext[ReporterAgentDeps], n: int = 10, by: str = "bit_score") -> List[Dict[str, Any]]:
+        """
+        Best hits across all BLAST searches.
+
+        Args:
+            n: Number of hits to return (at most 50)
+            by: Sort key: bit_score, evalue, identity, coverage or alignment_length
+        """
+        try:
+            return ctx.deps.hit_index.top_hits(n, by)
+        except ValueError as e:
+            raise ModelRetry(str(e)) from e
+
+    @agent.tool
+    async def hits_for_taxon(ctx: RunContext[ReporterAgentDeps], name: str, n: int = 20) -> List[Dict[str, Any]]:
+        """
+        Best hits whose subject id or GenBank, BioProject or BioSample annotations mention a name.
+
+        Args:
+            name: Organism, taxon or any annotation text, matched case-insensitively
+            n: Number of hits to return (at most 50)
+        """
+        return ctx.deps.hit_index.hits_for_taxon(name, n)
+
+    @agent.tool
+    async def coverage_summary(ctx: RunContext[ReporterAgentDeps], query_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Covered intervals, gaps and percent coverage of a query sequence.
+
+        Args:
+            query_id: Query sequence id; omit for every query
+        """
+        return ctx.deps.hit_index.coverage_summary(query_id)
+
+    @agent.tool
+    async def hit_detail(ctx: RunContext[ReporterAgentDeps], subject_id: str) -> List[Dict[str, Any]]:
+        """
+        Every alignment (HSP) of one subject sequence with all its fields and annotations.
+
+        Args:
+            subject_id: Subject accession, with or without version
+        """
+        return ctx.deps.hit_index.hit_detail(subject_id)
     
     return agent
+
+
+class NarrativeRelay:
+    """
+    Passes the text of one reporter response on as it streams.
+
+    The reporter may write a short preamble before calling its tools, which is
+    not part of the narrative. A response's text is held back only until it is
+    longer than a preamble (`PREAMBLE_CHARS`) or its text part ends without a
+    tool call following; held text is dropped when a tool call starts first.
+    Everything after that is forwarded delta by delta.
+
+    Args:
+        callback: Called with each narrative text delta
+    """
+
+    def __init__(self, callback: Callable[[str], None]):
+        self.callback = callback
+        self._held: List[str] = []
+        self._live = False
+
+    def _release(self) -> None:
+        self._live = True
+        for text in self._held:
+            self.callback(text)
+        self._held.clear()
+
+    def _text(self, text: str) -> None:
+        if not text:
+            return
+        if self._live:
+            self.callback(text)
+            return
+        self._held.append(text)
+        if sum(len(held) for held in self._held) > PREAMBLE_CHARS:
+            self._release()
+
+    def feed(self, event: AgentStreamEvent) -> None:
+        """Handle one event of the response stream."""
+        if isinstance(event, PartStartEvent):
+            if isinstance(event.part, ToolCallPart):
+                self._held.clear()
+            elif isinstance(event.part, TextPart):
+                self._text(event.part.content)
+        elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+            self._text(event.delta.content_delta)
+        elif isinstance(event, PartEndEvent) and isinstance(event.part, TextPart):
+            if event.next_part_kind == "tool-call":
+                self._held.clear()
+            else:
+                self._release()
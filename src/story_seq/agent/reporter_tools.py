@@ -0,0 +1,197 @@
+"""
+reporter_tools.py
+
+Evidence retrieval for the reporter agent.
+
+Rather than serializing every BLAST hit into the reporter's prompt, the hits of
+all searches are indexed once in a single `BlastHitTable` and the reporter gets
+a compact overview plus tools that pull only the evidence it asks for:
+
+    - top_hits(n, by): best hits overall, by bit score, e-value, identity, ...
+    - hits_for_taxon(name): hits whose annotations mention an organism or taxon
+    - coverage_summary(query_id): covered span and gaps of a query
+    - hit_detail(subject_id): every HSP and annotation of one subject
+
+Prompt size then depends on the number of searches and queries, not hits.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from story_seq.models import BlastResult
+from story_seq.util.coverage import find_gaps, merge_intervals
+from story_seq.util.hit_table import SORT_DESCENDING, BlastHitTable
+
+# Columns searched by hits_for_taxon
+ANNOTATION_COLUMNS = ("subject_id", "genbank_summary", "bioproject_info", "biosample_info")
+# Longest annotation text included in a hit row
+SUMMARY_CHARS = 160
+# Most rows or intervals any single tool call returns
+MAX_ROWS = 50
+
+
+def _clip(text: Optional[str], limit: int = SUMMARY_CHARS) -> Optional[str]:
+    if text is None or len(text) <= limit:
+        return text
+    return text[:limit - 3] + "..."
+
+
+class HitIndex:
+    """
+    Every hit of a list of BLAST results in one table, with query lookups.
+
+    Searches are named S1, S2, ... in the order of the results.
+    """
+
+    def __init__(self, results: List[BlastResult]):
+        self.results = results
+        counts = [result.num_hits for result in results]
+        self.table = BlastHitTable.from_hits(hit for result in results for hit in result.hits)
+        self.search = np.repeat(np.arange(len(results), dtype=np.int64), counts)
+        self.offsets = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+        self.query_length = np.repeat(np.array([r.query_length for r in results], dtype=np.int64), counts)
+        records = self.table.records
+        span = np.abs(records["query_end"] - records["query_start"]) + 1
+        self.coverage = span * 100.0 / np.maximum(self.query_length, 1)
+        self._lowered: Optional[List[str]] = None
+        self._query_rows: Optional[Dict[str, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _strings(self, name: str, rows: np.ndarray) -> List[Optional[str]]:
+        return [self.table.pool.get(int(idx)) for idx in self.table.records[name][rows]]
+
+    def _rows(self, rows: np.ndarray) -> List[Dict[str, Any]]:
+        """Compact hit rows, as the tools return them."""
+        records = self.table.records[rows]
+        return [
+            {
+                "search": f"S{int(self.search[row]) + 1}",
+                "query_id": query_id,
+                "subject_id": subject_id,
+                "identity": float(record["identity"]),
+                "evalue": float(record["evalue"]),
+                "bit_score": float(record["bit_score"]),
+                "coverage": round(float(self.coverage[row]), 1),
+                "query_span": [int(record["query_start"]), int(record["query_end"])],
+                "summary": _clip(summary),
+            }
+            for row, record, query_id, subject_id, summary in zip(
+                rows.tolist(), records,
+                self._strings("query_id", rows), self._strings("subject_id", rows),
+                self._strings("genbank_summary", rows), strict=True,
+            )
+        ]
+
+    def _order(self, by: str) -> np.ndarray:
+        if by not in SORT_DESCENDING:
+            raise ValueError(f"Unknown sort key {by!r}; use one of {', '.join(SORT_DESCENDING)}")
+        values = self.coverage if by == "coverage" else self.table.records[by]
+        return np.argsort(-values if SORT_DESCENDING[by] else values, kind="stable")
+
+    def top_hits(self, n: int = 10, by: str = "bit_score") -> List[Dict[str, Any]]:
+        """Best n hits across all searches."""
+        return self._rows(self._order(by)[:max(0, min(n, MAX_ROWS))])
+
+    def hits_for_taxon(self, name: str, n: int = 20) -> List[Dict[str, Any]]:
+        """Best hits (by bit score) whose subject id or annotations mention `name`, case-insensitively."""
+        if self._lowered is None:
+            self._lowered = [s.lower() for s in self.table.pool.strings]
+        needle = name.strip().lower()
+        # Match against each distinct string once, then select rows through the pool indexes
+        matching = np.array([needle in s for s in self._lowered] + [False], dtype=bool)
+        mask = np.zeros(len(self.table), dtype=bool)
+        for column in ANNOTATION_COLUMNS:
+            mask |= matching[self.table.records[column]]  # -1 (None) hits the trailing False
+        rows = np.flatnonzero(mask)
+        rows = rows[np.argsort(-self.table.records["bit_score"][rows], kind="stable")]
+        return self._rows(rows[:max(0, min(n, MAX_ROWS))])
+
+    def _rows_by_query(self) -> Dict[str, np.ndarray]:
+        """Row indexes of each query's hits, queries in order of first appearance (grouped once)."""
+        if self._query_rows is None:
+            codes = self.table.records["query_id"]
+            order = np.argsort(codes, kind="stable")
+            _, starts = np.unique(codes[order], return_index=True)
+            groups = sorted(np.split(order, starts[1:]), key=lambda rows: rows[0]) if len(order) else []
+            self._query_rows = {self.table.pool.strings[int(codes[rows[0]])]: rows for rows in groups}
+        return self._query_rows
+
+    def coverage_summary(self, query_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Covered intervals and gaps of one query, or of every query when query_id is None."""
+        by_query = self._rows_by_query()
+        names = [query_id] if query_id is not None else list(by_query)
+        records = self.table.records
+        summaries = []
+        for name in names:
+            rows = by_query.get(name, np.empty(0, dtype=np.int64))
+            if rows.size == 0:
+                summaries.append({"query_id": name, "hits": 0})
+                continue
+            length = int(self.query_length[rows].max())
+            covered = merge_intervals(records["query_start"][rows], records["query_end"][rows])
+            covered_bases = sum(min(end, length) - start + 1 for start, end in covered if start <= length)
+            gaps = find_gaps(covered, length)
+            summaries.append({
+                "query_id": name,
+                "query_length": length,
+                "hits": int(rows.size),
+                "percent_covered": round(100.0 * covered_bases / length, 1),
+                "covered": [list(interval) for interval in covered[:MAX_ROWS]],
+                "gaps": [list(gap) for gap in gaps[:MAX_ROWS]],
+            })
+        return summaries
+
+    def hit_detail(self, subject_id: str) -> List[Dict[str, Any]]:
+        """Every HSP of a subject (accession version optional) with its full annotations."""
+        base = subject_id.split(".")[0]
+        subjects = self.table.strings("subject_id")
+        rows = [i for i, s in enumerate(subjects) if s == subject_id or (s or "").split(".")[0] == base]
+        details = []
+        for row in rows[:MAX_ROWS]:
+            hit = self.table.hit(row)
+            result = self.results[int(self.search[row])]
+            details.append({
+                "search": f"S{int(self.search[row]) + 1}",
+                "blast_method": result.blast_method,
+                "database": result.database,
+                "search_reason": result.search_reason,
+                "query_length": result.query_length,
+                "coverage": round(float(self.coverage[row]), 1),
+                **hit.model_dump(),
+            })
+        return details
+
+    def overview(self, hits_per_search: int = 3) -> str:
+        """A few lines per search and per query: counts, best hits and coverage."""
+        if not len(self):
+            return f"{len(self.results)} BLAST search(es), no hits."
+        subjects = np.unique(self.table.records["subject_id"]).size
+        queries = self.coverage_summary()
+        lines = [
+            f"{len(self)} hits from {len(self.results)} BLAST search(es) on {len(queries)} query sequence(s), "
+            f"{subjects} distinct subjects."
+        ]
+        for number, result in enumerate(self.results):
+            rows = np.arange(self.offsets[number], self.offsets[number + 1])
+            lines.append(
+                f"S{number + 1}: {result.blast_method} against {result.database}, {rows.size} hits "
+                f"({result.search_reason or 'no reason given'})"
+            )
+            best = rows[np.argsort(-self.table.records["bit_score"][rows], kind="stable")[:hits_per_search]]
+            for row in self._rows(best):
+                summary = _clip(row["summary"], 80)
+                lines.append(
+                    f"  - {row['subject_id']}: {row['identity']:.1f}% identity, e-value {row['evalue']:.2g}, "
+                    f"{row['coverage']:.0f}% query coverage{'; ' + summary if summary else ''}"
+                )
+        for query in queries[:10]:
+            lines.append(
+                f"Query {query['query_id']} ({query['query_length']} long): {query['percent_covered']}% covered, "
+                f"{len(query['gaps'])} gap(s)"
+            )
+        if len(queries) > 10:
+            lines.append(f"... and {len(queries) - 10} more queries (use coverage_summary)")
+        return "\n".join(lines)
@@ -2,7 +2,7 @@
 
 import asyncio
 from pathlib import Path
-from typing import Optional, Any
+from typing import Callable, List, Optional, Any
 import typer
 from rich.console import Console
 from rich.table import Table
@@ -24,6 +24,20 @@ def paths_to_strings(obj: Any) -> Any:
     else:
         return obj
 
+def make_narrative_printer(target: Console) -> Callable[[str], None]:
+    """Return a callback that renders streamed narrative text deltas to the console."""
+    started = False
+
+    def print_chunk(chunk: str) -> None:
+        nonlocal started
+        if not started:
+            target.print()
+            target.print("[bold green]Narrative:[/bold green]")
+            started = True
+        target.print(chunk, end="", markup=False, highlight=False, soft_wrap=True)
+
+    return print_chunk
+
 app = typer.Typer(
     name="story-seq",
     help="A CLI tool for sequence narrative analysis using AI",
@@ -189,7 +203,39 @@ def blast(
         Optional[str],
         typer.Option(
             "--start",
-            help="Task to start pipeline from (get_fasta_sketch, call_config_agent, call_blast_agent, call_reporter_agent)",
+            help="Task to start pipeline from (get_fasta_sketch, call_config_agent, call_blast_agent, call_coverage_followup, call_reporter_agent)",
+        ),
+    ] = None,
+    export_dir: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--export-dir",
+            help="Directory of columnar datasets to append the results to",
+            file_okay=False,
+            dir_okay=True,
+        ),
+    ] = None,
+    export_format: Annotated[
+        str,
+        typer.Option(
+            "--export-format",
+            help="Format of the exported datasets (parquet, arrow)",
+        ),
+    ] = "parquet",
+    result_index: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--result-index",
+            help="SQLite index of earlier analyses to reuse results from and record this run in (overrides config file)",
+            dir_okay=False,
+        ),
+    ] = None,
+    deadline: Annotated[
+        Optional[float],
+        typer.Option(
+            "--deadline",
+            help="Time budget in seconds for the whole run; the running task is cancelled and partial results are saved when it passes",
+            min=1,
         ),
     ] = None,
 ) -> None:
@@ -204,10 +250,20 @@ def blast(
     Command-line parameters override configuration file values.
     
     Use --state-file to save pipeline state after each step and --start
-    to resume from a specific task.
+    to resume from a specific task. With --deadline, a run that runs out of
+    time saves its state and can be resumed the same way.
     """
     from story_seq.pipeline.state import PipelineOptions
     from story_seq.pipeline.blast_pipeline import run_pipeline
+
+    # Fail before the run rather than after it when the results cannot be exported
+    if export_dir:
+        from story_seq.pipeline.export import check_export_format
+        try:
+            check_export_format(export_format)
+        except (ImportError, ValueError) as e:
+            console.print(f"[red]Error:[/red] {e}")
+            raise typer.Exit(1) from e
     
     # Load config from file
     config = load_config()
@@ -221,6 +277,8 @@ def blast(
     config.llm_api_url = final_llm_api_url
     config.llm_model = final_llm_model
     config.llm_api_key = final_llm_api_key
+    if result_index:
+        config.result_index_path = str(result_index)
     
     # Create PipelineOptions object
     options = PipelineOptions(
@@ -246,12 +304,361 @@ def blast(
     table.add_row("LLM API URL", final_llm_api_url if final_llm_api_url else "[dim]Not specified[/dim]")
     table.add_row("LLM Model", final_llm_model)
     table.add_row("LLM API Key", "[dim]***[/dim]" if final_llm_api_key else "[dim]Not specified[/dim]")
+    table.add_row("Result Index", config.result_index_path or "[dim]Disabled[/dim]")
+    table.add_row("Deadline", f"{deadline:g}s" if deadline else "[dim]None[/dim]")
     
     console.print(table)
     console.print()
     
-    # Run the pipeline
-    run_pipeline(options, state_file=state_file, start_task=start)
+    # Run the pipeline, streaming the narrative as it is generated
+    run_pipeline(
+        options,
+        state_file=state_file,
+        start_task=start,
+        narrative_callback=make_narrative_printer(console),
+        export_dir=export_dir,
+        export_format=export_format,
+        deadline=deadline,
+    )
+    console.print()
+
+
+@app.command()
+def export(
+    state_files: Annotated[
+        List[Path],
+        typer.Argument(
+            help="Pipeline state file(s) written with --state-file",
+            exists=True,
+            file_okay=True,
+            dir_okay=False,
+            readable=True,
+        ),
+    ],
+    output_dir: Annotated[
+        Path,
+        typer.Option(
+            "--output-dir",
+            "-o",
+            help="Directory of columnar datasets to append the results to",
+            file_okay=False,
+            dir_okay=True,
+        ),
+    ],
+    export_format: Annotated[
+        str,
+        typer.Option(
+            "--format",
+            help="Format of the exported datasets (parquet, arrow)",
+        ),
+    ] = "parquet",
+    question: Annotated[
+        str,
+        typer.Option(
+            "--question",
+            help="Question the runs answered (state files do not record it)",
+        ),
+    ] = "",
+) -> None:
+    """
+    Export saved pipeline results to partitioned Parquet/Arrow datasets.
+
+    Each state file is appended as one run to the sketch_files, analysis_config,
+    blast_hits and narratives datasets under the output directory.
+    """
+    import json
+
+    from story_seq.pipeline.export import export_results
+    from story_seq.pipeline.state import PipelineOptions, PipelineState
+
+    config = load_config()
+
+    table = Table(title="Exported Runs")
+    table.add_column("State File", style="cyan")
+    table.add_column("Dataset", style="green")
+    table.add_column("Path")
+
+    for state_file in state_files:
+        with open(state_file) as f:
+            state_data = json.load(f)
+        input_files = (state_data.get("fasta_sketch") or {}).get("run_summary", {}).get("input_files_list", [])
+        options = PipelineOptions(
+            config=config,
+            query=",".join(input_files) if input_files else str(state_file),
+            question=question,
+        )
+        state = PipelineState(options=options, **state_data)
+        try:
+            written = export_results(state, output_dir, fmt=export_format)
+        except (ImportError, ValueError) as e:
+            console.print(f"[red]Error:[/red] {e}")
+            raise typer.Exit(1) from e
+        for name, path in written.items():
+            table.add_row(str(state_file), name, str(path))
+
+    console.print(table)
+
+
+@app.command()
+def enqueue(
+    queries: Annotated[
+        List[Path],
+        typer.Argument(
+            help="Query FASTA file(s); one job is queued per file",
+            exists=True,
+            file_okay=True,
+            dir_okay=False,
+            readable=True,
+        ),
+    ],
+    question: Annotated[
+        str,
+        typer.Option(
+            "--question",
+            help="Question to ask the LLM about the BLAST results",
+        ),
+    ] = "",
+    queue_path: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--queue",
+            help="SQLite job queue (overrides job_queue_path in the config file)",
+            dir_okay=False,
+        ),
+    ] = None,
+    deadline: Annotated[
+        Optional[float],
+        typer.Option(
+            "--deadline",
+            help="Time budget in seconds for each attempt at a job",
+            min=1,
+        ),
+    ] = None,
+    max_attempts: Annotated[
+        int,
+        typer.Option(
+            "--max-attempts",
+            help="Times a job is claimed before it is marked failed",
+            min=1,
+        ),
+    ] = 3,
+) -> None:
+    """
+    Queue pipeline runs for `story-seq worker` processes.
+
+    Each job records the current configuration, so workers run it with the
+    settings in effect when it was queued.
+    """
+    from story_seq.pipeline.job_queue import JobQueue
+
+    config = load_config()
+    queue = JobQueue(queue_path or config.job_queue_path)
+    for query in queries:
+        job_id = queue.enqueue(
+            query,
+            question if question else "Analyze the BLAST results",
+            config=config,
+            deadline=deadline,
+            max_attempts=max_attempts,
+        )
+        console.print(f"Queued job {job_id}: {query}")
+    counts = queue.counts()
+    console.print(f"[dim]{queue.path}: " + ", ".join(f"{n} {status}" for status, n in counts.items()) + "[/dim]")
+
+
+@app.command()
+def worker(
+    queue_path: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--queue",
+            help="SQLite job queue (overrides job_queue_path in the config file)",
+            dir_okay=False,
+        ),
+    ] = None,
+    concurrency: Annotated[
+        int,
+        typer.Option(
+            "--concurrency",
+            "-c",
+            help="Pipelines to run at once in this worker",
+            min=1,
+        ),
+    ] = 1,
+    lease: Annotated[
+        float,
+        typer.Option(
+            "--lease",
+            help="Seconds a claimed job stays leased without a heartbeat",
+            min=3,
+        ),
+    ] = 60.0,
+    poll_interval: Annotated[
+        float,
+        typer.Option(
+            "--poll-interval",
+            help="Seconds between polls of an empty queue",
+        ),
+    ] = 2.0,
+    exit_when_empty: Annotated[
+        bool,
+        typer.Option(
+            "--exit-when-empty",
+            help="Stop once no job is runnable instead of waiting for more",
+        ),
+    ] = False,
+) -> None:
+    """
+    Claim and run queued pipeline jobs.
+
+    Start workers on as many nodes as needed; they share the queue database.
+    Jobs held by a worker that stops heartbeating are re-run by another worker,
+    resuming from the job's last checkpoint.
+    """
+    import asyncio
+
+    from story_seq.pipeline.job_queue import JobQueue, run_worker
+
+    config = load_config()
+    queue = JobQueue(queue_path or config.job_queue_path)
+    console.print(f"[bold cyan]Worker started[/bold cyan] on {queue.path}")
+    ran = asyncio.run(run_worker(
+        queue,
+        concurrency=concurrency,
+        lease_seconds=lease,
+        poll_interval=poll_interval,
+        exit_when_empty=exit_when_empty,
+    ))
+    counts = queue.counts()
+    console.print(f"Ran {ran} job(s); queue: " + ", ".join(f"{n} {status}" for status, n in counts.items()))
+
+
+@app.command()
+def loadtest(
+    pipelines: Annotated[
+        int,
+        typer.Option(
+            "--pipelines",
+            "-n",
+            help="Total number of pipelines to run",
+        ),
+    ] = 20,
+    concurrency: Annotated[
+        int,
+        typer.Option(
+            "--concurrency",
+            "-c",
+            help="Maximum number of pipelines in flight at once",
+        ),
+    ] = 5,
+    llm_latency: Annotated[
+        str,
+        typer.Option(
+            "--llm-latency",
+            help="Fake LLM latency: fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA (seconds)",
+        ),
+    ] = "lognormal:0.5,0.4",
+    llm_error_rate: Annotated[
+        float,
+        typer.Option(
+            "--llm-error-rate",
+            help="Probability a fake LLM request fails with HTTP 429/500",
+        ),
+    ] = 0.0,
+    mcp_latency: Annotated[
+        str,
+        typer.Option(
+            "--mcp-latency",
+            help="Fake BLAST search latency, same format as --llm-latency",
+        ),
+    ] = "lognormal:2,0.5",
+    mcp_error_rate: Annotated[
+        float,
+        typer.Option(
+            "--mcp-error-rate",
+            help="Probability a fake BLAST search fails",
+        ),
+    ] = 0.0,
+    llm_max_in_flight: Annotated[
+        int,
+        typer.Option(
+            "--llm-max-in-flight",
+            help="Maximum concurrent LLM requests across all pipelines",
+        ),
+    ] = 4,
+    query: Annotated[
+        Optional[Path],
+        typer.Option(
+            "--query",
+            "-q",
+            help="Query FASTA file path (a synthetic sequence is used if omitted)",
+            exists=True,
+            file_okay=True,
+            dir_okay=False,
+            readable=True,
+        ),
+    ] = None,
+    seed: Annotated[
+        int,
+        typer.Option(
+            "--seed",
+            help="Seed for the fake servers and the synthetic query",
+        ),
+    ] = 0,
+) -> None:
+    """
+    Load test the pipeline against local stand-in LLM and NCBI MCP servers.
+
+    No network access or API keys are needed: a deterministic OpenAI-compatible
+    server and a fake ncbi-mcp-server answer every request with configurable
+    latency and error rates.
+    """
+    from story_seq.loadtest import LatencyDistribution, run_loadtest
+
+    try:
+        llm_dist = LatencyDistribution.parse(llm_latency)
+        mcp_dist = LatencyDistribution.parse(mcp_latency)
+    except ValueError as e:
+        console.print(f"[red]Error:[/red] {e}")
+        raise typer.Exit(1) from e
+
+    console.print(
+        f"[bold cyan]Running {pipelines} pipeline(s), {concurrency} at a time[/bold cyan]"
+    )
+    report = run_loadtest(
+        pipelines=pipelines,
+        concurrency=concurrency,
+        llm_latency=llm_dist,
+        llm_error_rate=llm_error_rate,
+        mcp_latency=mcp_dist,
+        mcp_error_rate=mcp_error_rate,
+        llm_max_in_flight=llm_max_in_flight,
+        query=query,
+        seed=seed,
+    )
+
+    table = Table(title="Load Test Results")
+    table.add_column("Metric", style="cyan", no_wrap=True)
+    table.add_column("Value", style="green")
+    table.add_row("Pipelines", f"{report.succeeded} succeeded / {len(report.failures)} failed")
+    table.add_row("Wall Time", f"{report.wall_time:.2f} s")
+    table.add_row("Throughput", f"{report.throughput:.2f} pipelines/min")
+    for name, value in report.percentiles().items():
+        table.add_row(f"Latency {name}", f"{value:.2f} s")
+    table.add_row("Peak RSS", f"{report.peak_rss_mb:.1f} MB")
+    table.add_row("Peak RSS (MCP servers)", f"{report.peak_child_rss_mb:.1f} MB")
+    table.add_row(
+        "LLM Requests",
+        ", ".join(f"{name}={count}" for name, count in report.llm_counts.items()),
+    )
+    table.add_row(
+        "Coalesced Requests",
+        ", ".join(f"{name}={count}" for name, count in report.coalesced.items()) or "none",
+    )
+    console.print(table)
+
+    for failure in report.failures[:10]:
+        console.print(f"[red]{failure}[/red]")
 
 
 @app.command()
@@ -420,13 +827,14 @@ async def _run_agent_async(
         from story_seq.agent.reporter_agent import ReporterAgentDeps
         from story_seq.agent.validation_agent import ValidationAgentDeps
         from story_seq.util import process_multiple_files
+        from pydantic_ai import Agent
     except ImportError as e:
         console.print(f"[red]Error:[/red] Failed to import agents: {e}")
         console.print("[yellow]Make sure pydantic-ai is installed: pip install pydantic-ai[/yellow]")
         raise typer.Exit(1)
     
     # Get the appropriate agent based on agent_name
-    agent = None
+    agent: Optional[Agent[Any, Any]] = None
     deps = None
     try:
         if agent_name == "configuration":
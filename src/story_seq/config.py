@@ -3,11 +3,30 @@
 import json
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field, ValidationError
 
 
+class LLMEndpoint(BaseModel):
+    """One OpenAI-compatible inference endpoint in a load-balanced pool."""
+
+    url: str = Field(description="Base URL of the endpoint, e.g. http://gpu-node-1:8000/v1")
+    model: Optional[str] = Field(
+        default=None,
+        description="Model name served by this endpoint (defaults to llm_model)"
+    )
+    api_key: Optional[str] = Field(
+        default=None,
+        description="API key for this endpoint (defaults to llm_api_key)"
+    )
+    weight: float = Field(
+        default=1.0,
+        gt=0,
+        description="Relative share of traffic; higher weights receive more requests"
+    )
+
+
 class StorySeqConfig(BaseModel):
     """Configuration for story-seq application."""
 
@@ -33,6 +52,248 @@ class StorySeqConfig(BaseModel):
         default=100000,
         description="Maximum tokens for AI responses"
     )
+    llm_endpoints: List[LLMEndpoint] = Field(
+        default_factory=list,
+        description="Pool of LLM endpoints to load-balance across; when set, llm_api_url is not used"
+    )
+
+    # LLM request scheduling (shared by every agent in the process)
+    llm_max_in_flight: int = Field(
+        default=4,
+        ge=1,
+        description="Maximum concurrent requests to the LLM endpoint"
+    )
+    llm_tokens_per_minute: Optional[int] = Field(
+        default=None,
+        description="Estimated prompt tokens per minute sent to the LLM endpoint (no limit if unset)"
+    )
+    llm_max_retries: int = Field(
+        default=5,
+        ge=0,
+        description="Retries per LLM request on 429/5xx responses and connection errors"
+    )
+
+    # Configuration agent fast path
+    config_rules_min_confidence: float = Field(
+        default=0.8,
+        ge=0,
+        description="Use the rule-based analysis configuration when its confidence reaches this value; otherwise ask the LLM (set above 1 to always ask)"
+    )
+
+    # Index of earlier analyses, consulted before running the pipeline
+    result_index_path: Optional[str] = Field(
+        default=None,
+        description="SQLite file indexing analyzed sequences and their results; reuse is disabled if unset"
+    )
+    result_index_min_containment: float = Field(
+        default=0.9,
+        ge=0,
+        le=1,
+        description="Minimum k-mer containment before an indexed sequence is checked as a superstring of the query"
+    )
+
+    # Work queue shared by `story-seq enqueue` and `story-seq worker`
+    job_queue_path: str = Field(
+        default="~/.storyseq/jobs.sqlite",
+        description="SQLite job queue; put it on a filesystem shared by every worker node"
+    )
+
+    # NCBI MCP server configuration
+    ncbi_mcp_server_args: List[str] = Field(
+        default_factory=lambda: ["-m", "ncbi_mcp_server.server"],
+        description="Arguments passed to the Python interpreter to start the NCBI MCP server"
+    )
+
+    # ORF translation for protein-level searches (Modes B and C)
+    orf_translation: bool = Field(
+        default=True,
+        description="Translate ORFs of nucleotide queries so protein-level searches can use blastp instead of blastx/tblastx"
+    )
+    orf_min_protein_length: int = Field(
+        default=100,
+        ge=1,
+        description="Minimum length in amino acids of a translated ORF"
+    )
+    orf_start_codons: Literal["atg", "alternative", "none"] = Field(
+        default="atg",
+        description="ORF starts: first ATG, any start codon of the genetic code (ATG/GTG/TTG...), or none (stop to stop)"
+    )
+    orf_genetic_code: int = Field(
+        default=11,
+        description="NCBI genetic code used for translation (11: bacteria, archaea, plastids)"
+    )
+
+    # Deterministic BLAST escalation policy for Modes A, B and C
+    blast_policy: bool = Field(
+        default=True,
+        description="Run the mode's BLAST programs in order from Python, stopping once every query is answered; the BLAST agent only handles ambiguous results"
+    )
+    blast_policy_tool: str = Field(
+        default="blast_search",
+        description="NCBI MCP server tool the policy calls (arguments: sequence, program, database, max_hits_per_query and, for searches limited to a taxon, entrez_query); its signature is checked before the first search"
+    )
+    blast_max_concurrent_searches: int = Field(
+        default=3,
+        ge=1,
+        description="Maximum BLAST searches in flight per run, for independent searches of the policy or parallel agent tool calls"
+    )
+    blast_policy_max_evalue: float = Field(
+        default=1e-10,
+        ge=0,
+        description="Hits with a higher e-value are not counted as evidence"
+    )
+    blast_policy_min_hits: int = Field(
+        default=1,
+        ge=1,
+        description="Escalate to the next program while a query has fewer significant hits"
+    )
+    blast_policy_min_coverage: float = Field(
+        default=50.0,
+        ge=0,
+        le=100,
+        description="Escalate to the next program while a query's hits cover less of it (fragmentary hits)"
+    )
+    blast_policy_stop_coverage: float = Field(
+        default=80.0,
+        ge=0,
+        le=100,
+        description="Stop escalating once each query has a hit of the stop identity covering at least this percentage of it"
+    )
+    blast_policy_stop_identity: float = Field(
+        default=95.0,
+        ge=0,
+        le=100,
+        description="Percent identity a hit from a nucleotide search (megablast, blastn) needs to stop escalation"
+    )
+    blast_policy_stop_protein_identity: float = Field(
+        default=60.0,
+        ge=0,
+        le=100,
+        description="Percent identity a hit from a protein or translated search needs to stop escalation"
+    )
+
+    # Remote BLAST jobs for the policy (NCBI BLAST URL API)
+    blast_backend: Literal["mcp", "url_api"] = Field(
+        default="mcp",
+        description="How the BLAST policy runs searches: the NCBI MCP server's tool, or the BLAST URL API through a job manager that polls every run's searches together"
+    )
+    blast_url: str = Field(
+        default="https://blast.ncbi.nlm.nih.gov/Blast.cgi",
+        description="BLAST URL API endpoint"
+    )
+    blast_min_request_interval: float = Field(
+        default=10.0,
+        ge=0,
+        description="Minimum seconds between any two requests to the BLAST URL API"
+    )
+    blast_min_poll_interval: float = Field(
+        default=60.0,
+        ge=0,
+        description="Minimum seconds between two status checks of one remote search"
+    )
+    blast_max_poll_interval: float = Field(
+        default=300.0,
+        ge=0,
+        description="Maximum seconds between two status checks of one remote search"
+    )
+
+    # Local k-mer pre-classification narrowing Mode A searches (requires taxonomy_dir)
+    kmer_reference: Optional[str] = Field(
+        default=None,
+        description="FASTA of reference sequences labelled with taxids (kraken:taxid|N in the header, or kmer_seqid2taxid); its k-mer index is cached next to it. Disabled if unset"
+    )
+    kmer_seqid2taxid: Optional[str] = Field(
+        default=None,
+        description="File of 'sequence id<TAB>taxid' lines labelling the reference sequences"
+    )
+    kmer_size: int = Field(
+        default=31,
+        ge=12,
+        le=32,
+        description="Length of the indexed k-mers"
+    )
+    kmer_min_confidence: float = Field(
+        default=0.5,
+        gt=0,
+        le=1,
+        description="Share of a query's k-mers a taxon's clade needs for a provisional call"
+    )
+    kmer_certain_confidence: float = Field(
+        default=0.9,
+        gt=0,
+        le=1,
+        description="When every query has a species-level call with this share of its k-mers, only the Mode A ladder within the provisional taxa runs, without the unlimited fallback"
+    )
+    kmer_restrict_rank: str = Field(
+        default="genus",
+        description="Rank of the provisional taxa Mode A searches are first limited to"
+    )
+
+    # Reporter fast path: template narratives for unambiguous results
+    template_narratives: bool = Field(
+        default=True,
+        description="Write the narrative from templates, without the reporter LLM, when every query's best hit meets the thresholds below"
+    )
+    template_min_identity: float = Field(
+        default=99.0,
+        ge=0,
+        le=100,
+        description="Minimum percent identity of each query's best hit for a template narrative"
+    )
+    template_min_coverage: float = Field(
+        default=95.0,
+        ge=0,
+        le=100,
+        description="Minimum percent query coverage of each query's best hit for a template narrative"
+    )
+    template_max_evalue: float = Field(
+        default=1e-30,
+        ge=0,
+        description="Maximum e-value of each query's best hit for a template narrative"
+    )
+
+    # Offline taxonomic interpretation of BLAST hits
+    taxonomy_dir: Optional[str] = Field(
+        default=None,
+        description="Directory holding the NCBI taxdump (nodes.dmp, names.dmp); its index is cached there and the reporter gets a weighted LCA of the hits. Disabled if unset"
+    )
+    taxonomy_min_support: float = Field(
+        default=0.5,
+        gt=0,
+        le=1,
+        description="Share of the bit-score votes a taxon needs to be reported as the weighted LCA of the hits"
+    )
+
+    # Map-reduce narratives for large batches
+    reporter_batch_min_queries: int = Field(
+        default=20,
+        ge=0,
+        description="Write per-query narratives and merge them in a tree when the query has at least this many sequences (0 disables)"
+    )
+    reporter_fanout: int = Field(
+        default=8,
+        ge=1,
+        description="Maximum reporter LLM calls in flight while writing and merging batch narratives"
+    )
+    reporter_reduce_width: int = Field(
+        default=8,
+        ge=2,
+        description="Average number of narratives merged by one reduce call"
+    )
+    narrative_cache_path: Optional[str] = Field(
+        default="~/.storyseq/narratives.sqlite",
+        description="SQLite cache of per-query and merged batch narratives; caching is disabled if unset"
+    )
+
+    # Coverage follow-up configuration
+    coverage_followup: bool = Field(
+        default=True,
+        description="Run a follow-up BLAST round on query regions not covered by any hit"
+    )
+    coverage_gap_min_length: int = Field(
+        default=100,
+        description="Minimum length of an uncovered query region to search again"
+    )
 
 
 def get_config_path() -> Path:
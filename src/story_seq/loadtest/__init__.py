@@ -0,0 +1,17 @@
+"""
+Offline load testing for story-seq.
+
+Deterministic stand-ins for the OpenAI-compatible LLM endpoint and the NCBI
+MCP server, plus a harness that drives many concurrent pipelines against them.
+"""
+
+from story_seq.loadtest.fake_llm import FakeLLMServer
+from story_seq.loadtest.harness import LoadTestReport, run_loadtest
+from story_seq.loadtest.latency import LatencyDistribution
+
+__all__ = [
+    "LatencyDistribution",
+    "FakeLLMServer",
+    "LoadTestReport",
+    "run_loadtest",
+]
@@ -0,0 +1,160 @@
+"""
+A deterministic stand-in for the NCBI BLAST URL API (Blast.cgi).
+
+The server understands the three requests a remote search needs:
+
+    - `CMD=Put` (POST) submits a search and answers with a QBlastInfo block
+      holding its RID and RTOE
+    - `CMD=Get&FORMAT_OBJECT=SearchInfo` reports `Status=WAITING` until the
+      search's run time has passed, then `Status=READY` (`UNKNOWN` for RIDs it
+      never issued)
+    - `CMD=Get&FORMAT_TYPE=JSON2_S` returns the report, built by
+      `fake_blast_report` so the same query always yields the same hits
+
+Every request is logged with its arrival time so tests can check polling and
+request spacing.
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple, Type
+from urllib.parse import parse_qs, urlparse
+
+from story_seq.loadtest.fake_ncbi_mcp import fake_blast_report
+
+
+class FakeBlastURLAPI:
+    """
+    BLAST URL API server running in a background thread.
+
+    Use as a context manager; `url` is the endpoint to configure as `blast_url`.
+
+    Args:
+        run_seconds: Seconds each search takes, by program (default for others: `default_run_seconds`)
+        default_run_seconds: Run time of programs not in `run_seconds`
+        rtoe: Estimated time to completion reported on submission, in seconds
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+    """
+
+    def __init__(
+        self,
+        run_seconds: Optional[Dict[str, float]] = None,
+        default_run_seconds: float = 0.0,
+        rtoe: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.run_seconds = run_seconds or {}
+        self.default_run_seconds = default_run_seconds
+        self.rtoe = rtoe
+        self._lock = threading.Lock()
+        self.searches: Dict[str, Dict[str, Any]] = {}
+        self.log: List[Tuple[float, str, str]] = []  # (time, CMD/object, RID)
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.socket.getsockname()[:2]
+        return f"http://{host}:{port}/Blast.cgi"
+
+    def start(self) -> "FakeBlastURLAPI":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-blast-url-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeBlastURLAPI":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def count(self, kind: str, rid: Optional[str] = None) -> int:
+        """Requests of a kind ("Put", "SearchInfo", "JSON2_S"), optionally for one RID."""
+        with self._lock:
+            return sum(1 for _, k, r in self.log if k == kind and (rid is None or r == rid))
+
+    def _put(self, params: Dict[str, str]) -> str:
+        program = "megablast" if params.get("MEGABLAST") == "on" else params.get("PROGRAM", "blastn")
+        with self._lock:
+            rid = f"FAKE{len(self.searches) + 1:04d}"
+            self.searches[rid] = {
+                "program": program,
+                "database": params.get("DATABASE", "nt"),
+                "query": params.get("QUERY", ""),
+                "ready_at": time.monotonic() + self.run_seconds.get(program, self.default_run_seconds),
+            }
+            self.log.append((time.monotonic(), "Put", rid))
+        return f"<!--\nQBlastInfoBegin\n    RID = {rid}\n    RTOE = {self.rtoe}\nQBlastInfoEnd\n-->\n"
+
+    def _search_info(self, rid: str) -> str:
+        with self._lock:
+            self.log.append((time.monotonic(), "SearchInfo", rid))
+            search = self.searches.get(rid)
+        if search is None:
+            status = "UNKNOWN"
+        else:
+            status = "READY" if time.monotonic() >= search["ready_at"] else "WAITING"
+        extra = "\n    ThereAreHits=yes" if status == "READY" else ""
+        return f"<!--\nQBlastInfoBegin\n    Status={status}{extra}\nQBlastInfoEnd\n-->\n"
+
+    def _report(self, rid: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self.log.append((time.monotonic(), "JSON2_S", rid))
+            search = self.searches.get(rid)
+        if search is None or time.monotonic() < search["ready_at"]:
+            return None
+        return fake_blast_report(search["query"], search["program"], search["database"])
+
+    def _handler_class(self) -> Type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - silence per-request logging
+                pass
+
+            def do_GET(self) -> None:
+                params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                self._dispatch(params)
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                self._dispatch(params)
+
+            def _dispatch(self, params: Dict[str, str]) -> None:
+                cmd = params.get("CMD")
+                if cmd == "Put":
+                    self._send(200, "text/html", server._put(params))
+                elif cmd == "Get" and params.get("FORMAT_OBJECT") == "SearchInfo":
+                    self._send(200, "text/html", server._search_info(params.get("RID", "")))
+                elif cmd == "Get":
+                    report = server._report(params.get("RID", ""))
+                    if report is None:
+                        self._send(404, "text/plain", "Unknown or unfinished RID")
+                    else:
+                        self._send(200, "application/json", json.dumps(report))
+                else:
+                    self._send(400, "text/plain", f"Unsupported CMD {cmd}")
+
+            def _send(self, status: int, content_type: str, body: str) -> None:
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
@@ -0,0 +1,378 @@
+"""
+A deterministic stand-in for an OpenAI-compatible chat completions endpoint.
+
+The server answers `POST /v1/chat/completions` well enough to drive every agent
+in the pipeline without a real model:
+
+    - a request offering an output tool whose schema has `analysis_scenario`
+      is the configuration agent, answered with a fixed AnalysisConfig
+    - a request offering a BLAST-like function tool is the BLAST agent; it first
+      calls the tool with the query sequence from the prompt, then selects every
+      search in the tool's summary as the `final_result` output
+    - anything else is the reporter agent, answered with narrative text
+
+Responses honour `stream: true` (server-sent events) and every request waits for
+a latency drawn from a configurable distribution. A configurable fraction of
+requests fail with HTTP 429 or 500 so client retry behaviour is exercised.
+Usage reports cached prompt tokens from a simulated prefix cache.
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Type
+
+from story_seq.loadtest.latency import NO_LATENCY, LatencyDistribution
+
+# Give up on a tool after this many calls in one conversation and return no results
+MAX_TOOL_CALLS = 3
+# Granularity of the simulated prefix cache (about 64 tokens)
+PREFIX_BLOCK_CHARS = 256
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def _query_from_prompt(messages: List[Dict[str, Any]]) -> str:
+    """Recover the query FASTA the BLAST agent puts in its instructions."""
+    for message in messages:
+        text = _message_text(message)
+        marker = text.find("Query Sequences:")
+        if marker != -1:
+            return text[marker + len("Query Sequences:"):].strip()
+    return ">query\nN"
+
+
+def _decode_tool_payload(content: str) -> Any:
+    """Decode tool output, unwrapping MCP structured content ({"result": "<json>"})."""
+    try:
+        payload = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+    while isinstance(payload, dict) and set(payload) == {"result"}:
+        inner = payload["result"]
+        if not isinstance(inner, str):
+            return inner
+        try:
+            payload = json.loads(inner)
+        except ValueError:
+            return None
+    return payload
+
+
+def _fake_arguments(schema: Dict[str, Any], sequence: str) -> Dict[str, Any]:
+    """Fill a tool's JSON schema, putting the query into sequence-like fields."""
+    arguments: Dict[str, Any] = {}
+    for name, prop in schema.get("properties", {}).items():
+        lowered = name.lower()
+        if "seq" in lowered or lowered == "query":
+            arguments[name] = sequence
+        elif lowered == "program":
+            arguments[name] = "blastn"
+        elif lowered in ("database", "db"):
+            arguments[name] = "nt"
+        elif "default" in prop:
+            arguments[name] = prop["default"]
+        elif prop.get("type") == "integer":
+            arguments[name] = 10
+        elif prop.get("type") == "number":
+            arguments[name] = 10.0
+        elif prop.get("type") == "boolean":
+            arguments[name] = False
+        elif name in schema.get("required", []):
+            arguments[name] = ""
+    return arguments
+
+
+class _Reply:
+    """What the fake model says: either text or a single tool call."""
+
+    def __init__(self, text: str = "", tool_name: str = "", arguments: Optional[Dict[str, Any]] = None):
+        self.text = text
+        self.tool_name = tool_name
+        self.arguments = json.dumps(arguments or {})
+
+    @property
+    def finish_reason(self) -> str:
+        return "tool_calls" if self.tool_name else "stop"
+
+
+def build_reply(request: Dict[str, Any], narrative_words: int = 200) -> Tuple[str, _Reply]:
+    """
+    Decide how the fake model answers a chat completions request.
+
+    Returns:
+        Tuple of (agent kind, reply); the kind is "config", "blast" or "reporter"
+    """
+    messages = request.get("messages", [])
+    tools = {
+        tool["function"]["name"]: tool["function"]
+        for tool in request.get("tools", [])
+        if tool.get("type") == "function"
+    }
+    output_tool = tools.pop("final_result", None)
+
+    if output_tool is None:
+        return "reporter", _Reply(text=_fake_narrative(messages, narrative_words))
+
+    properties = output_tool.get("parameters", {}).get("properties", {})
+    if "analysis_scenario" in properties:
+        return "config", _Reply(tool_name="final_result", arguments={
+            "identify_unknown_dna": True,
+            "find_protein_homologs": False,
+            "functional_hint": False,
+            "custom_other": False,
+            "analysis_scenario": "Mode A: identify unknown DNA (load test)",
+        })
+
+    tool_messages = [m for m in messages if m.get("role") == "tool"]
+    payload = _decode_tool_payload(_message_text(tool_messages[-1])) if tool_messages else None
+    if isinstance(payload, dict) and "searches" in payload:
+        # The pipeline captured the hits; the model only names the searches to keep
+        return "blast", _Reply(tool_name="final_result", arguments={"response": [
+            {"search_id": search["search_id"], "search_reason": "Identify the query sequence (load test)"}
+            for search in payload["searches"]
+        ]})
+
+    blast_tools = [name for name in tools if "blast" in name.lower()] or list(tools)
+    if blast_tools and len(tool_messages) < MAX_TOOL_CALLS:
+        name = blast_tools[0]
+        arguments = _fake_arguments(tools[name].get("parameters", {}), _query_from_prompt(messages))
+        return "blast", _Reply(tool_name=name, arguments=arguments)
+
+    return "blast", _Reply(tool_name="final_result", arguments={"response": []})
+
+
+def _fake_narrative(messages: List[Dict[str, Any]], words: int) -> str:
+    prompt = "\n".join(_message_text(m) for m in messages)
+    digest = hashlib.sha256(prompt.encode()).hexdigest()
+    rng = random.Random(digest)
+    vocabulary = [
+        "the", "query", "sequence", "aligns", "with", "high", "identity", "to",
+        "reference", "genomes", "suggesting", "a", "close", "relationship",
+        "coverage", "hits", "across", "region", "organism", "evidence",
+    ]
+    body = " ".join(rng.choice(vocabulary) for _ in range(max(words - 4, 0)))
+    return f"Load test narrative {digest[:8]}. {body}."
+
+
+class FakeLLMServer:
+    """
+    OpenAI-compatible chat completions server running in a background thread.
+
+    Use as a context manager; `url` is the base URL to configure as
+    `llm_api_url` (it already ends in `/v1`).
+
+    Args:
+        latency: Per-request latency distribution
+        error_rate: Probability that a request fails with HTTP 429 or 500
+        narrative_words: Length of the reporter's narrative
+        chunk_words: Words per streamed chunk
+        seed: Seed for latency and failure sampling
+        host: Interface to bind
+        port: Port to bind (0 picks a free port)
+    """
+
+    def __init__(
+        self,
+        latency: LatencyDistribution = NO_LATENCY,
+        error_rate: float = 0.0,
+        narrative_words: int = 200,
+        chunk_words: int = 8,
+        seed: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.narrative_words = narrative_words
+        self.chunk_words = chunk_words
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {
+            "requests": 0, "errors": 0, "config": 0, "blast": 0, "reporter": 0, "cache_hits": 0,
+        }
+        self._prefixes: Set[str] = set()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.socket.getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc: object) -> None:
+        self.stop()
+
+    def _draw(self) -> Tuple[float, bool]:
+        with self._lock:
+            self.counts["requests"] += 1
+            delay = self.latency.sample(self._rng)
+            failed = self._rng.random() < self.error_rate
+            if failed:
+                self.counts["errors"] += 1
+        return delay, failed
+
+    def _prompt_cache(self, messages: List[Dict[str, Any]]) -> Tuple[int, int]:
+        """
+        Estimate (prompt_tokens, cached_tokens) like a server with prefix caching.
+
+        As in vLLM's automatic prefix caching, the prompt is hashed in fixed-size
+        blocks, each block's hash covering everything before it, and the leading
+        blocks already seen in earlier requests count as cached.
+        """
+        prompt = "\n".join(_message_text(m) for m in messages)
+        running = hashlib.sha256()
+        cached_chars = 0
+        with self._lock:
+            for start in range(0, len(prompt) - PREFIX_BLOCK_CHARS + 1, PREFIX_BLOCK_CHARS):
+                running.update(prompt[start:start + PREFIX_BLOCK_CHARS].encode())
+                key = running.hexdigest()
+                if key in self._prefixes and cached_chars == start:
+                    cached_chars += PREFIX_BLOCK_CHARS
+                self._prefixes.add(key)
+            if cached_chars:
+                self.counts["cache_hits"] += 1
+        return max(1, len(prompt) // 4), cached_chars // 4
+
+    def _count(self, kind: str) -> None:
+        with self._lock:
+            self.counts[kind] += 1
+
+    def _handler_class(self) -> Type[BaseHTTPRequestHandler]:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - silence per-request logging
+                pass
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+
+                delay, failed = server._draw()
+                time.sleep(delay)
+                if failed:
+                    status = server._rng.choice([429, 500])
+                    self._send_json(status, {"error": {
+                        "message": "Simulated failure", "type": "fake_llm_error", "code": status,
+                    }})
+                    return
+
+                kind, reply = build_reply(body, server.narrative_words)
+                server._count(kind)
+                usage = _usage(reply, *server._prompt_cache(body.get("messages", [])))
+                model = body.get("model", "fake-llm")
+                if body.get("stream"):
+                    self._send_stream(model, reply, usage)
+                else:
+                    self._send_json(200, _completion(model, reply, usage))
+
+            def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model: str, reply: _Reply, usage: Dict[str, Any]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                for chunk in _stream_chunks(model, reply, usage, server.chunk_words):
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+def _usage(reply: _Reply, prompt_tokens: int = 100, cached_tokens: int = 0) -> Dict[str, Any]:
+    completion_tokens = len((reply.text or reply.arguments).split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+def _tool_calls(reply: _Reply) -> List[Dict[str, Any]]:
+    return [{
+        "index": 0,
+        "id": f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": reply.tool_name, "arguments": reply.arguments},
+    }]
+
+
+def _completion(model: str, reply: _Reply, usage: Dict[str, Any]) -> Dict[str, Any]:
+    message: Dict[str, Any] = {"role": "assistant", "content": reply.text or None}
+    if reply.tool_name:
+        message["tool_calls"] = _tool_calls(reply)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": message, "finish_reason": reply.finish_reason}],
+        "usage": usage,
+    }
+
+
+def _stream_chunks(
+    model: str, reply: _Reply, usage: Dict[str, Any], chunk_words: int
+) -> Iterator[Dict[str, Any]]:
+    base = {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+    }
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+        return {**base, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+    yield chunk({"role": "assistant", "content": ""})
+    if reply.tool_name:
+        yield chunk({"tool_calls": _tool_calls(reply)})
+    else:
+        words = reply.text.split(" ")
+        for i in range(0, len(words), chunk_words):
+            piece = " ".join(words[i:i + chunk_words])
+            yield chunk({"content": piece if i == 0 else " " + piece})
+    yield chunk({}, reply.finish_reason)
+    yield {**base, "choices": [], "usage": usage}
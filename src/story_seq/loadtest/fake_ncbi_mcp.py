@@ -0,0 +1,151 @@
+"""
+A deterministic stand-in for ncbi-mcp-server.
+
+Runs as a stdio MCP server exposing a `blast_search` tool that answers with an
+NCBI BLAST JSON2 report. Results are derived from a hash of the query, so the
+same sequence always yields the same hits, and each call waits for a latency
+drawn from a configurable distribution and fails with a configurable
+probability.
+
+Usage:
+    python -m story_seq.loadtest.fake_ncbi_mcp --latency lognormal:2,0.5 --error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+from story_seq.loadtest.latency import LatencyDistribution
+
+ORGANISMS = [
+    (1313, "Streptococcus pneumoniae"),
+    (10298, "Human alphaherpesvirus 1"),
+    (10090, "Mus musculus"),
+    (9606, "Homo sapiens"),
+    (10245, "Vaccinia virus"),
+    (562, "Escherichia coli"),
+]
+
+
+def _query_sequence(sequence: str) -> str:
+    """Strip FASTA headers and whitespace from a query."""
+    lines = [line for line in sequence.splitlines() if not line.startswith(">")]
+    return re.sub(r"\s+", "", "".join(lines)) or "N"
+
+
+def fake_blast_report(
+    sequence: str,
+    program: str = "blastn",
+    database: str = "nt",
+    max_hits: int = 50,
+) -> Dict[str, Any]:
+    """
+    Build a deterministic BLAST JSON2 report for a query.
+
+    The first hit spans the whole query at near-identity; later hits are
+    progressively weaker and shorter.
+    """
+    seq = _query_sequence(sequence)
+    query_len = len(seq)
+    rng = random.Random(hashlib.sha256(f"{program}:{database}:{seq}".encode()).digest())
+
+    hits: List[Dict[str, Any]] = []
+    for num in range(1, max_hits + 1):
+        taxid, organism = ORGANISMS[rng.randrange(len(ORGANISMS))]
+        span = query_len if num == 1 else max(1, int(query_len * rng.uniform(0.2, 1.0)))
+        query_from = 1 if num == 1 else rng.randint(1, query_len - span + 1)
+        identity = span if num == 1 else int(span * rng.uniform(0.7, 0.99))
+        bit_score = round(1.8 * identity * (1.0 - num / (max_hits + 1)), 1) or 1.0
+        accession = f"FK{rng.randint(100000, 999999)}.1"
+        hits.append({
+            "num": num,
+            "description": [{
+                "id": f"gi|{rng.randint(10**8, 10**9)}|gb|{accession}|",
+                "accession": accession,
+                "title": f"{organism} synthetic sequence {num}",
+                "taxid": taxid,
+                "sciname": organism,
+            }],
+            "len": span + rng.randint(0, 5000),
+            "hsps": [{
+                "num": 1,
+                "bit_score": bit_score,
+                "score": int(bit_score * 2),
+                "evalue": float(f"{10 ** -min(180.0, bit_score / 10):.3g}"),
+                "identity": identity,
+                "align_len": span,
+                "query_from": query_from,
+                "query_to": query_from + span - 1,
+                "hit_from": 1,
+                "hit_to": span,
+            }],
+        })
+
+    return {"BlastOutput2": [{"report": {
+        "program": program,
+        "version": "BLASTN 2.15.0+ (fake)",
+        "search_target": {"db": database},
+        "results": {"search": {
+            "query_id": "Query_1",
+            "query_title": sequence.splitlines()[0].lstrip(">") if sequence.startswith(">") else "query",
+            "query_len": query_len,
+            "hits": hits,
+        }},
+    }}]}
+
+
+def build_server(
+    latency: LatencyDistribution,
+    error_rate: float = 0.0,
+    max_hits: int = 50,
+    seed: Optional[int] = None,
+) -> Any:
+    """Create the FastMCP server instance."""
+    from mcp.server.fastmcp import FastMCP
+
+    server = FastMCP("fake-ncbi-mcp-server", log_level="WARNING")
+    rng = random.Random(seed)
+
+    # The BLAST agent sets a log level on connect, which FastMCP does not handle by default
+    @server._mcp_server.set_logging_level()
+    async def set_logging_level(level: str) -> None:
+        return None
+
+    @server.tool()
+    async def blast_search(
+        sequence: str,
+        program: str = "blastn",
+        database: str = "nt",
+        max_hits_per_query: int = max_hits,
+        entrez_query: str = "",
+    ) -> str:
+        """Run a (simulated) NCBI BLAST search and return the BLAST JSON2 report."""
+        await asyncio.sleep(latency.sample(rng))
+        if rng.random() < error_rate:
+            raise RuntimeError("Simulated NCBI BLAST failure (status=UNKNOWN)")
+        report = fake_blast_report(sequence, program, database, min(max_hits_per_query, max_hits))
+        return json.dumps(report)
+
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", default="fixed:0", help="Latency distribution per BLAST call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability a call fails")
+    parser.add_argument("--max-hits", type=int, default=50, help="Hits per search")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for latency and failures")
+    args = parser.parse_args(argv)
+
+    server = build_server(
+        LatencyDistribution.parse(args.latency), args.error_rate, args.max_hits, args.seed
+    )
+    server.run("stdio")
+
+
+if __name__ == "__main__":
+    main()
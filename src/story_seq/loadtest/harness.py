@@ -0,0 +1,185 @@
+"""
+Load test harness.
+
+Drives many full pipelines concurrently against the stand-in LLM and NCBI MCP
+servers and reports throughput, latency percentiles and peak memory.
+"""
+
+import asyncio
+import contextlib
+import io
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from story_seq.config import StorySeqConfig
+from story_seq.loadtest.fake_llm import FakeLLMServer
+from story_seq.loadtest.latency import LatencyDistribution
+from story_seq.util.single_flight import single_flight_metrics
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Default service times of the stand-in LLM and of a remote BLAST search
+LLM_LATENCY = LatencyDistribution("lognormal", (0.5, 0.4))
+MCP_LATENCY = LatencyDistribution("lognormal", (2.0, 0.5))
+
+
+@dataclass
+class LoadTestReport:
+    """Outcome of a load test run."""
+
+    pipelines: int
+    concurrency: int
+    wall_time: float
+    latencies: List[float] = field(default_factory=list)
+    failures: List[str] = field(default_factory=list)
+    peak_rss_mb: float = 0.0
+    peak_child_rss_mb: float = 0.0
+    llm_counts: Dict[str, int] = field(default_factory=dict)
+    coalesced: Dict[str, int] = field(default_factory=dict)  # identical in-flight requests shared, by kind
+
+    @property
+    def succeeded(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        """Completed pipelines per minute."""
+        return 60.0 * self.succeeded / self.wall_time if self.wall_time > 0 else 0.0
+
+    def percentiles(self) -> Dict[str, float]:
+        """Latency percentiles (and max) in seconds over successful pipelines."""
+        if not self.latencies:
+            return {}
+        values = np.percentile(self.latencies, PERCENTILES)
+        summary = {f"p{p}": float(v) for p, v in zip(PERCENTILES, values, strict=True)}
+        summary["max"] = max(self.latencies)
+        return summary
+
+
+def synthetic_query(path: Path, length: int = 2000, seed: int = 0) -> Path:
+    """Write a random single-record nucleotide FASTA query."""
+    rng = random.Random(seed)
+    sequence = "".join(rng.choice("ACGT") for _ in range(length))
+    lines = [sequence[i:i + 70] for i in range(0, length, 70)]
+    path.write_text(">loadtest_query synthetic\n" + "\n".join(lines) + "\n")
+    return path
+
+
+def _describe(error: BaseException) -> str:
+    """Summarize an error, looking through the exception groups raised by task groups."""
+    while getattr(error, "exceptions", None):
+        error = error.exceptions[0]  # type: ignore[attr-defined]
+    return f"{type(error).__name__}: {error}"
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def run_loadtest(
+    pipelines: int = 20,
+    concurrency: int = 5,
+    llm_latency: LatencyDistribution = LLM_LATENCY,
+    llm_error_rate: float = 0.0,
+    mcp_latency: LatencyDistribution = MCP_LATENCY,
+    mcp_error_rate: float = 0.0,
+    llm_max_in_flight: int = 4,
+    query: Optional[Path] = None,
+    question: str = "What organism is this sequence from?",
+    seed: int = 0,
+    quiet: bool = True,
+) -> LoadTestReport:
+    """
+    Run pipelines concurrently against the stand-in servers.
+
+    Every pipeline works on its own copy of the query in a scratch directory,
+    since pipeline steps write derived FASTA files next to the query.
+
+    Args:
+        pipelines: Total number of pipelines to run
+        concurrency: Maximum number of pipelines in flight at once
+        llm_latency: Latency of each fake LLM request
+        llm_error_rate: Probability a fake LLM request fails with HTTP 429/500
+        mcp_latency: Latency of each fake BLAST search
+        mcp_error_rate: Probability a fake BLAST search fails
+        llm_max_in_flight: Scheduler cap on concurrent LLM requests across all pipelines
+        query: Query FASTA (a synthetic sequence is used if not given)
+        question: Question passed to every pipeline
+        seed: Seed for the fake servers and the synthetic query
+        quiet: Suppress the pipelines' progress output
+
+    Returns:
+        LoadTestReport with latency, throughput and memory figures
+    """
+    from story_seq.pipeline.blast_pipeline import run_pipeline_async
+    from story_seq.pipeline.state import PipelineOptions
+
+    workdir = Path(tempfile.mkdtemp(prefix="story-seq-loadtest-"))
+    try:
+        source = Path(query) if query else synthetic_query(workdir / "query.fasta", seed=seed)
+
+        with FakeLLMServer(llm_latency, llm_error_rate, seed=seed) as llm:
+            base_config = StorySeqConfig(
+                llm_api_url=llm.url,
+                llm_api_key="loadtest",
+                llm_model="fake-llm",
+                llm_max_in_flight=llm_max_in_flight,
+                # The synthetic hits are clear-cut; keep the reporter LLM in the measured load
+                template_narratives=False,
+            )
+
+            async def one(index: int, semaphore: asyncio.Semaphore, report: LoadTestReport) -> None:
+                run_dir = workdir / f"pipeline-{index:04d}"
+                run_dir.mkdir()
+                run_query = run_dir / source.name
+                shutil.copyfile(source, run_query)
+                config = base_config.model_copy(update={"ncbi_mcp_server_args": [
+                    "-m", "story_seq.loadtest.fake_ncbi_mcp",
+                    "--latency", str(mcp_latency),
+                    "--error-rate", str(mcp_error_rate),
+                    "--seed", str(seed + index),
+                ]})
+                options = PipelineOptions(config=config, query=str(run_query), question=question)
+                async with semaphore:
+                    started = time.perf_counter()
+                    try:
+                        await run_pipeline_async(options)
+                    except Exception as e:
+                        report.failures.append(f"pipeline {index}: {_describe(e)}")
+                    else:
+                        report.latencies.append(time.perf_counter() - started)
+
+            async def run_all() -> LoadTestReport:
+                report = LoadTestReport(pipelines=pipelines, concurrency=concurrency, wall_time=0.0)
+                semaphore = asyncio.Semaphore(concurrency)
+                started = time.perf_counter()
+                await asyncio.gather(*(one(i, semaphore, report) for i in range(pipelines)))
+                report.wall_time = time.perf_counter() - started
+                return report
+
+            output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+            before = single_flight_metrics()
+            with output:
+                report = asyncio.run(run_all())
+            report.llm_counts = dict(llm.counts)
+            report.coalesced = {
+                name: counts["coalesced"] - before.get(name, {}).get("coalesced", 0)
+                for name, counts in single_flight_metrics().items()
+            }
+
+        report.peak_rss_mb = _peak_rss_mb(resource.RUSAGE_SELF)
+        report.peak_child_rss_mb = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+        return report
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
@@ -0,0 +1,48 @@
+"""Latency distributions for the stand-in servers."""
+
+import math
+import random
+from dataclasses import dataclass
+from typing import Tuple
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    """
+    A latency distribution in seconds, written as "<kind>:<params>".
+
+    Supported specs:
+        fixed:S              always S seconds
+        uniform:LO,HI        uniformly between LO and HI seconds
+        lognormal:MEDIAN,SIGMA
+                             log-normal with the given median and log-space sigma,
+                             the usual shape of LLM and BLAST service times
+    """
+
+    kind: str = "fixed"
+    params: Tuple[float, ...] = (0.0,)
+
+    @classmethod
+    def parse(cls, spec: str) -> "LatencyDistribution":
+        kind, _, raw = spec.partition(":")
+        params = tuple(float(p) for p in raw.split(",")) if raw else ()
+        expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+        if kind not in expected or len(params) != expected[kind]:
+            raise ValueError(
+                f"Invalid latency '{spec}': use fixed:S, uniform:LO,HI or lognormal:MEDIAN,SIGMA"
+            )
+        return cls(kind, params)
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.params)
+        median, sigma = self.params
+        return rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+
+    def __str__(self) -> str:
+        return f"{self.kind}:{','.join(f'{p:g}' for p in self.params)}"
+
+
+NO_LATENCY = LatencyDistribution()
@@ -65,10 +65,12 @@ class BlastHit(BaseModel):
     query_end: int = Field(gt=0, description="Query sequence end position")
     subject_start: int = Field(gt=0, description="Subject sequence start position")
     subject_end: int = Field(gt=0, description="Subject sequence end position")
-    genbank_summary: Optional[str] = Field(None, description="GenBank summary of the subject sequence")
-    bioproject_info: Optional[str] = Field(None, description="BioProjects related to the subject sequence")
-    biosample_info: Optional[str] = Field(None, description="BioSamples related to the subject sequence")
-     
+    genbank_summary: Optional[str] = Field(default=None, description="GenBank summary of the subject sequence")
+    bioproject_info: Optional[str] = Field(default=None, description="BioProjects related to the subject sequence")
+    biosample_info: Optional[str] = Field(default=None, description="BioSamples related to the subject sequence")
+    subject_taxid: Optional[int] = Field(default=None, description="NCBI taxonomy id of the subject sequence")
+
+
 class BlastResult(BaseModel):
     """Model for BLAST search results."""
     query_length: int = Field(gt=0, description="Length of query sequence")
@@ -76,6 +78,7 @@ class BlastResult(BaseModel):
     database: str = Field(description="Database searched")
     blast_method: str = Field(description="BLAST method used (e.g., blastn, blastp)")   
     search_reason: str = Field(description="Reason for performing this BLAST search")  
+
     @property
     def num_hits(self) -> int:
         """Return the number of hits."""
@@ -1,28 +1,48 @@
 from pydantic import BaseModel, Field
 from story_seq.config import StorySeqConfig
 from pydantic_graph import BaseNode,End,GraphRunContext,Graph
-from story_seq.pipeline.tasks import call_config_agent,get_fasta_sketch,call_blast_agent,call_reporter_agent
+from story_seq.pipeline.tasks import call_config_agent,get_fasta_sketch,call_blast_agent,call_coverage_followup,call_reporter_agent
 from story_seq.pipeline.state import PipelineState, PipelineOptions
+from story_seq.pipeline.deadline import Deadline
+from story_seq.agent.llm_scheduler import get_scheduler
+from story_seq.agent.blast_jobs import blast_job_managers
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional, Union
+import asyncio
 import json
+import shutil
 
-ResearchTaskGraph = Graph(nodes=[get_fasta_sketch,call_config_agent,call_blast_agent,call_reporter_agent])
+ResearchTaskGraph = Graph(nodes=[get_fasta_sketch,call_config_agent,call_blast_agent,call_coverage_followup,call_reporter_agent])
  
     
-def run_pipeline(options: PipelineOptions, state_file: Optional[Path] = None, start_task: Optional[str] = None) -> None:
-    """Run the sequence analysis pipeline with the given options.
-    
+async def run_pipeline_async(
+    options: PipelineOptions,
+    state_file: Optional[Path] = None,
+    start_task: Optional[str] = None,
+    narrative_callback: Optional[Callable[[str], None]] = None,
+    deadline: Optional[float] = None,
+) -> PipelineState:
+    """Run the pipeline graph on the current event loop and return the final state.
+
+    Several pipelines can run concurrently in one process this way, e.g. from
+    the load test harness.
+
     Args:
         options: Pipeline configuration options
         state_file: Optional path to save/load pipeline state
         start_task: Optional task name to start from (if state_file exists)
+        narrative_callback: Optional callable receiving narrative text deltas
+        deadline: Optional time budget in seconds for the whole run. The task
+            running when it passes is cancelled, the state is saved and
+            returned with `timed_out_at` set to that task.
     """
-    print(f"Running pipeline with query: {options.query}")
-    print(f"Question: {options.question}")
-    print(f"LLM Model: {options.config.llm_model}")
-    print(f"LLM API URL: {options.config.llm_api_url}")
-    
+    # The first run in the process sets the LLM limits of the scheduler every agent shares
+    get_scheduler(
+        max_in_flight=options.config.llm_max_in_flight,
+        tokens_per_minute=options.config.llm_tokens_per_minute,
+        max_retries=options.config.llm_max_retries,
+    )
+
     # Initialize or load the pipeline state
     if state_file and state_file.exists() and start_task:
         print(f"Loading state from {state_file}")
@@ -36,12 +56,16 @@ def run_pipeline(options: PipelineOptions, state_file: Optional[Path] = None, st
     # Store state_file path in state for tasks to use
     if state_file:
         state.state_file_path = str(state_file)
+    state.narrative_callback = narrative_callback
+    state.deadline = Deadline(deadline) if deadline else None
+    state.timed_out_at = None
     
     # Determine starting task
     task_map = {
         "get_fasta_sketch": get_fasta_sketch,
         "call_config_agent": call_config_agent,
         "call_blast_agent": call_blast_agent,
+        "call_coverage_followup": call_coverage_followup,
         "call_reporter_agent": call_reporter_agent,
     }
     
@@ -52,10 +76,74 @@ def run_pipeline(options: PipelineOptions, state_file: Optional[Path] = None, st
         start_node = get_fasta_sketch()
         print("Starting from beginning: get_fasta_sketch")
     
-    # Run the graph
-    import asyncio
-    result = asyncio.run(ResearchTaskGraph.run(start_node, state=state))
+    # Run the graph one task at a time so each task gets only the time left
+    node: Union[BaseNode[PipelineState, None, PipelineState], End[PipelineState]] = start_node
+    try:
+        # Remote BLAST job managers are shared by the runs on this loop; the last run to end closes them
+        async with blast_job_managers(), ResearchTaskGraph.iter(start_node, state=state) as graph_run:
+            while not isinstance(node, End):
+                try:
+                    node = await asyncio.wait_for(graph_run.next(node), timeout=state.time_remaining())
+                except asyncio.TimeoutError:
+                    task_name = type(node).__name__
+                    print(f"[{task_name}] Deadline of {deadline}s reached, task cancelled")
+                    state.timed_out_at = task_name
+                    # Checkpoint what the completed tasks produced so the run can be resumed
+                    state.save_to_file(task_name)
+                    return state
+        return node.data
+    finally:
+        # Derived files are kept next to a state file for resuming, otherwise they go with the run
+        if state.work_dir and not state.state_file_path:
+            shutil.rmtree(state.work_dir, ignore_errors=True)
+
+
+def run_pipeline(
+    options: PipelineOptions,
+    state_file: Optional[Path] = None,
+    start_task: Optional[str] = None,
+    narrative_callback: Optional[Callable[[str], None]] = None,
+    export_dir: Optional[Path] = None,
+    export_format: str = "parquet",
+    deadline: Optional[float] = None,
+) -> None:
+    """Run the sequence analysis pipeline with the given options.
+    
+    Args:
+        options: Pipeline configuration options
+        state_file: Optional path to save/load pipeline state
+        start_task: Optional task name to start from (if state_file exists)
+        narrative_callback: Optional callable receiving narrative text deltas as
+            the reporter streams them. When set, the narrative is not printed
+            again at the end of the run.
+        export_dir: Optional directory of columnar datasets to append the results to
+        export_format: Format of the exported datasets ("parquet" or "arrow"),
+            checked before the run starts
+        deadline: Optional time budget in seconds for the whole run
+    """
+    if export_dir:
+        from story_seq.pipeline.export import check_export_format
+        check_export_format(export_format)
+
+    print(f"Running pipeline with query: {options.query}")
+    print(f"Question: {options.question}")
+    print(f"LLM Model: {options.config.llm_model}")
+    print(f"LLM API URL: {options.config.llm_api_url}")
+    
+    state = asyncio.run(run_pipeline_async(options, state_file, start_task, narrative_callback, deadline))
+
+    if state.timed_out_at:
+        print(f"\nPipeline stopped at {state.timed_out_at}: deadline of {deadline}s reached.")
+        if state_file:
+            print(f"Partial results saved to {state_file}; resume with --start {state.timed_out_at}")
+        return
     
     print("\nPipeline execution completed!")
-    print(f"\n{result.output.narrative}")
+    if narrative_callback is None:
+        print(f"\n{state.narrative}")
 
+    if export_dir:
+        from story_seq.pipeline.export import export_results
+        written = export_results(state, export_dir, fmt=export_format)
+        for name, path in written.items():
+            print(f"Exported {name} to {path}")
@@ -0,0 +1,30 @@
+"""
+Overall time budget for a pipeline run.
+
+`run_pipeline_async` runs each graph node under `asyncio.wait_for` with the
+time left before the deadline, so a stuck node is cancelled (closing its
+MCP server and HTTP connections) instead of holding its worker slot. Nodes
+also pass the remaining time to the agents they create, which cap their
+LLM request and MCP tool timeouts with it.
+"""
+
+import time
+
+
+class Deadline:
+    """
+    A point in time by which a pipeline run must finish.
+
+    Args:
+        seconds: Time budget from now
+    """
+
+    def __init__(self, seconds: float):
+        if seconds <= 0:
+            raise ValueError("A deadline must be in the future")
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline (0 once it has passed)."""
+        return max(0.0, self.expires_at - time.monotonic())
@@ -0,0 +1,238 @@
+"""
+Columnar export of pipeline results.
+
+Each export appends one file per dataset to a directory of hive-partitioned
+Parquet (or Arrow IPC) datasets:
+
+    <output_dir>/<dataset>/run_date=YYYY-MM-DD/part-<run_id>.parquet
+
+Datasets:
+    sketch_files     one row per FASTA file in the sketch partitions
+    analysis_config  one row per run with the configuration agent's choice
+    blast_hits       one row per BLAST hit, flattened with its search metadata
+    narratives       one row per run with the narrative and its metadata
+
+Every row carries the run_id, so the datasets can be joined after loading.
+"""
+
+import hashlib
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Optional, Tuple, get_args
+
+from story_seq.pipeline.state import PipelineState
+from story_seq.util.hit_table import BlastHitTable
+
+ExportFormat = Literal["parquet", "arrow"]
+EXPORT_FORMATS: Tuple[str, ...] = get_args(ExportFormat)
+
+
+def _require_pyarrow() -> Any:
+    try:
+        import pyarrow  # type: ignore[import-untyped]
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for exporting results: pip install 'story-seq[export]'"
+        ) from e
+    return pyarrow
+
+
+def check_export_format(fmt: str) -> Any:
+    """
+    Validate an export format and return the pyarrow module.
+
+    Called before a run starts, so a bad format or a missing pyarrow does not
+    surface only after the pipeline has finished.
+
+    Raises:
+        ValueError: If the format is not one of EXPORT_FORMATS
+        ImportError: If pyarrow is not installed
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}', expected one of {EXPORT_FORMATS}")
+    return _require_pyarrow()
+
+
+def _schemas(pa: Any) -> Dict[str, Any]:
+    """Fixed schemas so files appended by different runs stay compatible."""
+    run_fields = [
+        ("run_id", pa.string()),
+        ("exported_at", pa.timestamp("us", tz="UTC")),
+        ("query", pa.string()),
+    ]
+    return {
+        "sketch_files": pa.schema(run_fields + [
+            ("partition", pa.string()),
+            ("source_file", pa.string()),
+            ("original_source", pa.string()),
+            ("record_count", pa.int64()),
+            ("total_length", pa.int64()),
+        ]),
+        "analysis_config": pa.schema(run_fields + [
+            ("question", pa.string()),
+            ("identify_unknown_dna", pa.bool_()),
+            ("find_protein_homologs", pa.bool_()),
+            ("functional_hint", pa.bool_()),
+            ("custom_other", pa.bool_()),
+            ("analysis_scenario", pa.string()),
+        ]),
+        "blast_hits": pa.schema(run_fields + [
+            ("search_index", pa.int32()),
+            ("database", pa.string()),
+            ("blast_method", pa.string()),
+            ("search_reason", pa.string()),
+            ("query_length", pa.int64()),
+            ("query_id", pa.string()),
+            ("subject_id", pa.string()),
+            ("identity", pa.float64()),
+            ("alignment_length", pa.int64()),
+            ("evalue", pa.float64()),
+            ("bit_score", pa.float64()),
+            ("query_start", pa.int64()),
+            ("query_end", pa.int64()),
+            ("subject_start", pa.int64()),
+            ("subject_end", pa.int64()),
+            ("genbank_summary", pa.string()),
+            ("bioproject_info", pa.string()),
+            ("biosample_info", pa.string()),
+            ("subject_taxid", pa.int64()),
+        ]),
+        "narratives": pa.schema(run_fields + [
+            ("question", pa.string()),
+            ("llm_model", pa.string()),
+            ("num_searches", pa.int32()),
+            ("num_hits", pa.int64()),
+            ("narrative_chars", pa.int64()),
+            ("narrative_words", pa.int64()),
+            ("narrative_sha256", pa.string()),
+            ("narrative", pa.string()),
+        ]),
+    }
+
+
+def _sketch_rows(state: PipelineState) -> List[Dict[str, Any]]:
+    rows = []
+    partitions = (state.fasta_sketch or {}).get("partitions", {})
+    for partition, detail in partitions.items():
+        for file_info in detail.get("files", []):
+            rows.append({
+                "partition": partition,
+                "source_file": str(file_info.get("source_file")),
+                "original_source": file_info.get("original_source"),
+                "record_count": file_info.get("record_count"),
+                "total_length": file_info.get("total_length"),
+            })
+    return rows
+
+
+def _config_rows(state: PipelineState) -> List[Dict[str, Any]]:
+    if state.analysis_config is None:
+        return []
+    return [{"question": state.options.question, **state.analysis_config.model_dump()}]
+
+
+def _hit_columns(state: PipelineState) -> Dict[str, list]:
+    columns: Dict[str, list] = {}
+    for search_index, result in enumerate(state.blast_results or []):
+        table_columns = BlastHitTable.from_result(result).to_columns()
+        n = result.num_hits
+        search_columns: Dict[str, list] = {
+            "search_index": [search_index] * n,
+            "database": [result.database] * n,
+            "blast_method": [result.blast_method] * n,
+            "search_reason": [result.search_reason] * n,
+            "query_length": [result.query_length] * n,
+            **table_columns,
+        }
+        for name, values in search_columns.items():
+            columns.setdefault(name, []).extend(values)
+    return columns
+
+
+def _narrative_rows(state: PipelineState) -> List[Dict[str, Any]]:
+    if state.narrative is None:
+        return []
+    text = state.narrative if isinstance(state.narrative, str) else state.narrative.narrative
+    results = state.blast_results or []
+    return [{
+        "question": state.options.question,
+        "llm_model": state.options.config.llm_model,
+        "num_searches": len(results),
+        "num_hits": sum(result.num_hits for result in results),
+        "narrative_chars": len(text),
+        "narrative_words": len(text.split()),
+        "narrative_sha256": hashlib.sha256(text.encode()).hexdigest(),
+        "narrative": text,
+    }]
+
+
+def export_results(
+    state: PipelineState,
+    output_dir: Path,
+    run_id: Optional[str] = None,
+    fmt: str = "parquet",
+) -> Dict[str, Path]:
+    """
+    Append the results held in a pipeline state to the columnar datasets.
+
+    Args:
+        state: Pipeline state to export
+        output_dir: Root directory of the datasets
+        run_id: Identifier shared by every exported row (random if not given)
+        fmt: "parquet" or "arrow" (Arrow IPC file)
+
+    Returns:
+        Mapping of dataset name to the file written; datasets with no rows are skipped.
+    """
+    pa = check_export_format(fmt)
+
+    run_id = run_id or uuid.uuid4().hex
+    exported_at = datetime.now(timezone.utc)
+    schemas = _schemas(pa)
+
+    datasets: Dict[str, Dict[str, list]] = {
+        "sketch_files": _rows_to_columns(_sketch_rows(state)),
+        "analysis_config": _rows_to_columns(_config_rows(state)),
+        "blast_hits": _hit_columns(state),
+        "narratives": _rows_to_columns(_narrative_rows(state)),
+    }
+
+    written = {}
+    for name, columns in datasets.items():
+        num_rows = len(next(iter(columns.values()))) if columns else 0
+        if num_rows == 0:
+            continue
+        columns = {
+            "run_id": [run_id] * num_rows,
+            "exported_at": [exported_at] * num_rows,
+            "query": [state.options.query] * num_rows,
+            **columns,
+        }
+        table = pa.Table.from_pydict(columns, schema=schemas[name])
+
+        partition_dir = Path(output_dir) / name / f"run_date={exported_at:%Y-%m-%d}"
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        path = partition_dir / f"part-{run_id}.{fmt}"
+        _write_table(pa, table, path, fmt)
+        written[name] = path
+    return written
+
+
+def _rows_to_columns(rows: List[Dict[str, Any]]) -> Dict[str, list]:
+    columns: Dict[str, list] = {}
+    for row in rows:
+        for name, value in row.items():
+            columns.setdefault(name, []).append(value)
+    return columns
+
+
+def _write_table(pa: Any, table: Any, path: Path, fmt: str) -> None:
+    if fmt == "parquet":
+        import pyarrow.parquet as pq  # type: ignore[import-untyped]
+
+        pq.write_table(table, path, compression="zstd")
+    else:
+        with pa.OSFile(str(path), "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
@@ -0,0 +1,328 @@
+"""
+Work queue for running pipelines on many workers.
+
+Jobs (query, question, config) are kept in a SQLite database, so no broker is
+needed: producers enqueue jobs and `story-seq worker` processes on any node
+that can open the database claim and run them. Put the database and the query
+files on a filesystem every node shares.
+
+    - a claimed job is leased to its worker for a fixed time, and the worker
+      renews the lease with heartbeats while the pipeline runs
+    - a job whose lease lapses (its worker crashed or lost the network) is
+      handed to another worker, up to `max_attempts` claims in total
+    - every job has its own pipeline state file, so a job picked up again
+      resumes after the last task its previous worker checkpointed
+"""
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from pathlib import Path
+from typing import Any, Dict, Optional, Union, cast
+
+from pydantic import BaseModel, Field
+
+from story_seq.config import StorySeqConfig
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'queued',
+    query TEXT NOT NULL,
+    question TEXT NOT NULL,
+    config TEXT NOT NULL,
+    deadline REAL,
+    state_file TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    enqueued_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, id);
+"""
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class Job(BaseModel):
+    """A pipeline run in the queue."""
+    id: int
+    status: str
+    query: str
+    question: str
+    config: StorySeqConfig
+    deadline: Optional[float] = Field(default=None, description="Time budget in seconds for each attempt")
+    state_file: str
+    attempts: int
+    max_attempts: int
+    worker: Optional[str] = None
+    error: Optional[str] = None
+
+
+def resume_point(state_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Task to resume a checkpointed pipeline from, given its saved state.
+
+    Returns None when nothing was checkpointed and "done" when the narrative
+    has already been written.
+    """
+    timed_out_at: Optional[str] = state_data.get("timed_out_at")
+    if timed_out_at:
+        return timed_out_at
+    if state_data.get("narrative") is not None:
+        return "done"
+    if state_data.get("blast_results") is not None:
+        # The follow-up only checkpoints once it has searched its gaps
+        if state_data.get("coverage_gaps") is not None:
+            return "call_reporter_agent"
+        return "call_coverage_followup"
+    if state_data.get("analysis_config") is not None:
+        return "call_blast_agent"
+    if state_data.get("fasta_sketch") is not None:
+        return "call_config_agent"
+    return None
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """
+    SQLite-backed queue of pipeline jobs.
+
+    Args:
+        path: Database file; created with its parent directories on first use.
+            State files are written to a `states` directory next to it.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.state_dir = self.path.parent / "states"
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _job(self, row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            status=row["status"],
+            query=row["query"],
+            question=row["question"],
+            config=StorySeqConfig(**json.loads(row["config"])),
+            deadline=row["deadline"],
+            state_file=row["state_file"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            worker=row["worker"],
+            error=row["error"],
+        )
+
+    def enqueue(
+        self,
+        query: Union[str, Path],
+        question: str,
+        config: Optional[StorySeqConfig] = None,
+        deadline: Optional[float] = None,
+        max_attempts: int = 3,
+    ) -> int:
+        """Add a job and return its id. The query path is stored as an absolute path."""
+        config = config or StorySeqConfig()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO jobs (query, question, config, deadline, max_attempts, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (str(Path(query).resolve()), question, config.model_dump_json(), deadline, max_attempts, time.time()),
+            )
+            job_id = cast(int, cursor.lastrowid)  # always set after an INSERT
+            conn.execute(
+                "UPDATE jobs SET state_file = ? WHERE id = ?",
+                (str(self.state_dir / f"job-{job_id}.json"), job_id),
+            )
+        return job_id
+
+    def claim(self, worker: str, lease_seconds: float = 60.0) -> Optional[Job]:
+        """
+        Lease the oldest runnable job to `worker`.
+
+        Jobs whose lease has lapsed are returned to the queue first, or failed
+        if they have used up their attempts.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front so two workers cannot claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', worker = NULL, finished_at = ?, "
+                    "error = 'lease expired on the last attempt' "
+                    "WHERE status = 'running' AND lease_expires < ? AND attempts >= max_attempts",
+                    (now, now),
+                )
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL "
+                    "WHERE status = 'running' AND lease_expires < ?",
+                    (now,),
+                )
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                    "lease_expires = ?, started_at = COALESCE(started_at, ?) WHERE id = ?",
+                    (worker, now + lease_seconds, now, row["id"]),
+                )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self._job(row)
+
+    def heartbeat(self, job_id: int, worker: str, lease_seconds: float = 60.0) -> bool:
+        """Renew a lease; False means the job is no longer this worker's to run."""
+        with closing(self._connect()) as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease_seconds, job_id, worker),
+            ).rowcount
+        return updated == 1
+
+    def complete(self, job_id: int, worker: str) -> bool:
+        with closing(self._connect()) as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET status = 'done', finished_at = ?, error = NULL "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time(), job_id, worker),
+            ).rowcount
+        return updated == 1
+
+    def fail(self, job_id: int, worker: str, error: str) -> bool:
+        """Record a failed attempt: requeue the job, or fail it if it has no attempts left."""
+        with closing(self._connect()) as conn:
+            updated = conn.execute(
+                "UPDATE jobs SET error = ?, worker = NULL, "
+                "status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                "finished_at = CASE WHEN attempts >= max_attempts THEN ? ELSE NULL END "
+                "WHERE id = ? AND worker = ? AND status = 'running'",
+                (error, time.time(), job_id, worker),
+            ).rowcount
+        return updated == 1
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each status."""
+        with closing(self._connect()) as conn:
+            found = dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: found.get(status, 0) for status in JOB_STATUSES}
+
+
+async def _run_job(queue: JobQueue, job: Job, worker: str, lease_seconds: float) -> None:
+    from story_seq.pipeline.blast_pipeline import run_pipeline_async
+    from story_seq.pipeline.state import PipelineOptions
+
+    state_file = Path(job.state_file)
+    start_task = None
+    if state_file.exists():
+        with open(state_file) as f:
+            start_task = resume_point(json.load(f))
+    if start_task == "done":
+        await asyncio.to_thread(queue.complete, job.id, worker)
+        return
+    if start_task:
+        print(f"[worker] Job {job.id}: resuming from {start_task} (attempt {job.attempts})")
+
+    options = PipelineOptions(config=job.config, query=job.query, question=job.question)
+    pipeline = asyncio.create_task(
+        run_pipeline_async(options, state_file=state_file, start_task=start_task, deadline=job.deadline)
+    )
+    # Renew the lease while the pipeline runs; stop if another worker has taken the job over
+    lost = False
+    while not pipeline.done():
+        await asyncio.wait({pipeline}, timeout=lease_seconds / 3)
+        if not pipeline.done() and not await asyncio.to_thread(queue.heartbeat, job.id, worker, lease_seconds):
+            lost = True
+            pipeline.cancel()
+    try:
+        state = await pipeline
+    except asyncio.CancelledError:
+        if lost:
+            print(f"[worker] Job {job.id}: lease lost, abandoned")
+            return
+        raise
+    except Exception as e:
+        await asyncio.to_thread(queue.fail, job.id, worker, f"{type(e).__name__}: {e}")
+        print(f"[worker] Job {job.id}: failed ({type(e).__name__}: {e})")
+        return
+
+    if state.timed_out_at:
+        await asyncio.to_thread(queue.fail, job.id, worker, f"deadline reached in {state.timed_out_at}")
+        print(f"[worker] Job {job.id}: deadline reached in {state.timed_out_at}")
+    else:
+        await asyncio.to_thread(queue.complete, job.id, worker)
+        print(f"[worker] Job {job.id}: done")
+
+
+async def run_worker(
+    queue: JobQueue,
+    worker: Optional[str] = None,
+    concurrency: int = 1,
+    lease_seconds: float = 60.0,
+    poll_interval: float = 2.0,
+    exit_when_empty: bool = False,
+) -> int:
+    """
+    Claim and run jobs until stopped, or until the queue is empty.
+
+    Args:
+        queue: Queue to take jobs from
+        worker: Worker id recorded on claimed jobs (defaults to host:pid:random)
+        concurrency: Pipelines to run at once in this process
+        lease_seconds: Lease length; heartbeats renew it every third of this
+        poll_interval: Seconds to wait before polling an empty queue again
+        exit_when_empty: Return once no job is runnable instead of polling
+
+    Returns:
+        Number of jobs this worker ran
+    """
+    worker = worker or default_worker_id()
+    ran = 0
+
+    async def slot() -> None:
+        nonlocal ran
+        while True:
+            # Database calls run in a thread so a busy database does not stall other pipelines
+            job = await asyncio.to_thread(queue.claim, worker, lease_seconds)
+            if job is None:
+                if exit_when_empty:
+                    return
+                await asyncio.sleep(poll_interval)
+                continue
+            print(f"[worker] Job {job.id}: claimed by {worker} (attempt {job.attempts}/{job.max_attempts})")
+            await _run_job(queue, job, worker, lease_seconds)
+            ran += 1
+
+    await asyncio.gather(*(slot() for _ in range(concurrency)))
+    return ran
@@ -0,0 +1,406 @@
+"""
+Persistent index of analyzed sequences.
+
+Every completed run is recorded in a SQLite database together with the
+sequences it analyzed, so a later run on the same sequences can be answered
+from the index instead of searching again:
+
+    - each sequence is keyed by a digest of its canonical form (uppercase,
+      and for nucleotides the lesser of the sequence and its reverse
+      complement), so a resubmitted sequence matches on either strand
+    - a FracMinHash sketch of canonical k-mers is stored per sequence, so a
+      query that is a substring of an earlier sequence is found by k-mer
+      containment and then confirmed by an exact substring search
+
+An exact match of every stored record with the same question returns the
+stored configuration, BLAST results and narrative. Otherwise the stored BLAST results are adapted
+to the new query (hits moved onto its strand and coordinates) so only the
+cheap configuration and reporter steps run again.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+from contextlib import closing
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Set, Tuple, Union, cast
+
+from Bio.SeqRecord import SeqRecord
+
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult, SequenceNarrative
+from story_seq.util.orfs import ORF_ID_PATTERN
+
+NT_ALPHABET = frozenset("ACGTUN")
+NT_KMER = 21
+AA_KMER = 7
+SCALED = 4
+_COMPLEMENT = str.maketrans("ACGTUN", "TGCAAN")
+_NON_RESIDUE = re.compile(r"[^A-Z*]")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    question TEXT NOT NULL,
+    analysis_config TEXT,
+    blast_results TEXT NOT NULL,
+    narrative TEXT
+);
+CREATE TABLE IF NOT EXISTS sequences (
+    id INTEGER PRIMARY KEY,
+    analysis_id INTEGER NOT NULL REFERENCES analyses(id),
+    record_id TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    alphabet TEXT NOT NULL,
+    reversed INTEGER NOT NULL,
+    sequence TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sequences_digest ON sequences(digest);
+CREATE TABLE IF NOT EXISTS kmers (
+    hash INTEGER NOT NULL,
+    sequence_id INTEGER NOT NULL REFERENCES sequences(id)
+);
+CREATE INDEX IF NOT EXISTS kmers_hash ON kmers(hash);
+"""
+
+
+def _reverse_complement(sequence: str) -> str:
+    return sequence.translate(_COMPLEMENT)[::-1]
+
+
+def canonical_sequence(sequence: str) -> Tuple[str, str, bool]:
+    """
+    Return (canonical, alphabet, reversed) for a sequence.
+
+    The alphabet is "NT" or "AA". `reversed` is True when the canonical form
+    is the reverse complement of the input.
+    """
+    residues = _NON_RESIDUE.sub("", str(sequence).upper())
+    if residues and set(residues) <= NT_ALPHABET:
+        residues = residues.replace("U", "T")
+        reverse = _reverse_complement(residues)
+        if reverse < residues:
+            return reverse, "NT", True
+        return residues, "NT", False
+    return residues, "AA", False
+
+
+def sequence_digest(canonical: str, alphabet: str) -> str:
+    return hashlib.sha256(f"{alphabet}:{canonical}".encode()).hexdigest()
+
+
+def _hash64(kmer: str) -> int:
+    # Signed so it fits an SQLite INTEGER
+    return int.from_bytes(hashlib.blake2b(kmer.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+def kmer_sketch(canonical: str, alphabet: str, scaled: int = SCALED) -> Set[int]:
+    """
+    FracMinHash sketch: the hashes of roughly 1/scaled of the sequence's k-mers.
+
+    Nucleotide k-mers are strand-canonical so both strands of a sequence give
+    the same sketch.
+    """
+    k = NT_KMER if alphabet == "NT" else AA_KMER
+    hashes = set()
+    for i in range(len(canonical) - k + 1):
+        kmer = canonical[i:i + k]
+        if alphabet == "NT":
+            kmer = min(kmer, _reverse_complement(kmer))
+        value = _hash64(kmer)
+        if value % scaled == 0:
+            hashes.add(value)
+    return hashes
+
+
+@dataclass
+class SequenceMatch:
+    """Where one query record was found in an earlier analysis."""
+    record_id: str
+    stored_record_id: str
+    kind: str  # "exact" or "substring"
+    reverse: bool  # query is on the opposite strand to the stored sequence
+    offset: int  # 0-based start of the query within the stored sequence (same strand)
+    length: int
+    containment: float = 1.0
+
+
+@dataclass
+class IndexMatch:
+    """An earlier analysis that covers every record of a query."""
+    analysis_id: int
+    question: str
+    analysis_config: Optional[AnalysisConfig]
+    blast_results: List[BlastResult]
+    narrative: Union[None, str, SequenceNarrative]
+    matches: List[SequenceMatch] = field(default_factory=list)
+    stored_record_ids: List[str] = field(default_factory=list)  # every record of the earlier analysis
+
+    @property
+    def exact(self) -> bool:
+        """Every record matched an indexed sequence in full, and the earlier analysis had no other records."""
+        return _is_exact(self.matches, self.stored_record_ids)
+
+
+def _is_exact(matches: List[SequenceMatch], stored_record_ids: Iterable[str]) -> bool:
+    return all(m.kind == "exact" for m in matches) and set(stored_record_ids) <= {m.stored_record_id for m in matches}
+
+
+def _flip(start: int, end: int, length: int) -> Tuple[int, int]:
+    return length - end + 1, length - start + 1
+
+
+def adapt_hits(
+    result: BlastResult, match: SequenceMatch, stored_length: int, single_record: bool = True
+) -> Optional[BlastResult]:
+    """
+    Move a stored result's hits onto the coordinates of a matched query.
+
+    Hits are moved onto the query's strand, clipped to the part of the stored
+    sequence the query covers and shifted to start at 1. Subject coordinates
+    are clipped by the same amounts, which is exact for ungapped alignments
+    and approximate otherwise. When the stored analysis had several records,
+    only hits on the matched record are kept.
+
+    Hits of translated ORFs are in protein coordinates of the ORF, so they are
+    only kept, renamed after the query, when the query is the stored sequence
+    itself on the same strand. Returns None when no hit overlaps the query.
+    """
+    window_start = match.offset + 1
+    window_end = match.offset + match.length
+    hits: List[BlastHit] = []
+    orf_hits: List[BlastHit] = []
+    for hit in result.hits:
+        query_id = hit.query_id.split(" ")[0]
+        orf = ORF_ID_PATTERN.match(query_id)
+        record_id = orf["record_id"] if orf else query_id
+        if not single_record and record_id != match.stored_record_id:
+            continue
+        if orf:
+            if match.kind == "exact" and not match.reverse:
+                orf_hits.append(hit.model_copy(update={"query_id": match.record_id + query_id[len(record_id):]}))
+            continue
+        q_lo, q_hi = sorted((hit.query_start, hit.query_end))
+        s_start, s_end = hit.subject_start, hit.subject_end
+        if match.reverse:
+            # Express the stored hit on the query's strand first
+            q_lo, q_hi = _flip(q_lo, q_hi, stored_length)
+            s_start, s_end = s_end, s_start
+        lo, hi = max(q_lo, window_start), min(q_hi, window_end)
+        if lo > hi:
+            continue
+        step = 1 if s_end >= s_start else -1
+        s_start += step * (lo - q_lo)
+        s_end -= step * (q_hi - hi)
+        hits.append(hit.model_copy(update={
+            "query_id": match.record_id,
+            "query_start": lo - match.offset,
+            "query_end": hi - match.offset,
+            "subject_start": max(1, s_start),
+            "subject_end": max(1, s_end),
+            "alignment_length": hi - lo + 1,
+        }))
+    if not hits and not orf_hits:
+        return None
+    reason = result.search_reason
+    if match.kind != "exact" or match.reverse:
+        reason = f"{reason} (reused from an earlier analysis of a sequence containing this query)"
+    # ORF results keep the ORF's protein length
+    query_length = match.length if hits else result.query_length
+    return result.model_copy(update={"hits": hits + orf_hits, "query_length": query_length, "search_reason": reason})
+
+
+class ResultIndex:
+    """
+    SQLite-backed index of completed analyses.
+
+    Args:
+        path: Database file; created with its parent directories on first use
+        min_containment: Fraction of a query's sketched k-mers that must occur
+            in an indexed sequence before it is checked as a substring
+    """
+
+    def __init__(self, path: Union[str, Path], min_containment: float = 0.9):
+        self.path = Path(path).expanduser()
+        self.min_containment = min_containment
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def add(
+        self,
+        records: Mapping[str, SeqRecord],
+        question: str,
+        analysis_config: Optional[AnalysisConfig],
+        blast_results: Iterable[BlastResult],
+        narrative: Union[None, str, SequenceNarrative] = None,
+    ) -> int:
+        """Record a completed analysis of `records` and return its id."""
+        if isinstance(narrative, SequenceNarrative):
+            narrative_json = json.dumps({"model": narrative.model_dump(mode="json")})
+        else:
+            narrative_json = json.dumps({"text": narrative})
+        with closing(self._connect()) as conn, conn:
+            cursor = conn.execute(
+                "INSERT INTO analyses (created_at, question, analysis_config, blast_results, narrative) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    datetime.now(timezone.utc).isoformat(),
+                    question,
+                    analysis_config.model_dump_json() if analysis_config else None,
+                    json.dumps([r.model_dump(mode="json") for r in blast_results]),
+                    narrative_json,
+                ),
+            )
+            analysis_id = cast(int, cursor.lastrowid)  # always set after an INSERT
+            for record_id, record in records.items():
+                canonical, alphabet, reverse = canonical_sequence(str(record.seq))
+                if not canonical:
+                    continue
+                sequence_id = conn.execute(
+                    "INSERT INTO sequences (analysis_id, record_id, digest, alphabet, reversed, sequence) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (analysis_id, record_id, sequence_digest(canonical, alphabet), alphabet, int(reverse), canonical),
+                ).lastrowid
+                conn.executemany(
+                    "INSERT INTO kmers (hash, sequence_id) VALUES (?, ?)",
+                    ((value, sequence_id) for value in kmer_sketch(canonical, alphabet)),
+                )
+        return analysis_id
+
+    def _candidates(
+        self, conn: sqlite3.Connection, record_id: str, canonical: str, alphabet: str, reverse: bool
+    ) -> Iterator[Tuple[int, SequenceMatch]]:
+        """Yield (analysis_id, SequenceMatch) for every indexed sequence containing this one."""
+        rows = conn.execute(
+            "SELECT analysis_id, record_id, reversed, length(sequence) FROM sequences WHERE digest = ?",
+            (sequence_digest(canonical, alphabet),),
+        ).fetchall()
+        for analysis_id, stored_id, stored_reverse, length in rows:
+            yield analysis_id, SequenceMatch(record_id, stored_id, "exact", bool(stored_reverse) != reverse, 0, length)
+
+        sketch = kmer_sketch(canonical, alphabet)
+        if not sketch:
+            return
+        hashes = list(sketch)
+        counts: Dict[int, int] = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            for sequence_id, count in conn.execute(
+                f"SELECT sequence_id, COUNT(*) FROM kmers WHERE hash IN ({','.join('?' * len(chunk))}) "
+                "GROUP BY sequence_id",
+                chunk,
+            ):
+                counts[sequence_id] = counts.get(sequence_id, 0) + count
+        for sequence_id, count in sorted(counts.items(), key=lambda item: -item[1]):
+            containment = count / len(sketch)
+            if containment < self.min_containment:
+                break
+            row = conn.execute(
+                "SELECT analysis_id, record_id, reversed, sequence FROM sequences WHERE id = ? AND alphabet = ?",
+                (sequence_id, alphabet),
+            ).fetchone()
+            if row is None:
+                continue
+            analysis_id, stored_id, stored_reverse, stored = row
+            if len(stored) == len(canonical):
+                continue
+            # Containment only nominates candidates; reuse needs an exact substring
+            for probe, flipped in ((canonical, False), (_reverse_complement(canonical), True)):
+                if flipped and alphabet != "NT":
+                    break
+                position = stored.find(probe)
+                if position < 0:
+                    continue
+                # Map back from canonical forms to the sequences as submitted: the
+                # offset is measured on the stored sequence's strand that matches the query
+                probe_is_reversed_query = reverse != flipped
+                relative = probe_is_reversed_query != bool(stored_reverse)
+                if probe_is_reversed_query:
+                    position = len(stored) - position - len(probe)
+                yield analysis_id, SequenceMatch(
+                    record_id, stored_id, "substring", relative, position, len(probe), containment
+                )
+                break
+
+    def lookup(self, records: Mapping[str, SeqRecord], question: str = "") -> Optional[IndexMatch]:
+        """
+        Find an earlier analysis covering every record, preferring exact
+        matches, then the same question, then the most recent analysis.
+        """
+        queries = [(record_id, *canonical_sequence(str(record.seq))) for record_id, record in records.items()]
+        if not queries or any(not canonical for _, canonical, _, _ in queries):
+            return None
+
+        with closing(self._connect()) as conn:
+            per_record: List[Dict[int, SequenceMatch]] = []
+            for record_id, canonical, alphabet, reverse in queries:
+                found: Dict[int, SequenceMatch] = {}
+                for analysis_id, match in self._candidates(conn, record_id, canonical, alphabet, reverse):
+                    found.setdefault(analysis_id, match)
+                if not found:
+                    return None
+                per_record.append(found)
+
+            shared = set.intersection(*(set(found) for found in per_record))
+            if not shared:
+                return None
+            rows = {
+                row[0]: row for row in conn.execute(
+                    f"SELECT id, question, analysis_config, blast_results, narrative FROM analyses "
+                    f"WHERE id IN ({','.join('?' * len(shared))})",
+                    list(shared),
+                )
+            }
+            lengths: Dict[int, Dict[str, int]] = {}
+            for stored_analysis, stored_id, length in conn.execute(
+                f"SELECT analysis_id, record_id, length(sequence) FROM sequences "
+                f"WHERE analysis_id IN ({','.join('?' * len(shared))})",
+                list(shared),
+            ):
+                lengths.setdefault(stored_analysis, {})[stored_id] = length
+
+        def rank(analysis_id: int) -> Tuple[bool, bool, int]:
+            exact = _is_exact([found[analysis_id] for found in per_record], lengths.get(analysis_id, {}))
+            return exact, rows[analysis_id][1] == question, analysis_id
+
+        analysis_id = max(shared, key=rank)
+        _, stored_question, config_json, results_json, narrative_json = rows[analysis_id]
+        matches = [found[analysis_id] for found in per_record]
+
+        stored_results = [BlastResult(**result) for result in json.loads(results_json)]
+        stored_lengths = lengths.get(analysis_id, {})
+        adapted = []
+        for result in stored_results:
+            for match in matches:
+                moved = adapt_hits(
+                    result, match, stored_lengths.get(match.stored_record_id, match.length),
+                    single_record=len(stored_lengths) == 1,
+                )
+                if moved is not None:
+                    adapted.append(moved)
+
+        narrative_data = json.loads(narrative_json) if narrative_json else {}
+        narrative: Union[None, str, SequenceNarrative]
+        if "model" in narrative_data:
+            narrative = SequenceNarrative(**narrative_data["model"])
+        else:
+            narrative = narrative_data.get("text")
+        return IndexMatch(
+            analysis_id=analysis_id,
+            question=stored_question,
+            analysis_config=AnalysisConfig.model_validate_json(config_json) if config_json else None,
+            blast_results=adapted,
+            narrative=narrative,
+            matches=matches,
+            stored_record_ids=list(stored_lengths),
+        )
@@ -1,9 +1,10 @@
-from typing import List,Union,Dict,Any,Optional
+from typing import List,Union,Dict,Any,Optional,Callable
 from pydantic import BaseModel,Field
 from pydantic_ai import Agent
 from story_seq.config import StorySeqConfig
 from story_seq.models import AnalysisConfig, BlastResult, SequenceNarrative
 import json
+import tempfile
 from pathlib import Path
 
 class PipelineOptions(BaseModel):
@@ -20,9 +21,52 @@ class PipelineState(BaseModel):
     fasta_sketch: Optional[Dict[str, Any]] = Field(default=None, description="FASTA file sketch information")
     analysis_config: Union[None,AnalysisConfig] = Field(default=None, description="Analysis configuration determined by the configuration agent")   
     blast_results: Optional[List[BlastResult]] = Field(default=None, description="BLAST results from the BLAST agent")
+    provisional_taxa: Optional[Dict[str, Dict[str, Any]]] = Field(default=None, description="Provisional taxon of each nucleotide query from the local k-mer classifier, keyed by query id")
+    coverage_gaps: Optional[Dict[str, List[List[int]]]] = Field(default=None, description="Query regions left uncovered by the first BLAST round, keyed by query id")
     narrative: Union[None, str, SequenceNarrative] = Field(default=None, description="Narrative report from the reporter agent")
+    reused_analysis_id: Optional[int] = Field(default=None, description="Id of the earlier analysis in the result index whose results were reused")
+    timed_out_at: Optional[str] = Field(default=None, description="Task that was cancelled when the run's deadline passed; resume from it with --start")
+    llm_usage: Dict[str, Dict[str, int]] = Field(default_factory=dict, description="LLM usage per task, including prompt tokens the backend served from its prefix cache")
     state_file_path: Optional[str] = Field(default=None, exclude=True, description="Path to state file for persistence")
+    work_dir: Optional[str] = Field(default=None, exclude=True, description="Directory of files derived from the query, such as translated ORFs")
+    index_match: Optional[Any] = Field(default=None, exclude=True, description="Earlier analysis from the result index whose BLAST results can be reused")
+    narrative_callback: Optional[Callable[[str], None]] = Field(default=None, exclude=True, description="Called with each narrative text delta as the reporter streams it")
+    deadline: Optional[Any] = Field(default=None, exclude=True, description="Deadline of the run (story_seq.pipeline.deadline.Deadline)")
+
+    def time_remaining(self) -> Optional[float]:
+        """Seconds left before the run's deadline, or None if the run has no deadline."""
+        return self.deadline.remaining() if self.deadline is not None else None
     
+    def record_llm_usage(self, task_name: str, usage: Any) -> None:
+        """Accumulate an agent run's usage under the task name and log the prompt cache hit rate.
+
+        `cache_read_tokens` is only non-zero when the backend reports cached
+        prompt tokens (e.g. vLLM with prefix caching, or OpenAI).
+        """
+        totals = self.llm_usage.setdefault(task_name, {})
+        for key in ("requests", "input_tokens", "cache_read_tokens", "output_tokens"):
+            totals[key] = totals.get(key, 0) + (getattr(usage, key, 0) or 0)
+        hit_rate = totals["cache_read_tokens"] / totals["input_tokens"] if totals["input_tokens"] else 0.0
+        print(f"[{task_name}] LLM usage: {totals['requests']} request(s), {totals['input_tokens']} input tokens "
+              f"({totals['cache_read_tokens']} cached, {hit_rate:.0%}), {totals['output_tokens']} output tokens")
+
+    def working_directory(self) -> Path:
+        """Directory for files derived from the query, created on first use.
+
+        With a state file it is `<state file stem>_files` next to it, so a
+        resumed run finds the files again; otherwise it is a temporary
+        directory, which `run_pipeline_async` removes when the run ends.
+        """
+        if self.work_dir is None:
+            if self.state_file_path:
+                state_path = Path(self.state_file_path)
+                path = state_path.with_name(f"{state_path.stem}_files")
+                path.mkdir(parents=True, exist_ok=True)
+            else:
+                path = Path(tempfile.mkdtemp(prefix="story-seq-"))
+            self.work_dir = str(path)
+        return Path(self.work_dir)
+
     def save_to_file(self, task_name: str) -> None:
         """Save current state to file if state_file_path is set."""
         if self.state_file_path:
@@ -1,6 +1,8 @@
+import io
 from pydantic_graph import BaseNode,End,GraphRunContext,Edge
-from typing import List,Dict,Any,Union,Annotated,TYPE_CHECKING
-from dataclasses import dataclass,field
+from typing import List,Dict,Any,Union,Annotated,TYPE_CHECKING,AsyncContextManager,ContextManager,Mapping
+from dataclasses import asdict,dataclass,field
+from Bio import SeqIO
 from pydantic_ai.usage import UsageLimits
 from pydantic_ai import UsageLimitExceeded,Agent
 from story_seq.util import process_multiple_files
@@ -11,9 +13,9 @@ if TYPE_CHECKING:
 
 
 @dataclass
-class get_fasta_sketch(BaseNode[PipelineState]):
+class get_fasta_sketch(BaseNode[PipelineState, None, PipelineState]):
     """Process FASTA file(s) to generate sketch information."""
-    async def run(self, ctx: GraphRunContext) -> Union['call_config_agent', End]:
+    async def run(self, ctx: GraphRunContext[PipelineState]) -> Union['call_config_agent', 'call_blast_agent', End[PipelineState]]:
         print("[get_fasta_sketch] start")
         opts = ctx.state.options
         
@@ -31,23 +33,63 @@ class get_fasta_sketch(BaseNode[PipelineState]):
         
         # Save state if state file is configured
         ctx.state.save_to_file("get_fasta_sketch")
-        
+
+        if opts.config.result_index_path:
+            from story_seq.pipeline.result_index import ResultIndex
+            from story_seq.util.seq_io import fasta_records
+
+            index = ResultIndex(opts.config.result_index_path, opts.config.result_index_min_containment)
+            with fasta_records(opts.query) as records:
+                match = index.lookup(records, opts.question)
+            if match is not None:
+                kinds = ", ".join(sorted({m.kind for m in match.matches}))
+                print(f"[get_fasta_sketch] Seen before: analysis #{match.analysis_id} in the result index ({kinds})")
+                ctx.state.reused_analysis_id = match.analysis_id
+                same_question = match.question == opts.question
+                if match.exact and same_question and match.narrative is not None:
+                    ctx.state.analysis_config = match.analysis_config
+                    ctx.state.blast_results = match.blast_results
+                    ctx.state.narrative = match.narrative
+                    if ctx.state.narrative_callback:
+                        narrative = match.narrative
+                        ctx.state.narrative_callback(narrative if isinstance(narrative, str) else narrative.narrative)
+                    ctx.state.save_to_file("get_fasta_sketch")
+                    return End(data=ctx.state)
+                # Otherwise reuse the BLAST results, provided the configuration still agrees
+                ctx.state.index_match = match
+                if same_question and match.analysis_config is not None:
+                    ctx.state.analysis_config = match.analysis_config
+                    ctx.state.save_to_file("get_fasta_sketch")
+                    return call_blast_agent()
+
         return call_config_agent()
 
 @dataclass
-class call_config_agent(BaseNode[PipelineState]):   
+class call_config_agent(BaseNode[PipelineState, None, PipelineState]):   
     """Call the Configuration Agent to determine analysis configuration."""
-    async def run(self, ctx: GraphRunContext) -> "call_blast_agent":
+    async def run(self, ctx: GraphRunContext[PipelineState]) -> "call_blast_agent":
         print("[call_config_agent] start")
         opts = ctx.state.options
         
+        # Obvious requests are routed by rules, skipping the LLM round trip
+        from story_seq.agent.configuration_rules import classify_request
+
+        decision = classify_request(opts.question, ctx.state.fasta_sketch)
+        if decision.confidence >= opts.config.config_rules_min_confidence:
+            print(f"[call_config_agent] Rule-based configuration: {decision.config.analysis_scenario} "
+                  f"(confidence {decision.confidence:.2f}; {'; '.join(decision.reasons)})")
+            ctx.state.analysis_config = decision.config
+            ctx.state.save_to_file("call_config_agent")
+            return call_blast_agent()
+
         # build the dependencies for the configuration agent and then call it
         from story_seq.agent.configuration_agent import get_configuration_agent,ConfigurationAgentDeps
         from story_seq.models import AnalysisConfig
+        from pathlib import Path
 
         deps = ConfigurationAgentDeps(
             fasta_sketch=ctx.state.fasta_sketch,
-            query=opts.query,
+            query=Path(opts.query),
             question=opts.question
         )
 
@@ -55,11 +97,14 @@ class call_config_agent(BaseNode[PipelineState]):
             llm_api_url=opts.config.llm_api_url,
             llm_api_key=opts.config.llm_api_key,
             model_name=opts.config.llm_model,
-            max_tokens=opts.config.max_tokens
+            max_tokens=opts.config.max_tokens,
+            llm_endpoints=opts.config.llm_endpoints,
+            timeout=ctx.state.time_remaining()
         )
         # Pass the user question as message and deps as separate parameter
         result = await config_agent.run(opts.question, deps=deps)
         ctx.state.analysis_config = result.output
+        ctx.state.record_llm_usage("call_config_agent", result.usage)
         
         # Save state if state file is configured
         ctx.state.save_to_file("call_config_agent")
@@ -68,43 +113,267 @@ class call_config_agent(BaseNode[PipelineState]):
     
     #add a task to call the blast agent
 @dataclass
-class call_blast_agent(BaseNode[PipelineState]):    
+class call_blast_agent(BaseNode[PipelineState, None, PipelineState]):    
     """Call the BLAST Agent to perform sequence alignment."""
-    async def run(self, ctx: GraphRunContext) -> "call_reporter_agent":
+    async def run(self, ctx: GraphRunContext[PipelineState]) -> Union["call_coverage_followup", "call_reporter_agent"]:
         print("[call_blast_agent] start")
         opts = ctx.state.options
+
+        # Results adapted from an earlier analysis already include its coverage follow-up
+        match = ctx.state.index_match
+        mode_fields = {"analysis_scenario"}
+        if (
+            match is not None and match.analysis_config is not None and ctx.state.analysis_config is not None
+            and match.analysis_config.model_dump(exclude=mode_fields) == ctx.state.analysis_config.model_dump(exclude=mode_fields)
+        ):
+            ctx.state.blast_results = match.blast_results
+            print(f"[call_blast_agent] Reusing {len(match.blast_results)} BLAST result(s) from analysis #{match.analysis_id}")
+            ctx.state.save_to_file("call_blast_agent")
+            return call_reporter_agent()
         
         # build the dependencies for the BLAST agent and then call it
         from story_seq.agent.blast_agent import get_blast_agent,BlastAgentDeps
-        from story_seq.models import BlastResult
+        from story_seq.agent.blast_capture import join_selected_searches
         from pathlib import Path
 
+        # Protein-level modes search predicted proteins with blastp rather than blastx/tblastx
+        orf_files = []
+        config = ctx.state.analysis_config
+        sketch = ctx.state.fasta_sketch
+        if (
+            opts.config.orf_translation and config is not None
+            and (config.find_protein_homologs or config.functional_hint)
+            and sketch and sketch["partitions"]["NT"]["total_records"] > 0
+        ):
+            from story_seq.util.orfs import add_orf_partition
+
+            add_orf_partition(sketch, opts.config.orf_min_protein_length, opts.config.orf_start_codons,
+                              opts.config.orf_genetic_code, output_dir=str(ctx.state.working_directory()))
+            orf_files = [Path(f["source_file"]) for f in sketch["partitions"]["AA"]["files"] if f.get("translated_from")]
+            print(f"[call_blast_agent] {sketch['partitions']['AA'].get('translated_records', 0)} ORF(s) translated "
+                  f"to {', '.join(map(str, orf_files)) or 'no file'}")
+
         deps = BlastAgentDeps(
             query_file=Path(opts.query),
             database="nt",  # Default to NCBI nt database for now
             fasta_sketch=ctx.state.fasta_sketch,
-            analysis_config=ctx.state.analysis_config
+            analysis_config=ctx.state.analysis_config,
+            orf_files=orf_files
         )
 
+        # The mode's BLAST ladder runs without the LLM; the agent only takes over when the evidence is ambiguous
+        prompt = opts.question
+        steps = []
+        if opts.config.blast_policy and config is not None and sketch:
+            from story_seq.agent.blast_policy import mode_workflow
+
+            nt_files = [Path(f["source_file"]) for f in sketch["partitions"]["NT"]["files"]]
+            aa_files = [Path(f["source_file"]) for f in sketch["partitions"]["AA"]["files"]]
+            steps = mode_workflow(config, bool(nt_files), bool(aa_files))
+        if steps:
+            import json
+
+            from story_seq.agent.blast_agent import get_ncbi_mcp_server
+            from story_seq.agent.blast_capture import search_summary
+            from story_seq.agent.blast_policy import (
+                EscalationCriteria,
+                check_mcp_tool,
+                is_search_failure,
+                mcp_search,
+                run_blast_policy,
+            )
+            from story_seq.util.seq_io import fasta_records, read_fasta_text
+
+            sequences = {
+                "nucleotide": "".join(read_fasta_text(path) for path in nt_files),
+                "protein": "".join(read_fasta_text(path) for path in aa_files),
+            }
+            # Mode A searches start within the taxa the local k-mer index places the queries in
+            if config is not None and config.identify_unknown_dna and sequences["nucleotide"] and opts.config.kmer_reference:
+                if not opts.config.taxonomy_dir:
+                    print("[call_blast_agent] kmer_reference needs taxonomy_dir; searching without provisional taxa")
+                else:
+                    from story_seq.agent.blast_policy import narrow_workflow
+                    from story_seq.util.kmer_index import load_kmer_index, search_limits
+                    from story_seq.util.taxonomy import load_taxonomy
+
+                    try:
+                        taxonomy = load_taxonomy(opts.config.taxonomy_dir)
+                        kmer_index = load_kmer_index(opts.config.kmer_reference, taxonomy, opts.config.kmer_size,
+                                                     opts.config.kmer_seqid2taxid)
+                    except (OSError, ValueError) as error:
+                        print(f"[call_blast_agent] K-mer index unavailable ({error!r}); searching without provisional taxa")
+                    else:
+                        calls = [
+                            kmer_index.classify(record.id, str(record.seq), opts.config.kmer_min_confidence)
+                            for record in SeqIO.parse(io.StringIO(sequences["nucleotide"]), "fasta")
+                        ]
+                        ctx.state.provisional_taxa = {call.query_id: asdict(call) for call in calls}
+                        limits, certain = search_limits(calls, taxonomy, opts.config.kmer_restrict_rank,
+                                                        opts.config.kmer_certain_confidence)
+                        steps = narrow_workflow(steps, limits, certain)
+                        classified = sum(call.taxon is not None for call in calls)
+                        print(f"[call_blast_agent] {classified} of {len(calls)} query(ies) placed by k-mers; "
+                              f"{'searching within taxids ' + ', '.join(map(str, limits)) if limits else 'no search limits'}"
+                              f"{' at every stage, without the unlimited fallback (certain)' if certain else ''}")
+            criteria = EscalationCriteria(
+                max_evalue=opts.config.blast_policy_max_evalue,
+                min_hits=opts.config.blast_policy_min_hits,
+                min_coverage=opts.config.blast_policy_min_coverage,
+                stop_coverage=opts.config.blast_policy_stop_coverage,
+                stop_identity=opts.config.blast_policy_stop_identity,
+                stop_protein_identity=opts.config.blast_policy_stop_protein_identity,
+            )
+            if opts.config.blast_backend == "url_api":
+                from contextlib import nullcontext
+
+                from story_seq.agent.blast_jobs import get_blast_job_manager, url_api_search
+
+                # Shared with every pipeline on this event loop, so their searches are polled together
+                backend: AsyncContextManager[Any] = nullcontext()
+                search = url_api_search(get_blast_job_manager(
+                    opts.config.blast_url,
+                    min_request_interval=opts.config.blast_min_request_interval,
+                    min_poll_interval=opts.config.blast_min_poll_interval,
+                    max_poll_interval=opts.config.blast_max_poll_interval,
+                ))
+            else:
+                backend = get_ncbi_mcp_server(opts.config.ncbi_mcp_server_args, ctx.state.time_remaining())
+                search = mcp_search(backend, opts.config.blast_policy_tool)
+            try:
+                async with backend:
+                    # The tool's signature is checked first, so a mismatch costs no search
+                    if opts.config.blast_backend == "mcp":
+                        await check_mcp_tool(backend, opts.config.blast_policy_tool, steps)
+                    with fasta_records(opts.query) as records:
+                        decision = await run_blast_policy(
+                            search, steps, sequences, records, deps.captured_searches, criteria,
+                            max_concurrent=opts.config.blast_max_concurrent_searches,
+                        )
+            except Exception as error:
+                if not is_search_failure(error):
+                    raise
+                print(f"[call_blast_agent] BLAST policy failed ({error!r}), handing over to the BLAST agent")
+                decision = None
+
+            if decision is not None and decision.action == "stop":
+                ctx.state.blast_results = list(deps.captured_searches.values())
+                print(f"[call_blast_agent] BLAST policy stopped after {len(deps.captured_searches)} search(es), "
+                      f"no BLAST agent needed")
+                ctx.state.save_to_file("call_blast_agent")
+                return call_coverage_followup()
+            if decision is not None:
+                summaries = [search_summary(search_id, r) for search_id, r in deps.captured_searches.items()]
+                prompt = (
+                    f"{opts.question}\n\n"
+                    "The mode workflow already ran these searches, which are captured under the search ids below, "
+                    f"but left the evidence ambiguous ({'; '.join(decision.reasons)}). Decide whether further "
+                    "searches are needed, run them, and report the searches to keep, including these by search_id.\n"
+                    f"{json.dumps(summaries)}"
+                )
+
         blast_agent = await get_blast_agent(
             llm_api_url=opts.config.llm_api_url,
             llm_api_key=opts.config.llm_api_key,
             model_name=opts.config.llm_model,
-            max_tokens=opts.config.max_tokens
+            max_tokens=opts.config.max_tokens,
+            mcp_server_args=opts.config.ncbi_mcp_server_args,
+            llm_endpoints=opts.config.llm_endpoints,
+            timeout=ctx.state.time_remaining(),
+            max_concurrent_searches=opts.config.blast_max_concurrent_searches,
         )
         # Pass the user question as message and deps as separate parameter
-        result = await blast_agent.run(opts.question, deps=deps)
-        ctx.state.blast_results = result.output
+        result = await blast_agent.run(prompt, deps=deps)
+        # The agent only names the searches to keep; their hits were captured from the tool calls
+        ctx.state.blast_results = join_selected_searches(deps.captured_searches, result.output)
+        print(f"[call_blast_agent] {len(ctx.state.blast_results)} of {len(deps.captured_searches)} BLAST search(es) kept")
+        ctx.state.record_llm_usage("call_blast_agent", result.usage)
         
         # Save state if state file is configured
         ctx.state.save_to_file("call_blast_agent")
         
+        return call_coverage_followup()
+
+@dataclass
+class call_coverage_followup(BaseNode[PipelineState, None, PipelineState]):
+    """Search query regions left uncovered by the first BLAST round."""
+    async def run(self, ctx: GraphRunContext[PipelineState]) -> "call_reporter_agent":
+        print("[call_coverage_followup] start")
+        opts = ctx.state.options
+
+        if not opts.config.coverage_followup or not ctx.state.blast_results:
+            return call_reporter_agent()
+
+        import tempfile
+        from pathlib import Path
+
+        from story_seq.agent.blast_agent import BlastAgentDeps, get_blast_agent
+        from story_seq.agent.blast_capture import join_selected_searches
+        from story_seq.util.coverage import query_coverage_gaps, remap_gap_hits, write_gap_fasta
+        from story_seq.util.orfs import orf_hits_to_nucleotide
+        from story_seq.util.seq_io import fasta_base_name, fasta_records
+
+        with tempfile.TemporaryDirectory(prefix="story-seq-gaps-") as gap_dir:
+            with fasta_records(opts.query) as records:
+                # Hits on translated ORFs cover the nucleotide span the ORF came from; queries without
+                # any hit were already searched in full and are not searched again
+                covering = [orf_hits_to_nucleotide(r) for r in ctx.state.blast_results]
+                gaps = query_coverage_gaps(records, covering, opts.config.coverage_gap_min_length)
+                ctx.state.coverage_gaps = {qid: [list(gap) for gap in intervals] for qid, intervals in gaps.items()}
+                if not gaps:
+                    print("[call_coverage_followup] No gaps in queries with hits, no follow-up needed")
+                    return call_reporter_agent()
+
+                # The gap FASTA only lives for this round, outside the user's input directory
+                gap_file = Path(gap_dir) / f"{Path(fasta_base_name(opts.query)).name}_gaps.fasta"
+                count = write_gap_fasta(records, gaps, str(gap_file))
+            print(f"[call_coverage_followup] {count} uncovered region(s) written to {gap_file}")
+
+            deps = BlastAgentDeps(
+                query_file=gap_file,
+                database="nt",
+                fasta_sketch=ctx.state.fasta_sketch,
+                analysis_config=ctx.state.analysis_config
+            )
+            blast_agent = await get_blast_agent(
+                llm_api_url=opts.config.llm_api_url,
+                llm_api_key=opts.config.llm_api_key,
+                model_name=opts.config.llm_model,
+                max_tokens=opts.config.max_tokens,
+                mcp_server_args=opts.config.ncbi_mcp_server_args,
+                llm_endpoints=opts.config.llm_endpoints,
+                timeout=ctx.state.time_remaining(),
+                max_concurrent_searches=opts.config.blast_max_concurrent_searches,
+            )
+
+            # Tell the agent what the first round already explained so it can look past it
+            found = sorted({r.top_hit.subject_id for r in ctx.state.blast_results if r.top_hit})
+            prompt = (
+                f"{opts.question}\n\n"
+                "Coverage follow-up round: the query sequences below are regions of the original "
+                "query that no hit in the previous BLAST round covered. Search only these regions "
+                f"and set search_reason to explain it is a coverage gap follow-up. Previous top hits: "
+                f"{', '.join(found) if found else 'none'}. Exclude organisms already explained by "
+                "those hits where possible (e.g. with an Entrez query)."
+            )
+            result = await blast_agent.run(prompt, deps=deps)
+            followup = join_selected_searches(deps.captured_searches, result.output)
+            remapped = [remap_gap_hits(r) for r in followup]
+            dropped = sum(r.num_hits for r in followup) - sum(r.num_hits for r in remapped)
+            if dropped:
+                print(f"[call_coverage_followup] Dropped {dropped} hit(s) not on a gap record")
+            ctx.state.blast_results.extend(remapped)
+            ctx.state.record_llm_usage("call_coverage_followup", result.usage)
+
+        # Save state if state file is configured
+        ctx.state.save_to_file("call_coverage_followup")
+
         return call_reporter_agent()
 
 @dataclass
-class call_reporter_agent(BaseNode[PipelineState]):
+class call_reporter_agent(BaseNode[PipelineState, None, PipelineState]):
     """Call the Reporter Agent to generate narrative report."""
-    async def run(self, ctx: GraphRunContext) -> End:
+    async def run(self, ctx: GraphRunContext[PipelineState]) -> End[PipelineState]:
         print("[call_reporter_agent] start")
         opts = ctx.state.options
         
@@ -117,16 +386,113 @@ class call_reporter_agent(BaseNode[PipelineState]):
             analysis_config=ctx.state.analysis_config,
             question=opts.question
         )
+        if opts.config.taxonomy_dir and deps.blast_results:
+            from story_seq.util.taxonomy import load_taxonomy
 
-        reporter_agent = await get_reporter_agent(
-            llm_api_url=opts.config.llm_api_url,
-            llm_api_key=opts.config.llm_api_key,
-            model_name=opts.config.llm_model,
-            max_tokens=opts.config.max_tokens
-        )
-        # Pass the user question as message and deps as separate parameter
-        result = await reporter_agent.run(opts.question, deps=deps)
-        ctx.state.narrative = result.output
+            summary = load_taxonomy(opts.config.taxonomy_dir).summarize(
+                deps.blast_results, min_support=opts.config.taxonomy_min_support
+            )
+            if summary.weighted_lca is not None:
+                print(f"[call_reporter_agent] Weighted LCA of the hits: {summary.weighted_lca.name} "
+                      f"({summary.weighted_lca.rank}, {summary.support:.0%} of the votes)")
+            deps.taxonomy_summary = summary.describe()
+
+        sketch = ctx.state.fasta_sketch
+        query_count = (
+            sketch["partitions"]["NT"]["total_records"] + sketch["partitions"]["AA"]["total_records"]
+            - sketch["partitions"]["AA"].get("translated_records", 0)
+        ) if sketch else 0
+
+        # Unambiguous results are described from templates without calling the LLM
+        decision = None
+        if opts.config.template_narratives:
+            from contextlib import nullcontext
+
+            from story_seq.agent.narrative_templates import template_narrative
+            from story_seq.util.orfs import orf_record_id
+            from story_seq.util.seq_io import fasta_records
+
+            # ORF hits are measured against the nucleotide records they were translated from
+            has_orf_hits = any(orf_record_id(hit.query_id) != hit.query_id for r in deps.blast_results for hit in r.hits)
+            records_context: ContextManager[Mapping[str, Any]] = (
+                fasta_records(opts.query) if has_orf_hits else nullcontext({})
+            )
+            with records_context as records:
+                decision = template_narrative(
+                    deps.blast_results,
+                    ctx.state.analysis_config,
+                    query_count=query_count,
+                    min_identity=opts.config.template_min_identity,
+                    min_coverage=opts.config.template_min_coverage,
+                    max_evalue=opts.config.template_max_evalue,
+                    records=records,
+                )
+            if decision.narrative is None:
+                print(f"[call_reporter_agent] Template narrative not used ({'; '.join(decision.reasons)}), calling the reporter")
+
+        # Large batches get per-query narratives merged in a tree instead of one call over every hit
+        batch_min = opts.config.reporter_batch_min_queries
+        if decision is not None and decision.narrative is not None:
+            more = f"; ... {len(decision.reasons) - 3} more" if len(decision.reasons) > 3 else ""
+            print(f"[call_reporter_agent] Template narrative ({'; '.join(decision.reasons[:3])}{more})")
+            ctx.state.narrative = decision.narrative
+            if ctx.state.narrative_callback:
+                ctx.state.narrative_callback(ctx.state.narrative)
+        elif batch_min and query_count >= batch_min:
+            from story_seq.agent.batch_reporter import BatchReporter
+            from story_seq.util.seq_io import fasta_records
+
+            batch_reporter = BatchReporter(
+                opts.config, opts.question, ctx.state.analysis_config,
+                timeout=ctx.state.time_remaining(),
+                on_usage=lambda usage: ctx.state.record_llm_usage("call_reporter_agent", usage),
+            )
+            with fasta_records(opts.query) as records:
+                ctx.state.narrative = await batch_reporter.run(records, deps.blast_results)
+            if ctx.state.narrative_callback:
+                ctx.state.narrative_callback(ctx.state.narrative)
+        else:
+            reporter_agent = await get_reporter_agent(
+                llm_api_url=opts.config.llm_api_url,
+                llm_api_key=opts.config.llm_api_key,
+                model_name=opts.config.llm_model,
+                max_tokens=opts.config.max_tokens,
+                llm_endpoints=opts.config.llm_endpoints,
+                timeout=ctx.state.time_remaining()
+            )
+            from story_seq.agent.reporter_agent import NarrativeRelay
+
+            # The reporter calls tools before it writes, and run_stream would end at the first
+            # text it sends, so the run is driven node by node and each response's text is
+            # relayed as it arrives, less any preamble to a tool call.
+            async with reporter_agent.iter(opts.question, deps=deps) as run:
+                async for node in run:
+                    if not Agent.is_model_request_node(node):
+                        continue
+                    async with node.stream(run.ctx) as events:
+                        relay = NarrativeRelay(ctx.state.narrative_callback) if ctx.state.narrative_callback else None
+                        async for event in events:
+                            if relay is not None:
+                                relay.feed(event)
+            # Set once the run has reached its end, which the loop above always does
+            if run.result is not None:
+                ctx.state.narrative = run.result.output
+                ctx.state.record_llm_usage("call_reporter_agent", run.result.usage)
+
+        if opts.config.result_index_path:
+            from story_seq.pipeline.result_index import ResultIndex
+            from story_seq.util.seq_io import fasta_records
+
+            index = ResultIndex(opts.config.result_index_path, opts.config.result_index_min_containment)
+            with fasta_records(opts.query) as records:
+                analysis_id = index.add(
+                    records,
+                    opts.question,
+                    ctx.state.analysis_config,
+                    ctx.state.blast_results or [],
+                    ctx.state.narrative,
+                )
+            print(f"[call_reporter_agent] Recorded as analysis #{analysis_id} in the result index")
         
         # Save state if state file is configured
         ctx.state.save_to_file("call_reporter_agent")
@@ -7,8 +7,17 @@ functions and data models directly importable.
 
 # Import the main function from the fasta_sketch module
 from .fasta_sketch import process_multiple_files
+from .hit_table import BlastHitTable
+from .kmer_index import KmerIndex, load_kmer_index
+from .taxonomy import TaxonomyIndex, load_taxonomy
 
 __all__ = [
     # Functions
-    "process_multiple_files"
+    "process_multiple_files",
+    "load_kmer_index",
+    "load_taxonomy",
+    # Classes
+    "BlastHitTable",
+    "KmerIndex",
+    "TaxonomyIndex",
 ]
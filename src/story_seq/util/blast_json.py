@@ -0,0 +1,108 @@
+"""
+blast_json.py
+
+Conversion of NCBI BLAST JSON output into `BlastResult` models.
+
+NCBI BLAST (remote URL API with FORMAT_TYPE=JSON2_S, or `-outfmt 15` locally)
+reports each query search as:
+
+    {"BlastOutput2": [{"report": {
+        "program": "blastn",
+        "search_target": {"db": "nt"},
+        "results": {"search": {
+            "query_id": "Query_1", "query_title": "<fasta id> <description>",
+            "query_len": 1234,
+            "hits": [{"description": [{"accession": "...", "title": "...", "taxid": 9606}],
+                      "hsps": [{"bit_score": ..., "evalue": ..., "identity": ...,
+                                "align_len": ..., "query_from": ..., "query_to": ...,
+                                "hit_from": ..., "hit_to": ...}]}]}}}}]}
+
+Every HSP becomes one `BlastHit`, and each query search becomes one `BlastResult`.
+Hits take their query id from the first word of `query_title`, the FASTA id, since
+`query_id` only numbers the queries.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Union
+
+from story_seq.models import BlastHit, BlastResult
+
+
+def _reports(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if "BlastOutput2" in payload:
+        entries = payload["BlastOutput2"]
+        if isinstance(entries, dict):
+            entries = [entries]
+        return [entry["report"] for entry in entries]
+    if "report" in payload:
+        return [payload["report"]]
+    raise ValueError("Not a BLAST JSON report: expected a 'BlastOutput2' or 'report' key")
+
+
+def _searches(report: Dict[str, Any]) -> List[Dict[str, Any]]:
+    results = report.get("results", {})
+    if "search" in results:
+        return [results["search"]]
+    # Multi-query reports from some BLAST+ versions nest searches in "iterations"
+    return [iteration["search"] for iteration in results.get("iterations", [])]
+
+
+def _query_id(search: Dict[str, Any]) -> str:
+    # NCBI numbers queries "Query_1", "Query_2", ...; the FASTA id leads the title
+    title = (search.get("query_title") or "").split()
+    return title[0] if title else search.get("query_id") or "query"
+
+
+def parse_blast_json(
+    payload: Union[str, bytes, Dict[str, Any]],
+    search_reason: str = "",
+    max_hits: Optional[int] = None,
+) -> List[BlastResult]:
+    """
+    Parse NCBI BLAST JSON into one BlastResult per query search.
+
+    Args:
+        payload: JSON text or already-decoded JSON object
+        search_reason: Reason recorded on every resulting BlastResult
+        max_hits: Keep only this many subject sequences per search
+
+    Returns:
+        List of BlastResult objects in report order
+    """
+    data: Dict[str, Any] = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+
+    results = []
+    for report in _reports(data):
+        program = report.get("program", "")
+        database = report.get("search_target", {}).get("db", "")
+        for search in _searches(report):
+            query_id = _query_id(search)
+            hits = []
+            for hit in search.get("hits", [])[:max_hits]:
+                description = (hit.get("description") or [{}])[0]
+                subject_id = description.get("accession") or description.get("id", "")
+                for hsp in hit.get("hsps", []):
+                    align_len = hsp["align_len"]
+                    hits.append(BlastHit(
+                        query_id=query_id,
+                        subject_id=subject_id,
+                        identity=round(100.0 * hsp["identity"] / align_len, 2),
+                        alignment_length=align_len,
+                        evalue=hsp["evalue"],
+                        bit_score=hsp["bit_score"],
+                        query_start=hsp["query_from"],
+                        query_end=hsp["query_to"],
+                        subject_start=hsp["hit_from"],
+                        subject_end=hsp["hit_to"],
+                        # The definition line names the organism, until eutils summaries replace it
+                        genbank_summary=description.get("title"),
+                        subject_taxid=description.get("taxid"),
+                    ))
+            results.append(BlastResult(
+                query_length=search["query_len"],
+                hits=hits,
+                database=database,
+                blast_method=program,
+                search_reason=search_reason,
+            ))
+    return results
@@ -0,0 +1,161 @@
+"""
+coverage.py
+
+Deterministic query-coverage analysis for BLAST results.
+
+The `query_start`/`query_end` spans of every HSP are merged with a sorted sweep
+and the uncovered stretches of each query are reported as gaps. Gaps above a
+minimum length can be written out as a FASTA file of subsequences for a
+follow-up search round, and hits from that round can be mapped back onto the
+coordinates of the original query.
+"""
+
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+import numpy as np
+from Bio import SeqIO
+from Bio.SeqRecord import SeqRecord
+
+from story_seq.models import BlastHit, BlastResult
+from story_seq.util.hit_table import BlastHitTable
+
+Interval = Tuple[int, int]
+
+# Record ids written by write_gap_fasta look like "<query_id>:<start>-<end>"
+GAP_ID_PATTERN = re.compile(r"^(?P<query_id>.+):(?P<start>\d+)-(?P<end>\d+)$")
+
+
+def merge_intervals(starts: np.ndarray, ends: np.ndarray) -> List[Interval]:
+    """
+    Merge 1-based inclusive intervals that overlap or touch.
+
+    Reversed coordinates (start > end) are normalized first.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    if starts.size == 0:
+        return []
+    lo = np.minimum(starts, ends)
+    hi = np.maximum(starts, ends)
+    order = np.argsort(lo, kind="stable")
+    lo, hi = lo[order], hi[order]
+
+    # A new block begins wherever an interval starts after everything before it ended
+    reach = np.maximum.accumulate(hi)
+    new_block = np.empty(lo.size, dtype=bool)
+    new_block[0] = True
+    new_block[1:] = lo[1:] > reach[:-1] + 1
+
+    block_starts = lo[new_block]
+    block_ends = np.maximum.reduceat(hi, np.flatnonzero(new_block))
+    return list(zip(block_starts.tolist(), block_ends.tolist(), strict=True))
+
+
+def find_gaps(
+    covered: List[Interval], query_length: int, min_gap_length: int = 1
+) -> List[Interval]:
+    """Return the uncovered stretches of [1, query_length] at least min_gap_length long."""
+    gaps = []
+    position = 1
+    for start, end in covered:
+        if start > position:
+            gaps.append((position, min(start - 1, query_length)))
+        position = max(position, end + 1)
+    if position <= query_length:
+        gaps.append((position, query_length))
+    return [(s, e) for s, e in gaps if e - s + 1 >= min_gap_length]
+
+
+def match_query(query_id: str, records: Mapping[str, SeqRecord]) -> Optional[str]:
+    """Map a BLAST query id onto a FASTA record id."""
+    if query_id in records:
+        return query_id
+    token = query_id.split()[0] if query_id else query_id
+    if token in records:
+        return token
+    return None
+
+
+def query_coverage_gaps(
+    records: Mapping[str, SeqRecord],
+    blast_results: Iterable[BlastResult],
+    min_gap_length: int,
+) -> Dict[str, List[Interval]]:
+    """
+    Find the regions of each query record not covered by any HSP.
+
+    Args:
+        records: Query records keyed by record id
+        blast_results: BLAST results whose hits define covered spans
+        min_gap_length: Minimum gap length to report
+
+    Returns:
+        Mapping of record id to its gaps (1-based inclusive); records without
+        gaps are omitted, and so are records with no hits at all, since the
+        first round already searched them in full.
+    """
+    starts: Dict[str, List[np.ndarray]] = {rid: [] for rid in records}
+    ends: Dict[str, List[np.ndarray]] = {rid: [] for rid in records}
+    for result in blast_results:
+        if not result.hits:
+            continue
+        table = BlastHitTable.from_result(result)
+        query_ids = np.asarray(table.strings("query_id"), dtype=object)
+        for query_id in set(query_ids):
+            record_id = match_query(query_id, records)
+            if record_id is None:
+                continue
+            mask = query_ids == query_id
+            starts[record_id].append(table.records["query_start"][mask])
+            ends[record_id].append(table.records["query_end"][mask])
+
+    gaps = {}
+    for record_id, record in records.items():
+        if not starts[record_id]:
+            continue
+        covered = merge_intervals(
+            np.concatenate(starts[record_id]),
+            np.concatenate(ends[record_id]),
+        )
+        record_gaps = find_gaps(covered, len(record), min_gap_length)
+        if record_gaps:
+            gaps[record_id] = record_gaps
+    return gaps
+
+
+def write_gap_fasta(
+    records: Mapping[str, SeqRecord], gaps: Dict[str, List[Interval]], output_path: str
+) -> int:
+    """Write each gap as its own FASTA record and return the number written."""
+    gap_records = [
+        SeqRecord(
+            records[record_id][start - 1:end].seq,
+            id=f"{record_id}:{start}-{end}",
+            description=f"uncovered region {start}-{end} of {record_id}",
+        )
+        for record_id, intervals in gaps.items()
+        for start, end in intervals
+    ]
+    return SeqIO.write(gap_records, output_path, "fasta")
+
+
+def remap_gap_hits(result: BlastResult) -> BlastResult:
+    """
+    Translate hits against gap subsequences back onto original query coordinates.
+
+    Hits whose query id does not name a gap record cannot be placed on the
+    original query and are dropped rather than kept in gap coordinates.
+    """
+    hits: List[BlastHit] = []
+    for hit in result.hits:
+        match = GAP_ID_PATTERN.match(hit.query_id)
+        if not match:
+            continue
+        offset = int(match["start"]) - 1
+        hits.append(hit.model_copy(update={
+            "query_id": match["query_id"],
+            "query_start": hit.query_start + offset,
+            "query_end": hit.query_end + offset,
+        }))
+    return result.model_copy(update={"hits": hits})
@@ -5,7 +5,8 @@
 fasta_sketch.py
 
 A script to analyze one or more FASTA files and generate a single, 
-machine-readable JSON "sketch" for the entire batch.
+machine-readable JSON "sketch" for the entire batch. Inputs may be plain,
+gzip, bgzip or zstd compressed.
 
 The script categorizes all input sequences into either a Nucleotide (NT) or
 an Amino Acid (AA) partition. It calculates aggregated statistics for each partition
@@ -21,9 +22,10 @@ Usage:
 """
 
 import sys
-import os
 import json
 from Bio import SeqIO
+from story_seq.util.seq_io import open_fasta, fasta_base_name
+from story_seq.util.orfs import longest_orf_codons
 
 def guess_alphabet(sequence_str):
     """
@@ -41,38 +43,8 @@ def longest_orf_length(seq: str) -> int:
     ORF = region between in-frame stop codons (TAA/TAG/TGA); start codon not required.
     """
     seq = seq.upper().replace("\n", "").replace(" ", "")
-    stops = {"TAA", "TAG", "TGA"}
-
-    def revcomp(s: str) -> str:
-        comp = str.maketrans("ACGTN", "TGCAN")
-        return s.translate(comp)[::-1]
-
-    def max_orf_in_frame(s: str, frame: int) -> int:
-        max_len = 0
-        current_len = 0
-        # walk codon by codon starting at given frame
-        for i in range(frame, len(s) - 2, 3):
-            codon = s[i:i+3]
-            if codon in stops:
-                # stop codon ends current ORF
-                if current_len > max_len:
-                    max_len = current_len
-                current_len = 0
-            else:
-                current_len += 3
-        # tail ORF without trailing stop
-        if current_len > max_len:
-            max_len = current_len
-        return max_len
-
-    seq_rc = revcomp(seq)
-
-    best = 0
-    for frame in range(3):
-        best = max(best, max_orf_in_frame(seq, frame))
-        best = max(best, max_orf_in_frame(seq_rc, frame))
-
-    return best
+    # All six frames are scanned as NumPy codon arrays (see orfs.py)
+    return 3 * longest_orf_codons(seq)
 
 def analyze_single_fasta(file_path):
     """
@@ -81,7 +53,7 @@ def analyze_single_fasta(file_path):
     """
     records = []
     try:
-        with open(file_path, "r") as handle:
+        with open_fasta(file_path) as handle:
             for record in SeqIO.parse(handle, "fasta"):
                 records.append(record)
     except FileNotFoundError:
@@ -132,7 +104,7 @@ def analyze_single_fasta(file_path):
     }
     
     if file_alphabet_type == "mixed":
-        base_name, _ = os.path.splitext(file_path)
+        base_name = fasta_base_name(file_path)
         nt_filename = f"{base_name}_NT.fasta"
         aa_filename = f"{base_name}_AA.fasta"
         
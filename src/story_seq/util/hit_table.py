@@ -0,0 +1,230 @@
+"""
+hit_table.py
+
+A compact, column-oriented representation of BLAST hits.
+
+`BlastHitTable` stores the numeric fields of many `BlastHit` objects in a single
+NumPy structured array and keeps every identifier and annotation string once in
+an interned string pool. Filtering and sorting are vectorized, the top hit is
+computed once at construction, and the table converts losslessly to and from the
+`BlastHit` list used by `BlastResult`.
+"""
+
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from story_seq.models import BlastHit, BlastResult
+
+# Columns that hold indexes into the string pool (-1 means None)
+STRING_COLUMNS = (
+    "query_id",
+    "subject_id",
+    "genbank_summary",
+    "bioproject_info",
+    "biosample_info",
+)
+
+# Integer columns that are optional on BlastHit (-1 means None)
+OPTIONAL_INT_COLUMNS = ("subject_taxid",)
+
+HIT_DTYPE = np.dtype([
+    ("query_id", np.int32),
+    ("subject_id", np.int32),
+    ("identity", np.float64),
+    ("alignment_length", np.int64),
+    ("evalue", np.float64),
+    ("bit_score", np.float64),
+    ("query_start", np.int64),
+    ("query_end", np.int64),
+    ("subject_start", np.int64),
+    ("subject_end", np.int64),
+    ("genbank_summary", np.int32),
+    ("bioproject_info", np.int32),
+    ("biosample_info", np.int32),
+    ("subject_taxid", np.int64),
+])
+HIT_COLUMNS: Tuple[str, ...] = tuple(HIT_DTYPE.fields or ())
+
+# Default sort direction per key: smaller e-values are better, larger everything else
+SORT_DESCENDING = {
+    "evalue": False,
+    "identity": True,
+    "coverage": True,
+    "bit_score": True,
+    "alignment_length": True,
+}
+
+
+class StringPool:
+    """An append-only pool of interned strings addressed by integer index."""
+
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    def add(self, value: Optional[str]) -> int:
+        """Return the pool index for value, adding it if needed (-1 for None)."""
+        if value is None:
+            return -1
+        idx = self._index.get(value)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(sys.intern(value))
+            self._index[value] = idx
+        return idx
+
+    def get(self, idx: int) -> Optional[str]:
+        """Return the string stored at idx, or None for -1."""
+        return self.strings[idx] if idx >= 0 else None
+
+
+class BlastHitTable:
+    """
+    Column-oriented table of BLAST hits backed by a NumPy structured array.
+
+    Tables returned by `filter`, `sort_by` and `top` share the string pool of the
+    table they were derived from.
+    """
+
+    def __init__(
+        self,
+        records: np.ndarray,
+        pool: Optional[StringPool] = None,
+        query_length: Optional[int] = None,
+    ) -> None:
+        self.records = records
+        self.pool = pool if pool is not None else StringPool()
+        self.query_length = query_length
+        self.top_index: Optional[int] = (
+            int(np.argmax(records["bit_score"])) if len(records) else None
+        )
+
+    @classmethod
+    def from_hits(
+        cls, hits: Iterable[BlastHit], query_length: Optional[int] = None
+    ) -> "BlastHitTable":
+        """Build a table from BlastHit objects."""
+        pool = StringPool()
+
+        def value(hit: BlastHit, name: str) -> Any:
+            if name in STRING_COLUMNS:
+                return pool.add(getattr(hit, name))
+            if name in OPTIONAL_INT_COLUMNS:
+                return -1 if getattr(hit, name) is None else getattr(hit, name)
+            return getattr(hit, name)
+
+        rows = [tuple(value(hit, name) for name in HIT_COLUMNS) for hit in hits]
+        records = np.array(rows, dtype=HIT_DTYPE)
+        return cls(records, pool, query_length)
+
+    @classmethod
+    def from_result(cls, result: BlastResult) -> "BlastHitTable":
+        """Build a table from the hits of a BlastResult."""
+        return cls.from_hits(result.hits, query_length=result.query_length)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index: int) -> BlastHit:
+        return self.hit(index)
+
+    def _derive(self, records: np.ndarray) -> "BlastHitTable":
+        return BlastHitTable(records, self.pool, self.query_length)
+
+    def column(self, name: str) -> np.ndarray:
+        """Return a numeric column, or `coverage` (percent of the query aligned)."""
+        if name == "coverage":
+            return self.coverage
+        return self.records[name]
+
+    def strings(self, name: str) -> List[Optional[str]]:
+        """Return a string column decoded from the pool."""
+        return [self.pool.get(int(idx)) for idx in self.records[name]]
+
+    def optional_ints(self, name: str) -> List[Optional[int]]:
+        """Return an optional integer column, with None for missing values."""
+        return [None if value < 0 else value for value in self.records[name].tolist()]
+
+    @property
+    def coverage(self) -> np.ndarray:
+        """Percent query coverage of each hit's alignment span."""
+        if not self.query_length:
+            raise ValueError("query_length is required to compute coverage")
+        span: np.ndarray = np.abs(self.records["query_end"] - self.records["query_start"]) + 1
+        return span * 100.0 / self.query_length
+
+    def hit(self, index: int) -> BlastHit:
+        """Materialize a single row as a BlastHit."""
+        row = self.records[index]
+        values: Dict[str, Any] = {
+            name: self.pool.get(int(row[name])) if name in STRING_COLUMNS else row[name].item()
+            for name in HIT_COLUMNS
+        }
+        for name in OPTIONAL_INT_COLUMNS:
+            if values[name] < 0:
+                values[name] = None
+        # Values were validated when the table was built, so skip revalidation
+        return BlastHit.model_construct(**values)
+
+    def to_hits(self) -> List[BlastHit]:
+        """Convert the table back into a list of BlastHit objects."""
+        return [self.hit(i) for i in range(len(self.records))]
+
+    def to_columns(self) -> Dict[str, list]:
+        """Return the table as a mapping of column name to a list of values."""
+        return {
+            name: (
+                self.strings(name) if name in STRING_COLUMNS
+                else self.optional_ints(name) if name in OPTIONAL_INT_COLUMNS
+                else self.records[name].tolist()
+            )
+            for name in HIT_COLUMNS
+        }
+
+    @property
+    def top_hit(self) -> Optional[BlastHit]:
+        """Return the hit with the highest bit score (precomputed)."""
+        if self.top_index is None:
+            return None
+        return self.hit(self.top_index)
+
+    def filter(
+        self,
+        max_evalue: Optional[float] = None,
+        min_identity: Optional[float] = None,
+        min_coverage: Optional[float] = None,
+        min_bit_score: Optional[float] = None,
+    ) -> "BlastHitTable":
+        """Return the hits that satisfy all of the given thresholds."""
+        mask = np.ones(len(self.records), dtype=bool)
+        if max_evalue is not None:
+            mask &= self.records["evalue"] <= max_evalue
+        if min_identity is not None:
+            mask &= self.records["identity"] >= min_identity
+        if min_coverage is not None:
+            mask &= self.coverage >= min_coverage
+        if min_bit_score is not None:
+            mask &= self.records["bit_score"] >= min_bit_score
+        return self._derive(self.records[mask])
+
+    def sort_by(self, key: str = "bit_score", descending: Optional[bool] = None) -> "BlastHitTable":
+        """
+        Return the hits ordered by key (evalue, identity, coverage, bit_score, ...).
+
+        By default e-values sort ascending and every other key sorts descending.
+        """
+        if descending is None:
+            descending = SORT_DESCENDING.get(key, True)
+        values = self.column(key)
+        order = np.argsort(-values if descending else values, kind="stable")
+        return self._derive(self.records[order])
+
+    def top(self, n: int, by: str = "bit_score") -> "BlastHitTable":
+        """Return the best n hits according to `by`."""
+        return self._derive(self.sort_by(by).records[:n])
+
+    def select(self, indices: Sequence[int]) -> "BlastHitTable":
+        """Return the rows at the given positions."""
+        return self._derive(self.records[np.asarray(indices, dtype=np.intp)])
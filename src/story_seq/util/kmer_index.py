@@ -0,0 +1,276 @@
+"""
+kmer_index.py
+
+A local k-mer classifier giving query sequences a provisional taxon before BLAST.
+
+`build_kmer_index` reads a user-supplied reference FASTA (plain or compressed)
+whose sequences are labelled with NCBI taxids, either in the header
+(`>seq1|kraken:taxid|562 ...`, as for Kraken) or in a `seqid2taxid` file of
+`sequence id<TAB>taxid` lines. Each canonical k-mer (the smaller of a k-mer and
+its reverse complement, 2 bits per base in a uint64) is assigned to the taxon
+of the references containing it, or to their lowest common ancestor when
+several taxa share it. The index is two arrays, sorted k-mers and their
+taxids, saved as `.npy` files next to the reference and memory-mapped on
+later loads (`load_kmer_index`).
+
+`KmerIndex.classify` looks up a query's k-mers with one vectorized binary
+search and, like Kraken's confidence threshold, calls the deepest taxon whose
+clade holds at least `min_confidence` of all the query's k-mers.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from Bio import SeqIO
+
+from story_seq.util.seq_io import open_fasta
+from story_seq.util.taxonomy import Taxon, TaxonomyIndex
+
+# Bump when the saved arrays change
+CACHE_VERSION = 1
+# Longest k-mer that fits in a uint64
+MAX_K = 32
+
+_HEADER_TAXID = re.compile(r"taxid[|=](\d+)")
+# A, C, G, T (either case) to 0-3; everything else to 4
+_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "Tt")):
+    for _base in _bases:
+        _CODES[ord(_base)] = _code
+
+
+def canonical_kmers(sequence: str, k: int) -> np.ndarray:
+    """Canonical k-mers of a nucleotide sequence, in order; k-mers with ambiguous bases are dropped."""
+    if not 0 < k <= MAX_K:
+        raise ValueError(f"k must be between 1 and {MAX_K}")
+    codes = _CODES[np.frombuffer(sequence.encode("ascii", "replace"), dtype=np.uint8)]
+    count = len(codes) - k + 1
+    if count <= 0:
+        return np.empty(0, dtype=np.uint64)
+    bases = (codes & 3).astype(np.uint64)
+    forward = np.zeros(count, dtype=np.uint64)
+    reverse = np.zeros(count, dtype=np.uint64)
+    for offset in range(k):
+        window = bases[offset:offset + count]
+        forward = (forward << np.uint64(2)) | window
+        reverse |= (np.uint64(3) - window) << np.uint64(2 * offset)
+    ambiguous = np.concatenate([[0], np.cumsum(codes > 3)])
+    clean = ambiguous[k:] == ambiguous[:count]
+    kmers: np.ndarray = np.minimum(forward, reverse)[clean]
+    return kmers
+
+
+def _read_seqid2taxid(path: Union[str, Path]) -> Dict[str, int]:
+    labels = {}
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            fields = line.split()
+            if len(fields) >= 2 and fields[1].isdigit():
+                labels[fields[0]] = int(fields[1])
+    return labels
+
+
+def build_kmer_index(
+    reference: Union[str, Path],
+    taxonomy: TaxonomyIndex,
+    k: int = 31,
+    seqid2taxid: Optional[Union[str, Path]] = None,
+) -> Dict[str, np.ndarray]:
+    """
+    Collect the canonical k-mers of a labelled reference FASTA with their taxa.
+
+    Raises:
+        ValueError: If no reference sequence has a taxid known to the taxonomy
+    """
+    labels = _read_seqid2taxid(seqid2taxid) if seqid2taxid else {}
+    kmer_chunks, taxid_chunks = [], []
+    skipped = 0
+    with open_fasta(reference) as handle:
+        for record in SeqIO.parse(handle, "fasta"):
+            taxid = labels.get(record.id)
+            if taxid is None:
+                match = _HEADER_TAXID.search(record.description)
+                taxid = int(match.group(1)) if match else None
+            taxon = taxonomy.taxon(taxid) if taxid is not None else None
+            if taxon is None:
+                skipped += 1
+                continue
+            kmers = np.unique(canonical_kmers(str(record.seq), k))
+            kmer_chunks.append(kmers)
+            taxid_chunks.append(np.full(len(kmers), taxon.taxid, dtype=np.int32))
+    if skipped:
+        print(f"[kmer_index] Skipped {skipped} reference sequence(s) without a taxid known to the taxonomy")
+    if not kmer_chunks:
+        raise ValueError(f"{reference} has no reference sequences with known taxids")
+
+    kmers, taxids = np.concatenate(kmer_chunks), np.concatenate(taxid_chunks)
+    order = np.lexsort((taxids, kmers))
+    kmers, taxids = kmers[order], taxids[order]
+    distinct = np.ones(len(kmers), dtype=bool)
+    distinct[1:] = (kmers[1:] != kmers[:-1]) | (taxids[1:] != taxids[:-1])
+    kmers, taxids = kmers[distinct], taxids[distinct]
+    # k-mers shared by several taxa belong to their LCA
+    starts = np.flatnonzero(np.concatenate([[True], kmers[1:] != kmers[:-1]]))
+    return {"kmers": kmers[starts], "taxids": taxonomy.group_lca(taxids, starts).astype(np.int32)}
+
+
+@dataclass
+class KmerCall:
+    """Provisional classification of one query sequence."""
+    query_id: str
+    kmers: int  # k-mers in the query (without ambiguous bases)
+    classified: int = 0  # k-mers found in the index
+    taxon: Optional[Taxon] = None  # None when unclassified
+    confidence: float = 0.0  # share of the query's k-mers in the taxon's clade
+
+
+class KmerIndex:
+    """
+    Sorted canonical k-mers of a reference set and the taxid of each.
+
+    Build one with `KmerIndex.from_reference`, or load the cached arrays with
+    `load_kmer_index`.
+    """
+
+    def __init__(self, kmers: np.ndarray, taxids: np.ndarray, k: int, taxonomy: TaxonomyIndex):
+        self.kmers = kmers
+        self.taxids = taxids
+        self.k = k
+        self.taxonomy = taxonomy
+
+    @classmethod
+    def from_reference(
+        cls,
+        reference: Union[str, Path],
+        taxonomy: TaxonomyIndex,
+        k: int = 31,
+        seqid2taxid: Optional[Union[str, Path]] = None,
+    ) -> "KmerIndex":
+        """Index a labelled reference FASTA in memory."""
+        arrays = build_kmer_index(reference, taxonomy, k, seqid2taxid)
+        return cls(arrays["kmers"], arrays["taxids"], k, taxonomy)
+
+    def __len__(self) -> int:
+        return len(self.kmers)
+
+    def save(self, cache_dir: Union[str, Path], sources: Optional[Dict[str, List[int]]] = None) -> None:
+        """Write the arrays as `.npy` files, replacing any earlier cache in `cache_dir`."""
+        cache_dir = Path(cache_dir)
+        cache_dir.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{cache_dir.name}-", dir=cache_dir.parent))
+        np.save(staging / "kmers.npy", self.kmers)
+        np.save(staging / "taxids.npy", self.taxids)
+        (staging / "meta.json").write_text(json.dumps({"version": CACHE_VERSION, "k": self.k, "sources": sources or {}}))
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        try:
+            os.replace(staging, cache_dir)
+        except OSError:
+            # Another process wrote the same cache first
+            shutil.rmtree(staging, ignore_errors=True)
+
+    @classmethod
+    def load(cls, cache_dir: Union[str, Path], taxonomy: TaxonomyIndex) -> "KmerIndex":
+        """Memory-map the arrays saved in `cache_dir`."""
+        cache_dir = Path(cache_dir)
+        meta = json.loads((cache_dir / "meta.json").read_text())
+        return cls(
+            np.load(cache_dir / "kmers.npy", mmap_mode="r"),
+            np.load(cache_dir / "taxids.npy", mmap_mode="r"),
+            meta["k"],
+            taxonomy,
+        )
+
+    def classify(self, query_id: str, sequence: str, min_confidence: float = 0.5) -> KmerCall:
+        """Call the deepest taxon whose clade holds at least `min_confidence` of the query's k-mers."""
+        kmers = canonical_kmers(sequence, self.k)
+        call = KmerCall(query_id, kmers=len(kmers))
+        if not len(kmers) or not len(self.kmers):
+            return call
+        positions = np.minimum(np.searchsorted(self.kmers, kmers), len(self.kmers) - 1)
+        found = self.kmers[positions] == kmers
+        call.classified = int(found.sum())
+        fraction = call.classified / call.kmers
+        if fraction < min_confidence:
+            return call
+        taxa, counts = np.unique(self.taxids[positions[found]], return_counts=True)
+        chosen = self.taxonomy.weighted_lca(taxa, counts, min_support=min_confidence / fraction)
+        if chosen is not None:
+            call.taxon = self.taxonomy.taxon(chosen[0])
+            call.confidence = chosen[1] * fraction
+        return call
+
+
+def search_limits(
+    calls: List[KmerCall], taxonomy: TaxonomyIndex, rank: str = "genus", certain_confidence: float = 0.9
+) -> Tuple[List[int], bool]:
+    """
+    Taxids to limit the queries' BLAST searches to, and whether the calls are certain.
+
+    Each call is widened to its taxon of `rank` (calls above that rank are kept
+    as they are). There are no limits unless every query was classified; the
+    calls are certain when each is at species level or below with at least
+    `certain_confidence` of its k-mers.
+    """
+    taxa = [call.taxon for call in calls if call.taxon is not None]
+    if not calls or len(taxa) < len(calls):
+        return [], False
+    limits = sorted({(taxonomy.ancestor_at_rank(taxon.taxid, rank) or taxon).taxid for taxon in taxa})
+    certain = all(
+        call.confidence >= certain_confidence and taxonomy.ancestor_at_rank(taxon.taxid, "species") is not None
+        for call, taxon in zip(calls, taxa, strict=True)
+    )
+    return limits, certain
+
+
+def _file_stamps(*paths: Optional[Union[str, Path]]) -> Dict[str, List[int]]:
+    stamps = {}
+    for path in paths:
+        if path:
+            stat = Path(path).stat()
+            stamps[str(path)] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+_loaded: Dict[Tuple[str, str], KmerIndex] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_kmer_index(
+    reference: Union[str, Path],
+    taxonomy: TaxonomyIndex,
+    k: int = 31,
+    seqid2taxid: Optional[Union[str, Path]] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+) -> KmerIndex:
+    """
+    The k-mer index of a reference FASTA, memory-mapped from its cached arrays.
+
+    The cache (`<reference>.storyseq-k<k>` unless `cache_dir` is given) is
+    rebuilt when the reference or seqid2taxid file changes. Indexes are shared
+    within the process.
+    """
+    reference = Path(reference).expanduser()
+    seqid2taxid = Path(seqid2taxid).expanduser() if seqid2taxid else None
+    cache_dir = Path(cache_dir).expanduser() if cache_dir else reference.with_name(f"{reference.name}.storyseq-k{k}")
+    sources = _file_stamps(reference, seqid2taxid)
+    key = (str(cache_dir.resolve()), json.dumps(sources, sort_keys=True))
+    with _loaded_lock:
+        if key in _loaded:
+            return _loaded[key]
+        try:
+            meta = json.loads((cache_dir / "meta.json").read_text())
+        except (OSError, ValueError):
+            meta = {}
+        if meta.get("version") != CACHE_VERSION or meta.get("k") != k or meta.get("sources") != sources:
+            print(f"[kmer_index] Indexing the {k}-mers of {reference}")
+            KmerIndex.from_reference(reference, taxonomy, k, seqid2taxid).save(cache_dir, sources)
+        _loaded[key] = KmerIndex.load(cache_dir, taxonomy)
+        return _loaded[key]
@@ -0,0 +1,332 @@
+"""
+orfs.py
+
+Vectorized six-frame ORF calling and translation.
+
+Each strand is encoded once as a NumPy array of 2-bit bases, every reading
+frame is turned into an array of codon indexes, and stop codons, start codons
+and amino acids are looked up from 65-entry tables (the 65th entry is any
+codon with an ambiguous base). ORFs are the stretches between in-frame stops,
+optionally trimmed to the first start codon, so a whole record is called
+without a Python loop over codons.
+
+Translated ORFs are written as protein FASTA and added to the sketch's AA
+partition, letting protein-level searches run `blastp` on predicted proteins
+instead of translating the query on the fly with `blastx`/`tblastx`.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache, cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from Bio import SeqIO
+from Bio.Data import CodonTable
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from story_seq.models import BlastHit, BlastResult
+from story_seq.util.seq_io import fasta_base_name, open_fasta
+
+START_MODES = ("atg", "alternative", "none")
+
+# ORF record ids look like "<record_id>_orf<n>_<start>-<end>_<f|r>" (1-based nucleotide span)
+ORF_ID_PATTERN = re.compile(r"^(?P<record_id>.+)_orf\d+_(?P<start>\d+)-(?P<end>\d+)_(?P<strand>[fr])$")
+
+_BASE_CODE = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "TtUu")):
+    for _base in _bases:
+        _BASE_CODE[ord(_base)] = _code
+
+
+@dataclass
+class Orf:
+    """An open reading frame on one strand of a nucleotide record."""
+    record_id: str
+    strand: str  # "+" or "-"
+    frame: int  # 1-3, counted from the 5' end of its strand
+    start: int  # 1-based, on the forward strand, start <= end
+    end: int
+    protein: str
+    has_start: bool
+    has_stop: bool
+
+    def orf_id(self, number: int) -> str:
+        """Record id of the translated ORF; see ORF_ID_PATTERN."""
+        return f"{self.record_id}_orf{number}_{self.start}-{self.end}_{'f' if self.strand == '+' else 'r'}"
+
+
+@cache
+def codon_tables(table_id: int = 11) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Lookup arrays indexed by codon (16*b1 + 4*b2 + b3, or 64 if ambiguous).
+
+    Returns (amino_acids, is_stop, is_atg, is_start) for an NCBI genetic code;
+    is_start covers all the code's start codons (e.g. ATG, GTG, TTG for code 11).
+    """
+    table = CodonTable.unambiguous_dna_by_id[table_id]
+    amino_acids = np.full(65, ord("X"), dtype=np.uint8)
+    is_stop = np.zeros(65, dtype=bool)
+    is_atg = np.zeros(65, dtype=bool)
+    is_start = np.zeros(65, dtype=bool)
+    for index in range(64):
+        codon = "ACGT"[index // 16] + "ACGT"[index // 4 % 4] + "ACGT"[index % 4]
+        if codon in table.stop_codons:
+            is_stop[index] = True
+            amino_acids[index] = ord("*")
+        else:
+            amino_acids[index] = ord(table.forward_table[codon])
+        is_atg[index] = codon == "ATG"
+        is_start[index] = codon in table.start_codons
+    return amino_acids, is_stop, is_atg, is_start
+
+
+def encode_bases(seq: str) -> np.ndarray:
+    """Encode a nucleotide sequence as 0-3 (ACGT/U) and 4 (anything else)."""
+    return _BASE_CODE[np.frombuffer(seq.encode("ascii", "replace"), dtype=np.uint8)]
+
+
+def reverse_complement_codes(codes: np.ndarray) -> np.ndarray:
+    return np.where(codes < 4, 3 - codes, 4).astype(np.uint8)[::-1]
+
+
+def frame_codons(codes: np.ndarray, frame: int) -> np.ndarray:
+    """Codon indexes of one reading frame (0-based frame offset)."""
+    count = (len(codes) - frame) // 3
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+    triplets = codes[frame:frame + 3 * count].reshape(count, 3).astype(np.int64)
+    index = triplets[:, 0] * 16 + triplets[:, 1] * 4 + triplets[:, 2]
+    index[(triplets > 3).any(axis=1)] = 64
+    return index
+
+
+def stop_segments(codons: np.ndarray, is_stop: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start and end (exclusive) codon indexes of the stretches between stops.
+
+    A segment's end is the index of its stop codon, or the frame length for
+    the final segment, which has no stop.
+    """
+    stops = np.flatnonzero(is_stop[codons])
+    starts = np.concatenate(([0], stops + 1))
+    ends = np.concatenate((stops, [len(codons)]))
+    return starts, ends
+
+
+def longest_orf_codons(seq: str) -> int:
+    """Longest stop-to-stop stretch, in codons, across all six frames (no start codon required)."""
+    _, is_stop, _, _ = codon_tables(1)
+    codes = encode_bases(seq)
+    best = 0
+    for strand in (codes, reverse_complement_codes(codes)):
+        for frame in range(3):
+            starts, ends = stop_segments(frame_codons(strand, frame), is_stop)
+            best = max(best, int((ends - starts).max(initial=0)))
+    return best
+
+
+def find_orfs(
+    seq: str,
+    record_id: str = "query",
+    min_protein_length: int = 100,
+    start_codons: str = "atg",
+    table_id: int = 11,
+) -> List[Orf]:
+    """
+    Call ORFs in all six frames of a nucleotide sequence.
+
+    Args:
+        seq: Nucleotide sequence
+        record_id: Id of the record, used in ORF ids
+        min_protein_length: Minimum ORF length in amino acids (excluding the stop)
+        start_codons: "atg" to start ORFs at the first ATG, "alternative" to
+            also accept the genetic code's alternative starts (GTG, TTG, ...),
+            or "none" for stop-to-stop ORFs
+        table_id: NCBI genetic code (11: bacterial, archaeal and plant plastid)
+
+    Returns:
+        ORFs sorted by start position. ORFs running off either end of the
+        sequence are kept (has_stop is False at the 3' end; with
+        start_codons="none" the 5' end needs no start).
+    """
+    if start_codons not in START_MODES:
+        raise ValueError(f"start_codons must be one of {', '.join(START_MODES)}")
+    amino_acids, is_stop, is_atg, is_alt = codon_tables(table_id)
+    is_start = is_atg if start_codons == "atg" else is_alt
+    length = len(seq)
+    codes = encode_bases(seq)
+
+    orfs = []
+    for strand, strand_codes in (("+", codes), ("-", reverse_complement_codes(codes))):
+        for frame in range(3):
+            codons = frame_codons(strand_codes, frame)
+            if codons.size == 0:
+                continue
+            seg_starts, seg_ends = stop_segments(codons, is_stop)
+            if start_codons == "none":
+                orf_starts = seg_starts
+                valid = np.ones(seg_starts.size, dtype=bool)
+            else:
+                # First start codon at or after each segment start, if it lies inside the segment
+                start_positions = np.flatnonzero(is_start[codons])
+                if start_positions.size == 0:
+                    continue
+                nearest = np.searchsorted(start_positions, seg_starts)
+                found = nearest < start_positions.size
+                orf_starts = np.where(found, start_positions[np.minimum(nearest, start_positions.size - 1)], seg_ends)
+                valid = found & (orf_starts < seg_ends)
+            keep = valid & (seg_ends - orf_starts >= min_protein_length)
+            for first, last in zip(orf_starts[keep].tolist(), seg_ends[keep].tolist(), strict=True):
+                has_stop = last < codons.size
+                protein = amino_acids[codons[first:last]].tobytes().decode("ascii")
+                if start_codons != "none":
+                    # Alternative start codons are translated as methionine
+                    protein = "M" + protein[1:]
+                lo = frame + 3 * first
+                hi = frame + 3 * last + (3 if has_stop else 0)
+                start, end = (lo + 1, hi) if strand == "+" else (length - hi + 1, length - lo)
+                orfs.append(Orf(
+                    record_id=record_id, strand=strand, frame=frame + 1, start=start, end=end,
+                    protein=protein, has_start=start_codons != "none" or bool(is_atg[codons[first]]),
+                    has_stop=has_stop,
+                ))
+    orfs.sort(key=lambda orf: (orf.start, orf.strand))
+    return orfs
+
+
+def orf_records(orfs: Iterable[Orf]) -> List[SeqRecord]:
+    """Protein records named so hits can be mapped back to the nucleotide query."""
+    records = []
+    for number, orf in enumerate(orfs, start=1):
+        records.append(SeqRecord(
+            Seq(orf.protein),
+            id=orf.orf_id(number),
+            description=(f"{orf.record_id} {orf.start}-{orf.end} strand {orf.strand} frame {orf.frame}"
+                         f"{'' if orf.has_stop else ' partial'}"),
+        ))
+    return records
+
+
+def translate_fasta(
+    path: str,
+    output_path: Optional[str] = None,
+    min_protein_length: int = 100,
+    start_codons: str = "atg",
+    table_id: int = 11,
+) -> Tuple[str, int, int]:
+    """
+    Write the translated ORFs of every record in a nucleotide FASTA file.
+
+    Returns (output_path, record_count, total_length); the default output is
+    "<base>_ORFs.faa" next to the input.
+    """
+    output_path = output_path or f"{fasta_base_name(path)}_ORFs.faa"
+    records = []
+    with open_fasta(path) as handle:
+        for record in SeqIO.parse(handle, "fasta"):
+            orfs = find_orfs(str(record.seq), record.id, min_protein_length, start_codons, table_id)
+            records.extend(orf_records(orfs))
+    SeqIO.write(records, output_path, "fasta")
+    return output_path, len(records), sum(len(r) for r in records)
+
+
+def add_orf_partition(
+    fasta_sketch: Dict[str, Any],
+    min_protein_length: int = 100,
+    start_codons: str = "atg",
+    table_id: int = 11,
+    output_dir: Optional[str] = None,
+) -> List[str]:
+    """
+    Translate the ORFs of the sketch's NT files into its AA partition.
+
+    Each NT file gets a "<base>_ORFs.faa" entry in the AA partition with
+    `translated_from` naming the NT file; the files are written to
+    `output_dir` (by default next to each NT file). The AA partition's
+    `translated_records` counts these records so the query's own alphabet can
+    still be told apart. Returns the ORF files written (files without ORFs
+    are skipped).
+    """
+    aa = fasta_sketch["partitions"]["AA"]
+    nt_files = fasta_sketch["partitions"]["NT"]["files"]
+    already = {f.get("translated_from") for f in aa["files"]}
+    written = []
+    for nt_file in nt_files:
+        source = nt_file["source_file"]
+        if source in already:
+            continue
+        output_path = None
+        if output_dir is not None:
+            output_path = os.path.join(output_dir, f"{os.path.basename(fasta_base_name(source))}_ORFs.faa")
+        output_path, count, total_length = translate_fasta(source, output_path, min_protein_length, start_codons,
+                                                           table_id)
+        if count == 0:
+            continue
+        aa["files"].append({
+            "source_file": output_path,
+            "translated_from": source,
+            "record_count": count,
+            "total_length": total_length,
+        })
+        aa["total_records"] += count
+        aa["total_length"] += total_length
+        aa["translated_records"] = aa.get("translated_records", 0) + count
+        aa["average_length"] = round(aa["total_length"] / aa["total_records"], 2)
+        written.append(output_path)
+    return written
+
+
+def orf_record_id(query_id: str) -> str:
+    """Nucleotide record id an ORF query id was translated from (other ids are returned as is)."""
+    match = ORF_ID_PATTERN.match(query_id.split(" ")[0])
+    return match["record_id"] if match else query_id
+
+
+def _nucleotide_span(hit: BlastHit, match: "re.Match[str]") -> Tuple[int, int]:
+    """Forward-strand span of the nucleotide record that an ORF hit's amino acids were translated from."""
+    start, end = int(match["start"]), int(match["end"])
+    q_lo, q_hi = sorted((hit.query_start, hit.query_end))
+    if match["strand"] == "f":
+        return start + 3 * (q_lo - 1), min(end, start + 3 * q_hi - 1)
+    return max(start, end - 3 * q_hi + 1), end - 3 * (q_lo - 1)
+
+
+def orf_hits_to_nucleotide(result: BlastResult) -> BlastResult:
+    """
+    Express hits of translated-ORF queries as spans of the nucleotide query.
+
+    Used for query coverage: amino acid positions are converted to the
+    nucleotide span they were translated from. Hits whose query id is not an
+    ORF id are left unchanged.
+    """
+    hits: List[BlastHit] = []
+    for hit in result.hits:
+        match = ORF_ID_PATTERN.match(hit.query_id.split(" ")[0])
+        if not match:
+            hits.append(hit)
+            continue
+        nt_lo, nt_hi = _nucleotide_span(hit, match)
+        hits.append(hit.model_copy(update={
+            "query_id": match["record_id"], "query_start": nt_lo, "query_end": nt_hi,
+        }))
+    return result.model_copy(update={"hits": hits})
+
+
+def hit_coverage(hit: BlastHit, result: BlastResult, record_length: Optional[int] = None) -> Optional[float]:
+    """
+    Percent of its query record that a hit covers.
+
+    A hit on a translated ORF is measured as the nucleotide span it was
+    translated from, against `record_length`, the length of the ORF's
+    nucleotide record. Without that length its coverage is unknown (None).
+    """
+    match = ORF_ID_PATTERN.match(hit.query_id.split(" ")[0])
+    if match is None:
+        return 100.0 * (abs(hit.query_end - hit.query_start) + 1) / result.query_length
+    if not record_length:
+        return None
+    nt_lo, nt_hi = _nucleotide_span(hit, match)
+    return 100.0 * (nt_hi - nt_lo + 1) / record_length
@@ -0,0 +1,139 @@
+"""
+seq_io.py
+
+Transparent access to plain and compressed FASTA files.
+
+The compression format is detected from the leading magic bytes rather than
+the file name, and content is decoded as a stream, so compressed inputs never
+need to be expanded on disk. Supported formats:
+
+    gzip   streaming decode (multi-member files included)
+    bgzf   streaming decode, plus block-level random access by record id
+    zstd   streaming decode (requires the optional `zstandard` package)
+
+Sources may be paths or binary file objects such as HTTP response bodies.
+"""
+
+import gzip
+import io
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Dict, Iterator, Mapping, TextIO, Union
+
+from Bio import SeqIO
+from Bio.SeqRecord import SeqRecord
+
+Source = Union[str, "os.PathLike[str]", BinaryIO]
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+COMPRESSED_SUFFIXES = (".gz", ".bgz", ".gzip", ".zst", ".zstd")
+
+
+def _sniff(header: bytes) -> str:
+    """Classify a file from its first bytes."""
+    if header.startswith(ZSTD_MAGIC):
+        return "zstd"
+    if header.startswith(GZIP_MAGIC):
+        # BGZF is gzip with the FEXTRA flag and a 'BC' subfield in the extra block
+        if len(header) >= 14 and header[3] & 0x04 and header[12:14] == b"BC":
+            return "bgzf"
+        return "gzip"
+    return "none"
+
+
+class _OwningGzipFile(gzip.GzipFile):
+    """GzipFile that closes the stream it decodes, as the other formats' readers do."""
+
+    def __init__(self, source: io.BufferedReader) -> None:
+        super().__init__(fileobj=source)
+        self._source = source
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            self._source.close()
+
+
+def _peekable(stream: BinaryIO) -> io.BufferedReader:
+    if isinstance(stream, io.BufferedReader):
+        return stream
+    return io.BufferedReader(stream)  # type: ignore[arg-type]
+
+
+def detect_compression(path: Union[str, "os.PathLike[str]"]) -> str:
+    """Return "none", "gzip", "bgzf" or "zstd" for a file."""
+    with open(path, "rb") as raw:
+        return _sniff(raw.read(18))
+
+
+def open_fasta(source: Source) -> TextIO:
+    """
+    Open a FASTA source for streaming text reads, decompressing if needed.
+
+    The caller owns the returned handle and should close it (it works as a
+    context manager); closing it also closes `source`.
+    """
+    raw = _peekable(source if hasattr(source, "read") else open(source, "rb"))  # type: ignore[arg-type]
+    compression = _sniff(raw.peek(18)[:18])
+
+    if compression in ("gzip", "bgzf"):
+        return io.TextIOWrapper(_OwningGzipFile(raw), encoding="utf-8")
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "zstandard is required to read .zst FASTA files: pip install 'story-seq[compression]'"
+            ) from e
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+
+def read_fasta_text(source: Source) -> str:
+    """Return the decompressed text of a FASTA source."""
+    with open_fasta(source) as handle:
+        return handle.read()
+
+
+def load_fasta_records(path: Union[str, "os.PathLike[str]"]) -> Mapping[str, SeqRecord]:
+    """
+    Return the records of a FASTA file keyed by id.
+
+    Plain and BGZF files are indexed rather than loaded, so records are read on
+    access only (BGZF seeks straight to the block holding each record). Other
+    compressed formats cannot be seeked and are read in full. An index keeps
+    the file open until its `close()`; `fasta_records` closes it for you.
+    """
+    if detect_compression(path) in ("none", "bgzf"):
+        index: Mapping[str, SeqRecord] = SeqIO.index(os.fspath(path), "fasta")
+        return index
+    with open_fasta(path) as handle:
+        records: Dict[str, SeqRecord] = {record.id: record for record in SeqIO.parse(handle, "fasta")}
+    return records
+
+
+@contextmanager
+def fasta_records(path: Union[str, "os.PathLike[str]"]) -> Iterator[Mapping[str, SeqRecord]]:
+    """`load_fasta_records` as a context manager that closes the file index on exit."""
+    records = load_fasta_records(path)
+    try:
+        yield records
+    finally:
+        close = getattr(records, "close", None)
+        if close is not None:
+            close()
+
+
+def fasta_base_name(path: Union[str, "os.PathLike[str]"]) -> str:
+    """Strip compression and FASTA extensions, e.g. 'reads.fna.gz' -> 'reads'."""
+    base = os.fspath(path)
+    lowered = base.lower()
+    for suffix in COMPRESSED_SUFFIXES:
+        if lowered.endswith(suffix):
+            base = base[:-len(suffix)]
+            break
+    base, _ = os.path.splitext(base)
+    return base
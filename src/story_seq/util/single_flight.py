@@ -0,0 +1,130 @@
+"""
+Single-flight coalescing of identical concurrent calls.
+
+Caches only help once a result is stored. When a batch, or several pipelines
+in one process, ask for the same BLAST search, E-utilities lookup or cached
+narrative at the same moment, every caller misses the cache and the same
+remote work runs several times. A `SingleFlight` group lets the first caller
+for a key run the call while later callers with the same key await its
+result. Keys are built like the corresponding cache keys.
+
+The shared call runs as its own task: a caller that is cancelled (e.g. at its
+pipeline's deadline) stops waiting without failing the others, and the call is
+only cancelled when nobody waits for it any more. A call bound to resources of
+the caller that started it (its MCP session, say) is cancelled as soon as that
+caller stops waiting, and the callers still waiting run it again with their own
+`call`. Groups are process-wide and count their calls and coalesced requests
+(`single_flight_metrics`).
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Coroutine, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def flight_key(*parts: Any) -> str:
+    """Stable key for JSON-serializable call arguments."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+    abandoned: bool = False
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one.
+
+    Calls on different event loops never share a flight.
+
+    Args:
+        name: Group name used in metrics
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.metrics = {"calls": 0, "coalesced": 0}
+        self._lock = threading.Lock()
+        self._flights: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, _Flight]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @property
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(len(flights) for flights in self._flights.values())
+
+    async def do(self, key: Hashable, call: Callable[[], Coroutine[Any, Any, T]], bound: bool = False) -> T:
+        """
+        Run `call()`, or wait for the identical call already in flight.
+
+        Args:
+            key: Identifies calls that may share one result
+            call: Makes the call
+            bound: The call uses resources of the caller that starts it, so it
+                is abandoned when that caller stops waiting, and every other
+                caller runs it again with its own `call`
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flights = self._flights.setdefault(loop, {})
+        while True:
+            with self._lock:
+                flight = flights.get(key)
+                owner = flight is None
+                if flight is None:
+                    flight = _Flight(loop.create_task(call()))
+                    flights[key] = flight
+                    self.metrics["calls"] += 1
+
+                    def done(_: asyncio.Task, flight: _Flight = flight) -> None:
+                        with self._lock:
+                            if flights.get(key) is flight:
+                                del flights[key]
+
+                    flight.task.add_done_callback(done)
+                else:
+                    self.metrics["coalesced"] += 1
+                flight.waiters += 1
+            try:
+                # Unlike awaiting the task, waiting for it is not cancelled along with it
+                await asyncio.wait({flight.task})
+            finally:
+                flight.waiters -= 1
+                if not flight.task.done() and (flight.waiters == 0 or (bound and owner)):
+                    with self._lock:
+                        flight.abandoned = True
+                        if flights.get(key) is flight:
+                            del flights[key]
+                    flight.task.cancel()
+            if flight.abandoned and (flight.task.cancelled() or flight.task.exception() is not None):
+                continue
+            result: T = flight.task.result()
+            return result
+
+
+_groups: Dict[str, SingleFlight] = {}
+_groups_lock = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """The process-wide group `name`, created on first use."""
+    with _groups_lock:
+        if name not in _groups:
+            _groups[name] = SingleFlight(name)
+        return _groups[name]
+
+
+def single_flight_metrics() -> Dict[str, Dict[str, int]]:
+    """Calls made and requests coalesced so far, by group."""
+    with _groups_lock:
+        return {name: dict(group.metrics) for name, group in _groups.items()}
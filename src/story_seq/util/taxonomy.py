@@ -0,0 +1,457 @@
+"""
+taxonomy.py
+
+An offline NCBI taxonomy index for interpreting BLAST hits.
+
+`build_taxonomy_index` reads the NCBI taxdump (`nodes.dmp`, `names.dmp` and,
+if present, `merged.dmp`) into flat NumPy arrays:
+
+    - `parent`: node index of each node's parent (the root is its own parent)
+    - `depth` and `rank` of every node, and its scientific name in one byte buffer
+    - `node_of`: node index by taxid (-1 for unknown taxids; merged taxids
+      point at the taxon that replaced them)
+    - an Euler tour of the tree, the first occurrence of every node in it, and
+      a sparse table of the shallowest tour entry over runs of tour blocks
+
+The lowest common ancestor (LCA) of any set of taxa is the shallowest tour
+entry between their earliest and latest first occurrences: one range-minimum
+query. The arrays are saved as `.npy` files in a cache directory next to the
+taxdump and memory-mapped on later loads (`load_taxonomy`), so no pipeline
+parses the dump twice and processes share the pages.
+
+`TaxonomyIndex.summarize` condenses the hits of BLAST results: each subject's
+best bit score is a vote for its taxon and all of that taxon's ancestors, and
+the deepest taxon holding at least `min_support` of the votes is reported with
+its lineage.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from story_seq.models import BlastResult
+from story_seq.util.hit_table import BlastHitTable
+
+# Bump when the saved arrays change
+CACHE_VERSION = 1
+CACHE_DIRNAME = "storyseq-taxonomy"
+# Tour entries per block of the range-minimum structure
+BLOCK_SIZE = 64
+# Ranks shown in lineage summaries ("domain" replaced "superkingdom" in 2025 dumps)
+MAJOR_RANKS = ("superkingdom", "domain", "kingdom", "phylum", "class", "order", "family", "genus", "species")
+
+ARRAYS = ("taxids", "parent", "depth", "rank", "name_offsets", "name_bytes", "node_of", "euler", "tour_depth", "first", "sparse")
+SOURCE_FILES = ("nodes.dmp", "names.dmp", "merged.dmp")
+
+
+@dataclass(frozen=True)
+class Taxon:
+    """One node of the taxonomy."""
+    taxid: int
+    name: str
+    rank: str
+
+
+@dataclass
+class TaxonomySummary:
+    """Taxonomic interpretation of the hits of one or more BLAST searches."""
+    hits: int  # subject votes (best HSP per query and subject)
+    unplaced: int  # votes without a taxid known to the taxonomy
+    lca: Optional[Taxon] = None  # LCA of every placed subject
+    weighted_lca: Optional[Taxon] = None  # deepest taxon with at least min_support of the votes
+    support: float = 0.0  # share of the votes under weighted_lca
+    lineage: List[Taxon] = field(default_factory=list)  # root to weighted_lca, major ranks only
+    top_taxa: List[Tuple[Taxon, float]] = field(default_factory=list)  # subject taxa by share of votes
+
+    def describe(self) -> str:
+        """A few lines for the reporter's prompt."""
+        if self.weighted_lca is None:
+            return f"{self.hits} subject(s), none placed in the taxonomy."
+        lines = [
+            f"{self.hits - self.unplaced} of {self.hits} subject(s) placed in the taxonomy.",
+            f"Weighted LCA: {self.weighted_lca.name} ({self.weighted_lca.rank}, taxid {self.weighted_lca.taxid}) "
+            f"with {self.support:.0%} of the bit-score votes",
+            f"Lineage: {' > '.join(taxon.name for taxon in self.lineage)}",
+        ]
+        if self.lca is not None and self.lca != self.weighted_lca:
+            lines.append(f"LCA of all subjects: {self.lca.name} ({self.lca.rank})")
+        lines.extend(f"  - {taxon.name} ({taxon.rank}): {share:.0%}" for taxon, share in self.top_taxa)
+        return "\n".join(lines)
+
+
+def _read_dmp(path: Path) -> Iterator[List[str]]:
+    """Fields of each line of a taxdump file (`a\\t|\\tb\\t|\\n`)."""
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.rstrip("\n")
+            if line.endswith("\t|"):
+                line = line[:-2]
+            if line:
+                yield line.split("\t|\t")
+
+
+def _euler_tour(parent: np.ndarray, root: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Euler tour, node depths and first tour positions of the tree rooted at `root`."""
+    n = len(parent)
+    nodes = np.arange(n, dtype=np.int32)
+    is_child = nodes != root
+    order = np.argsort(parent[is_child], kind="stable")
+    children = nodes[is_child][order].tolist()
+    # Children of node i are children[next_child[i]:ends[i]]
+    sorted_parents = parent[is_child][order]
+    next_child = np.searchsorted(sorted_parents, nodes, side="left").tolist()
+    ends = np.searchsorted(sorted_parents, nodes, side="right").tolist()
+
+    tour = [root]
+    depth = [0] * n
+    first = [0] * n
+    stack = [root]
+    while stack:
+        node = stack[-1]
+        position = next_child[node]
+        if position < ends[node]:
+            next_child[node] = position + 1
+            child = children[position]
+            depth[child] = depth[node] + 1
+            first[child] = len(tour)
+            tour.append(child)
+            stack.append(child)
+        else:
+            stack.pop()
+            if stack:
+                tour.append(stack[-1])
+    if len(tour) != 2 * n - 1:
+        raise ValueError("nodes.dmp is not a tree: some nodes are not reachable from the root")
+    return np.array(tour, dtype=np.int32), np.array(depth, dtype=np.int32), np.array(first, dtype=np.int32)
+
+
+def _sparse_table(tour_depth: np.ndarray) -> np.ndarray:
+    """Tour position of the shallowest entry of each run of 2**level blocks, by level and first block."""
+    blocks = -(-len(tour_depth) // BLOCK_SIZE)
+    padded = np.full(blocks * BLOCK_SIZE, np.iinfo(np.int32).max, dtype=np.int32)
+    padded[:len(tour_depth)] = tour_depth
+    best = (np.argmin(padded.reshape(blocks, BLOCK_SIZE), axis=1) + np.arange(blocks) * BLOCK_SIZE).astype(np.int32)
+    levels = [best]
+    width = 1
+    while 2 * width <= blocks:
+        previous = levels[-1]
+        right = np.concatenate([previous[width:], previous[-width:]])
+        levels.append(np.where(padded[right] < padded[previous], right, previous))
+        width *= 2
+    return np.stack(levels)
+
+
+def build_taxonomy_index(taxdump_dir: Union[str, Path]) -> Dict[str, np.ndarray]:
+    """
+    Parse a taxdump directory into the arrays of a `TaxonomyIndex`.
+
+    Raises:
+        FileNotFoundError: If nodes.dmp or names.dmp is missing
+        ValueError: If the nodes do not form a single tree
+    """
+    taxdump_dir = Path(taxdump_dir)
+    taxid_list, parent_list, rank_list = [], [], []
+    for fields in _read_dmp(taxdump_dir / "nodes.dmp"):
+        taxid_list.append(int(fields[0]))
+        parent_list.append(int(fields[1]))
+        rank_list.append(fields[2])
+    names = {
+        int(fields[0]): fields[1]
+        for fields in _read_dmp(taxdump_dir / "names.dmp")
+        if len(fields) > 3 and fields[3] == "scientific name"
+    }
+    merged = [(int(f[0]), int(f[1])) for f in _read_dmp(taxdump_dir / "merged.dmp")] if (taxdump_dir / "merged.dmp").exists() else []
+
+    taxids = np.array(taxid_list, dtype=np.int32)
+    max_taxid = max([int(taxids.max())] + [old for old, _ in merged])
+    node_of = np.full(max_taxid + 1, -1, dtype=np.int32)
+    node_of[taxids] = np.arange(len(taxids), dtype=np.int32)
+    parent_taxids = np.array(parent_list, dtype=np.int64)
+    if parent_taxids.max() > max_taxid or (node_of[parent_taxids] < 0).any():
+        raise ValueError("nodes.dmp refers to parent taxids it does not define")
+    parent = node_of[parent_taxids]
+    roots = np.flatnonzero(parent == np.arange(len(parent)))
+    if len(roots) != 1:
+        raise ValueError(f"nodes.dmp must have exactly one root, found {len(roots)}")
+    for old, new in merged:
+        if new <= max_taxid:
+            node_of[old] = node_of[new]
+
+    euler, depth, first = _euler_tour(parent, int(roots[0]))
+    tour_depth = depth[euler]
+    ranks, rank_codes = np.unique(np.array(rank_list), return_inverse=True)
+    encoded = [names.get(taxid, str(taxid)).encode() for taxid in taxid_list]
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+    return {
+        "taxids": taxids,
+        "parent": parent,
+        "depth": depth,
+        "rank": rank_codes.astype(np.int16),
+        "ranks": ranks,
+        "name_offsets": name_offsets,
+        "name_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "node_of": node_of,
+        "euler": euler,
+        "tour_depth": tour_depth,
+        "first": first,
+        "sparse": _sparse_table(tour_depth),
+    }
+
+
+class TaxonomyIndex:
+    """
+    Array-backed NCBI taxonomy with constant-time LCA queries.
+
+    Build one with `TaxonomyIndex.from_taxdump`, or load the cached arrays with
+    `load_taxonomy`. Methods take and return NCBI taxids; taxids the taxonomy
+    does not know are ignored.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.taxids: np.ndarray = arrays["taxids"]
+        self.parent: np.ndarray = arrays["parent"]
+        self.depth: np.ndarray = arrays["depth"]
+        self.rank: np.ndarray = arrays["rank"]
+        self.name_offsets: np.ndarray = arrays["name_offsets"]
+        self.name_bytes: np.ndarray = arrays["name_bytes"]
+        self.node_of: np.ndarray = arrays["node_of"]
+        self.euler: np.ndarray = arrays["euler"]
+        self.tour_depth: np.ndarray = arrays["tour_depth"]
+        self.first: np.ndarray = arrays["first"]
+        self.sparse: np.ndarray = arrays["sparse"]
+        self.ranks: List[str] = [str(rank) for rank in arrays["ranks"]]
+
+    @classmethod
+    def from_taxdump(cls, taxdump_dir: Union[str, Path]) -> "TaxonomyIndex":
+        """Parse a taxdump directory into an in-memory index."""
+        return cls(build_taxonomy_index(taxdump_dir))
+
+    def __len__(self) -> int:
+        return len(self.taxids)
+
+    def save(self, cache_dir: Union[str, Path], sources: Optional[Dict[str, List[int]]] = None) -> None:
+        """Write the arrays as `.npy` files, replacing any earlier cache in `cache_dir`."""
+        cache_dir = Path(cache_dir)
+        cache_dir.parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f".{cache_dir.name}-", dir=cache_dir.parent))
+        for name in ARRAYS:
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(getattr(self, name)))
+        meta = {"version": CACHE_VERSION, "ranks": self.ranks, "sources": sources or {}}
+        (staging / "meta.json").write_text(json.dumps(meta))
+        # Move the old cache aside in one rename, so a process loading it never sees it half deleted
+        retired = staging.with_name(f"{staging.name}-old")
+        try:
+            os.rename(cache_dir, retired)
+        except FileNotFoundError:
+            pass
+        try:
+            os.replace(staging, cache_dir)
+        except OSError:
+            # Another process wrote the same cache first
+            shutil.rmtree(staging, ignore_errors=True)
+        shutil.rmtree(retired, ignore_errors=True)
+
+    @classmethod
+    def load(cls, cache_dir: Union[str, Path]) -> "TaxonomyIndex":
+        """Memory-map the arrays saved in `cache_dir`."""
+        cache_dir = Path(cache_dir)
+        meta = json.loads((cache_dir / "meta.json").read_text())
+        arrays = {name: np.load(cache_dir / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+        arrays["ranks"] = np.array(meta["ranks"])
+        return cls(arrays)
+
+    def _nodes(self, taxids: Iterable[int]) -> np.ndarray:
+        """Node indexes of the known taxids, in order."""
+        taxids = np.asarray(taxids if isinstance(taxids, np.ndarray) else list(taxids), dtype=np.int64)
+        in_range = (taxids >= 0) & (taxids < len(self.node_of))
+        nodes = np.full(len(taxids), -1, dtype=np.int64)
+        nodes[in_range] = self.node_of[taxids[in_range]]
+        return nodes
+
+    def _taxon(self, node: int) -> Taxon:
+        start, end = self.name_offsets[node], self.name_offsets[node + 1]
+        name = bytes(self.name_bytes[start:end]).decode()
+        return Taxon(int(self.taxids[node]), name, self.ranks[int(self.rank[node])])
+
+    def taxon(self, taxid: int) -> Optional[Taxon]:
+        """Name and rank of a taxid (merged taxids resolve to their replacement)."""
+        node = int(self._nodes([taxid])[0])
+        return self._taxon(node) if node >= 0 else None
+
+    def lineage(self, taxid: int, major_only: bool = False) -> List[Taxon]:
+        """Taxa from the root down to `taxid`, optionally only the major ranks and `taxid` itself."""
+        node = int(self._nodes([taxid])[0])
+        if node < 0:
+            return []
+        path = [node]
+        while self.parent[path[-1]] != path[-1]:
+            path.append(int(self.parent[path[-1]]))
+        taxa = [self._taxon(n) for n in reversed(path)]
+        if major_only:
+            taxa = [taxon for taxon in taxa[:-1] if taxon.rank in MAJOR_RANKS] + taxa[-1:]
+        return taxa
+
+    def _shallowest(self, lo: int, hi: int) -> int:
+        """Tour position of the shallowest entry in tour[lo:hi + 1]."""
+        depth = self.tour_depth
+        first_block, last_block = lo // BLOCK_SIZE, hi // BLOCK_SIZE
+        if last_block - first_block <= 1:
+            return lo + int(np.argmin(depth[lo:hi + 1]))
+        edge = (first_block + 1) * BLOCK_SIZE
+        candidates = [
+            lo + int(np.argmin(depth[lo:edge])),
+            last_block * BLOCK_SIZE + int(np.argmin(depth[last_block * BLOCK_SIZE:hi + 1])),
+        ]
+        inner_first, inner_last = first_block + 1, last_block - 1
+        level = (inner_last - inner_first + 1).bit_length() - 1
+        candidates.append(int(self.sparse[level, inner_first]))
+        candidates.append(int(self.sparse[level, inner_last - (1 << level) + 1]))
+        return min(candidates, key=lambda position: depth[position])
+
+    def lca(self, taxids: Iterable[int]) -> Optional[int]:
+        """Taxid of the lowest common ancestor of the known taxids (None if there are none)."""
+        nodes = self._nodes(taxids)
+        nodes = nodes[nodes >= 0]
+        if not len(nodes):
+            return None
+        positions = self.first[nodes]
+        return int(self.taxids[self.euler[self._shallowest(int(positions.min()), int(positions.max()))]])
+
+    def group_lca(self, taxids: np.ndarray, starts: np.ndarray) -> np.ndarray:
+        """
+        Taxid of the LCA of each group of consecutive known taxids.
+
+        Groups begin at the positions in `starts` (ascending, starting with 0).
+        Groups spanning the same tour range share one range-minimum query.
+        """
+        positions = self.first[self._nodes(taxids)]
+        ranges = np.stack([np.minimum.reduceat(positions, starts), np.maximum.reduceat(positions, starts)], axis=1)
+        distinct, inverse = np.unique(ranges, axis=0, return_inverse=True)
+        nodes = np.array([self.euler[self._shallowest(int(lo), int(hi))] for lo, hi in distinct], dtype=np.int64)
+        return self.taxids[nodes][inverse.reshape(-1)]
+
+    def ancestor_at_rank(self, taxid: int, rank: str) -> Optional[Taxon]:
+        """The taxon of `rank` on the lineage of `taxid` (`taxid` itself included), if any."""
+        return next((taxon for taxon in self.lineage(taxid) if taxon.rank == rank), None)
+
+    def support(
+        self, taxids: Iterable[int], weights: Optional[Union[Sequence[float], np.ndarray]] = None
+    ) -> Dict[int, float]:
+        """Share of the total weight held by every taxon on the lineages of the known taxids."""
+        nodes = self._nodes(taxids)
+        weight = np.ones(len(nodes)) if weights is None else np.asarray(weights, dtype=np.float64)
+        known = nodes >= 0
+        nodes, weight = nodes[known], weight[known]
+        total = weight.sum()
+        if not len(nodes) or total <= 0:
+            return {}
+        # Climb all lineages together; each taxon is counted once per lineage it is on
+        levels, level_weights = [nodes], [weight]
+        while len(nodes):
+            parents = self.parent[nodes].astype(np.int64)
+            climbing = parents != nodes
+            nodes, weight = parents[climbing], weight[climbing]
+            levels.append(nodes)
+            level_weights.append(weight)
+        taxa, inverse = np.unique(np.concatenate(levels), return_inverse=True)
+        shares = np.bincount(inverse, weights=np.concatenate(level_weights)) / total
+        return dict(zip(self.taxids[taxa].tolist(), shares.tolist(), strict=True))
+
+    def weighted_lca(
+        self,
+        taxids: Iterable[int],
+        weights: Optional[Union[Sequence[float], np.ndarray]] = None,
+        min_support: float = 0.5,
+    ) -> Optional[Tuple[int, float]]:
+        """Deepest taxon holding at least `min_support` of the weight, with its share."""
+        shares = self.support(taxids, weights)
+        eligible = [(taxid, share) for taxid, share in shares.items() if share >= min_support - 1e-9]
+        if not eligible:
+            return None
+        return max(eligible, key=lambda item: (int(self.depth[self.node_of[item[0]]]), item[1], -item[0]))
+
+    def summarize(self, results: List[BlastResult], min_support: float = 0.5, top: int = 5) -> TaxonomySummary:
+        """
+        Weighted LCA and lineage of the subjects hit by BLAST results.
+
+        Each query and subject pair votes once, with its best bit score.
+        """
+        best: Dict[Tuple[Optional[str], Optional[str]], Tuple[float, Optional[int]]] = {}
+        for result in results:
+            table = BlastHitTable.from_result(result)
+            for query_id, subject_id, bit_score, taxid in zip(
+                table.strings("query_id"), table.strings("subject_id"),
+                table.records["bit_score"].tolist(), table.optional_ints("subject_taxid"), strict=True,
+            ):
+                key = (query_id, subject_id)
+                if key not in best or bit_score > best[key][0]:
+                    best[key] = (bit_score, taxid)
+
+        scores = np.array([score for score, _ in best.values()], dtype=np.float64)
+        taxids = np.array([-1 if taxid is None else taxid for _, taxid in best.values()], dtype=np.int64)
+        placed = self._nodes(taxids) >= 0
+        summary = TaxonomySummary(hits=len(best), unplaced=int((~placed).sum()))
+        if not placed.any():
+            return summary
+
+        scores, taxids = scores[placed], taxids[placed]
+        lca = self.lca(taxids)
+        summary.lca = self.taxon(lca) if lca is not None else None
+        chosen = self.weighted_lca(taxids, scores, min_support)
+        if chosen is not None:
+            summary.weighted_lca = self.taxon(chosen[0])
+            summary.support = chosen[1]
+            summary.lineage = self.lineage(chosen[0], major_only=True)
+        nodes = self._nodes(taxids)
+        leaves, inverse = np.unique(nodes, return_inverse=True)
+        shares = np.bincount(inverse, weights=scores) / scores.sum()
+        order = np.argsort(-shares, kind="stable")[:top]
+        summary.top_taxa = [(self._taxon(int(leaves[i])), float(shares[i])) for i in order]
+        return summary
+
+
+def _source_stamps(taxdump_dir: Path) -> Dict[str, List[int]]:
+    stamps = {}
+    for name in SOURCE_FILES:
+        path = taxdump_dir / name
+        if path.exists():
+            stat = path.stat()
+            stamps[name] = [stat.st_size, stat.st_mtime_ns]
+    return stamps
+
+
+_loaded: Dict[Tuple[str, str], TaxonomyIndex] = {}
+_loaded_lock = threading.Lock()
+
+
+def load_taxonomy(taxdump_dir: Union[str, Path], cache_dir: Optional[Union[str, Path]] = None) -> TaxonomyIndex:
+    """
+    The taxonomy of a taxdump directory, memory-mapped from its cached arrays.
+
+    The cache (`<taxdump_dir>/storyseq-taxonomy` unless `cache_dir` is given) is
+    rebuilt when the dump files change. Indexes are shared within the process.
+    """
+    taxdump_dir = Path(taxdump_dir).expanduser()
+    cache_dir = Path(cache_dir).expanduser() if cache_dir else taxdump_dir / CACHE_DIRNAME
+    sources = _source_stamps(taxdump_dir)
+    key = (str(cache_dir.resolve()), json.dumps(sources, sort_keys=True))
+    with _loaded_lock:
+        if key in _loaded:
+            return _loaded[key]
+        try:
+            meta = json.loads((cache_dir / "meta.json").read_text())
+        except (OSError, ValueError):
+            meta = {}
+        if meta.get("version") != CACHE_VERSION or meta.get("sources") != sources:
+            print(f"[taxonomy] Indexing the taxdump in {taxdump_dir}")
+            TaxonomyIndex.from_taxdump(taxdump_dir).save(cache_dir, sources)
+        _loaded[key] = TaxonomyIndex.load(cache_dir)
+        return _loaded[key]
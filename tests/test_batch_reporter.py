@@ -0,0 +1,121 @@
+"""Tests for map-reduce batch narratives."""
+
+import asyncio
+import re
+from pathlib import Path
+from typing import List
+
+import pytest
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, UserPromptPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from story_seq.agent.batch_reporter import (
+    BatchReporter,
+    content_defined_groups,
+    split_results_by_query,
+)
+from story_seq.config import StorySeqConfig
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult
+
+
+def hit(query_id: str) -> BlastHit:
+    return BlastHit(query_id=query_id, subject_id=f"S_{query_id}", identity=99.0, alignment_length=100,
+                    evalue=1e-40, bit_score=180.0, query_start=1, query_end=100, subject_start=1, subject_end=100)
+
+
+def batch(query_ids: List[str]) -> List[BlastResult]:
+    # One search over the whole batch; the last query found nothing
+    return [BlastResult(query_length=100, database="nt", blast_method="megablast", search_reason="identify",
+                        hits=[hit(q) for q in query_ids[:-1]])]
+
+
+def test_groups_are_stable_when_an_id_is_inserted() -> None:
+    ids = [f"contig{i}" for i in range(300)]
+    before = [tuple(ids[i] for i in group) for group in content_defined_groups(ids, 8, 0)]
+    ids.insert(150, "contig_new")
+    after = [tuple(ids[i] for i in group) for group in content_defined_groups(ids, 8, 0)]
+
+    assert sum(map(len, after)) == 301
+    assert all(len(group) <= 16 for group in after)
+    assert 300 / len(before) > 4  # averages about 8 per group
+    assert len(set(after) - set(before)) <= 2
+
+
+def test_split_results_by_query_maps_orf_hits_to_their_record() -> None:
+    records = {"c1": None, "c2": None, "c3": None}
+    result = BlastResult(query_length=200, database="nr", blast_method="blastp", search_reason="function",
+                         hits=[hit("c1_orf1_1-600_f"), hit("c2"), hit("c1")])
+    per_query = split_results_by_query(records, [result])
+    assert [len(per_query[q][0].hits) if per_query[q] else 0 for q in records] == [2, 1, 0]
+
+
+def test_batch_report_is_bounded_and_reruns_only_the_changed_branch(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    calls = {"map": [], "reduce": 0}
+    in_flight = [0, 0]  # current, peak
+
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        prompt = [p.content for m in messages for p in m.parts if isinstance(p, UserPromptPart)][-1]
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        if info.function_tools:
+            query_id = re.search(r"about query (\S+) only", prompt)[1]
+            calls["map"].append(query_id)
+            return ModelResponse(parts=[TextPart(f"{query_id} is E. coli.")])
+        calls["reduce"] += 1
+        covered = re.search(r"covering (\d+) queries", prompt)[1]
+        return ModelResponse(parts=[TextPart(f"{covered} queries merged.")])
+
+    model = lambda *a, **k: FunctionModel(respond)  # noqa: E731
+    monkeypatch.setattr("story_seq.agent.reporter_agent.OpenAIModel", model)
+    monkeypatch.setattr("story_seq.agent.batch_reporter.OpenAIModel", model)
+    config = StorySeqConfig(llm_api_url="http://localhost:1/v1", reporter_fanout=3, reporter_reduce_width=4,
+                            narrative_cache_path=str(tmp_path / "narratives.sqlite"))
+
+    def report(query_ids: List[str]) -> str:
+        reporter = BatchReporter(config, "What are these?", AnalysisConfig(identify_unknown_dna=True))
+        return asyncio.run(reporter.run(dict.fromkeys(query_ids), batch(query_ids)))
+
+    query_ids = [f"contig{i}" for i in range(40)]
+    assert report(query_ids) == "40 queries merged."
+    assert sorted(calls["map"]) == sorted(query_ids[:-1])  # the query without hits needs no call
+    assert in_flight[1] <= 3
+    first_reduces = calls["reduce"]
+
+    # Unchanged batch: everything comes from the cache
+    calls.update(map=[], reduce=0)
+    assert report(query_ids) == "40 queries merged."
+    assert calls == {"map": [], "reduce": 0}
+
+    # One query added: one map call and one reduce call per level of the tree
+    query_ids.insert(20, "contig_new")
+    assert report(query_ids) == "41 queries merged."
+    assert calls["map"] == ["contig_new"]
+    assert 1 <= calls["reduce"] < first_reduces
+
+
+def test_concurrent_batches_share_identical_narrative_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    async def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        prompt = [p.content for m in messages for p in m.parts if isinstance(p, UserPromptPart)][-1]
+        calls.append("map" if info.function_tools else "reduce")
+        await asyncio.sleep(0.02)
+        return ModelResponse(parts=[TextPart(prompt[-40:])])
+
+    model = lambda *a, **k: FunctionModel(respond)  # noqa: E731
+    monkeypatch.setattr("story_seq.agent.reporter_agent.OpenAIModel", model)
+    monkeypatch.setattr("story_seq.agent.batch_reporter.OpenAIModel", model)
+    config = StorySeqConfig(llm_api_url="http://localhost:1/v1", narrative_cache_path=None)
+    query_ids = [f"contig{i}" for i in range(6)]
+
+    async def both() -> List[str]:
+        reporters = [BatchReporter(config, "Same question", AnalysisConfig(identify_unknown_dna=True)) for _ in range(2)]
+        return await asyncio.gather(*(r.run(dict.fromkeys(query_ids), batch(query_ids)) for r in reporters))
+
+    first, second = asyncio.run(both())
+    assert first == second
+    assert calls.count("map") == 5  # not 10: the second batch waited for the first one's calls
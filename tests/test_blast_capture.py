@@ -0,0 +1,189 @@
+"""Tests for capturing BLAST tool results outside the model's output."""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Callable, List
+
+import pytest
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelResponse,
+    RetryPromptPart,
+    ToolCallPart,
+    ToolReturnPart,
+)
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+from pydantic_ai.toolsets import FunctionToolset
+
+from story_seq.agent.blast_agent import BlastAgentDeps, get_blast_agent
+from story_seq.agent.blast_capture import (
+    BlastSearchSelection,
+    decode_tool_payload,
+    join_selected_searches,
+)
+from story_seq.loadtest.fake_ncbi_mcp import fake_blast_report
+
+QUERY = ">q1\n" + "ACGTTGCAAGGCTTAC" * 20 + "\n"
+
+
+def blast_search(sequence: str, program: str = "blastn") -> str:
+    """Return an NCBI BLAST JSON2 report, wrapped like MCP structured content."""
+    return json.dumps({"result": json.dumps(fake_blast_report(sequence, program=program, max_hits=40))})
+
+
+def esummary(ids: str) -> str:
+    """Return a plain-text document summary."""
+    return f"{ids}: Synthetic construct, complete sequence"
+
+
+def parts(messages: List[ModelMessage], kind: type) -> list:
+    return [part for message in messages for part in message.parts if isinstance(part, kind)]
+
+
+def run_agent(
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    respond: Callable[[List[ModelMessage], AgentInfo], ModelResponse],
+) -> tuple:
+    """Run the real BLAST agent with `respond` as the model and local tools as the MCP server."""
+    query = tmp_path / "query.fna"
+    query.write_text(QUERY)
+    seen: List[List[ModelMessage]] = []
+
+    def model_function(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        seen.append(messages)
+        return respond(messages, info)
+
+    monkeypatch.setattr("story_seq.agent.blast_agent.OpenAIModel", lambda *a, **k: FunctionModel(model_function))
+    monkeypatch.setattr("story_seq.agent.blast_agent.MCPServerStdio", lambda *a, **k: FunctionToolset([blast_search, esummary]))
+
+    agent = asyncio.run(get_blast_agent(llm_api_url="http://localhost:1/v1", llm_api_key="."))
+    deps = BlastAgentDeps(query_file=query, database="nt")
+    result = asyncio.run(agent.run("What is this?", deps=deps))
+    return result, deps, seen[-1]
+
+
+def test_blast_reports_are_captured_and_joined(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        returns = parts(messages, ToolReturnPart)
+        if not returns:
+            return ModelResponse(parts=[
+                ToolCallPart("blast_search", {"sequence": QUERY}),
+                ToolCallPart("blast_search", {"sequence": QUERY, "program": "blastx"}),
+                ToolCallPart("esummary", {"ids": "FK1.1"}),
+            ])
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"response": [
+            {"search_id": "S2", "search_reason": "distant homologs", "subject_summaries": {}},
+            {"search_id": "S1", "search_reason": "species identification"},
+        ]})])
+
+    result, deps, messages = run_agent(tmp_path, monkeypatch, respond)
+
+    returns = [part.content for part in parts(messages, ToolReturnPart)]
+    summaries = [content for content in returns if isinstance(content, dict)]
+    # The model saw short summaries, not 40 hits per search; other tools pass through
+    assert sorted(s["searches"][0]["search_id"] for s in summaries) == ["S1", "S2"]
+    assert all(len(s["searches"][0]["top_hits"]) == 5 for s in summaries)
+    assert "FK1.1: Synthetic construct, complete sequence" in returns
+
+    joined = join_selected_searches(deps.captured_searches, result.output)
+    assert [(r.search_reason, r.num_hits) for r in joined] == [("distant homologs", 40), ("species identification", 40)]
+    methods = {r.search_reason: r.blast_method for r in joined}
+    assert methods["distant homologs"] == deps.captured_searches["S2"].blast_method
+
+
+def test_unknown_search_ids_are_sent_back_to_the_model(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        if not parts(messages, ToolReturnPart):
+            return ModelResponse(parts=[ToolCallPart("blast_search", {"sequence": QUERY})])
+        search_id = "S1" if parts(messages, RetryPromptPart) else "S7"
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"response": [
+            {"search_id": search_id, "search_reason": "species identification"},
+        ]})])
+
+    result, deps, messages = run_agent(tmp_path, monkeypatch, respond)
+
+    retry = parts(messages, RetryPromptPart)[0]
+    assert "S7" in str(retry.content) and "captured searches: S1" in str(retry.content)
+    assert [s.search_id for s in result.output] == ["S1"]
+
+
+def test_join_fills_subject_summaries_and_defaults_to_every_search() -> None:
+    from story_seq.util.blast_json import parse_blast_json
+
+    first, second = (parse_blast_json(fake_blast_report(QUERY, program=p, max_hits=3))[0] for p in ("blastn", "blastx"))
+    captured = {"S1": first, "S2": second}
+    subject = first.hits[0].subject_id
+
+    joined = join_selected_searches(captured, [
+        BlastSearchSelection(search_id="S1", search_reason="identify", subject_summaries={subject: "Synthetic construct"}),
+    ])
+    assert len(joined) == 1
+    assert joined[0].hits[0].genbank_summary == "Synthetic construct"
+    assert first.hits[0].genbank_summary.endswith("synthetic sequence 1")
+
+    everything = join_selected_searches(captured, [])
+    assert [r.search_reason for r in everything] == ["blastn search against nt", "blastx search against nt"]
+
+
+def test_decode_tool_payload() -> None:
+    assert decode_tool_payload(json.dumps({"result": json.dumps({"a": 1})})) == {"a": 1}
+    assert decode_tool_payload('BLAST finished:\n{"report": {}}') == {"report": {}}
+    assert decode_tool_payload("No hits found") is None
+
+
+def test_parallel_blast_calls_are_capped(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    in_flight = [0, 0]  # current, peak
+
+    async def slow_blast_search(sequence: str, program: str = "blastn") -> str:
+        """Return a BLAST report after a delay."""
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0.05)
+        in_flight[0] -= 1
+        return blast_search(sequence, program)
+
+    def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        if not parts(messages, ToolReturnPart):
+            return ModelResponse(parts=[
+                ToolCallPart("slow_blast_search", {"sequence": QUERY, "program": program})
+                for program in ("blastn", "blastx", "tblastx")
+            ])
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"response": []})])
+
+    query = tmp_path / "query.fna"
+    query.write_text(QUERY)
+    monkeypatch.setattr("story_seq.agent.blast_agent.OpenAIModel", lambda *a, **k: FunctionModel(respond))
+    monkeypatch.setattr("story_seq.agent.blast_agent.MCPServerStdio", lambda *a, **k: FunctionToolset([slow_blast_search]))
+
+    agent = asyncio.run(get_blast_agent(llm_api_url="http://localhost:1/v1", llm_api_key=".", max_concurrent_searches=2))
+    deps = BlastAgentDeps(query_file=query, database="nt")
+    asyncio.run(agent.run("What is this?", deps=deps))
+
+    assert len(deps.captured_searches) == 3
+    assert in_flight[1] == 2
+
+
+def test_parse_blast_json_takes_query_ids_from_the_title() -> None:
+    from story_seq.util.blast_json import parse_blast_json
+
+    def search(number: int, title: str) -> dict:
+        hsp = {"bit_score": 90.0, "evalue": 1e-20, "identity": 50, "align_len": 50,
+               "query_from": 1, "query_to": 50, "hit_from": 1, "hit_to": 50}
+        return {"query_id": f"Query_{number}", "query_title": title, "query_len": 200,
+                "hits": [{"description": [{"accession": "AB1.1", "title": "Synthetic", "taxid": 32630}],
+                          "hsps": [hsp]}]}
+
+    report = {"BlastOutput2": [
+        {"report": {"program": "blastn", "search_target": {"db": "nt"},
+                    "results": {"search": search(1, "contig_7 length=200 cov=12.5")}}},
+        {"report": {"program": "blastn", "search_target": {"db": "nt"},
+                    "results": {"search": search(2, "contig_8")}}},
+        {"report": {"program": "blastn", "search_target": {"db": "nt"},
+                    "results": {"search": {**search(3, ""), "query_title": None}}}},
+    ]}
+
+    results = parse_blast_json(json.dumps(report))
+    assert [r.hits[0].query_id for r in results] == ["contig_7", "contig_8", "Query_3"]
+    assert parse_blast_json(fake_blast_report(QUERY, max_hits=1))[0].hits[0].query_id == "q1"
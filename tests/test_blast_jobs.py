@@ -0,0 +1,137 @@
+"""Tests for remote BLAST jobs over the URL API, against a local stand-in server."""
+
+import asyncio
+import time
+from itertools import pairwise
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from story_seq.agent.blast_jobs import (
+    BlastJobError,
+    BlastJobManager,
+    BlastSearchRequest,
+    blast_job_managers,
+    get_blast_job_manager,
+    parse_qblast_info,
+)
+from story_seq.loadtest.fake_blast_url_api import FakeBlastURLAPI
+from story_seq.util.blast_json import parse_blast_json
+
+QUERY = ">q1\n" + "ACGTTGCAAGGCTTAC" * 20 + "\n"
+FAST = {"min_request_interval": 0.02, "min_poll_interval": 0.05, "max_poll_interval": 0.2}
+
+
+def test_parse_qblast_info() -> None:
+    page = "<html><!--\nQBlastInfoBegin\n    RID = 7DZ1K3B9016\n    RTOE = 27\nQBlastInfoEnd\n--></html>"
+    assert parse_qblast_info(page) == {"RID": "7DZ1K3B9016", "RTOE": "27"}
+    assert parse_qblast_info("QBlastInfoBegin\n\tStatus=WAITING\nQBlastInfoEnd")["Status"] == "WAITING"
+    assert parse_qblast_info("<html>no info</html>") == {}
+
+
+def test_batch_is_submitted_up_front_and_polled_together() -> None:
+    run_seconds = {"megablast": 0.1, "blastx": 0.6, "tblastx": 0.3}
+
+    async def main(url: str) -> Tuple[BlastJobManager, List[Dict[str, Any]], Dict[str, float], float]:
+        manager = get_blast_job_manager(url, **FAST)
+        assert get_blast_job_manager(url) is manager  # shared by every pipeline on the loop
+        started = time.monotonic()
+        futures = [await manager.submit(BlastSearchRequest(QUERY, program)) for program in run_seconds]
+        finished: Dict[str, float] = {}
+        for program, future in zip(run_seconds, futures, strict=True):
+            future.add_done_callback(lambda _, p=program: finished.setdefault(p, time.monotonic() - started))
+        reports = await asyncio.gather(*futures)
+        await manager.aclose()
+        return manager, reports, finished, time.monotonic() - started
+
+    with FakeBlastURLAPI(run_seconds=run_seconds) as server:
+        manager, reports, finished, elapsed = asyncio.run(main(server.url))
+
+    assert [parse_blast_json(r)[0].blast_method for r in reports] == ["megablast", "blastx", "tblastx"]
+    # Each search is delivered as soon as it is ready, and the batch takes about as long as its slowest search
+    assert sorted(finished, key=finished.get) == ["megablast", "tblastx", "blastx"]
+    assert elapsed < 0.6 + 0.2 + 0.5
+    # The whole batch is submitted before any report comes back; every request is spaced,
+    # and no RID is polled too often
+    kinds = [kind for _, kind, _ in server.log]
+    assert kinds.count("Put") == 3 and max(i for i, k in enumerate(kinds) if k == "Put") < kinds.index("JSON2_S")
+    stamps = [stamp for stamp, _, _ in server.log]
+    assert all(b - a >= 0.015 for a, b in pairwise(stamps))
+    for rid in server.searches:
+        polls = [stamp for stamp, kind, r in server.log if kind == "SearchInfo" and r == rid]
+        assert all(b - a >= 0.045 for a, b in pairwise(polls))
+        assert server.count("JSON2_S", rid) == 1
+    assert manager.requests["status"] == server.count("SearchInfo") < 3 * 0.6 / 0.02
+
+
+def test_expired_rid_fails_its_future() -> None:
+    async def main(url: str, server: FakeBlastURLAPI) -> None:
+        manager = get_blast_job_manager(url, **FAST)
+        future = await manager.submit(BlastSearchRequest(QUERY, "blastn"))
+        server.searches.clear()  # the server forgot the RID
+        try:
+            with pytest.raises(BlastJobError, match="status UNKNOWN"):
+                await future
+        finally:
+            await manager.aclose()
+
+    with FakeBlastURLAPI(default_run_seconds=1.0) as server:
+        asyncio.run(main(server.url, server))
+
+
+def test_waiter_cancelled_mid_poll_does_not_stop_the_poller() -> None:
+    async def main(url: str) -> Dict[str, Any]:
+        manager = get_blast_job_manager(url, **FAST)
+        gone, kept = [await manager.submit(BlastSearchRequest(QUERY, program)) for program in ("blastn", "blastx")]
+        gone_rid = next(rid for rid, job in manager.jobs.items() if job.future is gone)
+        request = manager._request
+
+        async def cancel_while_fetching(kind: str, method: str, params: Dict[str, Any]) -> Any:
+            # The waiter gives up (deadline, cancelled flight) while its report is being fetched
+            if kind == "get" and params["RID"] == gone_rid:
+                gone.cancel()
+            return await request(kind, method, params)
+
+        manager._request = cancel_while_fetching  # type: ignore[method-assign]
+        try:
+            return await asyncio.wait_for(kept, timeout=5)
+        finally:
+            await manager.aclose()
+
+    with FakeBlastURLAPI(run_seconds={"blastn": 0.05, "blastx": 0.3}) as server:
+        report = asyncio.run(main(server.url))
+    assert parse_blast_json(report)[0].blast_method == "blastx"
+
+
+def test_unexpected_poll_error_fails_every_outstanding_search() -> None:
+    async def main(url: str) -> None:
+        manager = get_blast_job_manager(url, **FAST)
+        futures = [await manager.submit(BlastSearchRequest(QUERY, program)) for program in ("blastn", "blastx")]
+
+        async def broken(kind: str, method: str, params: Dict[str, Any]) -> Any:
+            raise KeyError("Status")
+
+        manager._request = broken  # type: ignore[method-assign]
+        try:
+            for future in futures:
+                with pytest.raises(BlastJobError, match="KeyError"):
+                    await asyncio.wait_for(future, timeout=5)
+            assert not manager.jobs
+        finally:
+            await manager.aclose()
+
+    with FakeBlastURLAPI(default_run_seconds=1.0) as server:
+        asyncio.run(main(server.url))
+
+
+def test_managers_are_closed_when_the_last_run_on_the_loop_ends() -> None:
+    async def main() -> None:
+        async with blast_job_managers():
+            manager = get_blast_job_manager("http://blast.invalid/Blast.cgi", **FAST)
+            async with blast_job_managers():
+                assert get_blast_job_manager("http://blast.invalid/Blast.cgi") is manager
+            assert not manager._client.is_closed
+        assert manager._client.is_closed
+        assert get_blast_job_manager("http://blast.invalid/Blast.cgi") is not manager
+
+    asyncio.run(main())
@@ -0,0 +1,232 @@
+"""Tests for the deterministic BLAST escalation policy."""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+import pytest
+
+from story_seq.agent.blast_policy import (
+    EscalationCriteria,
+    PolicyDecision,
+    PolicyStep,
+    check_mcp_tool,
+    is_search_failure,
+    mode_workflow,
+    narrow_workflow,
+    run_blast_policy,
+)
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult
+
+RECORDS = {"q1": None, "q2": None}
+
+
+def search_result(program: str, hits: List[tuple]) -> dict:
+    """A BlastResult-shaped tool payload; hits are (query_id, identity, query_end, evalue)."""
+    return BlastResult(query_length=1000, database="nt", blast_method=program, search_reason="", hits=[
+        BlastHit(query_id=query_id, subject_id=f"{program}_{query_id}", identity=identity, alignment_length=query_end,
+                 evalue=evalue, bit_score=identity, query_start=1, query_end=query_end, subject_start=1,
+                 subject_end=query_end)
+        for query_id, identity, query_end, evalue in hits
+    ]).model_dump()
+
+
+def run(
+    responses: Dict[str, List[tuple]], steps: List[PolicyStep], max_concurrent: int = 3
+) -> Tuple[PolicyDecision, List[tuple], Dict[str, BlastResult], int]:
+    calls: List[tuple] = []
+    in_flight = [0, 0]  # current, peak
+
+    async def search(step: PolicyStep, sequences: str) -> list:
+        calls.append((step.program, sequences))
+        in_flight[0] += 1
+        in_flight[1] = max(in_flight)
+        await asyncio.sleep(0.05)
+        in_flight[0] -= 1
+        return [search_result(step.program, responses[step.program])]
+
+    captured: Dict[str, BlastResult] = {}
+    sequences = {"nucleotide": ">q1\nACGT\n>q2\nACGT\n", "protein": ">q1_orf1\nMK\n"}
+    decision = asyncio.run(run_blast_policy(search, steps, sequences, RECORDS, captured, EscalationCriteria(), max_concurrent))
+    return decision, calls, captured, in_flight[1]
+
+
+def test_mode_workflows() -> None:
+    mode_a = mode_workflow(AnalysisConfig(identify_unknown_dna=True), has_nucleotide=True, has_protein=False)
+    assert [s.program for s in mode_a] == ["megablast", "blastn", "blastx"]
+    # DNA with translated ORFs: blastp on the proteins and tblastx on the DNA together, then context
+    mode_c = mode_workflow(AnalysisConfig(functional_hint=True), has_nucleotide=True, has_protein=True)
+    assert [(s.program, s.molecule, s.stage) for s in mode_c] == [
+        ("blastp", "protein", 1), ("tblastx", "nucleotide", 1), ("megablast", "nucleotide", 2),
+    ]
+    mode_b = mode_workflow(AnalysisConfig(find_protein_homologs=True), True, False)
+    assert [(s.program, s.stage) for s in mode_b] == [("blastx", 1), ("megablast", 1), ("tblastx", 2)]
+    assert mode_workflow(AnalysisConfig(custom_other=True), True, True) == []
+
+
+def test_provisional_taxa_narrow_the_first_search() -> None:
+    steps = mode_workflow(AnalysisConfig(identify_unknown_dna=True), True, False)
+    narrowed = narrow_workflow(steps, [561, 590])
+    assert [(s.program, s.stage, s.entrez_query) for s in narrowed] == [
+        ("megablast", 1, "txid561[Organism:exp] OR txid590[Organism:exp]"),
+        ("megablast", 2, ""), ("blastn", 3, ""), ("blastx", 4, ""),
+    ]
+    assert narrow_workflow(steps, []) == steps
+
+
+def test_certain_taxa_run_only_the_limited_ladder() -> None:
+    steps = mode_workflow(AnalysisConfig(identify_unknown_dna=True), True, False)
+    certain = narrow_workflow(steps, [562], certain=True)
+    assert len(certain) == len(steps) == 3
+    assert [(s.program, s.stage, s.entrez_query) for s in certain] == [
+        ("megablast", 1, "txid562[Organism:exp]"), ("blastn", 2, "txid562[Organism:exp]"),
+        ("blastx", 3, "txid562[Organism:exp]"),
+    ]
+
+
+def test_an_uncertain_call_falls_back_to_the_full_ladder() -> None:
+    steps = narrow_workflow(mode_workflow(AnalysisConfig(identify_unknown_dna=True), True, False), [562])
+    searched = []
+
+    async def search(step: PolicyStep, sequences: str) -> list:
+        searched.append((step.program, bool(step.entrez_query)))
+        # Nothing within the provisional taxon; the unlimited megablast answers both queries
+        hits = [] if step.entrez_query else [("q1", 99.5, 1000, 0.0), ("q2", 98.0, 900, 1e-100)]
+        return [search_result(step.program, hits)]
+
+    decision = asyncio.run(run_blast_policy(search, steps, {"nucleotide": ">q1\nACGT\n"}, RECORDS, {}, EscalationCriteria()))
+    assert decision.action == "stop"
+    assert searched == [("megablast", True), ("megablast", False)]
+
+
+def test_policy_stops_after_the_first_conclusive_search() -> None:
+    steps = mode_workflow(AnalysisConfig(identify_unknown_dna=True), True, False)
+    decision, calls, captured, _ = run({"megablast": [("q1", 99.5, 1000, 0.0), ("q2", 98.0, 900, 1e-100)]}, steps)
+    assert decision.action == "stop"
+    assert [program for program, _ in calls] == ["megablast"]
+    assert calls[0][1].startswith(">q1")
+    assert captured["S1"].search_reason.endswith("(megablast against nt, policy stage 1)")
+
+
+def test_policy_escalates_weak_queries_and_hands_ambiguity_to_the_agent() -> None:
+    steps = mode_workflow(AnalysisConfig(identify_unknown_dna=True), True, False)
+    decision, calls, _, _ = run({
+        "megablast": [("q1", 99.5, 1000, 0.0)],  # q2: no hits
+        "blastn": [("q2", 90.0, 300, 1e-20), ("q2", 85.0, 200, 1.0)],  # fragmentary; the second is not significant
+        "blastx": [("q2", 45.0, 900, 1e-30)],  # substantial but inconclusive
+    }, steps)
+    assert [program for program, _ in calls] == ["megablast", "blastn", "blastx"]
+    assert decision.action == "ambiguous"
+    assert decision.reasons == ["q2: best hit blastx_q2 at 45.0% identity over 90%"]
+
+    # Nothing substantial anywhere on the ladder: stop and let the reporter explain
+    decision, calls, captured, _ = run({"megablast": [("q1", 99.5, 1000, 0.0)], "blastn": [], "blastx": []}, steps)
+    assert decision.action == "stop" and len(captured) == 3
+    assert decision.reasons == ["ladder exhausted; q2: 0 significant hit(s)"]
+
+
+def test_independent_searches_of_a_stage_run_concurrently() -> None:
+    steps = mode_workflow(AnalysisConfig(functional_hint=True), True, True)
+    responses = {"blastp": [("q1_orf1_1-600_f", 45.0, 200, 1e-30)], "tblastx": [("q2", 99.0, 1000, 0.0)],
+                 "megablast": [("q1", 99.9, 1000, 0.0)]}
+
+    decision, calls, captured, peak = run(responses, steps)
+    assert peak == 2  # blastp and tblastx together, then megablast
+    assert [c[0] for c in calls] == ["blastp", "tblastx", "megablast"]
+    assert [r.blast_method for r in captured.values()] == ["blastp", "tblastx", "megablast"]
+    assert decision.action == "stop"
+
+    assert run(responses, steps, max_concurrent=1)[3] == 1
+
+
+def test_mcp_tool_signature_is_checked() -> None:
+    steps = mode_workflow(AnalysisConfig(identify_unknown_dna=True), True, False)
+    properties = {name: {"type": "string"} for name in ("sequence", "program", "database", "max_hits_per_query")}
+
+    def check(schema: dict, tool_steps: List[PolicyStep] = steps) -> None:
+        server = SimpleNamespace(list_tools=lambda: asyncio.sleep(0, [SimpleNamespace(name="blast_search", inputSchema=schema)]))
+        asyncio.run(check_mcp_tool(server, "blast_search", tool_steps))
+
+    check({"properties": properties, "required": ["sequence"]})
+    with pytest.raises(ValueError, match="missing: entrez_query"):
+        check({"properties": properties}, narrow_workflow(steps, [562]))
+    with pytest.raises(ValueError, match="also required: query_file"):
+        check({"properties": properties, "required": ["query_file"]})
+    with pytest.raises(ValueError, match="no 'blast_run' tool"):
+        server = SimpleNamespace(list_tools=lambda: asyncio.sleep(0, [SimpleNamespace(name="blast_search", inputSchema={})]))
+        asyncio.run(check_mcp_tool(server, "blast_run", steps))
+
+
+def test_only_search_failures_hand_over_to_the_agent() -> None:
+    from pydantic_ai import ModelRetry
+
+    try:
+        from builtins import ExceptionGroup
+    except ImportError:  # Python 3.10: the backport anyio uses
+        from exceptiongroup import ExceptionGroup
+
+    assert is_search_failure(ModelRetry("unknown tool")) and is_search_failure(ConnectionRefusedError())
+    assert not is_search_failure(KeyError("q1")) and not is_search_failure(TypeError())
+    assert is_search_failure(ExceptionGroup("startup", [OSError(), ValueError()]))
+    assert not is_search_failure(ExceptionGroup("startup", [OSError(), KeyError()]))
+
+
+def test_mcp_search_waiting_on_a_cancelled_pipeline_searches_on_its_own_server() -> None:
+    from story_seq.agent.blast_policy import mcp_search
+
+    step = mode_workflow(AnalysisConfig(identify_unknown_dna=True), True, False)[0]
+    calls: List[str] = []
+
+    class Server:
+        """An MCP server whose session closes when its pipeline stops."""
+
+        def __init__(self, name: str) -> None:
+            self.name = name
+            self.closed = False
+
+        async def direct_call_tool(self, tool_name: str, args: dict) -> list:
+            calls.append(self.name)
+            await asyncio.sleep(0.05)
+            if self.closed:
+                raise RuntimeError("closed stream")  # not a search failure: it would crash the pipeline
+            return [search_result(args["program"], [("q1", 99.9, 1000, 0.0)])]
+
+    async def pipeline(name: str) -> list:
+        server = Server(name)
+        try:
+            return await mcp_search(server, "blast_search")(step, ">q1\nACGT\n")
+        finally:
+            server.closed = True
+
+    async def main() -> list:
+        first = asyncio.create_task(pipeline("first"))
+        second = asyncio.create_task(pipeline("second"))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(main())[0]["blast_method"] == step.program
+    assert calls == ["first", "second"]
+
+
+def test_a_failed_search_cancels_the_rest_of_its_stage() -> None:
+    steps = mode_workflow(AnalysisConfig(functional_hint=True), True, True)
+    finished: List[str] = []
+
+    async def search(step: PolicyStep, sequences: str) -> list:
+        if step.program == "blastp":
+            raise ValueError("blastp search failed")
+        await asyncio.sleep(0.1)
+        finished.append(step.program)
+        return [search_result(step.program, [])]
+
+    async def main() -> None:
+        with pytest.raises(ValueError, match="blastp"):
+            await run_blast_policy(search, steps, {"nucleotide": ">q1\nACGT\n", "protein": ">q1_orf1\nMK\n"},
+                                   RECORDS, {}, EscalationCriteria())
+        await asyncio.sleep(0.2)
+
+    asyncio.run(main())
+    assert finished == []
@@ -0,0 +1,115 @@
+"""Tests for the rule-based configuration fast path."""
+
+import asyncio
+from typing import Any, NoReturn
+
+import pytest
+from pydantic_graph import GraphRunContext
+
+from story_seq.agent.configuration_rules import classify_request, sketch_alphabet
+from story_seq.config import StorySeqConfig
+from story_seq.pipeline.state import PipelineOptions, PipelineState
+from story_seq.pipeline.tasks import call_blast_agent, call_config_agent
+
+
+def make_sketch(nt_records: int = 0, aa_records: int = 0, has_orfs: bool = False) -> dict:
+    """Create a minimal FASTA sketch."""
+    return {"partitions": {
+        "NT": {"total_records": nt_records, "total_length": 1000 * nt_records, "has_orfs": has_orfs},
+        "AA": {"total_records": aa_records, "total_length": 300 * aa_records, "has_orfs": False},
+    }}
+
+
+def test_sketch_alphabet() -> None:
+    """The sketch is summarized as an alphabet and an ORF flag."""
+    assert sketch_alphabet(make_sketch(nt_records=2, has_orfs=True)) == ("NT", True)
+    assert sketch_alphabet(make_sketch(aa_records=1)) == ("AA", False)
+    assert sketch_alphabet(make_sketch(nt_records=1, aa_records=1)) == ("mixed", False)
+    assert sketch_alphabet(None) == ("unknown", False)
+
+
+def test_protein_function_question_is_mode_b() -> None:
+    """A protein query asking what it does is confidently Mode B."""
+    decision = classify_request("What does this do?", make_sketch(aa_records=1))
+    assert decision.mode == "B"
+    assert decision.confidence >= 0.8
+    assert decision.config.find_protein_homologs
+    assert not decision.config.identify_unknown_dna
+
+
+@pytest.mark.parametrize("question", [
+    "Is this a resistance gene?",
+    "Does it carry blaCTX-M?",
+    "What is the function of this beta-lactamase?",
+])
+def test_amr_question_is_mode_c(question: str) -> None:
+    """AMR terms select Mode C, superseding functional inference."""
+    decision = classify_request(question, make_sketch(nt_records=1, has_orfs=True))
+    assert decision.mode == "C"
+    assert decision.config.functional_hint
+    assert decision.confidence >= 0.8
+
+
+def test_species_question_on_dna_is_mode_a() -> None:
+    """An organism question about DNA is confidently Mode A."""
+    decision = classify_request("What organism is this from?", make_sketch(nt_records=1))
+    assert decision.mode == "A"
+    assert decision.config.identify_unknown_dna
+    assert decision.config.analysis_scenario.startswith("Mode A")
+    assert decision.confidence >= 0.8
+
+
+def test_gene_names_are_case_sensitive() -> None:
+    """Ordinary words that look like gene prefixes do not trigger Mode C."""
+    decision = classify_request("Identify the species of this black mold", make_sketch(nt_records=1))
+    assert decision.mode == "A"
+
+
+def test_ambiguous_requests_have_low_confidence() -> None:
+    """Mixed intents and missing signals defer to the LLM."""
+    both = classify_request("Identify the species and the function", make_sketch(nt_records=1))
+    assert both.confidence < 0.8
+    nothing = classify_request("Analyze the BLAST results", make_sketch(nt_records=1, has_orfs=True))
+    assert nothing.confidence < 0.8
+    empty = classify_request("", None)
+    assert empty.mode is None
+    assert empty.config.custom_other
+
+
+def make_state(question: str, threshold: float = 0.8) -> PipelineState:
+    options = PipelineOptions(
+        config=StorySeqConfig(llm_api_url="http://localhost:1/v1", config_rules_min_confidence=threshold),
+        query="query.fasta",
+        question=question,
+    )
+    return PipelineState(options=options, fasta_sketch=make_sketch(aa_records=1))
+
+
+def test_config_node_skips_llm_when_confident(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The configuration node uses the rules and never builds the agent."""
+    async def fail(**kwargs: Any) -> NoReturn:
+        raise AssertionError("configuration agent should not be called")
+
+    monkeypatch.setattr("story_seq.agent.configuration_agent.get_configuration_agent", fail)
+    state = make_state("What does this protein do?")
+
+    next_node = asyncio.run(call_config_agent().run(GraphRunContext(state=state, deps=None)))
+
+    assert isinstance(next_node, call_blast_agent)
+    assert state.analysis_config.find_protein_homologs
+
+
+def test_config_node_asks_llm_below_threshold(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Below the confidence threshold the configuration agent is called."""
+    called = []
+
+    async def fake_agent(**kwargs: Any) -> NoReturn:
+        called.append(kwargs)
+        raise RuntimeError("stop here")
+
+    monkeypatch.setattr("story_seq.agent.configuration_agent.get_configuration_agent", fake_agent)
+    state = make_state("What does this protein do?", threshold=1.1)
+
+    with pytest.raises(RuntimeError, match="stop here"):
+        asyncio.run(call_config_agent().run(GraphRunContext(state=state, deps=None)))
+    assert called
@@ -0,0 +1,92 @@
+"""Tests for query coverage gap detection."""
+
+from pathlib import Path
+
+import numpy as np
+from Bio import SeqIO
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+
+from story_seq.models import BlastHit, BlastResult
+from story_seq.util.coverage import (
+    find_gaps,
+    merge_intervals,
+    query_coverage_gaps,
+    remap_gap_hits,
+    write_gap_fasta,
+)
+
+
+def make_hit(query_id: str, query_start: int, query_end: int) -> BlastHit:
+    """Create a BlastHit covering the given query span."""
+    return BlastHit(
+        query_id=query_id,
+        subject_id="subject1",
+        identity=99.0,
+        alignment_length=abs(query_end - query_start) + 1,
+        evalue=1e-30,
+        bit_score=300.0,
+        query_start=query_start,
+        query_end=query_end,
+        subject_start=1,
+        subject_end=abs(query_end - query_start) + 1,
+    )
+
+
+def make_result(hits: list, query_length: int = 1000) -> BlastResult:
+    return BlastResult(
+        query_length=query_length,
+        hits=hits,
+        database="nt",
+        blast_method="megablast",
+        search_reason="test",
+    )
+
+
+def test_merge_intervals() -> None:
+    """Test merging overlapping, touching and reversed spans."""
+    starts = np.array([500, 1, 90, 300, 700])
+    ends = np.array([600, 100, 150, 201, 590])
+    assert merge_intervals(starts, ends) == [(1, 150), (201, 300), (500, 700)]
+    assert merge_intervals(np.array([1, 101]), np.array([100, 200])) == [(1, 200)]
+    assert merge_intervals(np.empty(0), np.empty(0)) == []
+
+
+def test_find_gaps_respects_min_length() -> None:
+    """Test gap reporting at the edges and between blocks."""
+    covered = [(51, 100), (110, 800)]
+    assert find_gaps(covered, 1000) == [(1, 50), (101, 109), (801, 1000)]
+    assert find_gaps(covered, 1000, min_gap_length=50) == [(1, 50), (801, 1000)]
+    assert find_gaps([], 10) == [(1, 10)]
+
+
+def test_query_coverage_gaps_il12_like_case(tmp_path: Path) -> None:
+    """Test that a query explained only at its end reports the leading gap."""
+    records = {
+        "m002": SeqRecord(Seq("A" * 1000), id="m002"),
+        "other": SeqRecord(Seq("C" * 300), id="other"),
+    }
+    results = [
+        make_result([make_hit("m002", 700, 1000), make_hit("m002", 650, 720)]),
+        make_result([make_hit("other", 1, 300)], query_length=300),
+    ]
+    gaps = query_coverage_gaps(records, results, min_gap_length=100)
+    assert gaps == {"m002": [(1, 649)]}
+
+    # A record without hits was already searched in full and is not followed up
+    records["unmatched"] = SeqRecord(Seq("G" * 500), id="unmatched")
+    assert query_coverage_gaps(records, results, min_gap_length=100) == gaps
+
+    gap_file = tmp_path / "gaps.fasta"
+    assert write_gap_fasta(records, gaps, str(gap_file)) == 1
+    written = list(SeqIO.parse(str(gap_file), "fasta"))
+    assert written[0].id == "m002:1-649"
+    assert len(written[0].seq) == 649
+
+
+def test_remap_gap_hits() -> None:
+    """Test that follow-up hits are shifted back onto the original query."""
+    result = make_result([make_hit("m002:201-400", 11, 60), make_hit("Query_1", 1, 50)])
+    remapped = remap_gap_hits(result)
+    # A hit that names no gap record would mix coordinate systems, so it is dropped
+    assert [(h.query_id, h.query_start, h.query_end) for h in remapped.hits] == [("m002", 211, 260)]
@@ -0,0 +1,101 @@
+"""Tests for columnar export of pipeline results."""
+
+import json
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from story_seq.cli import app
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult
+from story_seq.pipeline.blast_pipeline import run_pipeline
+from story_seq.pipeline.export import export_results
+from story_seq.pipeline.state import PipelineOptions, PipelineState
+
+pa = pytest.importorskip("pyarrow")
+ds = pytest.importorskip("pyarrow.dataset")
+
+runner = CliRunner()
+
+
+def make_state() -> PipelineState:
+    """Create a finished pipeline state with two searches."""
+    hit = BlastHit(
+        query_id="tetM",
+        subject_id="WP_000691741.1",
+        identity=99.8,
+        alignment_length=639,
+        evalue=0.0,
+        bit_score=1300.0,
+        query_start=1,
+        query_end=639,
+        subject_start=1,
+        subject_end=639,
+        genbank_summary="tetracycline resistance protein Tet(M)",
+    )
+    results = [
+        BlastResult(query_length=639, hits=[hit, hit], database="nr", blast_method="blastp", search_reason="primary AMR probe"),
+        BlastResult(query_length=639, hits=[hit], database="nt", blast_method="tblastn", search_reason="deep AMR probe"),
+    ]
+    return PipelineState(
+        options=PipelineOptions(query="tetM.faa", question="Is this an AMR gene?"),
+        fasta_sketch={
+            "run_summary": {"total_input_files": 1, "input_files_list": ["tetM.faa"], "errors": []},
+            "partitions": {
+                "NT": {"total_records": 0, "total_length": 0, "files": [], "average_length": 0},
+                "AA": {"total_records": 1, "total_length": 639, "average_length": 639.0,
+                       "files": [{"source_file": "tetM.faa", "record_count": 1, "total_length": 639}]},
+            },
+        },
+        analysis_config=AnalysisConfig(functional_hint=True, analysis_scenario="Mode C"),
+        blast_results=results,
+        narrative="The query is Tet(M), a ribosomal protection protein.",
+    )
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_export_appends_runs(tmp_path: Path, fmt: str) -> None:
+    """Test that each export appends a run to every dataset."""
+    state = make_state()
+    first = export_results(state, tmp_path, run_id="run1", fmt=fmt)
+    export_results(state, tmp_path, run_id="run2", fmt=fmt)
+
+    assert set(first) == {"sketch_files", "analysis_config", "blast_hits", "narratives"}
+    assert "run_date=" in first["blast_hits"].parent.name
+
+    file_format = "parquet" if fmt == "parquet" else "ipc"
+    hits = ds.dataset(tmp_path / "blast_hits", format=file_format, partitioning="hive").to_table()
+    assert hits.num_rows == 6
+    assert sorted(set(hits["run_id"].to_pylist())) == ["run1", "run2"]
+    assert hits.filter(pa.compute.equal(hits["run_id"], "run1"))["search_index"].to_pylist() == [0, 0, 1]
+
+    narratives = ds.dataset(tmp_path / "narratives", format=file_format, partitioning="hive").to_table()
+    assert narratives["num_hits"].to_pylist() == [3, 3]
+
+
+def test_export_rejects_unknown_format(tmp_path: Path) -> None:
+    """Test that unsupported formats are rejected."""
+    with pytest.raises(ValueError):
+        export_results(make_state(), tmp_path, fmt="csv")
+
+
+def test_blast_command_rejects_unknown_format_before_running(tmp_path: Path) -> None:
+    """Test that a bad export format is caught before the pipeline starts."""
+    query = tmp_path / "query.fasta"
+    query.write_text(">q\nACGT\n")
+
+    result = runner.invoke(app, ["blast", str(query), "--export-dir", str(tmp_path / "out"), "--export-format", "csv"])
+    assert result.exit_code == 1
+    assert "Unsupported export format 'csv'" in result.output and "Running pipeline" not in result.output
+    with pytest.raises(ValueError):
+        run_pipeline(make_state().options, export_dir=tmp_path / "out", export_format="csv")
+
+
+def test_export_command(tmp_path: Path) -> None:
+    """Test the export command on a saved state file."""
+    state_file = tmp_path / "state.json"
+    state_file.write_text(json.dumps(make_state().model_dump(mode="json")))
+
+    result = runner.invoke(app, ["export", str(state_file), "--output-dir", str(tmp_path / "out")])
+    assert result.exit_code == 0
+    assert list((tmp_path / "out" / "blast_hits").glob("run_date=*/part-*.parquet"))
@@ -0,0 +1,100 @@
+"""Tests for the columnar BLAST hit table."""
+
+from typing import Any
+
+import pytest
+
+from story_seq.models import BlastHit, BlastResult
+from story_seq.util.hit_table import BlastHitTable
+
+
+def make_hit(subject_id: str, identity: float, evalue: float, bit_score: float,
+             query_start: int = 1, query_end: int = 100, **kwargs: Any) -> BlastHit:
+    """Create a BlastHit with sensible defaults."""
+    return BlastHit(
+        query_id="query1",
+        subject_id=subject_id,
+        identity=identity,
+        alignment_length=query_end - query_start + 1,
+        evalue=evalue,
+        bit_score=bit_score,
+        query_start=query_start,
+        query_end=query_end,
+        subject_start=1,
+        subject_end=query_end - query_start + 1,
+        **kwargs,
+    )
+
+
+@pytest.fixture
+def hits() -> list:
+    return [
+        make_hit("subject1", 95.0, 1e-10, 150.0, genbank_summary="TetM [S. pneumoniae]"),
+        make_hit("subject2", 99.5, 1e-50, 400.0, query_start=1, query_end=190),
+        make_hit("subject3", 80.0, 0.5, 40.0, query_start=50, query_end=80),
+    ]
+
+
+def test_round_trip_is_lossless(hits: list) -> None:
+    """Test that converting to a table and back preserves every field."""
+    table = BlastHitTable.from_hits(hits, query_length=200)
+    assert len(table) == 3
+    assert table.to_hits() == hits
+
+
+def test_string_pool_interns_ids(hits: list) -> None:
+    """Test that repeated identifiers are stored once."""
+    table = BlastHitTable.from_hits(hits)
+    assert table.pool.strings.count("query1") == 1
+    assert table.strings("subject_id") == ["subject1", "subject2", "subject3"]
+    assert table.strings("genbank_summary") == ["TetM [S. pneumoniae]", None, None]
+
+
+def test_top_hit_precomputed(hits: list) -> None:
+    """Test that the top hit is the highest bit score."""
+    table = BlastHitTable.from_hits(hits)
+    assert table.top_index == 1
+    assert table.top_hit == hits[1]
+    assert BlastHitTable.from_hits([]).top_hit is None
+
+
+def test_filter_and_sort(hits: list) -> None:
+    """Test vectorized filtering and sorting."""
+    table = BlastHitTable.from_hits(hits, query_length=200)
+
+    significant = table.filter(max_evalue=1e-5, min_coverage=50)
+    assert significant.strings("subject_id") == ["subject1", "subject2"]
+
+    by_evalue = table.sort_by("evalue")
+    assert by_evalue.strings("subject_id") == ["subject2", "subject1", "subject3"]
+
+    by_coverage = table.sort_by("coverage")
+    assert by_coverage.strings("subject_id")[0] == "subject2"
+
+    assert table.top(1, by="identity").to_hits() == [hits[1]]
+
+
+def test_coverage_requires_query_length(hits: list) -> None:
+    """Test that coverage needs the query length."""
+    table = BlastHitTable.from_hits(hits)
+    with pytest.raises(ValueError):
+        table.filter(min_coverage=50)
+
+
+def test_from_result_reflects_current_hits(hits: list) -> None:
+    """Test that a table built from a result sees hits added or edited since the last one."""
+    result = BlastResult(
+        query_length=200,
+        hits=hits,
+        database="nt",
+        blast_method="blastn",
+        search_reason="test",
+    )
+    assert BlastHitTable.from_result(result).top_hit == result.top_hit == hits[1]
+
+    result.hits.append(make_hit("subject4", 100.0, 0.0, 500.0))
+    result.hits[0].bit_score = 900.0
+    table = BlastHitTable.from_result(result)
+    assert table.top_hit == result.top_hit == result.hits[0]
+    assert table.to_hits() == result.hits
+    assert BlastResult(query_length=200, database="nt", blast_method="blastn", search_reason="test").top_hit is None
@@ -0,0 +1,105 @@
+"""Tests for the pipeline work queue."""
+
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import pytest
+
+from story_seq.pipeline.job_queue import JobQueue, resume_point, run_worker
+from story_seq.pipeline.state import PipelineOptions, PipelineState
+
+
+@pytest.fixture
+def queue(tmp_path: Path) -> JobQueue:
+    return JobQueue(tmp_path / "jobs.sqlite")
+
+
+@pytest.fixture
+def query(tmp_path: Path) -> Path:
+    path = tmp_path / "query.fna"
+    path.write_text(">query\nACGT\n")
+    return path
+
+
+def test_claims_are_exclusive_and_in_order(queue: JobQueue, query: Path) -> None:
+    first = queue.enqueue(query, "What is this?")
+    second = queue.enqueue(query, "What is this?")
+
+    job = queue.claim("worker-a")
+    assert job.id == first and job.attempts == 1 and job.query == str(query.resolve())
+    assert queue.claim("worker-b").id == second
+    assert queue.claim("worker-c") is None
+
+    assert not queue.complete(first, "worker-b")
+    assert queue.complete(first, "worker-a")
+    assert queue.counts() == {"queued": 0, "running": 1, "done": 1, "failed": 0}
+
+
+def test_lapsed_leases_are_reclaimed_until_attempts_run_out(queue: JobQueue, query: Path) -> None:
+    job_id = queue.enqueue(query, "What is this?", max_attempts=2)
+
+    assert queue.claim("crashed", lease_seconds=0.01).id == job_id
+    time.sleep(0.02)
+    job = queue.claim("rescuer", lease_seconds=0.01)
+    assert (job.id, job.attempts, job.worker) == (job_id, 2, "rescuer")
+    # The first worker has lost the job and must not keep it alive
+    assert not queue.heartbeat(job_id, "crashed")
+
+    time.sleep(0.02)
+    assert queue.claim("third") is None
+    assert queue.get(job_id).status == "failed"
+
+
+def test_failed_attempts_are_retried(queue: JobQueue, query: Path) -> None:
+    job_id = queue.enqueue(query, "What is this?", max_attempts=2)
+    queue.claim("w")
+    queue.fail(job_id, "w", "RuntimeError: boom")
+    assert queue.get(job_id).status == "queued"
+    queue.claim("w")
+    queue.fail(job_id, "w", "RuntimeError: boom again")
+    job = queue.get(job_id)
+    assert (job.status, job.error) == ("failed", "RuntimeError: boom again")
+
+
+def test_resume_point_follows_checkpoints() -> None:
+    assert resume_point({}) is None
+    assert resume_point({"fasta_sketch": {}}) == "call_config_agent"
+    assert resume_point({"fasta_sketch": {}, "analysis_config": {}}) == "call_blast_agent"
+    assert resume_point({"analysis_config": {}, "blast_results": []}) == "call_coverage_followup"
+    assert resume_point({"blast_results": [], "coverage_gaps": {}}) == "call_reporter_agent"
+    assert resume_point({"blast_results": [], "narrative": "Done."}) == "done"
+    assert resume_point({"fasta_sketch": {}, "timed_out_at": "call_blast_agent"}) == "call_blast_agent"
+
+
+def test_worker_runs_jobs_and_resumes_checkpoints(queue: JobQueue, query: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    fresh = queue.enqueue(query, "What is this?")
+    resumed = queue.enqueue(query, "What is this?")
+    # A previous worker got as far as the configuration before it died
+    checkpoint = queue.get(resumed).state_file
+    queue.state_dir.mkdir(parents=True, exist_ok=True)
+    with open(checkpoint, "w") as f:
+        json.dump({"fasta_sketch": {}, "analysis_config": {}}, f)
+
+    starts: Dict[str, Optional[str]] = {}
+
+    async def fake_run_pipeline_async(
+        options: PipelineOptions,
+        state_file: Optional[Path] = None,
+        start_task: Optional[str] = None,
+        deadline: Optional[float] = None,
+        **kwargs: Any,
+    ) -> PipelineState:
+        starts[str(state_file)] = start_task
+        await asyncio.sleep(0.05)
+        return PipelineState(options=options, narrative="Done.")
+
+    monkeypatch.setattr("story_seq.pipeline.blast_pipeline.run_pipeline_async", fake_run_pipeline_async)
+
+    ran = asyncio.run(run_worker(queue, worker="w", concurrency=2, lease_seconds=3, exit_when_empty=True))
+
+    assert ran == 2
+    assert starts == {queue.get(fresh).state_file: None, checkpoint: "call_blast_agent"}
+    assert queue.counts()["done"] == 2
@@ -0,0 +1,78 @@
+"""Tests for the local k-mer pre-classifier."""
+
+import random
+from pathlib import Path
+
+import numpy as np
+
+from story_seq.util.kmer_index import KmerIndex, canonical_kmers, load_kmer_index, search_limits
+from story_seq.util.taxonomy import TaxonomyIndex
+from tests.test_taxonomy import write_taxdump
+
+COMPLEMENT = str.maketrans("ACGT", "TGCA")
+
+
+def random_dna(rng: random.Random, length: int) -> str:
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+def reverse_complement(sequence: str) -> str:
+    return sequence.translate(COMPLEMENT)[::-1]
+
+
+def test_canonical_kmers_are_strand_independent() -> None:
+    sequence = "ACGTTGCAAGGNCTTACGGATCCA"
+    assert len(canonical_kmers(sequence, 5)) == len(sequence) - 4 - 5  # the five windows over N are dropped
+    assert sorted(canonical_kmers(sequence, 5)) == sorted(canonical_kmers(reverse_complement(sequence), 5))
+    # AAAA and its reverse complement TTTT encode as 0
+    assert canonical_kmers("TTTT", 4).tolist() == [0]
+    assert canonical_kmers("AC", 4).size == 0
+
+
+def test_queries_get_provisional_taxa(tmp_path: Path) -> None:
+    rng = random.Random(3)
+    taxonomy = TaxonomyIndex.from_taxdump(write_taxdump(tmp_path))
+    shared = random_dna(rng, 400)  # carried by both Escherichia species
+    ecoli, fergusonii, aureus = random_dna(rng, 3000), random_dna(rng, 3000), random_dna(rng, 3000)
+    reference = tmp_path / "reference.fa"
+    reference.write_text(
+        f">ecoli_k12|kraken:taxid|83333\n{ecoli}{shared}\n"
+        f">fergusonii\n{fergusonii}{shared}\n"
+        f">aureus|kraken:taxid|1280\n{aureus}\n"
+        f">unlabelled\n{random_dna(rng, 500)}\n"
+    )
+    labels = tmp_path / "seqid2taxid.map"
+    labels.write_text("fergusonii\t564\n")
+
+    index = load_kmer_index(reference, taxonomy, k=21, seqid2taxid=labels)
+    assert isinstance(index.kmers, np.memmap) and np.all(np.diff(index.kmers.astype(np.float64)) > 0)
+    assert load_kmer_index(reference, taxonomy, k=21, seqid2taxid=labels) is index
+
+    mutated = list(ecoli[1000:1800])
+    for position in range(0, 800, 200):
+        mutated[position] = "A" if mutated[position] != "A" else "C"
+    calls = [
+        index.classify("q_ecoli", reverse_complement("".join(mutated))),
+        index.classify("q_shared", shared),
+        index.classify("q_unknown", random_dna(rng, 500)),
+    ]
+    assert [call.taxon.name if call.taxon else None for call in calls] == [
+        "Escherichia coli K-12", "Escherichia", None,
+    ]
+    assert 0.85 < calls[0].confidence < 1.0 and calls[1].confidence == 1.0
+    assert calls[2].classified == 0
+
+    assert search_limits(calls[:2], taxonomy) == ([561], False)
+    assert search_limits(calls[:1], taxonomy, rank="species", certain_confidence=0.85) == ([562], True)
+    assert search_limits(calls, taxonomy) == ([], False)
+
+
+def test_in_memory_index_matches_the_cached_one(tmp_path: Path) -> None:
+    rng = random.Random(5)
+    taxonomy = TaxonomyIndex.from_taxdump(write_taxdump(tmp_path))
+    reference = tmp_path / "reference.fa"
+    reference.write_text(f">a|kraken:taxid|562\n{random_dna(rng, 800)}\n>b|kraken:taxid|28901\n{random_dna(rng, 800)}\n")
+    built = KmerIndex.from_reference(reference, taxonomy, k=15)
+    loaded = load_kmer_index(reference, taxonomy, k=15, cache_dir=tmp_path / "kmers")
+    assert np.array_equal(built.kmers, loaded.kmers) and np.array_equal(built.taxids, loaded.taxids)
+    assert set(loaded.taxids.tolist()) <= {562, 28901, 543}
@@ -0,0 +1,89 @@
+"""Tests for load balancing across LLM endpoints."""
+
+import asyncio
+import json
+from collections import Counter
+from typing import Awaitable, List
+
+import httpx
+
+from story_seq.agent.llm_endpoints import BalancingTransport, EndpointPool
+from story_seq.agent.llm_scheduler import LLMScheduler, SchedulingTransport
+from story_seq.config import LLMEndpoint
+
+
+def _post_all(transport: httpx.AsyncBaseTransport, count: int, concurrent: bool = True) -> List[httpx.Response]:
+    async def main() -> List[httpx.Response]:
+        async with httpx.AsyncClient(transport=transport) as client:
+            def post() -> Awaitable[httpx.Response]:
+                return client.post("http://a/v1/chat/completions", json={"model": "base", "messages": []})
+            if concurrent:
+                return await asyncio.gather(*(post() for _ in range(count)))
+            return [await post() for _ in range(count)]
+
+    return asyncio.run(main())
+
+
+def test_rewrites_url_model_and_key_per_endpoint() -> None:
+    """Requests keep their path but take the chosen endpoint's base URL, model and key."""
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append((str(request.url), json.loads(request.content)["model"], request.headers["authorization"]))
+        return httpx.Response(200, json={"ok": True})
+
+    pool = EndpointPool([
+        LLMEndpoint(url="http://a/v1"),
+        LLMEndpoint(url="http://b:8000/api/v1", model="other", api_key="key-b", weight=1000),
+    ])
+    _post_all(BalancingTransport(pool, api_key="shared", transport=httpx.MockTransport(handler)), 1)
+    assert seen == [("http://b:8000/api/v1/chat/completions", "other", "Bearer key-b")]
+
+
+def test_weights_and_latency_steer_traffic() -> None:
+    """Faster, heavier-weighted endpoints receive most of the requests."""
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.001 if request.url.host == "fast" else 0.02)
+        return httpx.Response(200, json={"host": request.url.host})
+
+    pool = EndpointPool([LLMEndpoint(url="http://slow/v1"), LLMEndpoint(url="http://fast/v1", weight=2)])
+    responses = _post_all(BalancingTransport(pool, transport=httpx.MockTransport(handler)), 40)
+    hosts = Counter(r.json()["host"] for r in responses)
+    assert hosts["fast"] > hosts["slow"] > 0
+    assert all(state.outstanding == 0 for state in pool.states)
+
+
+def test_connection_failures_fail_over_and_eject() -> None:
+    """Requests to a dead endpoint move to a live one, and the dead one is ejected."""
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "dead":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"ok": True})
+
+    pool = EndpointPool([LLMEndpoint(url="http://dead/v1", weight=10), LLMEndpoint(url="http://live/v1")])
+    responses = _post_all(BalancingTransport(pool, transport=httpx.MockTransport(handler)), 6, concurrent=False)
+    assert all(r.status_code == 200 for r in responses)
+
+    dead, live = pool.states
+    assert dead.failures == 3
+    assert dead.ejected_until > 0 and dead.ejections == 1
+    assert live.requests == 6
+
+
+def test_scheduler_retries_go_to_another_endpoint() -> None:
+    """A 503 is retried by the scheduler on an endpoint the request has not tried yet."""
+    hosts = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        hosts.append(request.url.host)
+        if request.url.host == "busy":
+            return httpx.Response(503)
+        return httpx.Response(200, json={"ok": True})
+
+    pool = EndpointPool([LLMEndpoint(url="http://busy/v1", weight=10), LLMEndpoint(url="http://idle/v1")])
+    scheduler = LLMScheduler(max_in_flight=2, backoff_base=0.001)
+    transport = SchedulingTransport("blast", scheduler, BalancingTransport(pool, transport=httpx.MockTransport(handler)))
+    responses = _post_all(transport, 1)
+    assert responses[0].status_code == 200
+    assert hosts == ["busy", "idle"]
+    assert scheduler.in_flight == 0
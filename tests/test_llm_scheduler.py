@@ -0,0 +1,248 @@
+"""Tests for the process-wide LLM request scheduler."""
+
+import asyncio
+from typing import AsyncIterator, List
+
+import httpx
+import pytest
+
+from story_seq.agent.llm_scheduler import (
+    STAGE_HEADER,
+    LLMScheduler,
+    SchedulingTransport,
+    get_scheduler,
+    scheduled_provider,
+)
+
+
+def test_priority_orders_waiting_requests() -> None:
+    """Reporter requests are granted before configuration requests queued earlier."""
+    scheduler = LLMScheduler(max_in_flight=1)
+    granted = []
+
+    async def request(stage: str) -> None:
+        await scheduler.acquire(stage)
+        granted.append(stage)
+        scheduler.release()
+
+    async def main() -> None:
+        await scheduler.acquire("blast")
+        waiters = [asyncio.create_task(request(stage)) for stage in ("config", "config", "reporter")]
+        await asyncio.sleep(0)
+        assert scheduler.waiting == 3
+        scheduler.release()
+        await asyncio.gather(*waiters)
+
+    asyncio.run(main())
+    assert granted == ["reporter", "config", "config"]
+
+
+def test_max_in_flight_is_enforced() -> None:
+    """No more than max_in_flight requests reach the transport at once."""
+    active = 0
+    peak = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return httpx.Response(200, json={"ok": True})
+
+    scheduler = LLMScheduler(max_in_flight=2)
+
+    async def main() -> None:
+        transport = SchedulingTransport("blast", scheduler, httpx.MockTransport(handler))
+        async with httpx.AsyncClient(transport=transport) as client:
+            responses = await asyncio.gather(*(client.post("http://llm/v1", json={}) for _ in range(8)))
+        assert all(r.status_code == 200 for r in responses)
+
+    asyncio.run(main())
+    assert peak == 2
+    assert scheduler.in_flight == 0
+
+
+def test_waiter_cancelled_between_dispatch_and_grant_returns_its_slot() -> None:
+    """A slot granted to a waiter that is cancelled before the grant runs is released."""
+    scheduler = LLMScheduler(max_in_flight=1)
+
+    async def main() -> None:
+        await scheduler.acquire()
+        waiter = asyncio.create_task(scheduler.acquire())
+        await asyncio.sleep(0)
+        scheduler.release()  # dispatches the slot to the waiter; the grant is only scheduled
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert scheduler.in_flight == 0
+        await asyncio.wait_for(scheduler.acquire(), timeout=1.0)
+        scheduler.release()
+
+    asyncio.run(main())
+
+
+def test_retries_throttled_requests_and_backs_off() -> None:
+    """429s are retried (honouring Retry-After) and halve the concurrency cap."""
+    statuses = iter([429, 503, 200])
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        status = next(statuses)
+        headers = {"Retry-After": "0"} if status == 429 else {}
+        return httpx.Response(status, headers=headers, json={"status": status})
+
+    scheduler = LLMScheduler(max_in_flight=4, backoff_base=0.0)
+
+    async def main() -> httpx.Response:
+        transport = SchedulingTransport("config", scheduler, httpx.MockTransport(handler))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post("http://llm/v1", json={})
+
+    response = asyncio.run(main())
+    assert response.status_code == 200
+    assert scheduler.limit < 4
+    assert scheduler.in_flight == 0
+
+
+def test_gives_up_after_max_retries() -> None:
+    """The last retryable response is returned once retries are exhausted."""
+    calls = 0
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal calls
+        calls += 1
+        return httpx.Response(500)
+
+    scheduler = LLMScheduler(max_retries=2, backoff_base=0.0)
+
+    async def main() -> httpx.Response:
+        transport = SchedulingTransport("config", scheduler, httpx.MockTransport(handler))
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.post("http://llm/v1", json={})
+
+    assert asyncio.run(main()).status_code == 500
+    assert calls == 3
+
+
+def test_token_budget_delays_requests() -> None:
+    """A request that would exceed the tokens-per-minute budget waits."""
+    scheduler = LLMScheduler(max_in_flight=4, tokens_per_minute=10)
+
+    async def main() -> None:
+        await scheduler.acquire("blast", tokens=8)
+        scheduler.release()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.acquire("blast", tokens=8), timeout=0.05)
+        # Small requests still fit in what is left of the budget
+        await asyncio.wait_for(scheduler.acquire("blast", tokens=2), timeout=0.05)
+        scheduler.release()
+
+    asyncio.run(main())
+
+
+class EventStream(httpx.AsyncByteStream):
+    """Unbuffered response body, as a real streaming response would be."""
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield b"data: [DONE]\n\n"
+
+
+def test_streamed_response_holds_slot_until_closed() -> None:
+    """A streaming response counts as in flight until its body is closed."""
+    scheduler = LLMScheduler(max_in_flight=1)
+
+    async def main() -> None:
+        transport = SchedulingTransport("reporter", scheduler, httpx.MockTransport(
+            lambda request: httpx.Response(200, stream=EventStream())
+        ))
+        async with httpx.AsyncClient(transport=transport) as client:
+            async with client.stream("POST", "http://llm/v1", json={}) as response:
+                assert scheduler.in_flight == 1
+                await response.aread()
+            assert scheduler.in_flight == 0
+
+    asyncio.run(main())
+
+
+def test_token_delay_wakes_a_waiter_on_another_thread(monkeypatch: pytest.MonkeyPatch) -> None:
+    """The re-dispatch timer reaches a waiter whose loop runs in another thread."""
+    import threading
+    import time
+
+    monkeypatch.setattr("story_seq.agent.llm_scheduler.TOKEN_WINDOW_SECONDS", 0.2)
+    scheduler = LLMScheduler(max_in_flight=1, tokens_per_minute=10)
+    waited: List[float] = []
+
+    def other_pipeline() -> None:
+        async def wait() -> None:
+            started = time.monotonic()
+            # Queued behind the slot; once released, it still waits for the token budget
+            await asyncio.wait_for(scheduler.acquire("blast", tokens=8), timeout=3.0)
+            waited.append(time.monotonic() - started)
+            scheduler.release()
+
+        asyncio.run(wait())
+
+    async def main() -> None:
+        await scheduler.acquire("blast", tokens=8)
+        thread = threading.Thread(target=other_pipeline)
+        thread.start()
+        while not scheduler.waiting:
+            await asyncio.sleep(0.01)
+        scheduler.release()  # schedules the token timer on the other thread's loop from here
+        await asyncio.to_thread(thread.join)
+
+    asyncio.run(main())
+    assert waited and waited[0] < 1.0
+
+
+def test_process_scheduler_keeps_its_first_limits(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Later pipelines do not reset the adaptive limit of the shared scheduler."""
+    monkeypatch.setattr("story_seq.agent.llm_scheduler._scheduler", None)
+    scheduler = get_scheduler(max_in_flight=4)
+    scheduler.record_outcome(throttled=True)
+
+    assert get_scheduler(max_in_flight=8) is scheduler
+    assert (scheduler.max_in_flight, scheduler.limit) == (4, 2.0)
+
+
+def test_agents_share_an_http_client_and_keep_their_stage(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Providers on one loop share a client; each request is scheduled for its agent's stage."""
+    stages: List[str] = []
+    scheduler = LLMScheduler(max_in_flight=1)
+
+    async def acquire(stage: str = "config", tokens: int = 1) -> None:
+        stages.append(stage)
+
+    monkeypatch.setattr(scheduler, "acquire", acquire)
+    monkeypatch.setattr(scheduler, "release", lambda: None)
+    monkeypatch.setattr("story_seq.agent.llm_scheduler._scheduler", scheduler)
+
+    async def main() -> List[httpx.Request]:
+        reporter = scheduled_provider("http://llm/v1", "key", stage="reporter", timeout=30)
+        blast = scheduled_provider("http://llm/v1", "key", stage="blast")
+        assert reporter.client._client is blast.client._client
+        sent: List[httpx.Request] = []
+        transport = reporter.client._client._transport
+        transport._transport = httpx.MockTransport(lambda request: sent.append(request) or httpx.Response(200, json={}))
+        await reporter.client.get("/models", cast_to=httpx.Response)
+        await blast.client.get("/models", cast_to=httpx.Response)
+        return sent
+
+    sent = asyncio.run(main())
+    assert stages == ["reporter", "blast"]
+    assert all(STAGE_HEADER not in request.headers for request in sent)
+
+
+def test_request_timeout_is_capped_by_the_time_left() -> None:
+    """A deadline's remaining time caps the request timeout, even once nothing is left."""
+    async def main() -> List[httpx.Timeout]:
+        return [
+            scheduled_provider("http://llm/v1", "key", stage="reporter", timeout=timeout).client.timeout
+            for timeout in (None, 30.0, 0.0)
+        ]
+
+    default, capped, expired = asyncio.run(main())
+    assert (default.read, default.connect) == (600, 5)
+    assert (capped.read, capped.connect) == (30.0, 5)
+    assert (expired.read, expired.connect) == (0.0, 0.0)
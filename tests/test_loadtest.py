@@ -0,0 +1,139 @@
+"""Tests for the load test stand-in servers and harness."""
+
+import json
+import random
+from typing import Any, Dict, List
+
+import httpx
+import pytest
+
+# Import the MCP client at collection time: its stdio transport binds sys.stderr as a
+# default argument, and CLI tests that run earlier swap sys.stderr for a buffer
+import story_seq.agent.blast_agent  # noqa: F401
+from story_seq.loadtest import FakeLLMServer, LatencyDistribution, run_loadtest
+from story_seq.loadtest.fake_llm import build_reply
+from story_seq.loadtest.fake_ncbi_mcp import fake_blast_report
+from story_seq.util.blast_json import parse_blast_json
+
+QUERY = ">q1 test\nACGTACGTAC\nGTACGTACGT\n"
+
+
+def test_latency_distribution_parse() -> None:
+    """Latency specs parse, sample within range and round-trip to text."""
+    rng = random.Random(0)
+    assert LatencyDistribution.parse("fixed:0.25").sample(rng) == 0.25
+    uniform = LatencyDistribution.parse("uniform:1,2")
+    assert all(1 <= uniform.sample(rng) <= 2 for _ in range(100))
+    assert str(LatencyDistribution.parse("lognormal:2,0.5")) == "lognormal:2,0.5"
+    with pytest.raises(ValueError):
+        LatencyDistribution.parse("uniform:1")
+    with pytest.raises(ValueError):
+        LatencyDistribution.parse("gamma:1,2")
+
+
+def test_fake_blast_report_is_deterministic() -> None:
+    """The same query always produces the same report, which parses into hits."""
+    report = fake_blast_report(QUERY, max_hits=5)
+    assert report == fake_blast_report(QUERY, max_hits=5)
+
+    results = parse_blast_json(json.dumps(report), search_reason="test")
+    assert len(results) == 1
+    result = results[0]
+    assert result.query_length == 20
+    assert result.num_hits == 5
+    assert result.search_reason == "test"
+    top = result.top_hit
+    assert (top.query_start, top.query_end, top.identity) == (1, 20, 100.0)
+
+
+def _blast_tools() -> List[Dict[str, Any]]:
+    return [
+        {"type": "function", "function": {
+            "name": "blast_search",
+            "parameters": {"type": "object", "properties": {
+                "sequence": {"type": "string"},
+                "program": {"type": "string", "default": "blastn"},
+                "max_hits_per_query": {"type": "integer"},
+            }, "required": ["sequence"]},
+        }},
+        {"type": "function", "function": {
+            "name": "final_result",
+            "parameters": {"type": "object", "properties": {"response": {"type": "array"}}},
+        }},
+    ]
+
+
+def test_build_reply_drives_blast_tool_then_final_result() -> None:
+    """The fake model calls the BLAST tool first and selects its searches afterwards."""
+    messages = [
+        {"role": "system", "content": f"BLAST Search Parameters:\n\nQuery Sequences:\n{QUERY}"},
+        {"role": "user", "content": "What is this?"},
+    ]
+    kind, reply = build_reply({"messages": messages, "tools": _blast_tools()})
+    assert kind == "blast"
+    assert reply.tool_name == "blast_search"
+    arguments = json.loads(reply.arguments)
+    assert arguments["sequence"] == QUERY.strip()
+    assert arguments["program"] == "blastn"
+
+    # The capture toolset replaces the BLAST report with per-search summaries
+    tool_output = json.dumps({"searches": [{"search_id": "S1", "num_hits": 3}], "note": ""})
+    messages.append({"role": "tool", "tool_call_id": "call_1", "content": tool_output})
+    kind, reply = build_reply({"messages": messages, "tools": _blast_tools()})
+    assert reply.tool_name == "final_result"
+    response = json.loads(reply.arguments)["response"]
+    assert [selection["search_id"] for selection in response] == ["S1"]
+
+
+def test_build_reply_config_and_reporter() -> None:
+    """Configuration requests get an AnalysisConfig and plain requests get text."""
+    config_tool = {"type": "function", "function": {
+        "name": "final_result",
+        "parameters": {"type": "object", "properties": {"analysis_scenario": {"type": "string"}}},
+    }}
+    kind, reply = build_reply({"messages": [], "tools": [config_tool]})
+    assert kind == "config"
+    assert json.loads(reply.arguments)["identify_unknown_dna"] is True
+
+    kind, reply = build_reply({"messages": [{"role": "user", "content": "Tell me"}]}, narrative_words=50)
+    assert kind == "reporter"
+    assert reply.tool_name == ""
+    assert len(reply.text.split()) == 50
+
+
+def test_fake_llm_server_streams_and_fails() -> None:
+    """The server speaks the chat completions wire format, including SSE and errors."""
+    request = {"model": "fake", "messages": [{"role": "user", "content": "hi"}]}
+    with FakeLLMServer(narrative_words=20, chunk_words=5) as server:
+        response = httpx.post(f"{server.url}/chat/completions", json=request)
+        assert response.status_code == 200
+        text = response.json()["choices"][0]["message"]["content"]
+
+        streamed = httpx.post(f"{server.url}/chat/completions", json={**request, "stream": True})
+        events = [line[len("data: "):] for line in streamed.text.splitlines() if line.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        chunks = [json.loads(event) for event in events[:-1]]
+        deltas = [c["choices"][0]["delta"].get("content", "") for c in chunks if c["choices"]]
+        assert "".join(deltas) == text
+        assert chunks[-1]["usage"]["completion_tokens"] == 20
+
+    with FakeLLMServer(error_rate=1.0) as server:
+        response = httpx.post(f"{server.url}/chat/completions", json=request)
+        assert response.status_code in (429, 500)
+        assert server.counts["errors"] == 1
+
+
+def test_run_loadtest_end_to_end() -> None:
+    """Full pipelines run against the stand-ins and are reported."""
+    report = run_loadtest(
+        pipelines=2,
+        concurrency=2,
+        llm_latency=LatencyDistribution.parse("fixed:0"),
+        mcp_latency=LatencyDistribution.parse("fixed:0"),
+    )
+    assert report.failures == []
+    assert report.succeeded == 2
+    assert report.throughput > 0
+    assert set(report.percentiles()) == {"p50", "p90", "p95", "p99", "max"}
+    assert report.llm_counts["reporter"] == 2
+    assert report.peak_rss_mb > 0
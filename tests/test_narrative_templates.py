@@ -0,0 +1,73 @@
+"""Tests for the template narrative fast path."""
+
+from typing import List
+
+from story_seq.agent.narrative_templates import organism_of, template_narrative
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult
+
+
+def hit(query_id: str, identity: float, summary: str, query_end: int = 1000, evalue: float = 0.0) -> BlastHit:
+    return BlastHit(query_id=query_id, subject_id=f"ACC{int(identity * 10)}", identity=identity,
+                    alignment_length=query_end, evalue=evalue, bit_score=identity * 10, query_start=1,
+                    query_end=query_end, subject_start=1, subject_end=query_end, genbank_summary=summary,
+                    bioproject_info="PRJNA1 (surveillance)")
+
+
+def results(hits: List[BlastHit], method: str = "megablast") -> List[BlastResult]:
+    return [BlastResult(query_length=1000, database="nt", blast_method=method, search_reason="identify", hits=hits)]
+
+
+MODE_A = AnalysisConfig(identify_unknown_dna=True)
+
+
+def test_organism_of() -> None:
+    assert organism_of("tetracycline resistance protein TetM [Streptococcus pneumoniae]") == "Streptococcus pneumoniae"
+    assert organism_of("Escherichia coli strain K-12 chromosome, complete genome") == "Escherichia coli"
+    assert organism_of("uncharacterized protein") is None
+
+
+def test_clear_species_hit_gets_a_template_narrative() -> None:
+    decision = template_narrative(
+        results([hit("q1", 99.8, "Escherichia coli strain K-12, complete genome"),
+                 hit("q1", 97.0, "Shigella flexneri 2a, complete genome")]),
+        MODE_A, query_count=1,
+    )
+    assert decision.narrative.startswith("q1 is identified as Escherichia coli")
+    assert "PRJNA1 (surveillance)" in decision.narrative
+    assert "1 of the top 2 hits agree" in decision.narrative
+
+
+def test_unclear_evidence_falls_back_to_the_reporter() -> None:
+    clear = hit("q1", 99.8, "Escherichia coli strain K-12, complete genome")
+    cases = {
+        "identity": [hit("q1", 92.0, "Escherichia coli strain K-12, complete genome")],
+        "coverage": [hit("q1", 99.8, "Escherichia coli strain K-12, complete genome", query_end=600)],
+        "E-value": [hit("q1", 99.8, "Escherichia coli strain K-12, complete genome", evalue=1e-5)],
+        "almost as well": [clear, hit("q1", 99.5, "Shigella flexneri 2a, complete genome")],
+    }
+    for problem, hits in cases.items():
+        decision = template_narrative(results(hits), MODE_A, query_count=1)
+        assert decision.narrative is None and problem in decision.reasons[0]
+
+    assert template_narrative(results([clear]), MODE_A, query_count=2).narrative is None  # a query without hits
+    assert template_narrative(results([clear]), AnalysisConfig(custom_other=True)).narrative is None
+    # Mode C needs the hit to be an AMR gene
+    mode_c = AnalysisConfig(functional_hint=True)
+    assert template_narrative(results([clear], "blastx"), mode_c).narrative is None
+    amr = hit("q1", 100.0, "tetracycline resistance protein TetM [Streptococcus pneumoniae]")
+    assert "antimicrobial resistance gene" in template_narrative(results([amr], "blastx"), mode_c).narrative
+
+
+def test_orf_hits_are_measured_on_their_nucleotide_record() -> None:
+    mode_c = AnalysisConfig(functional_hint=True)
+    # The whole 300-residue ORF matches, but it spans 900 of the contig's 5000 bases
+    amr = hit("contig_orf1_101-1000_f", 100.0, "tetracycline resistance protein TetM [Streptococcus pneumoniae]",
+              query_end=300)
+    protein = [BlastResult(query_length=300, database="nr", blast_method="blastp", search_reason="AMR", hits=[amr])]
+
+    decision = template_narrative(protein, mode_c, query_count=1)
+    assert decision.narrative is None and "unknown" in decision.reasons[0]
+    decision = template_narrative(protein, mode_c, query_count=1, records={"contig": "N" * 5000})
+    assert decision.narrative is None and decision.reasons == ["contig: coverage 18% < 95.0%"]
+    decision = template_narrative(protein, mode_c, query_count=1, records={"contig": "N" * 903})
+    assert "over 100% of the query" in decision.narrative
@@ -0,0 +1,127 @@
+"""Tests for six-frame ORF calling and translation."""
+
+import random
+from pathlib import Path
+
+import pytest
+from Bio import SeqIO
+from Bio.Seq import Seq
+
+from story_seq.agent.configuration_rules import sketch_alphabet
+from story_seq.models import BlastHit, BlastResult
+from story_seq.util import process_multiple_files
+from story_seq.util.fasta_sketch import longest_orf_length
+from story_seq.util.orfs import (
+    Orf,
+    add_orf_partition,
+    find_orfs,
+    hit_coverage,
+    orf_hits_to_nucleotide,
+)
+
+
+def coding_sequence(codons: int, seed: int = 0, start: str = "ATG") -> str:
+    rng = random.Random(seed)
+    sense = ["GCT", "AAA", "CTG", "GGC", "TTT", "GAA", "CGT", "TCC"]
+    return start + "".join(rng.choice(sense) for _ in range(codons - 1)) + "TAA"
+
+
+def flank(length: int) -> str:
+    # Stops in every forward frame keep ORFs from extending into the flanks
+    return ("TAGTGATAA" * length)[:length]
+
+
+def codon_walk(seq: str) -> int:
+    """Reference: longest stop-to-stop run in nt, walking codon by codon."""
+    best = 0
+    for strand in (seq, str(Seq(seq).reverse_complement())):
+        for frame in range(3):
+            run = 0
+            for i in range(frame, len(strand) - 2, 3):
+                run = 0 if strand[i:i + 3] in ("TAA", "TAG", "TGA") else run + 3
+                best = max(best, run)
+    return best
+
+
+def test_longest_orf_length_matches_codon_walk() -> None:
+    rng = random.Random(7)
+    for _ in range(100):
+        seq = "".join(rng.choice("ACGTN") for _ in range(rng.randint(0, 300)))
+        assert longest_orf_length(seq) == codon_walk(seq)
+    assert longest_orf_length("atgaaa\naaa") == 9
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+def test_find_orfs_translates_both_strands(reverse: bool) -> None:
+    gene = coding_sequence(150)
+    seq = flank(40) + gene + flank(31)
+    if reverse:
+        seq = str(Seq(seq).reverse_complement())
+
+    orfs = find_orfs(seq, "contig", min_protein_length=100)
+
+    assert len(orfs) == 1
+    orf = orfs[0]
+    assert orf.strand == ("-" if reverse else "+")
+    assert orf.end - orf.start + 1 == len(gene)
+    assert orf.protein == str(Seq(gene).translate(table=11, to_stop=True))
+    assert orf.has_start and orf.has_stop
+
+
+def test_start_codon_modes_and_minimum_length() -> None:
+    # A GTG start 20 codons (GTG + 19 sense codons) upstream of the first ATG
+    gene = coding_sequence(20, start="GTG")[:-3] + coding_sequence(120)
+    seq = flank(30) + gene + flank(30)
+
+    def forward(start_codons: str) -> Orf:
+        return max((o for o in find_orfs(seq, min_protein_length=100, start_codons=start_codons) if o.strand == "+"),
+                   key=lambda o: len(o.protein))
+
+    atg, alternative = forward("atg"), forward("alternative")
+    assert len(alternative.protein) == len(atg.protein) + 20
+    assert alternative.protein.startswith("M")
+    assert find_orfs(seq, min_protein_length=200) == []
+    with pytest.raises(ValueError):
+        find_orfs(seq, start_codons="ctg")
+
+
+def test_orf_partition_is_added_to_sketch(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.chdir(tmp_path)
+    query = tmp_path / "contig.fna"
+    query.write_text(">contig\n" + flank(40) + coding_sequence(150) + flank(40) + "\n")
+    sketch = process_multiple_files([str(query)])
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+
+    written = add_orf_partition(sketch, min_protein_length=100, output_dir=str(work_dir))
+
+    aa = sketch["partitions"]["AA"]
+    assert written == [str(work_dir / "contig_ORFs.faa")]
+    assert not (tmp_path / "contig_ORFs.faa").exists()
+    assert aa["total_records"] == aa["translated_records"] == 1
+    assert aa["files"][0]["translated_from"] == str(query)
+    record = next(SeqIO.parse(written[0], "fasta"))
+    assert record.id == "contig_orf1_41-493_f"
+    # The query is still a nucleotide query, and translating twice adds nothing
+    assert sketch_alphabet(sketch)[0] == "NT"
+    assert add_orf_partition(sketch) == []
+
+
+def test_orf_hits_map_back_to_nucleotide_spans() -> None:
+    def hit(query_id: str) -> BlastHit:
+        return BlastHit(query_id=query_id, subject_id="WP_1", identity=90.0, alignment_length=50,
+                        evalue=1e-20, bit_score=100.0, query_start=11, query_end=60,
+                        subject_start=1, subject_end=50)
+
+    result = BlastResult(
+        query_length=150, database="nr", blast_method="blastp", search_reason="function",
+        hits=[hit("contig_orf1_41-493_f"), hit("contig_orf2_101-550_r"), hit("other")],
+    )
+    spans = [(h.query_id, h.query_start, h.query_end) for h in orf_hits_to_nucleotide(result).hits]
+    assert spans == [("contig", 71, 220), ("contig", 371, 520), ("other", 11, 60)]
+
+    # Coverage of an ORF hit is that of its nucleotide span on the record, not of the protein
+    orf_hit, _, other = result.hits
+    assert hit_coverage(orf_hit, result, record_length=1500) == 10.0
+    assert hit_coverage(orf_hit, result) is None
+    assert hit_coverage(other, result) == pytest.approx(100.0 * 50 / 150)
@@ -0,0 +1,327 @@
+"""Tests for the sequence analysis pipeline."""
+
+import asyncio
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Union
+
+import pytest
+from pydantic_ai import Agent, RunContext
+from pydantic_ai.models.test import TestModel
+from pydantic_graph import GraphRunContext
+
+from story_seq.agent.blast_capture import BlastSearchSelection
+from story_seq.config import StorySeqConfig
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult
+from story_seq.pipeline.blast_pipeline import ResearchTaskGraph
+from story_seq.pipeline.state import PipelineOptions, PipelineState
+from story_seq.pipeline.tasks import call_coverage_followup, call_reporter_agent
+
+
+def make_state(query: str = "query.fasta", **kwargs: Any) -> PipelineState:
+    """Create a pipeline state for a dummy query."""
+    options = PipelineOptions(
+        config=StorySeqConfig(llm_api_url="http://localhost:1/v1"),
+        query=query,
+        question="What is this?",
+    )
+    return PipelineState(options=options, **kwargs)
+
+
+def make_hit(query_id: str, query_start: int, query_end: int) -> BlastHit:
+    """Create a BlastHit covering the given query span."""
+    return BlastHit(
+        query_id=query_id,
+        subject_id="subject1",
+        identity=99.0,
+        alignment_length=query_end - query_start + 1,
+        evalue=1e-30,
+        bit_score=300.0,
+        query_start=query_start,
+        query_end=query_end,
+        subject_start=1,
+        subject_end=query_end - query_start + 1,
+    )
+
+
+def test_reporter_streams_narrative(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that the reporter node streams deltas and stores the full narrative."""
+    narrative = "The query is a tetracycline resistance protein TetM."
+
+    async def fake_get_reporter_agent(**kwargs: Any) -> Agent:
+        return Agent(TestModel(custom_output_text=narrative), output_type=str)
+
+    monkeypatch.setattr(
+        "story_seq.agent.reporter_agent.get_reporter_agent", fake_get_reporter_agent
+    )
+
+    chunks: List[str] = []
+    state = make_state(analysis_config=AnalysisConfig(), blast_results=[])
+    state.narrative_callback = chunks.append
+
+    result = asyncio.run(ResearchTaskGraph.run(call_reporter_agent(), state=state))
+
+    assert "".join(chunks) == narrative
+    assert result.output.narrative == narrative
+
+
+def test_narrative_callback_not_serialized() -> None:
+    """Test that the streaming callback is excluded from the saved state."""
+    state = make_state()
+    state.narrative_callback = print
+    assert "narrative_callback" not in state.model_dump(mode="json")
+
+
+def test_coverage_followup_searches_gaps(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test that uncovered regions are searched again and mapped back to the query."""
+    query = tmp_path / "construct.fna"
+    query.write_text(">construct\n" + "ACGT" * 250 + "\n")
+
+    followup = BlastResult(
+        query_length=600,
+        hits=[make_hit("construct:1-600", 1, 550)],
+        database="nt",
+        blast_method="blastn",
+        search_reason="coverage gap follow-up",
+    )
+    seen_queries = []
+
+    async def fake_get_blast_agent(**kwargs: Any) -> Agent:
+        agent = Agent(
+            TestModel(custom_output_args=[{"search_id": "S1", "search_reason": "coverage gap follow-up"}]),
+            output_type=List[BlastSearchSelection],
+        )
+
+        @agent.instructions
+        def record_query(ctx: RunContext) -> str:
+            seen_queries.append(ctx.deps.query_file)
+            # Stands in for the capture toolset storing the search's results
+            ctx.deps.captured_searches["S1"] = followup
+            return ""
+
+        return agent
+
+    monkeypatch.setattr("story_seq.agent.blast_agent.get_blast_agent", fake_get_blast_agent)
+
+    first_round = BlastResult(
+        query_length=1000,
+        hits=[make_hit("construct", 601, 1000)],
+        database="nt",
+        blast_method="megablast",
+        search_reason="species identification",
+    )
+    state = make_state(query=str(query), analysis_config=AnalysisConfig(), blast_results=[first_round])
+
+    next_node = asyncio.run(call_coverage_followup().run(GraphRunContext(state=state, deps=None)))
+
+    assert isinstance(next_node, call_reporter_agent)
+    assert state.coverage_gaps == {"construct": [[1, 600]]}
+    # The gap FASTA is written to a temporary directory, not next to the query, and removed afterwards
+    assert [path.name for path in seen_queries] == ["construct_gaps.fasta"]
+    assert seen_queries[0].parent != tmp_path and not seen_queries[0].exists()
+    assert len(state.blast_results) == 2
+    assert state.blast_results[1].hits[0].query_id == "construct"
+
+
+def test_record_llm_usage_accumulates_cache_hits() -> None:
+    """Usage is summed per task and saved with the state."""
+    from pydantic_ai.usage import RunUsage
+
+    state = make_state()
+    state.record_llm_usage("call_blast_agent", RunUsage(requests=1, input_tokens=1000, cache_read_tokens=0, output_tokens=10))
+    state.record_llm_usage("call_blast_agent", RunUsage(requests=1, input_tokens=1000, cache_read_tokens=900, output_tokens=20))
+
+    assert state.llm_usage["call_blast_agent"] == {
+        "requests": 2, "input_tokens": 2000, "cache_read_tokens": 900, "output_tokens": 30,
+    }
+    assert state.model_dump(mode="json")["llm_usage"]["call_blast_agent"]["cache_read_tokens"] == 900
+
+
+def test_deadline_cancels_running_task_and_checkpoints(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """A stuck task is cancelled at the deadline and the partial state is saved."""
+    import json
+    import time
+
+    from story_seq.pipeline.blast_pipeline import run_pipeline_async
+
+    query = tmp_path / "query.fna"
+    query.write_text(">query\n" + "ACGTTGCA" * 50 + "\n")
+    state_file = tmp_path / "state.json"
+    budgets = []
+
+    async def fake_get_blast_agent(**kwargs: Any) -> Agent:
+        budgets.append(kwargs["timeout"])
+        from pydantic_ai.messages import ModelMessage, ModelResponse
+        from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+        async def stuck(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+            await asyncio.sleep(30)
+            raise AssertionError("the deadline should have cancelled this request")
+
+        return Agent(FunctionModel(stuck), output_type=List[BlastResult])
+
+    monkeypatch.setattr("story_seq.agent.blast_agent.get_blast_agent", fake_get_blast_agent)
+
+    options = PipelineOptions(
+        config=StorySeqConfig(llm_api_url="http://localhost:1/v1"),
+        query=str(query),
+        question="Which species is this from?",
+    )
+    started = time.monotonic()
+    state = asyncio.run(run_pipeline_async(options, state_file=state_file, deadline=1.0))
+
+    assert time.monotonic() - started < 5
+    assert 0 < budgets[0] <= 1.0
+    assert state.timed_out_at == "call_blast_agent"
+    # The rule-based configuration finished before the deadline and was checkpointed
+    saved = json.loads(state_file.read_text())
+    assert saved["timed_out_at"] == "call_blast_agent"
+    assert saved["analysis_config"]["identify_unknown_dna"] is True
+    assert saved["blast_results"] is None
+
+
+def test_blast_policy_runs_without_provisional_taxa_when_the_taxonomy_is_missing(tmp_path: Path) -> None:
+    """A taxonomy or k-mer index that cannot be loaded leaves the mode workflow as it is."""
+    from story_seq.pipeline.tasks import call_blast_agent
+    from story_seq.util import process_multiple_files
+
+    query = tmp_path / "query.fna"
+    query.write_text(">query\n" + "ACGTTGCAAGGCTTAC" * 40 + "\n")
+    reference = tmp_path / "reference.fa"
+    reference.write_text(">ref|kraken:taxid|562\n" + "ACGTTGCAAGGCTTAC" * 40 + "\n")
+    options = PipelineOptions(
+        config=StorySeqConfig(
+            llm_api_url="http://localhost:1/v1",
+            ncbi_mcp_server_args=["-m", "story_seq.loadtest.fake_ncbi_mcp"],
+            kmer_reference=str(reference),
+            taxonomy_dir=str(tmp_path / "missing"),
+        ),
+        query=str(query),
+        question="Which species is this from?",
+    )
+    state = PipelineState(
+        options=options,
+        fasta_sketch=process_multiple_files([str(query)]),
+        analysis_config=AnalysisConfig(identify_unknown_dna=True),
+    )
+
+    next_node = asyncio.run(call_blast_agent().run(GraphRunContext(state=state, deps=None)))
+
+    assert isinstance(next_node, call_coverage_followup)
+    assert state.provisional_taxa is None
+    assert state.blast_results and state.blast_results[0].blast_method == "megablast"
+
+
+def test_blast_agent_takes_over_when_the_policy_tool_does_not_match(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """A policy tool the MCP server does not offer is detected before any search."""
+    from story_seq.pipeline.tasks import call_blast_agent
+    from story_seq.util import process_multiple_files
+
+    prompts = []
+
+    async def fake_get_blast_agent(**kwargs: Any) -> Agent:
+        agent = Agent(TestModel(custom_output_args=[]), output_type=List[BlastSearchSelection])
+
+        @agent.instructions
+        def record_prompt(ctx: RunContext) -> str:
+            prompts.append(len(ctx.deps.captured_searches))
+            return ""
+
+        return agent
+
+    monkeypatch.setattr("story_seq.agent.blast_agent.get_blast_agent", fake_get_blast_agent)
+    query = tmp_path / "query.fna"
+    query.write_text(">query\n" + "ACGTTGCAAGGCTTAC" * 40 + "\n")
+    options = PipelineOptions(
+        config=StorySeqConfig(
+            llm_api_url="http://localhost:1/v1",
+            ncbi_mcp_server_args=["-m", "story_seq.loadtest.fake_ncbi_mcp"],
+            blast_policy_tool="blast_run",
+        ),
+        query=str(query),
+        question="Which species is this from?",
+    )
+    state = PipelineState(
+        options=options,
+        fasta_sketch=process_multiple_files([str(query)]),
+        analysis_config=AnalysisConfig(identify_unknown_dna=True),
+    )
+
+    asyncio.run(call_blast_agent().run(GraphRunContext(state=state, deps=None)))
+
+    assert prompts == [0]
+    assert state.blast_results == []
+
+
+def test_working_directory_follows_the_state_file(tmp_path: Path) -> None:
+    """Derived files sit next to the state file, or in a temporary directory without one."""
+    import shutil
+
+    state = make_state(state_file_path=str(tmp_path / "runs" / "state.json"))
+    assert state.working_directory() == tmp_path / "runs" / "state_files"
+    assert state.working_directory().is_dir()
+
+    temporary = make_state().working_directory()
+    assert temporary.is_dir() and tmp_path not in temporary.parents
+    shutil.rmtree(temporary)
+
+
+def test_reporter_streams_only_the_narrative_after_tool_calls(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Text the reporter writes before calling a tool is not streamed, and the tools still run."""
+    from pydantic_ai.messages import ModelMessage, ToolReturnPart
+    from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+    narrative = ["The query is ", "a tetracycline ", "resistance protein."]
+    tool_returns: List[ToolReturnPart] = []
+
+    async def stream(messages: List[ModelMessage], info: AgentInfo) -> AsyncIterator[Union[str, Dict[int, DeltaToolCall]]]:
+        returns = [p for m in messages for p in m.parts if isinstance(p, ToolReturnPart)]
+        if not returns:
+            yield "Let me look at the best hits first."
+            yield {0: DeltaToolCall(name="top_hits", json_args='{"n": 1}')}
+            return
+        tool_returns.extend(returns)
+        for chunk in narrative:
+            yield chunk
+
+    monkeypatch.setattr("story_seq.agent.reporter_agent.OpenAIModel", lambda *a, **k: FunctionModel(stream_function=stream))
+
+    chunks: List[str] = []
+    state = make_state(analysis_config=AnalysisConfig(), blast_results=[BlastResult(
+        query_length=1000, hits=[make_hit("q1", 1, 1000)], database="nt", blast_method="megablast",
+        search_reason="species identification",
+    )])
+    state.narrative_callback = chunks.append
+
+    result = asyncio.run(ResearchTaskGraph.run(call_reporter_agent(), state=state))
+
+    assert chunks == narrative
+    assert result.output.narrative == "".join(narrative)
+    assert [row["subject_id"] for row in tool_returns[0].content] == ["subject1"]
+
+
+def test_reporter_streams_the_narrative_before_the_response_ends(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Narrative deltas reach the callback while the model is still writing."""
+    from pydantic_ai.messages import ModelMessage
+    from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+    narrative = [f"Sentence {i} of a narrative about a tetracycline resistance protein. " for i in range(10)]
+    chunks: List[str] = []
+    seen_before_last: List[int] = []
+
+    async def stream(messages: List[ModelMessage], info: AgentInfo) -> AsyncIterator[str]:
+        for chunk in narrative[:-1]:
+            yield chunk
+        seen_before_last.append(len(chunks))
+        yield narrative[-1]
+
+    monkeypatch.setattr("story_seq.agent.reporter_agent.OpenAIModel", lambda *a, **k: FunctionModel(stream_function=stream))
+
+    state = make_state(analysis_config=AnalysisConfig(), blast_results=[])
+    state.narrative_callback = chunks.append
+
+    result = asyncio.run(ResearchTaskGraph.run(call_reporter_agent(), state=state))
+
+    assert seen_before_last[0] > 0
+    assert "".join(chunks) == "".join(narrative) == result.output.narrative
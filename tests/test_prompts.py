@@ -0,0 +1,51 @@
+"""Tests for static prompt loading and prompt assembly order."""
+
+import asyncio
+from typing import Any
+
+import pytest
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from story_seq.agent import prompts
+from story_seq.agent.configuration_agent import ConfigurationAgentDeps, get_configuration_agent
+from story_seq.agent.prompts import static_prompt
+
+
+def test_static_prompt_is_read_once(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Repeated lookups return the cached text without touching the file again."""
+    static_prompt.cache_clear()
+    opened = []
+    real_open = open
+
+    def counting_open(path: Any, *args: Any, **kwargs: Any) -> Any:
+        opened.append(path)
+        return real_open(path, *args, **kwargs)
+
+    monkeypatch.setattr("builtins.open", counting_open)
+    first = static_prompt("reporter")
+    second = static_prompt("reporter")
+    assert first is second
+    assert opened == [prompts.PROMPT_DIR / "static_reporter_agent_prompt.md"]
+
+
+def test_configuration_instructions_start_with_static_prompt() -> None:
+    """The static prompt is a stable prefix and the FASTA sketch follows it."""
+    seen = []
+
+    def model_function(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+        seen.append(messages[0].instructions)
+        return ModelResponse(parts=[ToolCallPart("final_result", {"analysis_scenario": "Mode A"})])
+
+    async def main() -> None:
+        agent = await get_configuration_agent(llm_api_key="x", llm_api_url="http://localhost:1/v1")
+        deps = ConfigurationAgentDeps(question="What is this?", fasta_sketch={"partitions": {"NT": {"total_records": 1}}})
+        with agent.override(model=FunctionModel(model_function)):
+            await agent.run("What is this?", deps=deps)
+            await agent.run("Something else?", deps=deps)
+
+    asyncio.run(main())
+    static = static_prompt("configuration").strip()
+    assert all(instructions.startswith(static) for instructions in seen)
+    assert '"total_records": 1' in seen[0]
+    assert seen[0] == seen[1]
@@ -0,0 +1,108 @@
+"""Tests for the reporter agent's hit retrieval tools."""
+
+import asyncio
+from typing import Any, List, Optional
+
+import pytest
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+from story_seq.agent.reporter_agent import ReporterAgentDeps, get_reporter_agent
+from story_seq.agent.reporter_tools import HitIndex
+from story_seq.models import BlastHit, BlastResult
+
+
+def hit(subject_id: str, bit_score: float, query_start: int, query_end: int, summary: Optional[str] = None,
+        query_id: str = "contig1", **kwargs: Any) -> BlastHit:
+    return BlastHit(
+        query_id=query_id, subject_id=subject_id, identity=kwargs.get("identity", 95.0),
+        alignment_length=query_end - query_start + 1, evalue=kwargs.get("evalue", 1e-20), bit_score=bit_score,
+        query_start=query_start, query_end=query_end, subject_start=1, subject_end=query_end - query_start + 1,
+        genbank_summary=summary, biosample_info=kwargs.get("biosample_info"),
+    )
+
+
+@pytest.fixture
+def results() -> List[BlastResult]:
+    species = BlastResult(
+        query_length=1000, database="nt", blast_method="megablast", search_reason="species identification",
+        hits=[
+            hit("CP000001.1", 900.0, 1, 500, "Escherichia coli K-12 chromosome"),
+            hit("CP000002.1", 400.0, 301, 700, "Shigella flexneri 2a chromosome", identity=88.0),
+            hit("CP000001.1", 120.0, 801, 900, "Escherichia coli K-12 chromosome"),
+        ],
+    )
+    protein = BlastResult(
+        query_length=1000, database="nr", blast_method="blastx", search_reason="function",
+        hits=[hit("WP_1.1", 300.0, 1, 450, "beta-lactamase TEM-1", evalue=1e-90,
+                  biosample_info="isolated from Escherichia coli wastewater")],
+    )
+    return [species, protein]
+
+
+def test_queries_over_the_indexed_hits(results: List[BlastResult]) -> None:
+    index = HitIndex(results)
+
+    assert [row["subject_id"] for row in index.top_hits(2)] == ["CP000001.1", "CP000002.1"]
+    best_evalue = index.top_hits(1, by="evalue")[0]
+    assert (best_evalue["search"], best_evalue["subject_id"]) == ("S2", "WP_1.1")
+    with pytest.raises(ValueError):
+        index.top_hits(by="score")
+
+    # Annotations of every kind are searched, best hit first
+    assert [row["subject_id"] for row in index.hits_for_taxon("escherichia COLI")] == ["CP000001.1", "WP_1.1", "CP000001.1"]
+    assert index.hits_for_taxon("Salmonella") == []
+
+    coverage, = index.coverage_summary("contig1")
+    assert coverage["covered"] == [[1, 700], [801, 900]]
+    assert coverage["gaps"] == [[701, 800], [901, 1000]]
+    assert coverage["percent_covered"] == 80.0
+
+    detail = index.hit_detail("CP000001")
+    assert [d["query_start"] for d in detail] == [1, 801]
+    assert detail[0]["blast_method"] == "megablast" and detail[0]["genbank_summary"].startswith("Escherichia")
+
+
+def test_coverage_summary_groups_hits_by_query(results: List[BlastResult]) -> None:
+    mixed = BlastResult(
+        query_length=400, database="nt", blast_method="blastn", search_reason="other contigs",
+        hits=[hit("A.1", 50.0, 1, 100, query_id="contig3"), hit("B.1", 60.0, 201, 400, query_id="contig2"),
+              hit("C.1", 70.0, 101, 200, query_id="contig3")],
+    )
+    summaries = HitIndex(results + [mixed]).coverage_summary()
+    assert [(s["query_id"], s["hits"]) for s in summaries] == [("contig1", 4), ("contig3", 2), ("contig2", 1)]
+    assert summaries[1]["covered"] == [[1, 200]] and summaries[2]["gaps"] == [[1, 200]]
+    assert HitIndex(results).coverage_summary("contig9") == [{"query_id": "contig9", "hits": 0}]
+    assert HitIndex([]).coverage_summary() == []
+
+
+def test_overview_does_not_grow_with_hits(results: List[BlastResult]) -> None:
+    many = results[0].model_copy(update={
+        "hits": results[0].hits + [hit(f"XX{i}.1", 10.0, 1, 50, "filler " * 30) for i in range(2000)],
+    })
+    small, large = HitIndex(results).overview(), HitIndex([many, results[1]]).overview()
+    assert "S1: megablast against nt" in small and "80.0% covered" in small
+    assert len(large) < len(small) + 50
+
+
+def test_reporter_prompt_has_overview_and_tools_fetch_hits(results: List[BlastResult], monkeypatch: pytest.MonkeyPatch) -> None:
+    seen: List[List[ModelMessage]] = []
+
+    def respond(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+        seen.append(messages)
+        assert {"top_hits", "hits_for_taxon", "coverage_summary", "hit_detail"} <= {t.name for t in info.function_tools}
+        if len(seen) == 1:
+            return ModelResponse(parts=[ToolCallPart("hits_for_taxon", {"name": "Shigella"})])
+        return ModelResponse(parts=[TextPart("The query is from Escherichia coli.")])
+
+    monkeypatch.setattr("story_seq.agent.reporter_agent.OpenAIModel", lambda *a, **k: FunctionModel(respond))
+    agent = asyncio.run(get_reporter_agent(llm_api_url="http://localhost:1/v1", llm_api_key="."))
+    deps = ReporterAgentDeps(blast_results=results, question="What is this?")
+    result = asyncio.run(agent.run("What is this?", deps=deps))
+
+    assert result.output == "The query is from Escherichia coli."
+    instructions = seen[0][0].instructions
+    assert "BLAST results overview" in instructions and "CP000001.1" in instructions
+    assert "subject_start" not in instructions
+    returned, = [p for m in seen[1] for p in m.parts if isinstance(p, ToolReturnPart)]
+    assert [row["subject_id"] for row in returned.content] == ["CP000002.1"]
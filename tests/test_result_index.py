@@ -0,0 +1,153 @@
+"""Tests for the index of earlier analyses."""
+
+import asyncio
+import random
+from pathlib import Path
+from typing import Dict, List
+
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from pydantic_graph import End, GraphRunContext
+
+from story_seq.config import StorySeqConfig
+from story_seq.models import AnalysisConfig, BlastHit, BlastResult
+from story_seq.pipeline.result_index import ResultIndex, canonical_sequence
+from story_seq.pipeline.state import PipelineOptions, PipelineState
+from story_seq.pipeline.tasks import call_blast_agent, call_reporter_agent, get_fasta_sketch
+
+CONFIG = AnalysisConfig(identify_unknown_dna=True, analysis_scenario="Mode A — Species Identification")
+
+
+def random_dna(length: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    return "".join(rng.choice("ACGT") for _ in range(length))
+
+
+def records(**sequences: str) -> Dict[str, SeqRecord]:
+    return {name: SeqRecord(Seq(seq), id=name) for name, seq in sequences.items()}
+
+
+def stored_result() -> List[BlastResult]:
+    hit = BlastHit(
+        query_id="gene", subject_id="NC_000913.3", identity=100.0, alignment_length=600,
+        evalue=0.0, bit_score=1100.0, query_start=1, query_end=600, subject_start=5001, subject_end=5600,
+    )
+    return [BlastResult(query_length=600, hits=[hit], database="nt", blast_method="megablast",
+                        search_reason="species identification")]
+
+
+def test_canonical_sequence_is_strand_independent() -> None:
+    dna = random_dna(50)
+    reverse = str(Seq(dna).reverse_complement())
+    assert canonical_sequence(dna)[0] == canonical_sequence(reverse.lower())[0]
+    assert canonical_sequence(dna)[2] != canonical_sequence(reverse)[2]
+    assert canonical_sequence("MKTAYIAKQR")[1] == "AA"
+
+
+def test_reverse_complement_resubmission_is_an_exact_match(tmp_path: Path) -> None:
+    """The same sequence on the other strand is found by digest, with hits flipped onto it."""
+    dna = random_dna(600)
+    index = ResultIndex(tmp_path / "index.sqlite")
+    index.add(records(gene=dna), "What is this?", CONFIG, stored_result(), "An E. coli gene.")
+
+    match = index.lookup(records(flipped=str(Seq(dna).reverse_complement())), "What is this?")
+
+    assert match is not None and match.exact
+    assert match.narrative == "An E. coli gene."
+    assert match.analysis_config == CONFIG
+    hit = match.blast_results[0].hits[0]
+    assert (hit.query_id, hit.query_start, hit.query_end) == ("flipped", 1, 600)
+    assert (hit.subject_start, hit.subject_end) == (5600, 5001)
+
+
+def test_substring_is_found_by_containment_and_clipped(tmp_path: Path) -> None:
+    """A fragment of an indexed sequence reuses the hits covering it, in its own coordinates."""
+    dna = random_dna(600)
+    index = ResultIndex(tmp_path / "index.sqlite")
+    index.add(records(gene=dna), "What is this?", CONFIG, stored_result(), "An E. coli gene.")
+
+    fragment = dna[200:500]
+    match = index.lookup(records(fragment=fragment), "Which species?")
+
+    assert match is not None and not match.exact
+    assert match.matches[0].offset == 200
+    result = match.blast_results[0]
+    assert result.query_length == 300
+    hit = result.hits[0]
+    assert (hit.query_start, hit.query_end, hit.alignment_length) == (1, 300, 300)
+    assert (hit.subject_start, hit.subject_end) == (5201, 5500)
+
+    # The reverse complement of the fragment maps to the same subject span, reversed
+    flipped = index.lookup(records(fragment=str(Seq(fragment).reverse_complement())))
+    hit = flipped.blast_results[0].hits[0]
+    assert (hit.query_start, hit.query_end) == (1, 300)
+    assert (hit.subject_start, hit.subject_end) == (5500, 5201)
+
+
+def test_one_record_of_a_stored_batch_is_not_an_exact_match(tmp_path: Path) -> None:
+    """A query holding only some records of an earlier batch reuses their hits, not the batch narrative."""
+    a, b = random_dna(600), random_dna(600, seed=2)
+    hits = [
+        BlastHit(query_id=query_id, subject_id=subject_id, identity=100.0, alignment_length=600, evalue=0.0,
+                 bit_score=1100.0, query_start=1, query_end=600, subject_start=1, subject_end=600)
+        for query_id, subject_id in (("a", "NC_000913.3"), ("b", "NC_007795.1"))
+    ]
+    orf_hit = hits[0].model_copy(update={"query_id": "a_orf1_1-600_f", "query_end": 199, "alignment_length": 199})
+    results = [BlastResult(query_length=600, hits=[hit], database="nt", blast_method="megablast", search_reason="")
+               for hit in hits]
+    results.append(BlastResult(query_length=199, hits=[orf_hit], database="nr", blast_method="blastp", search_reason=""))
+    index = ResultIndex(tmp_path / "index.sqlite")
+    index.add(records(a=a, b=b), "What is this?", CONFIG, results, "Batch narrative: a is E. coli and b is S. aureus")
+
+    match = index.lookup(records(a=a), "What is this?")
+    assert match is not None and not match.exact
+    assert [(r.blast_method, r.query_length, [h.query_id for h in r.hits]) for r in match.blast_results] == [
+        ("megablast", 600, ["a"]), ("blastp", 199, ["a_orf1_1-600_f"]),
+    ]
+    assert index.lookup(records(a=a, b=b), "What is this?").exact
+
+    # ORF hits are in protein coordinates, so a fragment does not reuse them
+    fragment = index.lookup(records(part=a[100:400]))
+    assert [r.blast_method for r in fragment.blast_results] == ["megablast"]
+
+
+def test_unrelated_or_mutated_sequences_are_not_reused(tmp_path: Path) -> None:
+    dna = random_dna(600)
+    index = ResultIndex(tmp_path / "index.sqlite")
+    index.add(records(gene=dna), "What is this?", CONFIG, stored_result(), "An E. coli gene.")
+
+    assert index.lookup(records(other=random_dna(600, seed=1))) is None
+    # Highly similar but not an exact substring: no reuse
+    mutated = dna[200:350] + ("A" if dna[350] != "A" else "C") + dna[351:500]
+    assert index.lookup(records(fragment=mutated)) is None
+
+
+def test_pipeline_answers_seen_sequences_from_the_index(tmp_path: Path) -> None:
+    """Same sequence and question ends the run at once; a fragment skips BLAST."""
+    dna = random_dna(600)
+    index_path = tmp_path / "index.sqlite"
+    ResultIndex(index_path).add(records(gene=dna), "What is this?", CONFIG, stored_result(), "An E. coli gene.")
+
+    def run_sketch(sequence: str, question: str) -> tuple:
+        query = tmp_path / "query.fna"
+        query.write_text(f">query\n{sequence}\n")
+        options = PipelineOptions(
+            config=StorySeqConfig(result_index_path=str(index_path)), query=str(query), question=question,
+        )
+        state = PipelineState(options=options)
+        chunks: List[str] = []
+        state.narrative_callback = chunks.append
+        node = asyncio.run(get_fasta_sketch().run(GraphRunContext(state=state, deps=None)))
+        return state, node, chunks
+
+    state, node, chunks = run_sketch(dna, "What is this?")
+    assert isinstance(node, End)
+    assert state.narrative == "An E. coli gene." and chunks == ["An E. coli gene."]
+    assert state.reused_analysis_id == 1
+
+    state, node, _ = run_sketch(dna[100:400], "What is this?")
+    assert isinstance(node, call_blast_agent)
+    node = asyncio.run(node.run(GraphRunContext(state=state, deps=None)))
+    assert isinstance(node, call_reporter_agent)
+    assert state.blast_results[0].hits[0].query_id == "query"
+    assert "index_match" not in state.model_dump(mode="json")
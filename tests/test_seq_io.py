@@ -0,0 +1,102 @@
+"""Tests for compressed FASTA input."""
+
+import gzip
+from pathlib import Path
+
+import pytest
+from Bio import bgzf
+
+from story_seq.util.fasta_sketch import analyze_single_fasta
+from story_seq.util.seq_io import (
+    detect_compression,
+    fasta_base_name,
+    fasta_records,
+    load_fasta_records,
+    open_fasta,
+    read_fasta_text,
+)
+
+FASTA = ">seq1 test\nATGAAACCCGGGTTTTAA\n>seq2\nMKVLAAGIELPQ\n"
+
+
+@pytest.fixture
+def fasta_files(tmp_path: Path) -> dict:
+    """Write the same FASTA content in every supported encoding."""
+    plain = tmp_path / "reads.fasta"
+    plain.write_text(FASTA)
+
+    gz = tmp_path / "reads.fna.gz"
+    with gzip.open(gz, "wt") as handle:
+        handle.write(FASTA)
+
+    bgz = tmp_path / "reads.fa.bgz"
+    with bgzf.BgzfWriter(str(bgz), "wb") as handle:
+        handle.write(FASTA.encode())
+
+    return {"none": plain, "gzip": gz, "bgzf": bgz}
+
+
+def test_detect_compression_from_magic_bytes(fasta_files: dict, tmp_path: Path) -> None:
+    """Test that detection uses content, not file names."""
+    for expected, path in fasta_files.items():
+        assert detect_compression(path) == expected
+
+    misnamed = tmp_path / "reads.txt"
+    misnamed.write_bytes(fasta_files["gzip"].read_bytes())
+    assert detect_compression(misnamed) == "gzip"
+
+
+def test_streaming_decode(fasta_files: dict) -> None:
+    """Test that every format decodes to the original text."""
+    for path in fasta_files.values():
+        assert read_fasta_text(path) == FASTA
+        with open(path, "rb") as raw, open_fasta(raw) as handle:
+            assert handle.read() == FASTA
+
+
+def test_zstd_decode(tmp_path: Path) -> None:
+    """Test streaming zstd decode."""
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "reads.fasta.zst"
+    path.write_bytes(zstandard.ZstdCompressor().compress(FASTA.encode()))
+    assert detect_compression(path) == "zstd"
+    assert read_fasta_text(path) == FASTA
+
+
+def test_bgzf_random_access(fasta_files: dict) -> None:
+    """Test record lookup by id on an indexed bgzip file."""
+    with fasta_records(fasta_files["bgzf"]) as records:
+        assert str(records["seq2"].seq) == "MKVLAAGIELPQ"
+    assert len(load_fasta_records(fasta_files["gzip"])) == 2
+
+
+def test_handles_and_indexes_are_closed(fasta_files: dict) -> None:
+    """Test that closing a decoded handle closes its source, and that indexes are closed on exit."""
+    for path in fasta_files.values():
+        raw = open(path, "rb")
+        with open_fasta(raw) as handle:
+            handle.read()
+        assert raw.closed
+
+    with fasta_records(fasta_files["none"]) as records:
+        assert str(records["seq1"].seq) == "ATGAAACCCGGGTTTTAA"
+        handle = records._proxy._handle
+    assert handle.closed
+    with fasta_records(fasta_files["gzip"]) as records:
+        assert len(records) == 2
+
+
+def test_sketch_reads_compressed_mixed_file(fasta_files: dict) -> None:
+    """Test sketching and mixed-file splitting of a gzip input."""
+    result = analyze_single_fasta(str(fasta_files["gzip"]))
+    analysis = result["analysis"]
+    assert analysis["file_alphabet_type"] == "mixed"
+    assert analysis["partitions"]["NT"]["output_file"].endswith("reads_NT.fasta")
+    assert Path(analysis["partitions"]["AA"]["output_file"]).exists()
+
+
+def test_fasta_base_name() -> None:
+    """Test stripping compression and FASTA extensions."""
+    assert fasta_base_name("dir/reads.fna.gz") == "dir/reads"
+    assert fasta_base_name("reads.fasta.zst") == "reads"
+    assert fasta_base_name("reads.fasta") == "reads"
@@ -0,0 +1,105 @@
+"""Tests for single-flight coalescing of identical concurrent calls."""
+
+import asyncio
+from typing import Any, List, Tuple
+
+import pytest
+
+from story_seq.util.single_flight import SingleFlight, flight_key
+
+
+def test_concurrent_identical_calls_share_one_result() -> None:
+    group = SingleFlight("test")
+    started = []
+
+    async def lookup(accession: str) -> str:
+        started.append(accession)
+        await asyncio.sleep(0.02)
+        if accession == "BAD":
+            raise ValueError("no such accession")
+        return f"summary of {accession}"
+
+    async def main() -> Tuple[List[str], List[Any], str]:
+        calls = [group.do(flight_key("esummary", a), lambda a=a: lookup(a)) for a in ["NC_1", "NC_1", "NC_2", "NC_1"]]
+        results = await asyncio.gather(*calls)
+        failures = await asyncio.gather(*(group.do("BAD", lambda: lookup("BAD")) for _ in range(2)), return_exceptions=True)
+        # Once the first call finished, the same key runs again (caching is the caller's business)
+        again = await group.do(flight_key("esummary", "NC_1"), lambda: lookup("NC_1"))
+        return results, failures, again
+
+    results, failures, again = asyncio.run(main())
+    assert results == ["summary of NC_1", "summary of NC_1", "summary of NC_2", "summary of NC_1"]
+    assert all(isinstance(f, ValueError) for f in failures)
+    assert again == "summary of NC_1"
+    assert started == ["NC_1", "NC_2", "BAD", "NC_1"]
+    assert group.metrics == {"calls": 4, "coalesced": 3}
+    assert group.in_flight == 0
+
+
+def test_cancelled_waiter_does_not_cancel_the_shared_call() -> None:
+    group = SingleFlight("test")
+    finished = []
+
+    async def search() -> str:
+        await asyncio.sleep(0.05)
+        finished.append(True)
+        return "report"
+
+    async def main() -> None:
+        leader = asyncio.create_task(group.do("q", search))
+        follower = asyncio.create_task(group.do("q", search))
+        await asyncio.sleep(0.01)
+        leader.cancel()  # e.g. the first pipeline hit its deadline
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert await follower == "report"
+
+        # Nobody waiting any more: the call itself is cancelled
+        lone = asyncio.create_task(group.do("q2", search))
+        await asyncio.sleep(0.01)
+        lone.cancel()
+        await asyncio.sleep(0.06)
+
+    asyncio.run(main())
+    assert finished == [True]
+
+
+def test_bound_call_reruns_for_waiters_when_its_owner_is_cancelled() -> None:
+    group = SingleFlight("test")
+    calls = []
+
+    class Session:
+        """Stands in for a pipeline's MCP session, closed when the pipeline stops."""
+
+        def __init__(self, name: str) -> None:
+            self.name = name
+            self.closed = False
+
+        async def search(self) -> str:
+            calls.append(self.name)
+            await asyncio.sleep(0.05)
+            if self.closed:
+                raise RuntimeError("session closed")
+            return f"report via {self.name}"
+
+    async def pipeline(name: str) -> str:
+        session = Session(name)
+        try:
+            return await group.do("q", session.search, bound=True)
+        finally:
+            session.closed = True
+
+    async def main() -> Tuple[str, str]:
+        first = asyncio.create_task(pipeline("first"))
+        second = asyncio.create_task(pipeline("second"))
+        third = asyncio.create_task(pipeline("third"))
+        await asyncio.sleep(0.01)
+        first.cancel()  # e.g. the first pipeline hit its deadline
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, await third
+
+    # The waiters run the search once more, on the first remaining waiter's session
+    assert asyncio.run(main()) == ("report via second", "report via second")
+    assert calls == ["first", "second"]
+    assert group.in_flight == 0
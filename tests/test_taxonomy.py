@@ -0,0 +1,130 @@
+"""Tests for the offline taxonomy index, on a tiny synthetic taxdump."""
+
+import random
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pytest
+
+from story_seq.models import BlastHit, BlastResult
+from story_seq.util.taxonomy import CACHE_DIRNAME, TaxonomyIndex, load_taxonomy
+
+# taxid, parent, rank, scientific name
+NODES = [
+    (1, 1, "no rank", "root"),
+    (2, 131567, "domain", "Bacteria"),
+    (131567, 1, "cellular root", "cellular organisms"),
+    (1224, 2, "phylum", "Pseudomonadota"),
+    (1236, 1224, "class", "Gammaproteobacteria"),
+    (543, 1236, "family", "Enterobacteriaceae"),
+    (561, 543, "genus", "Escherichia"),
+    (562, 561, "species", "Escherichia coli"),
+    (83333, 562, "strain", "Escherichia coli K-12"),
+    (564, 561, "species", "Escherichia fergusonii"),
+    (590, 543, "genus", "Salmonella"),
+    (28901, 590, "species", "Salmonella enterica"),
+    (1239, 2, "phylum", "Bacillota"),
+    (1280, 1239, "species", "Staphylococcus aureus"),
+]
+
+
+def write_taxdump(
+    path: Path,
+    nodes: Sequence[Tuple[int, int, str, str]] = NODES,
+    merged: Iterable[Tuple[int, int]] = ((469598, 562),),
+) -> Path:
+    with open(path / "nodes.dmp", "w") as handle:
+        for taxid, parent, rank, _ in nodes:
+            handle.write(f"{taxid}\t|\t{parent}\t|\t{rank}\t|\t\t|\t0\t|\n")
+    with open(path / "names.dmp", "w") as handle:
+        for taxid, _, _, name in nodes:
+            handle.write(f"{taxid}\t|\t{name}\t|\t\t|\tscientific name\t|\n")
+            handle.write(f"{taxid}\t|\t{name.lower()} alias\t|\t\t|\tsynonym\t|\n")
+    with open(path / "merged.dmp", "w") as handle:
+        for old, new in merged:
+            handle.write(f"{old}\t|\t{new}\t|\n")
+    return path
+
+
+def hit(subject_id: str, taxid: Optional[int], bit_score: float, query_id: str = "q1") -> BlastHit:
+    return BlastHit(query_id=query_id, subject_id=subject_id, identity=99.0, alignment_length=100, evalue=1e-40,
+                    bit_score=bit_score, query_start=1, query_end=100, subject_start=1, subject_end=100,
+                    subject_taxid=taxid)
+
+
+def test_lca_lineage_and_cached_memory_map(tmp_path: Path) -> None:
+    write_taxdump(tmp_path)
+    taxonomy = load_taxonomy(tmp_path)
+    assert isinstance(taxonomy.parent, np.memmap)
+    assert (tmp_path / CACHE_DIRNAME / "euler.npy").exists()
+    assert load_taxonomy(tmp_path) is taxonomy
+
+    assert taxonomy.lca([83333, 564]) == 561
+    assert taxonomy.lca([562, 28901, 83333]) == 543
+    assert taxonomy.lca([562, 1280]) == 2
+    assert taxonomy.lca([564]) == 564
+    assert taxonomy.lca([469598, 564]) == 561  # merged taxid
+    assert taxonomy.lca([999999, -5]) is None
+    assert [t.name for t in taxonomy.lineage(83333, major_only=True)] == [
+        "Bacteria", "Pseudomonadota", "Gammaproteobacteria", "Enterobacteriaceae", "Escherichia",
+        "Escherichia coli", "Escherichia coli K-12",
+    ]
+    assert taxonomy.taxon(562).rank == "species"
+
+
+def test_lca_matches_brute_force_on_a_random_tree(tmp_path: Path) -> None:
+    rng = random.Random(7)
+    nodes = [(1, 1, "no rank", "root")]
+    for taxid in range(2, 800):
+        nodes.append((taxid, rng.choice(nodes[-40:])[0], "no rank", f"taxon {taxid}"))
+    rng.shuffle(nodes)
+    taxonomy = TaxonomyIndex.from_taxdump(write_taxdump(tmp_path, nodes, merged=()))
+    parents = {taxid: parent for taxid, parent, _, _ in nodes}
+
+    def path(taxid: int) -> List[int]:
+        lineage = [taxid]
+        while lineage[-1] != 1:
+            lineage.append(parents[lineage[-1]])
+        return lineage
+
+    for _ in range(300):
+        taxa = rng.sample(range(1, 800), rng.randint(2, 4))
+        common = set.intersection(*(set(path(t)) for t in taxa))
+        assert taxonomy.lca(taxa) == max(common, key=lambda t: len(path(t)))
+
+
+def test_summarize_weights_subjects_by_best_bit_score(tmp_path: Path) -> None:
+    taxonomy = TaxonomyIndex.from_taxdump(write_taxdump(tmp_path))
+    results = [
+        BlastResult(query_length=100, database="nt", blast_method="megablast", search_reason="", hits=[
+            hit("A1", 83333, 500.0), hit("A1", 83333, 90.0), hit("A2", 562, 480.0),
+            hit("A3", 564, 300.0), hit("A4", 1280, 60.0), hit("A5", None, 400.0),
+        ]),
+        BlastResult(query_length=100, database="nt", blast_method="blastn", search_reason="",
+                    hits=[hit("A1", 83333, 90.0)]),
+    ]
+    summary = taxonomy.summarize(results)
+    assert (summary.hits, summary.unplaced) == (5, 1)
+    assert summary.lca.name == "Bacteria"
+    # E. coli holds 980 of 1340 bit-score votes; with a stricter threshold the call moves up to the genus
+    assert summary.weighted_lca.name == "Escherichia coli"
+    assert summary.support == pytest.approx(980 / 1340)
+    assert summary.lineage[-2:] == [taxonomy.taxon(561), taxonomy.taxon(562)]
+    assert taxonomy.summarize(results, min_support=0.9).weighted_lca.name == "Escherichia"
+    assert [taxon.name for taxon, _ in summary.top_taxa][:2] == ["Escherichia coli K-12", "Escherichia coli"]
+    assert "Weighted LCA: Escherichia coli (species, taxid 562) with 73%" in summary.describe()
+
+
+def test_saving_over_a_cache_leaves_only_the_new_one(tmp_path: Path) -> None:
+    (tmp_path / "taxdump").mkdir()
+    taxonomy = TaxonomyIndex.from_taxdump(write_taxdump(tmp_path / "taxdump"))
+    cache = tmp_path / "cache"
+    taxonomy.save(cache, {"nodes.dmp": [1, 1]})
+    old = TaxonomyIndex.load(cache)  # memory-mapped from the cache being replaced
+
+    taxonomy.save(cache, {"nodes.dmp": [2, 2]})
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["cache", "taxdump"]
+    assert '"nodes.dmp": [2, 2]' in (cache / "meta.json").read_text()
+    assert TaxonomyIndex.load(cache).lca([83333, 564]) == old.lca([83333, 564]) == 561